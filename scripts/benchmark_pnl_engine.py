@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""
+Benchmark for the local P&L engine (ledger_cfo.integrations.qbo_ledger).
+
+Generates synthetic transaction lines over several years and times:
+  * extracting postings from raw QBO transaction JSON (the cold start after a mirror sync),
+  * building the engine (one grouped aggregation over every line),
+  * a monthly P&L with a Total column, and a multi-period comparison,
+  * the same monthly report with a plain Python loop, for reference.
+
+Usage:
+    python scripts/benchmark_pnl_engine.py --lines 1000000 --years 5
+"""
+import argparse
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from ledger_cfo.integrations.qbo_ledger import LedgerLines, PnLEngine, lines_from_transactions, period_buckets  # noqa: E402
+
+ACCOUNT_TYPES = ["Income"] * 20 + ["Cost of Goods Sold"] * 10 + ["Expense"] * 60 + ["Other Income"] * 5 + ["Other Expense"] * 5
+
+
+def timed(label, func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    print(f"{label:<48} {time.perf_counter() - started:8.3f}s")
+    return result
+
+
+def synthetic_columns(n_lines, years, rng):
+    days = np.datetime64(f"{2025 - years}-01-01") + rng.integers(0, 365 * years, n_lines)
+    account_ids = rng.integers(0, len(ACCOUNT_TYPES), n_lines).astype(str)
+    amounts = np.round(rng.uniform(1, 2000, n_lines), 2)
+    return days, account_ids, amounts
+
+
+def synthetic_raw_transactions(days, account_ids, amounts, lines_per_txn=4):
+    """Groups the columns into Purchases of lines_per_txn account-based expense lines each."""
+    purchases = []
+    for start in range(0, len(amounts), lines_per_txn):
+        purchases.append({"TxnDate": str(days[start]), "Line": [
+            {"DetailType": "AccountBasedExpenseLineDetail", "Amount": float(amounts[i]),
+             "AccountBasedExpenseLineDetail": {"AccountRef": {"value": account_ids[i]}}}
+            for i in range(start, min(start + lines_per_txn, len(amounts)))]})
+    return {"Purchase": purchases}
+
+
+def python_loop_report(days, account_ids, amounts, buckets):
+    """Straightforward per-line loop: bucket lookup plus dict accumulation."""
+    bounds = [(np.datetime64(start), np.datetime64(end)) for _, start, end in buckets]
+    starts = np.array([b[0] for b in bounds])
+    totals = defaultdict(float)
+    for day, account_id, amount in zip(days.tolist(), account_ids.tolist(), amounts.tolist()):
+        index = int(np.searchsorted(starts, np.datetime64(day), side="right")) - 1
+        if 0 <= index < len(bounds) and day <= bounds[index][1]:
+            totals[(account_id, index)] += amount
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--skip-loop", action="store_true", help="Skip the (slow) plain Python reference loop")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    accounts = {str(i): {"name": f"Account {i}", "account_type": t} for i, t in enumerate(ACCOUNT_TYPES)}
+    days, account_ids, amounts = synthetic_columns(args.lines, args.years, rng)
+    start, end = f"{2025 - args.years}-01-01", "2024-12-31"
+    print(f"{args.lines:,} lines over {args.years} years, {len(accounts)} accounts\n")
+
+    raw = synthetic_raw_transactions(days, account_ids, amounts)
+    timed(f"extract postings from {len(raw['Purchase']):,} raw transactions", lines_from_transactions, raw, {})
+    lines = timed("columns -> LedgerLines", LedgerLines.from_columns, days, account_ids, amounts)
+    engine = timed("build engine (grouped aggregation)", PnLEngine, lines, accounts)
+    report = timed("monthly P&L + Total", engine.report, start, end, "Month")
+    timed("quarterly P&L + Total", engine.report, start, end, "Quarter")
+    timed("compare 3 periods", engine.compare, {"2024": ("2024-01-01", "2024-12-31"), "2023": ("2023-01-01", "2023-12-31"),
+                                                "Q4 2024": ("2024-10-01", "2024-12-31")})
+    print(f"\nNet income {start}..{end}: {report['totals']['NetIncome'][-1]:,.2f} across {len(report['columns'])} columns")
+
+    if not args.skip_loop:
+        loop_totals = timed("monthly P&L, plain Python loop", python_loop_report, days, account_ids, amounts,
+                            period_buckets(start, end, "Month"))
+        engine_total = engine.totals([(start, end)]).sum()
+        print(f"Loop and engine agree: {np.isclose(sum(loop_totals.values()), engine_total)}")
+
+
+if __name__ == "__main__":
+    main()
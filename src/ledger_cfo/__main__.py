@@ -8,12 +8,15 @@ import subprocess
 import time
 from typing import Dict, List, Any, Optional, Tuple
 import inspect
+import threading
 
 # Import core and integration modules
 from .core.config import get_secret
 from .core.constants import Intent
 from .core.database import get_db_session, get_engine
 from .core import crud # Import crud
+from .core import metrics # In-process counters/histograms for /metrics
+from .core.executors import InstrumentedExecutor # Sized thread pools per blocking subsystem
 from .core.logging_config import configure_logging # <-- Import new config function
 from .integrations.gmail_api import (
     get_gmail_service,
@@ -31,6 +34,7 @@ from .processing.nlu import check_for_confirmation # Keep confirmation check
 from .processing.tasks import dispatch_task, execute_confirmed_action # Remove PENDING_CONFIRMATIONS import
 from .processing import llm_orchestrator # Import the LLM orchestrator
 from .integrations import qbo_api # Import the full module for tool access
+from .integrations.qbo_sync import sync_qbo_mirror, warm_directory # CDC sync of the local QBO mirror
 from tenacity import retry, stop_after_attempt, wait_exponential # For ask_claude retry
 
 # Configure logging using the new module
@@ -39,6 +43,11 @@ logger = logging.getLogger(__name__) # Get logger after configuration
 
 # --- Global Constants ---
 REACT_MAX_STEPS = 10 # Maximum steps for the ReAct loop
+# Claude consultations block a thread for up to 120s each; keep them off the default executor (used by CALCULATE)
+CLAUDE_EXECUTOR_WORKERS = int(os.getenv("CLAUDE_EXECUTOR_WORKERS", "4"))
+claude_executor = InstrumentedExecutor("claude", CLAUDE_EXECUTOR_WORKERS)
+# Sync customers/vendors and load the name directory in the background when the app starts
+QBO_WARM_ON_STARTUP = os.getenv("QBO_WARM_ON_STARTUP", "false").lower() == "true"
 
 # Create Flask app
 app = Flask(__name__)
@@ -102,6 +111,14 @@ def health_check():
     # Could add DB check later if needed
     return "OK", 200
 
+# --- Metrics Endpoint --- #
+@app.route("/metrics", methods=["GET"])
+def metrics_snapshot():
+    """In-process counters and histograms (QBO queue wait, rate-limit hits, ...) as JSON."""
+    snapshot = metrics.snapshot()
+    snapshot['qbo_token_seconds_left'] = qbo_api.get_qbo_token_seconds_left()
+    return jsonify(snapshot), 200
+
 # --- Core Email Processing Logic --- #
 async def process_emails():
     """
@@ -383,6 +400,42 @@ async def task_process_emails():
         logger.error(f"Unhandled exception in task_process_emails: {e}", exc_info=True)
         return "Internal Server Error during email processing.", 500
 
+# Endpoint to bring the local QBO mirror up to date (for Cloud Scheduler/cron)
+@app.route('/tasks/sync-qbo', methods=['POST'])
+async def task_sync_qbo():
+    """Runs an incremental CDC sync of the QBO mirror tables."""
+    logger.info("Received request to sync the QBO mirror.")
+    qbo_client = get_qbo_client()
+    if not qbo_client:
+        logger.error("Failed to initialize QBO client for mirror sync.")
+        return "Error: QBO client initialization failed.", 500
+    try:
+        with get_db_session() as db:
+            stats = await sync_qbo_mirror(qbo_client, db)
+            db.commit()
+        return jsonify(stats), 200
+    except Exception as e:
+        logger.error(f"QBO mirror sync failed: {e}", exc_info=True)
+        return "Internal Server Error during QBO mirror sync.", 500
+
+def warm_qbo_directory():
+    """Bulk-syncs customers and vendors and loads the in-process name directory. Logs and returns on failure."""
+    qbo_client = get_qbo_client()
+    if not qbo_client:
+        logger.error("Failed to initialize QBO client for the directory warm-up.")
+        return
+    try:
+        started = time.monotonic()
+        with get_db_session() as db:
+            stats = asyncio.run(warm_directory(qbo_client, db))
+            db.commit()
+        logger.info(f"QBO directory warm-up finished in {time.monotonic() - started:.1f}s: {stats}")
+    except Exception as e:
+        logger.error(f"QBO directory warm-up failed; names will be resolved on demand: {e}", exc_info=True)
+
+if QBO_WARM_ON_STARTUP:
+    threading.Thread(target=warm_qbo_directory, name="qbo-directory-warmup", daemon=True).start()
+
 # --- Tool Execution Functions --- #
 
 async def execute_qbo_tool(action_name: str, params: dict, qbo_client, db_session) -> Any:
@@ -395,12 +448,14 @@ async def execute_qbo_tool(action_name: str, params: dict, qbo_client, db_sessio
         "QBO_FIND_ESTIMATES": qbo_api.find_estimates,
         "QBO_GET_ESTIMATE_DETAILS": qbo_api.get_estimate_details,
         "QBO_CREATE_INVOICE": qbo_api.create_invoice,
+        "QBO_CREATE_ESTIMATE": qbo_api.create_estimate,
         "QBO_SEND_INVOICE": qbo_api.send_invoice,
         "QBO_VOID_INVOICE": qbo_api.void_invoice,
         "QBO_FIND_ITEM": qbo_api.find_item,
         "QBO_CREATE_PURCHASE": qbo_api.create_purchase,
-        # Add generate_pnl_report if re-enabled later
-        # "QBO_GENERATE_PNL": qbo_api.generate_pnl_report,
+        "QBO_GENERATE_PNL": qbo_api.generate_pnl_report,
+        "QBO_GET_REPORT": qbo_api.get_report,
+        "QBO_GET_AR_AGING": qbo_api.get_ar_aging,
     }
 
     target_func = func_mapping.get(action_name)
@@ -737,7 +792,7 @@ async def execute_react_loop(initial_request: str, conversation_id: str, qbo_cli
                     claude_query = f"The assistant is stuck in a ReAct loop for request '{initial_request[:100]}...'. Current history: {json.dumps(history)}. The last LLM response lacked an action or final answer: {json.dumps(llm_response_to_save)}. What should be the next observation or action?"
                     try:
                         logger.info("Consulting Claude for missing action.", extra=log_context)
-                        claude_suggestion = await asyncio.to_thread(run_ask_claude_sync, claude_query, claude_consultations + 1)
+                        claude_suggestion = await claude_executor.run(run_ask_claude_sync, claude_query, claude_consultations + 1, operation="ask_claude")
                         claude_consultations += 1
                         if claude_suggestion:
                             logger.info(f"Claude suggested: {claude_suggestion}", extra=log_context)
@@ -802,7 +857,7 @@ async def execute_react_loop(initial_request: str, conversation_id: str, qbo_cli
                             claude_query = f"The assistant encountered an error executing tool '{action}' with params {json.dumps(action_params)} for request '{initial_request[:100]}...'. Error: {error_detail}. Current history: {json.dumps(history[-4:])}. How should the assistant proceed or retry?"
                             try:
                                 logger.info("Consulting Claude for tool error.", extra=log_context)
-                                claude_suggestion = await asyncio.to_thread(run_ask_claude_sync, claude_query, claude_consultations + 1)
+                                claude_suggestion = await claude_executor.run(run_ask_claude_sync, claude_query, claude_consultations + 1, operation="ask_claude")
                                 claude_consultations += 1
                                 if claude_suggestion:
                                     logger.info(f"Claude suggested for tool error: {claude_suggestion}", extra=log_context)
@@ -859,7 +914,7 @@ async def execute_react_loop(initial_request: str, conversation_id: str, qbo_cli
                         claude_query = f"The assistant encountered an unexpected system error while trying to execute tool '{action}' with params {json.dumps(action_params)} for request '{initial_request[:100]}...'. Error: {tool_exec_err}. Current history: {json.dumps(history[-4:])}. How should the assistant proceed?"
                         try:
                             logger.info("Consulting Claude for unexpected tool error.", extra=log_context)
-                            claude_suggestion = await asyncio.to_thread(run_ask_claude_sync, claude_query, claude_consultations + 1)
+                            claude_suggestion = await claude_executor.run(run_ask_claude_sync, claude_query, claude_consultations + 1, operation="ask_claude")
                             claude_consultations += 1
                             if claude_suggestion:
                                 logger.info(f"Claude suggested for system error: {claude_suggestion}", extra=log_context)
@@ -898,7 +953,7 @@ async def execute_react_loop(initial_request: str, conversation_id: str, qbo_cli
                 claude_query = f"The ReAct loop encountered an unexpected error on step {step+1} for request '{initial_request[:100]}...'. Error: {loop_err}. Current history: {json.dumps(history[-4:])}. How should the assistant proceed or recover?"
                 try:
                     logger.info("Consulting Claude for loop error.", extra=log_context)
-                    claude_suggestion = await asyncio.to_thread(run_ask_claude_sync, claude_query, claude_consultations + 1)
+                    claude_suggestion = await claude_executor.run(run_ask_claude_sync, claude_query, claude_consultations + 1, operation="ask_claude")
                     claude_consultations += 1
                     if claude_suggestion:
                         logger.info(f"Claude suggested recovery for loop error: {claude_suggestion}", extra=log_context)
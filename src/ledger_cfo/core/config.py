@@ -130,6 +130,39 @@ def get_secret(internal_key: str, project_id: str | None = None) -> str | None:
         logging.error(f"An unexpected error occurred trying to access secret ID '{secret_id}' in project '{target_project_id}': {e}", exc_info=True)
         return None
 
+def add_secret_version(internal_key: str, value: str, project_id: str | None = None) -> bool:
+    """
+    Stores a new version of a secret in Google Cloud Secret Manager (e.g. a rotated refresh token).
+
+    Args:
+        internal_key: The Secret ID in Secret Manager. The secret itself must already exist.
+        value: The new secret value.
+        project_id: The GCP Project ID. Uses GCP_PROJECT_ID env var if not provided.
+
+    Returns:
+        True if the new version was added, False on error.
+    """
+    if not secret_manager_client:
+        logging.error("Secret Manager client is not available. Cannot store secret version.")
+        return False
+
+    target_project_id = project_id or GCP_PROJECT_ID
+    if not target_project_id:
+        logging.error("GCP Project ID is not configured. Cannot store secret version.")
+        return False
+
+    parent = f"projects/{target_project_id}/secrets/{internal_key}"
+    try:
+        secret_manager_client.add_secret_version(parent=parent, payload={"data": value.encode("UTF-8")})
+        logging.info(f"Stored new version of secret: {internal_key}")
+        return True
+    except PermissionDenied:
+        logging.error(f"Permission denied adding a version to secret ID '{internal_key}'. Ensure the running identity has the 'Secret Manager Secret Version Adder' role.")
+        return False
+    except Exception as e:
+        logging.error(f"An unexpected error occurred adding a version to secret ID '{internal_key}': {e}", exc_info=True)
+        return False
+
 # Example usage (optional, for direct testing of this module)
 # if __name__ == "__main__":
 #     logging.basicConfig(level=logging.INFO)
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import select, update, delete, and_
+from sqlalchemy import select, update, delete, and_, or_
 import logging
 from datetime import datetime, timedelta
 
@@ -9,6 +9,8 @@ from ..models.pending_action import PendingAction
 from ..models.vendor_cache import VendorCache
 from ..models.account_cache import AccountCache
 from ..models.conversation_history import ConversationHistory
+from ..models.sync_state import QBOSyncState
+from ..models.qbo_cache_entry import QBOCacheEntry, QBOCacheSetMember
 
 logger = logging.getLogger(__name__)
 
@@ -366,4 +368,163 @@ def save_conversation_turn(db: Session, conversation_id: str, turn_data: dict):
     # Flush may be needed here if commit happens later
     # db.flush()
     logger.debug(f"Added turn {next_sequence} for conversation {conversation_id} to session.")
-    # The commit should happen within the main loop after successful processing of the turn 
\ No newline at end of file
+    # The commit should happen within the main loop after successful processing of the turn
+
+# --- QBO Mirror CRUD --- #
+
+MIRROR_UPSERT_CHUNK_SIZE = 500 # Rows per INSERT ... ON CONFLICT statement
+
+def _insert_for_dialect(db: Session):
+    """Returns the dialect-specific insert() that supports ON CONFLICT, or None if unsupported."""
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+def bulk_upsert_mirror_rows(db: Session, model, key_column: str, rows: list[dict]) -> int:
+    """
+    Inserts or updates mirror rows keyed on a unique QBO ID column, in chunks,
+    using INSERT ... ON CONFLICT DO UPDATE. Returns the number of rows written.
+    """
+    if not rows:
+        return 0
+    logger.info(f"Bulk upserting {len(rows)} rows into {model.__tablename__}.")
+    dialect_insert = _insert_for_dialect(db)
+    if dialect_insert is None:
+        # Fallback for other databases: merge row by row through the ORM
+        logger.warning(f"No ON CONFLICT support for dialect {db.get_bind().dialect.name}; upserting row by row.")
+        existing = {getattr(obj, key_column): obj for obj in db.execute(
+            select(model).where(getattr(model, key_column).in_([r[key_column] for r in rows]))).scalars()}
+        for row in rows:
+            obj = existing.get(row[key_column]) or model()
+            for column_name, value in row.items():
+                setattr(obj, column_name, value)
+            db.add(obj)
+        db.flush()
+        return len(rows)
+
+    for start in range(0, len(rows), MIRROR_UPSERT_CHUNK_SIZE):
+        chunk = rows[start:start + MIRROR_UPSERT_CHUNK_SIZE]
+        statement = dialect_insert(model).values(chunk)
+        update_columns = {name: statement.excluded[name] for name in chunk[0] if name != key_column}
+        statement = statement.on_conflict_do_update(index_elements=[key_column], set_=update_columns)
+        db.execute(statement)
+    db.flush()
+    return len(rows)
+
+def delete_mirror_rows(db: Session, model, key_column: str, qbo_ids: list[str]) -> int:
+    """Deletes mirror rows whose QBO ID is in qbo_ids. Returns the number of rows deleted."""
+    if not qbo_ids:
+        return 0
+    statement = delete(model).where(getattr(model, key_column).in_(qbo_ids))
+    result = db.execute(statement)
+    logger.info(f"Deleted {result.rowcount} rows from {model.__tablename__}.")
+    return result.rowcount
+
+def get_sync_states(db: Session) -> dict[str, QBOSyncState]:
+    """Returns the sync state of every mirrored entity, keyed by entity name."""
+    statement = select(QBOSyncState)
+    return {state.entity_name: state for state in db.execute(statement).scalars()}
+
+def update_sync_state(db: Session, entity_name: str, high_water_mark: datetime) -> QBOSyncState:
+    """Records a new high-water mark for an entity after a successful sync."""
+    state = db.get(QBOSyncState, entity_name)
+    if state:
+        state.high_water_mark = high_water_mark
+        state.last_synced_at = datetime.utcnow()
+    else:
+        state = QBOSyncState(entity_name=entity_name, high_water_mark=high_water_mark, last_synced_at=datetime.utcnow())
+    db.add(state)
+    db.flush()
+    logger.debug(f"Sync state for {entity_name} set to high-water mark {high_water_mark}.")
+    return state
+
+# --- Shared QBO Cache CRUD ---
+# Backs the SQL implementation of the L2 cache tier (integrations/qbo_cache_backends.py).
+# Expiry times are Unix timestamps; expired rows are ignored on read and purged periodically.
+
+def _not_expired(column, now: float):
+    return or_(column.is_(None), column > now)
+
+def get_cache_entry(db: Session, cache_key: str, now: float) -> bytes | None:
+    """Returns the stored value for cache_key, or None if it is missing or expired."""
+    statement = select(QBOCacheEntry.value).where(QBOCacheEntry.cache_key == cache_key, _not_expired(QBOCacheEntry.expires_at, now))
+    return db.execute(statement).scalar_one_or_none()
+
+def set_cache_entry(db: Session, cache_key: str, value: bytes, expires_at: float | None):
+    """Inserts or replaces a cache entry."""
+    dialect_insert = _insert_for_dialect(db)
+    if dialect_insert is None:
+        db.merge(QBOCacheEntry(cache_key=cache_key, value=value, expires_at=expires_at))
+    else:
+        statement = dialect_insert(QBOCacheEntry).values(cache_key=cache_key, value=value, expires_at=expires_at)
+        statement = statement.on_conflict_do_update(index_elements=['cache_key'], set_={'value': value, 'expires_at': expires_at})
+        db.execute(statement)
+    db.flush()
+
+def delete_cache_keys(db: Session, cache_keys: list[str], now: float) -> int:
+    """Deletes the entries and sets named by cache_keys. Returns how many live ones were deleted."""
+    if not cache_keys:
+        return 0
+    live_entries = db.execute(select(QBOCacheEntry.cache_key).where(
+        QBOCacheEntry.cache_key.in_(cache_keys), _not_expired(QBOCacheEntry.expires_at, now))).scalars().all()
+    live_sets = db.execute(select(QBOCacheSetMember.set_key).distinct().where(
+        QBOCacheSetMember.set_key.in_(cache_keys), _not_expired(QBOCacheSetMember.expires_at, now))).scalars().all()
+    db.execute(delete(QBOCacheEntry).where(QBOCacheEntry.cache_key.in_(cache_keys)))
+    db.execute(delete(QBOCacheSetMember).where(QBOCacheSetMember.set_key.in_(cache_keys)))
+    db.flush()
+    return len(live_entries) + len(live_sets)
+
+def add_cache_set_members(db: Session, set_key: str, members: list[str], now: float) -> int:
+    """Adds members to a cache set, ignoring ones already present. Returns how many were added."""
+    # An expired set is gone: start it afresh, as Redis would
+    db.execute(delete(QBOCacheSetMember).where(QBOCacheSetMember.set_key == set_key, QBOCacheSetMember.expires_at <= now))
+    existing = {row.member: row.expires_at for row in db.execute(
+        select(QBOCacheSetMember.member, QBOCacheSetMember.expires_at).where(QBOCacheSetMember.set_key == set_key))}
+    set_expires_at = next(iter(existing.values()), None) # New members share the set's expiry
+    new_members = [m for m in dict.fromkeys(members) if m not in existing]
+    if not new_members:
+        return 0
+    rows = [{'set_key': set_key, 'member': member, 'expires_at': set_expires_at} for member in new_members]
+    dialect_insert = _insert_for_dialect(db)
+    if dialect_insert is None:
+        db.add_all(QBOCacheSetMember(**row) for row in rows)
+    else:
+        # Another worker may add the same member concurrently
+        db.execute(dialect_insert(QBOCacheSetMember).values(rows).on_conflict_do_nothing())
+    db.flush()
+    return len(new_members)
+
+def get_cache_set_members(db: Session, set_key: str, now: float) -> set[str]:
+    """Returns the members of a cache set, or an empty set if it is missing or expired."""
+    statement = select(QBOCacheSetMember.member).where(QBOCacheSetMember.set_key == set_key, _not_expired(QBOCacheSetMember.expires_at, now))
+    return set(db.execute(statement).scalars())
+
+def expire_cache_key(db: Session, cache_key: str, expires_at: float) -> bool:
+    """Sets the expiry of an entry or set. Returns False if neither exists."""
+    updated = db.execute(update(QBOCacheEntry).where(QBOCacheEntry.cache_key == cache_key).values(expires_at=expires_at)).rowcount
+    updated += db.execute(update(QBOCacheSetMember).where(QBOCacheSetMember.set_key == cache_key).values(expires_at=expires_at)).rowcount
+    db.flush()
+    return updated > 0
+
+def find_cache_keys(db: Session, prefix: str, now: float) -> list[str]:
+    """Returns the live entry and set keys starting with prefix."""
+    escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    entries = db.execute(select(QBOCacheEntry.cache_key).where(
+        QBOCacheEntry.cache_key.like(f"{escaped}%", escape='\\'), _not_expired(QBOCacheEntry.expires_at, now))).scalars()
+    sets = db.execute(select(QBOCacheSetMember.set_key).distinct().where(
+        QBOCacheSetMember.set_key.like(f"{escaped}%", escape='\\'), _not_expired(QBOCacheSetMember.expires_at, now))).scalars()
+    return list(entries) + list(sets)
+
+def purge_expired_cache_rows(db: Session, now: float) -> int:
+    """Deletes expired cache entries and set members. Returns the number of rows deleted."""
+    deleted = db.execute(delete(QBOCacheEntry).where(QBOCacheEntry.expires_at <= now)).rowcount
+    deleted += db.execute(delete(QBOCacheSetMember).where(QBOCacheSetMember.expires_at <= now)).rowcount
+    db.flush()
+    if deleted:
+        logger.debug(f"Purged {deleted} expired shared cache rows.")
+    return deleted
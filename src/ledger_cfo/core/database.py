@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import create_engine, Engine
+from sqlalchemy import create_engine, Engine, inspect, text
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
 from google.cloud.sql.connector import Connector, IPTypes
 import pg8000
@@ -43,6 +43,29 @@ def get_db_connection_details() -> dict:
         logger.error(f"Failed to get DB connection details from Secret Manager: {e}", exc_info=True)
         raise
 
+def _add_missing_columns(engine: Engine):
+    """
+    Adds nullable columns that exist on the models but not yet in the database.
+    create_all only creates missing tables, so this covers columns added to existing
+    tables (e.g. the QBO mirror columns on customer_cache). Only additive changes are made.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {col['name'] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                if not column.nullable:
+                    logger.warning(f"Cannot add NOT NULL column {table.name}.{column.name} automatically. Migrate it manually.")
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                logger.info(f"Adding missing column {table.name}.{column.name} ({column_type}).")
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
 # This function is now internal, called only when needed by get_db_session or get_engine
 def _initialize_database(test_config=None):
     """
@@ -109,6 +132,7 @@ def _initialize_database(test_config=None):
             # calling get_db_session/get_engine for the first time (__main__.py)
             from .. import models # Adjust if models are elsewhere relative to database.py
             Base.metadata.create_all(bind=temp_engine)
+            _add_missing_columns(temp_engine)
             logger.info("Database tables checked/created successfully.")
         except Exception as table_exc:
             logger.error(f"Failed to create database tables: {table_exc}", exc_info=True)
@@ -0,0 +1,83 @@
+"""
+Named, sized thread pools for blocking work called from async code.
+
+asyncio.to_thread runs everything on the loop's default executor, so one slow subsystem
+(e.g. a 120s Claude consultation) can occupy the threads another one (QBO SDK calls) needs.
+Each subsystem gets its own InstrumentedExecutor instead, which reports per operation:
+
+  * executor_queue_depth (gauge): calls submitted but not yet started,
+  * executor_wait_seconds (histogram): time from submission to a worker picking the call up,
+  * executor_run_seconds (histogram): time spent running in the worker.
+"""
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+def operation_name(func: Callable) -> str:
+    """Metric label for a callable: 'Invoice.get' for Invoice.get (not the mixin's 'ReadMixin.get')."""
+    owner = getattr(func, "__self__", None)
+    if owner is not None and hasattr(func, "__name__"):
+        owner_name = owner.__name__ if isinstance(owner, type) else type(owner).__name__
+        return f"{owner_name}.{func.__name__}"
+    return getattr(func, "__qualname__", repr(func))
+
+class InstrumentedExecutor:
+    """A fixed-size thread pool usable from any event loop, with queue and latency metrics."""
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        # Created on first use so importing a module never starts threads
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+            return self._pool
+
+    def queue_depth(self, operation: str) -> float:
+        return metrics.gauge("executor_queue_depth", executor=self.name, operation=operation).value
+
+    async def run(self, func: Callable, *args, operation: Optional[str] = None, **kwargs) -> Any:
+        """Runs func(*args, **kwargs) on this pool (like asyncio.to_thread, context variables included) and awaits it."""
+        operation = operation or operation_name(func)
+        queue_depth = metrics.gauge("executor_queue_depth", executor=self.name, operation=operation)
+        context = contextvars.copy_context()
+        submitted_at = time.monotonic()
+
+        def _run_instrumented():
+            started_at = time.monotonic()
+            queue_depth.dec()
+            metrics.histogram("executor_wait_seconds", executor=self.name, operation=operation).observe(started_at - submitted_at)
+            try:
+                return context.run(func, *args, **kwargs)
+            finally:
+                metrics.histogram("executor_run_seconds", executor=self.name, operation=operation).observe(time.monotonic() - started_at)
+
+        queue_depth.inc()
+        try:
+            future = self.pool.submit(_run_instrumented)
+        except Exception:
+            queue_depth.dec() # Never queued (e.g. pool shut down)
+            raise
+        # A caller cancelled while queued cancels the call too; it then never leaves the queue by running
+        future.add_done_callback(lambda f: queue_depth.dec() if f.cancelled() else None)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            logger.info(f"Shutting down executor '{self.name}'")
+            pool.shutdown(wait=wait)
@@ -0,0 +1,126 @@
+"""
+In-process metrics: counters, gauges and histograms keyed by name and labels.
+
+Kept dependency-free on purpose; snapshot() returns plain dicts, served as JSON by the
+/metrics route in __main__ and easy to forward to any monitoring backend later.
+"""
+import bisect
+import threading
+from typing import Dict, Tuple
+
+# Upper bounds (seconds) suited to latencies from sub-millisecond cache hits to slow QBO calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Tuple], "Counter"] = {}
+_gauges: Dict[Tuple[str, Tuple], "Gauge"] = {}
+_histograms: Dict[Tuple[str, Tuple], "Histogram"] = {}
+
+class Counter:
+    """A monotonically increasing count."""
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+class Gauge:
+    """A value that goes up and down, e.g. a queue depth."""
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def set(self, value: float):
+        with self._lock:
+            self._value = value
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+class Histogram:
+    """Count, sum, max and cumulative bucket counts of observed values."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._bucket_counts = [0] * (len(self.buckets) + 1) # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            self.max = max(self.max, value)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            cumulative, running = {}, 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), self._bucket_counts):
+                running += bucket_count
+                cumulative['+Inf' if bound == float('inf') else str(bound)] = running
+            return {'count': self.count, 'sum': self.sum, 'max': self.max, 'buckets': cumulative}
+
+def _key(name: str, labels: dict) -> Tuple[str, Tuple]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def counter(name: str, **labels) -> Counter:
+    """Returns (creating if needed) the counter for name and labels."""
+    key = _key(name, labels)
+    with _lock:
+        if key not in _counters:
+            _counters[key] = Counter()
+        return _counters[key]
+
+def gauge(name: str, **labels) -> Gauge:
+    """Returns (creating if needed) the gauge for name and labels."""
+    key = _key(name, labels)
+    with _lock:
+        if key not in _gauges:
+            _gauges[key] = Gauge()
+        return _gauges[key]
+
+def histogram(name: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **labels) -> Histogram:
+    """Returns (creating if needed) the histogram for name and labels."""
+    key = _key(name, labels)
+    with _lock:
+        if key not in _histograms:
+            _histograms[key] = Histogram(buckets)
+        return _histograms[key]
+
+def snapshot() -> dict:
+    """Returns every metric as {'counters': [...], 'gauges': [...], 'histograms': [...]} with labels inlined."""
+    with _lock:
+        counters = list(_counters.items())
+        gauges = list(_gauges.items())
+        histograms = list(_histograms.items())
+    return {
+        'counters': [{'name': name, 'labels': dict(labels), 'value': c.value} for (name, labels), c in counters],
+        'gauges': [{'name': name, 'labels': dict(labels), 'value': g.value} for (name, labels), g in gauges],
+        'histograms': [{'name': name, 'labels': dict(labels), **h.snapshot()} for (name, labels), h in histograms],
+    }
+
+def reset():
+    """Drops every metric. Intended for tests."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
@@ -0,0 +1,138 @@
+"""
+Chart-of-accounts resolver.
+
+create_purchase has to turn free text ("fuel", "Office supplies", "Amex") into account IDs
+of the right type. AccountResolver indexes one version of the chart of accounts (the list
+get_qbo_accounts returns) once:
+
+  * by normalized name ("Meals & Entertainment" and "meals and entertainment" are one key),
+  * by normalized fully qualified path ("Utilities:Gas and Electric"),
+  * by account type and by account sub-type,
+
+so exact lookups are dict hits. Only a name with no exact match falls back to a ranked fuzzy
+search, restricted to the requested account types. qbo_api.get_account_resolver keeps one
+resolver per chart-of-accounts generation.
+"""
+import difflib
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+EXPENSE_ACCOUNT_TYPES = ("Expense", "Other Expense", "Cost of Goods Sold")
+PAYMENT_ACCOUNT_TYPES = ("Bank", "Credit Card")
+MIN_FUZZY_SCORE = 0.8 # Posting to a wrong account is worse than asking; keep fuzzy matches close
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+_CAMEL_BOUNDARY = re.compile(r"(?<=[a-z])(?=[A-Z])")
+
+def normalize_account_name(name: Optional[str]) -> str:
+    """
+    Case-folded, '&' read as 'and', camel case split (sub-types like 'EntertainmentMeals'),
+    punctuation and whitespace collapsed to single spaces.
+    """
+    spaced = _CAMEL_BOUNDARY.sub(" ", name or "").casefold().replace("&", " and ")
+    return " ".join(_NON_ALNUM.sub(" ", spaced).split())
+
+def normalize_account_path(path: Optional[str]) -> str:
+    """A fully qualified name with each ':'-separated segment normalized."""
+    return ":".join(normalize_account_name(segment) for segment in (path or "").split(":"))
+
+class AccountResolver:
+    """O(1) exact lookups over one version of the chart of accounts, plus a ranked fuzzy fallback."""
+
+    def __init__(self, accounts: Iterable[Dict[str, Any]]):
+        # Inactive accounts cannot be posted to
+        self.accounts = [account for account in accounts if account.get("active") is not False]
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._by_name: Dict[str, List[Dict[str, Any]]] = {}
+        self._by_path: Dict[str, Dict[str, Any]] = {}
+        self._by_type: Dict[str, List[Dict[str, Any]]] = {}
+        self._by_sub_type: Dict[str, List[Dict[str, Any]]] = {}
+        for account in self.accounts:
+            self._by_id[str(account.get("qbo_account_id"))] = account
+            self._by_name.setdefault(normalize_account_name(account.get("name")), []).append(account)
+            self._by_path[normalize_account_path(account.get("fully_qualified_name") or account.get("name"))] = account
+            self._by_type.setdefault(normalize_account_name(account.get("account_type")), []).append(account)
+            if account.get("account_sub_type"):
+                self._by_sub_type.setdefault(normalize_account_name(account.get("account_sub_type")), []).append(account)
+
+    def __len__(self) -> int:
+        return len(self.accounts)
+
+    def get(self, account_id: str) -> Optional[Dict[str, Any]]:
+        return self._by_id.get(str(account_id))
+
+    def by_type(self, account_type: str, sub_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Accounts of a type (e.g. 'Bank'), optionally narrowed to a sub-type (e.g. 'Checking')."""
+        if sub_type is None:
+            return list(self._by_type.get(normalize_account_name(account_type), []))
+        return [a for a in self._by_sub_type.get(normalize_account_name(sub_type), [])
+                if normalize_account_name(a.get("account_type")) == normalize_account_name(account_type)]
+
+    @staticmethod
+    def _type_rank(account_types: Optional[Sequence[str]]) -> Dict[str, int]:
+        return {normalize_account_name(t): i for i, t in enumerate(account_types or ())}
+
+    def _of_types(self, accounts: Iterable[Dict[str, Any]], account_types: Optional[Sequence[str]]) -> List[Dict[str, Any]]:
+        """accounts restricted to account_types, in the order the types are listed (earlier types preferred)."""
+        if not account_types:
+            return list(accounts)
+        rank = self._type_rank(account_types)
+        matching = [a for a in accounts if normalize_account_name(a.get("account_type")) in rank]
+        return sorted(matching, key=lambda a: rank[normalize_account_name(a.get("account_type"))])
+
+    def find_exact(self, name: str, account_types: Optional[Sequence[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        The account whose fully qualified path, or else name, is name. Among accounts sharing
+        a name, earlier account_types win, then top-level accounts over sub-accounts.
+        """
+        if ":" in name:
+            account = self._by_path.get(normalize_account_path(name))
+            if account is not None and self._of_types([account], account_types):
+                return account
+        by_name = self._of_types(self._by_name.get(normalize_account_name(name), []), account_types)
+        if not by_name:
+            return None
+        rank = self._type_rank(account_types)
+        return min(by_name, key=lambda a: (rank.get(normalize_account_name(a.get("account_type")), 0), bool(a.get("parent_account_id"))))
+
+    def find_fuzzy(self, name: str, account_types: Optional[Sequence[str]] = None, limit: int = 5,
+                   min_score: float = MIN_FUZZY_SCORE) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        Accounts of account_types ranked by similarity of name to their name, path leaf or
+        sub-type: every query word present scores 0.9, otherwise the difflib ratio.
+        """
+        query = normalize_account_name(name)
+        if not query:
+            return []
+        query_words = set(query.split())
+        candidates = self._of_types(self.accounts, account_types) if account_types else self.accounts
+        scored = []
+        for position, account in enumerate(candidates):
+            best = 0.0
+            for text in (account.get("name"), (account.get("fully_qualified_name") or "").split(":")[-1], account.get("account_sub_type")):
+                normalized = normalize_account_name(text)
+                if not normalized:
+                    continue
+                score = difflib.SequenceMatcher(None, query, normalized).ratio()
+                if query_words <= set(normalized.split()):
+                    score = max(score, 0.9)
+                best = max(best, score)
+            if best >= min_score:
+                scored.append((best, position, account))
+        scored.sort(key=lambda entry: (-entry[0], entry[1]))
+        return [(score, account) for score, _, account in scored[:limit]]
+
+    def resolve(self, name: str, account_types: Optional[Sequence[str]] = None) -> Optional[Dict[str, Any]]:
+        """Exact path or name first, then the best fuzzy match above MIN_FUZZY_SCORE; None if neither."""
+        account = self.find_exact(name, account_types)
+        if account is not None:
+            return account
+        ranked = self.find_fuzzy(name, account_types, limit=1)
+        if ranked:
+            score, account = ranked[0]
+            logger.info(f"Resolved account '{name}' to '{account.get('name')}' (ID: {account.get('qbo_account_id')}) by fuzzy match ({score:.2f}).")
+            return account
+        return None
@@ -0,0 +1,107 @@
+"""
+Accounts receivable aging over every open invoice at once.
+
+Answering "who owes us money" one customer at a time (transactions, then arithmetic) takes
+dozens of tool calls. age_receivables instead takes the open invoices of all customers as
+arrays (customer code, due date, balance), computes days past due for all of them in one
+vectorized step, and sums balances per (customer, aging bucket) with a single np.bincount.
+
+Open invoices come from the mirror's indexed columns (load_open_invoices) or, when the
+mirror is stale, from one projected QBO query (open_invoices_from_raw). Balances are the
+invoices' current balances: an as_of date other than today moves the aging, not the balances.
+"""
+import datetime
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..models import InvoiceMirror
+
+logger = logging.getLogger(__name__)
+
+# Bucket labels and the last day past due each covers (the final bucket is open-ended)
+AGING_BUCKETS = ("current", "1-30", "31-60", "61-90", "91+")
+AGING_BUCKET_LIMITS = np.array([0, 30, 60, 90]) # Days past due: <= 0 is current, 1-30, 31-60, 61-90, above is 91+
+
+# The invoice fields aging needs; live queries select only these
+OPEN_INVOICE_FIELDS = ["DueDate", "TxnDate", "Balance", "CustomerRef"]
+
+@dataclass
+class OpenInvoices:
+    """Columnar open invoices: customer codes into customer_ids, due dates and open balances."""
+    customers: np.ndarray # int32 codes into customer_ids
+    due_dates: np.ndarray # datetime64[D]; the transaction date when an invoice has no due date
+    balances: np.ndarray # float64
+    customer_ids: List[str]
+    customer_names: List[Optional[str]]
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[Optional[str], Optional[str], Any, Any, Any]]) -> "OpenInvoices":
+        """Builds the arrays from (customer_id, customer_name, due_date, txn_date, balance) rows; zero balances are skipped."""
+        codes: Dict[str, int] = {}
+        names: List[Optional[str]] = []
+        customers, due_dates, balances = [], [], []
+        for customer_id, customer_name, due_date, txn_date, balance in rows:
+            if not balance or not (due_date or txn_date):
+                continue
+            customer_id = customer_id or "unknown"
+            if customer_id not in codes:
+                codes[customer_id] = len(codes)
+                names.append(customer_name)
+            customers.append(codes[customer_id])
+            due_dates.append(str(due_date or txn_date)[:10])
+            balances.append(float(balance))
+        return cls(np.array(customers, dtype=np.int32), np.array(due_dates, dtype="datetime64[D]"),
+                   np.array(balances, dtype=np.float64), list(codes), names)
+
+    def __len__(self) -> int:
+        return len(self.balances)
+
+def load_open_invoices(db: Session) -> OpenInvoices:
+    """Open invoices from the mirror's indexed columns (no JSON decoding)."""
+    statement = select(InvoiceMirror.customer_id, InvoiceMirror.customer_name, InvoiceMirror.due_date,
+                       InvoiceMirror.txn_date, InvoiceMirror.balance).where(InvoiceMirror.balance > 0)
+    return OpenInvoices.from_rows(db.execute(statement))
+
+def open_invoices_from_raw(raws: Iterable[Dict[str, Any]]) -> OpenInvoices:
+    """Open invoices from raw QBO invoices (e.g. the rows of a Balance > '0' query)."""
+    return OpenInvoices.from_rows(((raw.get("CustomerRef") or {}).get("value"), (raw.get("CustomerRef") or {}).get("name"),
+                                   raw.get("DueDate"), raw.get("TxnDate"), raw.get("Balance")) for raw in raws)
+
+def age_receivables(invoices: OpenInvoices, as_of: Optional[datetime.date] = None) -> Dict[str, Any]:
+    """
+    Sums open balances per customer and aging bucket as of a date (default today).
+    Returns {"as_of", "buckets", "customers", "totals"}; customers are dicts of customer_id,
+    customer_name, one amount per bucket, total and open_invoices, largest total first.
+    """
+    as_of = as_of or datetime.date.today()
+    days_past_due = (np.datetime64(as_of, "D") - invoices.due_dates).astype(np.int64)
+    buckets = np.searchsorted(AGING_BUCKET_LIMITS, days_past_due, side="left")
+    n_customers, n_buckets = len(invoices.customer_ids), len(AGING_BUCKETS)
+    amounts = np.bincount(invoices.customers.astype(np.int64) * n_buckets + buckets, weights=invoices.balances,
+                          minlength=n_customers * n_buckets).reshape(n_customers, n_buckets)
+    counts = np.bincount(invoices.customers, minlength=n_customers)
+    amounts = np.round(amounts, 2)
+    customer_totals = np.round(amounts.sum(axis=1), 2)
+
+    customers = []
+    for index in np.argsort(-customer_totals, kind="stable"):
+        customers.append({
+            "customer_id": invoices.customer_ids[index],
+            "customer_name": invoices.customer_names[index],
+            **{label: float(amount) for label, amount in zip(AGING_BUCKETS, amounts[index])},
+            "total": float(customer_totals[index]),
+            "open_invoices": int(counts[index]),
+        })
+    bucket_totals = np.round(amounts.sum(axis=0), 2)
+    return {
+        "as_of": as_of.isoformat(),
+        "buckets": list(AGING_BUCKETS),
+        "customers": customers,
+        "totals": {**{label: float(amount) for label, amount in zip(AGING_BUCKETS, bucket_totals)},
+                   "total": float(round(bucket_totals.sum(), 2))},
+    }
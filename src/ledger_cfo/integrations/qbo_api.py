@@ -1,11 +1,13 @@
 import logging
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Sequence
 from sqlalchemy.orm import Session
 import datetime
 import time
 from cachetools import TTLCache
 import asyncio # Added for async/sync execution
 import os
+import json
+import dataclasses
 
 from quickbooks.objects.customer import Customer
 from quickbooks.objects.invoice import Invoice
@@ -16,9 +18,11 @@ from quickbooks.objects.detailline import SalesItemLine, SalesItemLineDetail, Ac
 from quickbooks.objects.item import Item
 from quickbooks.objects.account import Account
 from quickbooks.objects.term import Term
+from quickbooks.objects.paymentmethod import PaymentMethod
 from quickbooks.objects.purchase import Purchase
 from quickbooks.objects.vendor import Vendor
 from quickbooks.objects.company_info import CompanyInfo # Import CompanyInfo
+from quickbooks.objects.preferences import Preferences
 from quickbooks.exceptions import QuickbooksException, AuthorizationException, ValidationException
 
 # from quickbooks.auth import AuthClient # Reverted - Assuming this path is correct if library installed properly
@@ -29,6 +33,27 @@ from intuitlib.client import AuthClient # Import the correct AuthClient
 # Assuming get_secret is correctly defined in core.config
 from ..core.config import get_secret
 from ..core import crud # Import CRUD operations
+from .qbo_errors import QBOError, AuthenticationError, NotFoundError, InvalidDataError, RateLimitError, map_qbo_exception
+from . import qbo_batch # Batch request payload/response handling
+from .qbo_concurrency import fan_out # Concurrent fan-out capped per realm
+from . import qbo_mirror # Local mirror read path (kept fresh by qbo_sync)
+from .qbo_query import QBOQuery, normalize_fields, project # Projected queries returning light records
+from .qbo_pagination import QBOPaginator, QueryCoalescer, QBO_MAX_PAGE_SIZE, window_starts, window_sql # Streaming and bulk pagination
+from .qbo_cache import TieredCache, CacheKey, customer_tag, entity_tag, entity_type_tag, lookup_tag # Tagged L1/L2 caches
+from .qbo_cache import single_flight # Coalesces concurrent identical cache misses
+from .qbo_cache import StaleWhileRevalidateCache # Reference data served stale while refreshing
+from . import qbo_cache
+from .qbo_rate_limit import rate_limiter # Realm-scoped token bucket + AIMD backoff
+from . import qbo_http # Asyncio-native transport, enabled per function via QBO_ASYNC_HTTP
+from . import qbo_reports # Report parameters, closed periods and Rows/ColData parsing
+from .qbo_reports import parse_date_range # Re-exported for nlu
+from . import qbo_ledger # Local P&L engine over the mirror
+from . import qbo_aging # Vectorized AR aging
+from . import qbo_customer_index # In-memory fuzzy customer search
+from . import qbo_directory # In-process name -> ID index of customers and vendors
+from . import qbo_accounts # Indexed chart-of-accounts resolver
+from . import qbo_items # Indexed item catalog
+from .qbo_auth import QBOTokenManager, RefreshTokenStore, SecretManagerRefreshTokenStore # Background token refresh
 # Removed unused model imports (handled by crud)
 # from ..models.customer import CustomerCache
 # from ..models.vendor_cache import VendorCache
@@ -37,27 +62,43 @@ from ..core import crud # Import CRUD operations
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # --- Custom Exception Hierarchy ---
-class QBOError(Exception):
-    """Base exception for Ledger CFO QBO integration errors."""
-    def __init__(self, message, original_exception=None):
-        super().__init__(message)
-        self.original_exception = original_exception
-
-class AuthenticationError(QBOError): pass
-class NotFoundError(QBOError): pass
-class InvalidDataError(QBOError): pass
-class RateLimitError(QBOError): pass
+# QBOError, AuthenticationError, NotFoundError, InvalidDataError and RateLimitError are
+# defined in qbo_errors (so helper modules can share them) and re-exported from here.
 
 # --- Caching ---
 # Evaluate cache TTLs. Customer/Vendor/Account data might be stable longer.
 # Transactional data (invoices, estimates, searches) should have shorter TTLs.
-customer_cache = TTLCache(maxsize=100, ttl=3600)  # 1 hour
 vendor_cache = TTLCache(maxsize=100, ttl=3600) # 1 hour
-account_cache = TTLCache(maxsize=1, ttl=3600) # Cache the whole CoA for 1 hour (use force_refresh)
-estimate_cache = TTLCache(maxsize=200, ttl=600)   # 10 minutes
-transaction_cache = TTLCache(maxsize=500, ttl=300) # 5 minutes
-details_cache = TTLCache(maxsize=200, ttl=600) # Cache individual txn details for 10 mins
-search_cache = TTLCache(maxsize=100, ttl=120) # Cache search results for 2 minutes
+# Slow-changing reference data is served stale (and refreshed in the background) after its TTL,
+# but never once older than QBO_REFERENCE_MAX_STALENESS_SECONDS
+QBO_REFERENCE_MAX_STALENESS_SECONDS = float(os.getenv("QBO_REFERENCE_MAX_STALENESS_SECONDS", "21600")) # 6 hours
+account_cache = StaleWhileRevalidateCache('accounts', ttl=3600, max_staleness=QBO_REFERENCE_MAX_STALENESS_SECONDS) # Whole CoA, fresh for 1 hour (use force_refresh)
+reference_cache = StaleWhileRevalidateCache('reference_data', ttl=3600, max_staleness=QBO_REFERENCE_MAX_STALENESS_SECONDS) # Items, terms, payment methods
+REFERENCE_ENTITIES = {'Item': Item, 'Term': Term, 'PaymentMethod': PaymentMethod}
+# Transactional caches are tagged (see qbo_cache) so write paths evict only dependent entries,
+# and shared between processes through the optional L2 tier (QBO_CACHE_L2_URL).
+# Customer details carry the customer's tag: invoices, payments and voids change its Balance.
+customer_cache = TieredCache('customers', maxsize=2000, ttl=3600)  # 1 hour; sized for bulk enrichment of recent transactions
+estimate_cache = TieredCache('estimates', maxsize=200, ttl=600)   # 10 minutes
+transaction_cache = TieredCache('transactions', maxsize=500, ttl=300) # 5 minutes
+# Full invoice/estimate documents and search result lists are held as compact serialized bytes
+# (see qbo_cache.CompactValue) and bounded by total size rather than entry count
+QBO_DETAILS_CACHE_BYTES = int(os.getenv("QBO_DETAILS_CACHE_BYTES", str(16 * 1024 * 1024)))
+QBO_SEARCH_CACHE_BYTES = int(os.getenv("QBO_SEARCH_CACHE_BYTES", str(8 * 1024 * 1024)))
+details_cache = TieredCache('details', maxsize=200, ttl=600, max_bytes=QBO_DETAILS_CACHE_BYTES) # Cache individual txn details for 10 mins
+search_cache = TieredCache('search', maxsize=100, ttl=120, max_bytes=QBO_SEARCH_CACHE_BYTES) # Cache search results for 2 minutes
+# Reports on open periods are evicted by writes to the transactions they total; closed periods cannot change
+report_cache = TieredCache('reports', maxsize=100, ttl=qbo_reports.QBO_OPEN_REPORT_TTL_SECONDS)
+closed_report_cache = TieredCache('closed_reports', maxsize=1000, ttl=qbo_reports.QBO_CLOSED_REPORT_TTL_SECONDS)
+# Names QBO just reported missing, so a retried lookup in the same conversation skips the query.
+# Kept short: an entity created outside this process only shows up once its entry expires.
+QBO_NOT_FOUND_TTL_SECONDS = float(os.getenv("QBO_NOT_FOUND_TTL_SECONDS", "120"))
+not_found_cache = TieredCache('not_found', maxsize=1000, ttl=QBO_NOT_FOUND_TTL_SECONDS)
+TRANSACTIONAL_CACHES = (customer_cache, estimate_cache, transaction_cache, details_cache, search_cache, report_cache, not_found_cache)
+
+# Multi-entity reads go through QBO's /batch endpoint by default; set to 'false' to send
+# them as concurrent individual queries instead.
+QBO_USE_BATCH_API = os.getenv('QBO_USE_BATCH_API', 'true').lower() == 'true'
 
 logger = logging.getLogger(__name__)
 
@@ -67,56 +108,373 @@ def _handle_qbo_sdk_error(e, context="QBO API call"):
     """Maps specific python-quickbooks exceptions to custom exceptions."""
     error_message = f"Error during {context}: {e}"
     logger.error(error_message, exc_info=True)
+    raise map_qbo_exception(e, context=context) from e
 
-    # Check for specific QBO exceptions first
-    if isinstance(e, AuthorizationException):
-        raise AuthenticationError(f"QBO authentication/authorization failed: {e}", original_exception=e) from e
-    # elif isinstance(e, NotFoundException): # Handled below by error code check
-    #     raise NotFoundError(f"QBO object not found or inactive: {e}", original_exception=e) from e
-    elif isinstance(e, ValidationException):
-        raise InvalidDataError(f"QBO data validation failed: {e}", original_exception=e) from e
-    # elif isinstance(e, RateLimitExceededException): # Handled below by error code check
-    #    raise RateLimitError(f"QBO rate limit exceeded: {e}", original_exception=e) from e
-    elif isinstance(e, QuickbooksException):
-        # Check for specific error codes within the base QuickbooksException
-        error_code = getattr(e, 'error_code', None)
-        # Safely get detail, handling if it's a string or missing
-        detail_attr = getattr(e, 'detail', None)
-        if isinstance(detail_attr, dict):
-            http_status_code = detail_attr.get('status', None)
-        else:
-            # If detail is not a dict (e.g., string, None), status code is unknown from detail
-            http_status_code = None
+def _cache_key(qbo_client: QuickBooks, operation: str, **params) -> CacheKey:
+    """Structured cache key for a read against the client's realm."""
+    return qbo_cache.cache_key(operation, _realm_of(qbo_client), **params)
 
-        # Log the raw detail if it wasn't a dict, for debugging
-        if not isinstance(detail_attr, dict) and detail_attr is not None:
-            logger.warning(f"QBO Exception detail was not a dictionary: {detail_attr}")
+def _not_found_key(qbo_client: QuickBooks, entity_name: str, name: str) -> CacheKey:
+    return _cache_key(qbo_client, 'not_found', entity=entity_name, name=qbo_directory.normalize_name(name))
 
-        if error_code and 600 <= int(error_code) < 700:
-            # Treat QBO 6xx error codes as NotFound
-            raise NotFoundError(f"QBO object not found or inactive (Error code: {error_code}): {e}", original_exception=e) from e
-        elif http_status_code == 429 or (error_code and error_code == '8012'): # Check HTTP 429 or QBO specific code
-            # Treat as RateLimitError
-            raise RateLimitError(f"QBO rate limit exceeded (HTTP Status: {http_status_code}, Error code: {error_code}): {e}", original_exception=e) from e
-        else:
-            # Catch-all for other QBO-specific errors
-            raise QBOError(f"A QBO specific error occurred (Error code: {error_code}): {e}", original_exception=e) from e
-    else:
-        # For non-QBO exceptions (network errors, etc.)
-        raise QBOError(f"An unexpected error occurred: {e}", original_exception=e) from e
+def _known_missing(qbo_client: QuickBooks, entity_name: str, name: str) -> bool:
+    """True if QBO reported no entity_name called name within QBO_NOT_FOUND_TTL_SECONDS."""
+    return not_found_cache.get(_not_found_key(qbo_client, entity_name, name)) is not None
+
+def _remember_missing(qbo_client: QuickBooks, entity_name: str, name: str):
+    term = qbo_directory.normalize_name(name)
+    not_found_cache.set(_not_found_key(qbo_client, entity_name, name), True, tags=[entity_type_tag(entity_name), lookup_tag(entity_name, term)])
+
+def _forget_missing(entity_name: str, name: str):
+    """Drops the not-found entry for a name that now exists (found or created)."""
+    qbo_cache.invalidate([not_found_cache], [lookup_tag(entity_name, qbo_directory.normalize_name(name))], reason=f"{entity_name} '{name}' exists")
+
+def _invalidate_after_write(entity_name: str, entity_id: Optional[str] = None, customer_id: Optional[str] = None):
+    """Evicts the cached reads a write to one entity can make stale: its details, its customer's lists, and lists of its type."""
+    tags = [entity_type_tag(entity_name)]
+    if entity_id:
+        tags.append(entity_tag(entity_name, entity_id))
+    if customer_id:
+        tags.append(customer_tag(customer_id))
+    qbo_cache.invalidate(TRANSACTIONAL_CACHES, tags, reason=f"write to {entity_name} {entity_id or ''}".strip())
+
+def _mirror_saved(db: Optional[Session], entity_name: str, saved_sdk):
+    """Stores an entity QBO returned from a write in the mirror, so mirror-served reads see the write at once."""
+    qbo_mirror.write_back(db, entity_name, [json.loads(saved_sdk.to_json())])
+
+async def _remirror_entity(qbo_client: QuickBooks, db: Optional[Session], EntityClass, entity_id: str, operation: str):
+    """
+    Re-reads an entity a write changed as a side effect (e.g. the invoice a payment was applied to)
+    and stores it in the mirror. Never raises: the write itself succeeded, and the next sync catches up.
+    """
+    if db is None:
+        return
+    try:
+        entity = await _read_entity(qbo_client, EntityClass, entity_id, operation)
+    except Exception as e:
+        logger.warning(f"Could not re-read {EntityClass.__name__} {entity_id} for the QBO mirror; it stays stale until the next sync: {e}")
+        return
+    _mirror_saved(db, EntityClass.__name__, entity)
+
+def _ref_id(ref) -> Optional[str]:
+    """Returns the value of an SDK Ref (object or dict), e.g. invoice.CustomerRef."""
+    if ref is None:
+        return None
+    return ref.get('value') if isinstance(ref, dict) else getattr(ref, 'value', None)
+
+def _realm_of(qbo_client) -> str:
+    return str(getattr(qbo_client, 'company_id', None) or 'default')
 
-def _generate_cache_key(*args, **kwargs):
-    """Generates a cache key from function arguments."""
-    # Consider sorting kwargs for consistency if order might change
-    return str(args) + str(sorted(kwargs.items()))
+def _realm_for_call(func, kwargs) -> str:
+    """Finds the realm a QBO SDK call targets: the 'qb' kwarg, or the client a bound method belongs to."""
+    return _realm_of(kwargs.get('qb') or getattr(func, '__self__', None))
 
-def _sync_qbo_call(func, *args, **kwargs):
-    """Helper to run synchronous QBO calls in a thread."""
+async def _sync_qbo_call(func, *args, **kwargs):
+    """Helper to run synchronous QBO calls on the dedicated SDK thread pool, under the realm's rate limiter."""
     # Ensure qb client is passed correctly, often as 'qb' keyword arg in SDK
-    return asyncio.to_thread(func, *args, **kwargs)
+    try:
+        return await rate_limiter.call(_realm_for_call(func, kwargs), func, *args, **kwargs)
+    except AuthorizationException:
+        # Expired/revoked access token: have the background refresher fetch a new one, don't wait for it
+        if qbo_token_manager:
+            qbo_token_manager.request_refresh()
+        raise
+
+async def _async_qbo_call(qbo_client: QuickBooks, method: str, *args, **kwargs) -> Dict[str, Any]:
+    """Runs a request on the async HTTP transport (e.g. method='read'), under the realm's rate limiter. Returns raw JSON."""
+    transport_method = getattr(qbo_http.transport, method)
+    try:
+        return await rate_limiter.run(_realm_of(qbo_client), lambda: transport_method(qbo_client, *args, **kwargs), operation=method)
+    except AuthorizationException:
+        # Same as _sync_qbo_call: nudge the background refresher and let the caller map the error
+        if qbo_token_manager:
+            qbo_token_manager.request_refresh()
+        raise
+
+async def _read_entity(qbo_client: QuickBooks, EntityClass, entity_id: str, operation: str):
+    """Reads one entity as an SDK object, over the async transport when enabled for operation."""
+    if qbo_http.is_enabled(operation):
+        response = await _async_qbo_call(qbo_client, 'read', EntityClass.__name__, entity_id)
+        return EntityClass.from_json(response[EntityClass.__name__])
+    return await _sync_qbo_call(EntityClass.get, entity_id, qb=qbo_client)
+
+async def run_batch(qbo_client: QuickBooks, operations: List[qbo_batch.BatchOperation]) -> Dict[str, qbo_batch.BatchResult]:
+    """
+    Executes operations through QBO's /batch endpoint, 30 operations per HTTP request.
+    Requests for more than one chunk are sent concurrently under the realm limit.
+    Returns one BatchResult per bId. Per-operation faults are mapped onto the QBOError
+    hierarchy and stored on the result; a failure of the whole request raises.
+    """
+    async def _send_chunk(chunk: List[qbo_batch.BatchOperation]) -> Dict[str, qbo_batch.BatchResult]:
+        payload = qbo_batch.build_batch_payload(chunk)
+        logger.debug(f"Sending QBO batch request with {len(chunk)} operation(s): {[op.bid for op in chunk]}")
+        try:
+            response = await _sync_qbo_call(qbo_client.batch_operation, json.dumps(payload))
+        except Exception as e:
+            _handle_qbo_sdk_error(e, context=f"batch request ({len(chunk)} operations)")
+        return qbo_batch.parse_batch_response(response, chunk)
+
+    chunks = qbo_batch.chunk_operations(operations)
+    chunk_results = await fan_out(qbo_client.company_id, [lambda chunk=chunk: _send_chunk(chunk) for chunk in chunks])
+    results: Dict[str, qbo_batch.BatchResult] = {}
+    for chunk_result in chunk_results:
+        results.update(chunk_result)
+    return results
+
+async def query_entities(qbo_client: QuickBooks, queries: Dict[str, str]) -> Dict[str, qbo_batch.BatchResult]:
+    """
+    Runs independent QBO SQL queries together and returns a BatchResult per query key.
+    Uses the batch endpoint (one round trip) unless QBO_USE_BATCH_API is disabled, in which
+    case the queries are fanned out concurrently under the per-realm concurrency limit.
+    Callers read results by key, so merged output keeps the caller's order either way.
+    """
+    if QBO_USE_BATCH_API:
+        return await run_batch(qbo_client, [qbo_batch.query_operation(key, query) for key, query in queries.items()])
+
+    async def _run_query(key: str, query: str) -> qbo_batch.BatchResult:
+        try:
+            if qbo_http.is_enabled('query_entities'):
+                response = await _async_qbo_call(qbo_client, 'query', query)
+            else:
+                response = await _sync_qbo_call(qbo_client.query, query)
+            return qbo_batch.BatchResult(bid=key, data=response)
+        except Exception as e:
+            logger.debug(f"QBO query '{key}' failed: {e}")
+            return qbo_batch.BatchResult(bid=key, error=map_qbo_exception(e, context=f"query '{key}'"))
+
+    results = await fan_out(qbo_client.company_id, [lambda key=key, query=query: _run_query(key, query) for key, query in queries.items()])
+    return {result.bid: result for result in results}
+
+def paginate_entities(qbo_client: QuickBooks, query: QBOQuery, page_size: int = QBO_MAX_PAGE_SIZE,
+                      prefetch_pages: Optional[int] = None, coalescer: Optional[QueryCoalescer] = None,
+                      skip_failed_queries: bool = False) -> QBOPaginator:
+    """
+    Returns an async iterator over every raw record matching query, read page_size rows at a time
+    with the next page prefetched (see qbo_pagination). Paginators sharing a coalescer send the
+    page queries they issue together as one request. With skip_failed_queries, a fault on the
+    query itself is logged and ends the iteration early; a failed request always raises.
+    """
+    coalescer = coalescer or QueryCoalescer(lambda queries: query_entities(qbo_client, queries))
+
+    async def _fetch_page(sql: str) -> List[Dict[str, Any]]:
+        result = await coalescer.run(query.entity_name, sql)
+        try:
+            return result.entities(query.entity_name)
+        except NotFoundError:
+            return [] # Past the last page
+        except QBOError as query_e:
+            if not skip_failed_queries:
+                raise
+            logger.error(f"Error querying {query.entity_name}, stopping its pagination: {query_e}")
+            return []
+
+    if prefetch_pages is None:
+        return QBOPaginator(query, _fetch_page, page_size=page_size)
+    return QBOPaginator(query, _fetch_page, page_size=page_size, prefetch_pages=prefetch_pages)
+
+# Entities covered by full exports (mirror bootstrap, year-end reporting)
+BULK_EXPORT_ENTITIES = ('Invoice', 'Payment', 'Estimate', 'SalesReceipt', 'Purchase', 'Customer', 'Vendor')
+QBO_BULK_READ_MAX_ATTEMPTS = int(os.getenv('QBO_BULK_READ_MAX_ATTEMPTS', '3')) # Per query, counting the first try
+QBO_BULK_READ_RETRY_BACKOFF_SECONDS = float(os.getenv('QBO_BULK_READ_RETRY_BACKOFF_SECONDS', '1.0'))
+
+def _result_rows(result: qbo_batch.BatchResult, entity_name: str) -> List[Dict[str, Any]]:
+    try:
+        return result.entities(entity_name)
+    except NotFoundError:
+        return []
+
+async def _query_with_retries(qbo_client: QuickBooks, queries: Dict[str, str]) -> Dict[str, qbo_batch.BatchResult]:
+    """
+    Runs independent queries concurrently, a batch request per MAX_BATCH_OPERATIONS of them, and
+    retries only what failed (a faulted query, or every query of a failed request) up to
+    QBO_BULK_READ_MAX_ATTEMPTS times. Not-found results are not failures. Raises the last error of
+    a query that never succeeded.
+    """
+    results: Dict[str, qbo_batch.BatchResult] = {}
+    pending = dict(queries)
+    for attempt in range(QBO_BULK_READ_MAX_ATTEMPTS):
+        if attempt:
+            await asyncio.sleep(QBO_BULK_READ_RETRY_BACKOFF_SECONDS * (2 ** (attempt - 1)))
+            logger.warning(f"Retrying {len(pending)} failed QBO bulk read quer(ies) (attempt {attempt + 1}): {list(pending)[:5]}")
+        keys = list(pending)
+        groups = [keys[i:i + qbo_batch.MAX_BATCH_OPERATIONS] for i in range(0, len(keys), qbo_batch.MAX_BATCH_OPERATIONS)]
+        outcomes = await asyncio.gather(*(query_entities(qbo_client, {key: pending[key] for key in group}) for group in groups),
+                                        return_exceptions=True)
+        failed, last_error = {}, None
+        for group, outcome in zip(groups, outcomes):
+            if isinstance(outcome, BaseException) and not isinstance(outcome, Exception):
+                raise outcome # Cancellation
+            for key in group:
+                error = outcome if isinstance(outcome, Exception) else outcome[key].error
+                if error is None or isinstance(error, NotFoundError):
+                    results[key] = outcome[key]
+                else:
+                    failed[key], last_error = pending[key], error
+        pending = failed
+        if not pending:
+            return results
+    raise last_error if isinstance(last_error, QBOError) else map_qbo_exception(last_error, context="bulk read")
+
+async def bulk_read_entities(qbo_client: QuickBooks, queries: Dict[str, QBOQuery], page_size: int = QBO_MAX_PAGE_SIZE) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Reads every row of each query, for full exports. The first round trip asks for each query's
+    COUNT(*) and first page together; every remaining STARTPOSITION window is then fetched
+    concurrently under the realm's rate limiter and reassembled in order. Failed windows are
+    retried (see _query_with_retries). Rows added after the count are read on past the last window.
+    Returns the raw rows per query key. Like any paged read this is not a snapshot.
+    """
+    first_round = {}
+    for key, query in queries.items():
+        first_round[f"{key}:count"] = query.count_sql()
+        first_round[f"{key}:1"] = window_sql(query, 1, page_size)
+    results = await _query_with_retries(qbo_client, first_round)
+
+    windows: Dict[str, Dict[int, List[Dict[str, Any]]]] = {}
+    remaining = {}
+    for key, query in queries.items():
+        count_response = results[f"{key}:count"].data or {}
+        total_count = int((count_response.get('QueryResponse') or {}).get('totalCount', 0))
+        windows[key] = {1: _result_rows(results[f"{key}:1"], query.entity_name)}
+        for start_position in window_starts(total_count, page_size)[1:]:
+            remaining[f"{key}:{start_position}"] = window_sql(query, start_position, page_size)
+        logger.debug(f"Bulk read of {key}: {total_count} row(s) in {len(window_starts(total_count, page_size))} window(s)")
+
+    if remaining:
+        logger.info(f"Fetching {len(remaining)} QBO page(s) concurrently for bulk read of {list(queries)}")
+        for window_key, result in (await _query_with_retries(qbo_client, remaining)).items():
+            key, start_position = window_key.rsplit(':', 1)
+            windows[key][int(start_position)] = _result_rows(result, queries[key].entity_name)
+
+    rows = {}
+    for key, query in queries.items():
+        rows[key] = [row for start_position in sorted(windows[key]) for row in windows[key][start_position]]
+        last_start = max(windows[key])
+        if len(windows[key][last_start]) == page_size:
+            # The table grew since the count; read the rest page by page
+            tail = dataclasses.replace(query, order_by=query.order_by or 'Id', start_position=last_start + page_size)
+            rows[key].extend(await paginate_entities(qbo_client, tail, page_size=page_size).to_list())
+    return rows
+
+async def bulk_export(qbo_client: QuickBooks, entity_names: Sequence[str] = BULK_EXPORT_ENTITIES) -> Dict[str, List[Dict[str, Any]]]:
+    """Every raw row of each entity (default BULK_EXPORT_ENTITIES), read with bulk_read_entities."""
+    return await bulk_read_entities(qbo_client, {entity_name: QBOQuery(entity_name) for entity_name in entity_names})
+
+# --- Reports ---
+
+@single_flight()
+async def get_report(qbo_client: QuickBooks, report_name: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                     accounting_method: Optional[str] = None, summarize_column_by: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Runs a QBO report ('ProfitAndLoss', 'BalanceSheet', 'AgedReceivables' or 'CustomerBalance')
+    and returns it parsed by qbo_reports.parse_report. Point-in-time reports (aging, balances)
+    are run as of end_date. Reports on closed periods are fetched once and then served from cache.
+    """
+    params = qbo_reports.report_params(report_name, start_date, end_date, accounting_method, summarize_column_by)
+    closed = qbo_reports.period_is_closed(end_date, await get_books_close_date(qbo_client)) if end_date else False
+    cache = closed_report_cache if closed else report_cache
+    cache_key = _cache_key(qbo_client, 'get_report', report=report_name, **params)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        logger.debug(f"Cache hit for {report_name} report {params}")
+        return cached
+
+    logger.info(f"Fetching {report_name} report from QBO with {params} ({'closed' if closed else 'open'} period)")
+    try:
+        if qbo_http.is_enabled('get_report'):
+            raw_report = await _async_qbo_call(qbo_client, 'report', report_name, params)
+        else:
+            raw_report = await _sync_qbo_call(qbo_client.get_report, report_name, qs=params)
+    except Exception as e:
+        _handle_qbo_sdk_error(e, context=f"fetching QBO {report_name} report")
+    report = qbo_reports.parse_report(raw_report)
+    cache.set(cache_key, report, tags=[] if closed else [entity_type_tag(name) for name in qbo_reports.REPORT_SOURCE_ENTITIES])
+    return report
+
+async def get_books_close_date(qbo_client: QuickBooks) -> Optional[str]:
+    """
+    The date the company's books are closed through (YYYY-MM-DD), or None if they were never closed.
+    QBO_BOOKS_CLOSED_THROUGH overrides the BookCloseDate in QBO Preferences, which is cached like
+    reference data. If Preferences cannot be read, every period is treated as open.
+    """
+    if qbo_reports.QBO_BOOKS_CLOSED_THROUGH:
+        return qbo_reports.QBO_BOOKS_CLOSED_THROUGH
+
+    async def load() -> Optional[str]:
+        logger.info("Fetching the books' closing date from QBO Preferences.")
+        preferences = await _sync_qbo_call(Preferences.get, qb=qbo_client)
+        return getattr(preferences.AccountingInfoPrefs, 'BookCloseDate', None) or None
+
+    try:
+        return await reference_cache.get(_cache_key(qbo_client, 'get_books_close_date'), load)
+    except Exception as e:
+        logger.warning(f"Could not read the books' closing date from QBO Preferences; treating report periods as open: {e}")
+        return None
+
+async def generate_pnl_report(qbo_client: QuickBooks, start_date: str, end_date: str, accounting_method: Optional[str] = None,
+                              summarize_column_by: Optional[str] = None, db: Optional[Session] = None,
+                              max_staleness: Optional[float] = None, source: str = 'qbo') -> Dict[str, Any]:
+    """
+    Profit and Loss for start_date..end_date (YYYY-MM-DD); see get_report. totals['NetIncome'] holds net income per column.
+    With source='mirror' and accounting_method='Accrual' the report is computed locally (qbo_ledger) when the mirror
+    is fresh enough, without calling QBO. The local engine omits Bills, JournalEntries, CreditMemos, Deposits and
+    VendorCredits, so only opt in for companies where reconcile_pnl agrees with QBO; otherwise QBO is asked.
+    """
+    if source not in ('qbo', 'mirror'):
+        raise ValueError(f"Unknown P&L source '{source}'. Expected 'qbo' or 'mirror'.")
+    if source == 'mirror':
+        if accounting_method != 'Accrual': # QBO uses the company's preferred basis when none is given
+            logger.info(f"Local P&L is accrual only (accounting_method={accounting_method!r}); asking QBO")
+        elif qbo_mirror.is_fresh(db, qbo_ledger.LEDGER_MIRROR_ENTITIES, max_staleness):
+            try:
+                return qbo_ledger.engine_for(db).report(start_date, end_date, summarize_column_by)
+            except ValueError as e: # e.g. a summarize_column_by only QBO supports
+                logger.info(f"Local P&L unavailable ({e}); asking QBO")
+    return await get_report(qbo_client, 'ProfitAndLoss', start_date, end_date, accounting_method, summarize_column_by)
+
+async def reconcile_pnl(qbo_client: QuickBooks, db: Session, start_date: str, end_date: str,
+                        summarize_column_by: Optional[str] = None, tolerance: float = 0.01) -> List[Dict[str, Any]]:
+    """Compares the locally computed accrual P&L with QBO's; returns the differences (empty when they agree within tolerance)."""
+    local = qbo_ledger.engine_for(db).report(start_date, end_date, summarize_column_by)
+    remote = await get_report(qbo_client, 'ProfitAndLoss', start_date, end_date, 'Accrual', summarize_column_by)
+    differences = qbo_ledger.reconcile(local, remote, tolerance)
+    if differences:
+        logger.warning(f"Local P&L for {start_date}..{end_date} differs from QBO's in {len(differences)} place(s)")
+    return differences
+
+async def get_ar_aging(qbo_client: QuickBooks, db: Optional[Session] = None, as_of_date: Optional[str] = None,
+                       max_staleness: Optional[float] = None, limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Accounts receivable aging of every customer with open invoices, in one call: balances per
+    customer in the current, 1-30, 31-60, 61-90 and 91+ days past due buckets (see qbo_aging).
+    Served from the mirror when fresh enough, otherwise from one paged query of open invoices.
+    limit keeps only the customers owing most; the totals still cover everyone.
+    """
+    try:
+        as_of = datetime.date.fromisoformat(as_of_date) if as_of_date else None
+    except ValueError as e:
+        raise InvalidDataError(f"as_of_date must be YYYY-MM-DD, got '{as_of_date}'", original_exception=e) from e
+
+    if qbo_mirror.is_fresh(db, ['Invoice'], max_staleness):
+        invoices = qbo_aging.load_open_invoices(db)
+    else:
+        query = QBOQuery('Invoice', fields=qbo_aging.OPEN_INVOICE_FIELDS).where("Balance > '0'")
+        invoices = qbo_aging.open_invoices_from_raw(await paginate_entities(qbo_client, query).to_list()) # Errors arrive mapped
+    aging = qbo_aging.age_receivables(invoices, as_of)
+    logger.info(f"Aged {len(invoices)} open invoices across {len(aging['customers'])} customers")
+    if limit:
+        aging['customers'] = aging['customers'][:limit]
+    return aging
 
 # Global client instance (reinstated)
 qbo_client_instance: Optional[QuickBooks] = None
+# Keeps qbo_client_instance's access token fresh in the background; created with the client
+qbo_token_manager: Optional[QBOTokenManager] = None
+# Where rotated refresh tokens are persisted; replace before the first get_qbo_client() call to change it
+refresh_token_store: RefreshTokenStore = SecretManagerRefreshTokenStore()
+
+def get_qbo_token_seconds_left() -> Optional[float]:
+    """Seconds until the current QBO access token expires, or None if no client has been initialized."""
+    return qbo_token_manager.seconds_left() if qbo_token_manager else None
 
 def get_qbo_client() -> Optional[QuickBooks]:
     """
@@ -124,20 +482,15 @@ def get_qbo_client() -> Optional[QuickBooks]:
     Handles fetching credentials and environment settings.
     Returns None if initialization fails.
     """
-    global qbo_client_instance
-    # Consider if re-initialization is needed based on token expiry or other factors
-    # For simplicity, this basic version initializes once.
+    global qbo_client_instance, qbo_token_manager
+    # The client is created once; its access token is refreshed ahead of expiry by qbo_token_manager.
     if qbo_client_instance:
-        # TODO: Add logic here to check if the token needs refreshing
-        # If token is expired or close to expiry, refresh it
-        # try:
-        #     qbo_client_instance.auth_client.refresh()
-        #     logger.info("QBO token refreshed successfully.")
-        # except Exception as refresh_err:
-        #     logger.error(f"Failed to refresh QBO token: {refresh_err}", exc_info=True)
-        #     # Decide how to handle refresh failure - maybe force re-init or raise error
-        #     qbo_client_instance = None # Force re-init on next call
-        #     return None # Or raise AuthenticationError("Token refresh failed")
+        if qbo_token_manager:
+            # Never blocks: (re)starts the refresh thread if needed and nudges it if the token is already due
+            if qbo_token_manager.needs_refresh():
+                qbo_token_manager.request_refresh()
+            else:
+                qbo_token_manager.start()
         logger.debug("Returning existing QBO client instance.")
         return qbo_client_instance
 
@@ -146,7 +499,7 @@ def get_qbo_client() -> Optional[QuickBooks]:
         # Fetch credentials from Secret Manager using the core config module
         client_id = get_secret("ledger-cfo-qbo-client-id")
         client_secret = get_secret("ledger-cfo-qbo-client-secret")
-        refresh_token = get_secret("ledger-cfo-qbo-refresh-token")
+        refresh_token = refresh_token_store.load()
         realm_id = get_secret("ledger-cfo-qbo-realm-id")
         environment = os.getenv('QBO_ENVIRONMENT', 'sandbox').lower()
 
@@ -206,30 +559,13 @@ def get_qbo_client() -> Optional[QuickBooks]:
         )
         logger.info("QuickBooks client initialized successfully.")
 
-        # Explicitly try to refresh the token immediately after initialization
-        # to ensure authentication is valid before returning the client.
-        try:
-            logger.info("Attempting initial token refresh...")
-            # NOTE: The refresh() method itself might not exist directly on QuickBooks,
-            # it's usually on the AuthClient instance. Access it via qbo_client_instance.auth_client
-            if hasattr(qbo_client_instance, 'auth_client') and hasattr(qbo_client_instance.auth_client, 'refresh'):
-                qbo_client_instance.auth_client.refresh() # Correct way to call refresh
-                logger.info("Initial token refresh successful.")
-                print("--- QBO Token Refresh Successful ---")
-            else:
-                logger.warning("Could not find refresh method on auth_client. Skipping explicit refresh.")
-        except AuthorizationException as refresh_ae:
-            logger.error(f"QBO initial token refresh failed with AuthorizationException: {refresh_ae}", exc_info=True)
-            # Log the HTTP debug output here if possible, though it might be complex
-            # to capture it specifically from this point. The global logging should catch it.
-            print(f"--- QBO Token Refresh FAILED: {refresh_ae} ---")
-            # Fail fast if refresh doesn't work
-            raise AuthenticationError(f"Initial token refresh failed: {refresh_ae}") from refresh_ae
-        except Exception as refresh_err:
-            logger.error(f"QBO initial token refresh failed with unexpected error: {refresh_err}", exc_info=True)
-            print(f"--- QBO Token Refresh FAILED Unexpectedly: {refresh_err} ---")
-            # Also fail fast on other refresh errors
-            raise QBOError(f"Initial token refresh failed unexpectedly: {refresh_err}") from refresh_err
+        # QuickBooks() already exchanged the refresh token in _start_session (failing fast on bad
+        # credentials). Hand the token over to the manager, which persists a rotated refresh token
+        # and refreshes ahead of expiry in the background from now on.
+        qbo_token_manager = QBOTokenManager(auth_client_instance, refresh_token_store, persisted_refresh_token=refresh_token)
+        qbo_token_manager.attach(qbo_client_instance)
+        qbo_token_manager.start()
+        logger.info(f"QBO token manager started; access token expires in {qbo_token_manager.seconds_left():.0f}s.")
 
         # Optional: Perform a test call to verify connection/token (Now redundant if refresh succeeded)
         # --- Temporarily commented out --- #
@@ -263,113 +599,242 @@ def get_qbo_client() -> Optional[QuickBooks]:
 
 # --- Core QBO Functions Placeholders (Task 1 Target) ---
 
+CUSTOMER_IN_QUERY_CHUNK_SIZE = 100 # Customer IDs per "WHERE Id IN (...)" query
+# The properties sdk_customer_to_dict reads; customer queries select only these
+CUSTOMER_DETAIL_FIELDS = ["Id", "DisplayName", "CompanyName", "GivenName", "FamilyName", "PrimaryEmailAddr",
+                          "PrimaryPhone", "BillAddr", "Balance", "SyncToken"]
+
+def _customer_cache_key(qbo_client: QuickBooks, customer_id: str) -> CacheKey:
+    return _cache_key(qbo_client, 'get_customer_details', customer_id=str(customer_id))
+
 async def get_customer_details(qbo_client: QuickBooks, customer_id: str) -> Dict[str, Any]:
-    """Fetches full details for a specific customer."""
-    logger.info(f"Placeholder: Fetching details for customer ID: {customer_id}")
-    # TODO: Implement using _sync_qbo_call(Customer.get, ...)
-    raise NotImplementedError
-
-async def get_customer_transactions(qbo_client: QuickBooks, customer_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[Dict[str, Any]]:
-    """Fetches Invoices, Payments, Estimates, Sales Receipts for a specific customer."""
-    cache_key = _generate_cache_key('get_customer_transactions', customer_id=customer_id, start_date=start_date, end_date=end_date)
-    if cache_key in transaction_cache:
+    """Fetches full details for a specific customer (see sdk_customer_to_dict). Raises NotFoundError if ID is invalid."""
+    cache_key = _customer_cache_key(qbo_client, customer_id)
+    cached = customer_cache.get(cache_key)
+    if cached is not None:
+        logger.debug(f"Cache hit for customer details ID: {customer_id}")
+        return cached
+
+    logger.info(f"Fetching details for customer ID: {customer_id} from QBO")
+    try:
+        customer = await _sync_qbo_call(Customer.get, customer_id, qb=qbo_client)
+    except Exception as e:
+        _handle_qbo_sdk_error(e, context=f"get customer details for ID {customer_id}")
+    details = sdk_customer_to_dict(customer)
+    customer_cache.set(cache_key, details, tags=[customer_tag(details["Id"])])
+    return details
+
+async def get_customers_by_ids(qbo_client: QuickBooks, customer_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetches details for many customers at once. Cached customers come from customer_cache; the
+    rest are fetched with "SELECT <CUSTOMER_DETAIL_FIELDS> FROM Customer WHERE Id IN (...)" queries of up to
+    CUSTOMER_IN_QUERY_CHUNK_SIZE IDs, run together, and cached.
+    Returns {customer_id: details}. IDs that QBO did not return (or whose chunk failed) are absent.
+    """
+    details: Dict[str, Dict[str, Any]] = {}
+    missing = []
+    for customer_id in dict.fromkeys(str(cid) for cid in customer_ids): # Distinct, in order
+        cached = customer_cache.get(_customer_cache_key(qbo_client, customer_id))
+        if cached is not None:
+            details[customer_id] = cached
+        else:
+            missing.append(customer_id)
+    if not missing:
+        return details
+
+    queries = {}
+    for start in range(0, len(missing), CUSTOMER_IN_QUERY_CHUNK_SIZE):
+        chunk = missing[start:start + CUSTOMER_IN_QUERY_CHUNK_SIZE]
+        # Transactions can reference inactive customers, which queries skip by default
+        query = QBOQuery('Customer', fields=CUSTOMER_DETAIL_FIELDS, max_results=len(chunk)).where_in('Id', chunk).where("Active IN (true, false)")
+        queries[f"customers_{start}"] = query.to_sql()
+    logger.info(f"Fetching {len(missing)} customer(s) from QBO in {len(queries)} bulk quer{'y' if len(queries) == 1 else 'ies'} "
+                f"({len(details)} cached)")
+    results = await query_entities(qbo_client, queries)
+
+    for key, result in results.items():
+        try:
+            raw_customers = result.entities('Customer')
+        except NotFoundError:
+            continue
+        except QBOError as chunk_e:
+            logger.warning(f"Bulk customer query {key} failed: {chunk_e}")
+            continue
+        for raw_customer in raw_customers:
+            customer_details = sdk_customer_to_dict(Customer.from_json(raw_customer))
+            customer_cache.set(_customer_cache_key(qbo_client, customer_details["Id"]), customer_details, tags=[customer_tag(customer_details["Id"])])
+            details[customer_details["Id"]] = customer_details
+    return details
+
+# Summary fields queried per transaction type by get_customer_transactions (in output order)
+CUSTOMER_TRANSACTION_FIELDS = {
+    Invoice: ["Id", "TxnDate", "TotalAmt", "Balance", "DueDate", "DocNumber"],
+    Payment: ["Id", "TxnDate", "TotalAmt", "UnappliedAmt"],
+    Estimate: ["Id", "TxnDate", "TotalAmt", "TxnStatus", "ExpirationDate", "DocNumber"],
+    salesreceipt.SalesReceipt: ["Id", "TxnDate", "TotalAmt", "DocNumber"] # Revised usage
+}
+
+def _transaction_summary(entity_name: str, entity: Dict[str, Any], fields_to_extract: List[str]) -> Dict[str, Any]:
+    """Builds the summary dict returned by get_customer_transactions from a raw QBO entity."""
+    txn_data = {"type": entity_name} # Add type identifier
+    for field in fields_to_extract:
+        txn_data[field] = entity.get(field)
+    # Add customer ref ID for context
+    customer_ref = entity.get("CustomerRef")
+    txn_data["CustomerRefValue"] = customer_ref.get("value") if customer_ref else None
+    return txn_data
+
+async def stream_customer_transactions(qbo_client: QuickBooks, customer_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                                       fields: Optional[List[str]] = None):
+    """
+    Async generator over a customer's transaction summaries, read live from QBO page by page,
+    so multi-year histories are neither truncated nor held in memory at once.
+    Yields every Invoice, then Payment, Estimate and SalesReceipt (the get_customer_transactions
+    shape); the types' first pages are fetched together, later pages ahead of the consumer.
+    A type whose query fails is logged and skipped after the rows already yielded; a failed
+    request as a whole raises.
+    """
+    fields = normalize_fields(fields)
+    coalescer = QueryCoalescer(lambda queries: query_entities(qbo_client, queries))
+    paginators = []
+    for EntityClass, fields_to_extract in CUSTOMER_TRANSACTION_FIELDS.items():
+        fields_to_extract = fields or fields_to_extract
+        query = QBOQuery(EntityClass.__name__, fields=fields_to_extract + ["CustomerRef"]).where_equals("CustomerRef", customer_id)
+        if start_date:
+            query.where(f"TxnDate >= '{start_date}'")
+        if end_date:
+            query.where(f"TxnDate <= '{end_date}'")
+        paginators.append((fields_to_extract, paginate_entities(qbo_client, query, coalescer=coalescer, skip_failed_queries=True).start()))
+
+    try:
+        for fields_to_extract, paginator in paginators:
+            entity_name = paginator.query.entity_name
+            count = 0
+            async for entity in paginator:
+                count += 1
+                yield _transaction_summary(entity_name, entity, fields_to_extract)
+            logger.debug(f"Found {count} {entity_name}(s) for customer {customer_id} in {paginator.pages_fetched} page(s)")
+    finally:
+        for _, paginator in paginators:
+            await paginator.aclose()
+
+@single_flight()
+async def get_customer_transactions(qbo_client: QuickBooks, customer_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                                    db: Optional[Session] = None, max_staleness: Optional[float] = None,
+                                    fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Fetches Invoices, Payments, Estimates, Sales Receipts for a specific customer.
+    Only the summary fields (or the given fields, for every type) are queried from QBO, and
+    every page is read (see stream_customer_transactions to process them without a list).
+    Served from the local mirror when it was synced within max_staleness seconds (needs db).
+    """
+    fields = normalize_fields(fields)
+    cache_key = _cache_key(qbo_client, 'get_customer_transactions', customer_id=customer_id, start_date=start_date, end_date=end_date,
+                           fields=tuple(fields) if fields else None)
+    cached = transaction_cache.get(cache_key)
+    if cached is not None:
         logger.debug(f"Cache hit for transactions, customer ID: {customer_id}, Dates: {start_date}-{end_date}")
-        return transaction_cache[cache_key]
+        return cached
 
-    logger.info(f"Fetching transactions for customer ID: {customer_id} from QBO (Start: {start_date}, End: {end_date})")
     all_transactions = []
     # Define entity types and the fields to extract for consistency
-    entity_map = {
-        Invoice: ["Id", "TxnDate", "TotalAmt", "Balance", "DueDate", "DocNumber"],
-        Payment: ["Id", "TxnDate", "TotalAmt", "UnappliedAmt"],
-        Estimate: ["Id", "TxnDate", "TotalAmt", "TxnStatus", "ExpirationDate", "DocNumber"],
-        salesreceipt.SalesReceipt: ["Id", "TxnDate", "TotalAmt", "DocNumber"] # Revised usage
-    }
-
-    try:
-        # Optional: Verify customer exists first? Could prevent unnecessary queries if customer ID is invalid.
-        # await get_customer_details(qbo_client, customer_id) # This would raise NotFoundError early
+    entity_map = CUSTOMER_TRANSACTION_FIELDS
+    if fields:
+        entity_map = {EntityClass: fields for EntityClass in entity_map}
+    entity_names = [EntityClass.__name__ for EntityClass in entity_map]
 
+    if qbo_mirror.is_fresh(db, entity_names, max_staleness):
+        mirrored = qbo_mirror.get_customer_transactions(db, entity_names, customer_id, start_date, end_date)
         for EntityClass, fields_to_extract in entity_map.items():
             entity_name = EntityClass.__name__
-            logger.debug(f"Querying for {entity_name} for customer {customer_id}")
-            # Build QBQL WHERE clause
-            filters = [f"CustomerRef = '{customer_id}'"]
-            if start_date:
-                filters.append(f"TxnDate >= '{start_date}'")
-            if end_date:
-                filters.append(f"TxnDate <= '{end_date}'")
-            query_filter = " AND ".join(filters)
-
-            # python-quickbooks' .where handles pagination up to 1000 results
-            try:
-                entities = await _sync_qbo_call(EntityClass.where, query_filter, qb=qbo_client)
-                logger.debug(f"Found {len(entities)} {entity_name}(s) for customer {customer_id}")
-
-                for entity in entities:
-                    txn_data = {"type": entity_name} # Add type identifier
-                    for field in fields_to_extract:
-                        # Handle nested attributes like CustomerRef if needed, though filter covers it
-                        # For simplicity, getattr handles basic fields
-                        txn_data[field] = getattr(entity, field, None)
-                    # Add customer ref ID for context
-                    txn_data["CustomerRefValue"] = entity.CustomerRef.value if entity.CustomerRef else None
-                    all_transactions.append(txn_data)
-
-            except QuickbooksException as query_e:
-                # Log other query errors but continue processing other types
-                # Check if it behaves like a NotFound error (e.g., specific error code)
-                # Example: QBO error codes for not found are often in the 6xx range (e.g., 610, 620)
-                error_code = getattr(query_e, 'error_code', None)
-                if error_code and 600 <= int(error_code) < 700:
-                     logger.debug(f"No {entity_name} found for customer {customer_id} matching criteria (Caught via QuickbooksException code {error_code}).")
-                     continue # Treat as NotFound
-                else:
-                    logger.error(f"Error querying {entity_name} for customer {customer_id}: {query_e}", exc_info=True)
-                    # Depending on policy, could raise here or collect errors
+            all_transactions.extend(_transaction_summary(entity_name, entity, fields_to_extract) for entity in mirrored[entity_name])
+        logger.info(f"Served {len(all_transactions)} transactions for customer ID: {customer_id} from the QBO mirror")
+        transaction_cache.set(cache_key, all_transactions, tags=[customer_tag(customer_id)])
+        return all_transactions
+
+    logger.info(f"Fetching transactions for customer ID: {customer_id} from QBO (Start: {start_date}, End: {end_date})")
+    try:
+        # Projected rows are partial, so unlike full reads they are not written back to the mirror
+        all_transactions = [txn async for txn in stream_customer_transactions(qbo_client, customer_id, start_date, end_date, fields)]
 
         logger.info(f"Successfully fetched {len(all_transactions)} total transactions for customer ID: {customer_id}")
-        transaction_cache[cache_key] = all_transactions # Update cache
+        transaction_cache.set(cache_key, all_transactions, tags=[customer_tag(customer_id)]) # Update cache
         return all_transactions
 
     except Exception as e:
-        # Catch errors not handled in the inner loop (like potential get_customer_details error)
+        # Catch errors for the batch request as a whole
+        if isinstance(e, QBOError):
+            raise
         _handle_qbo_sdk_error(e, context=f"get customer transactions for ID {customer_id}")
         # Error handler raises, no return needed
 
-async def get_estimate_details(qbo_client: QuickBooks, estimate_id: str) -> Dict[str, Any]:
-    """Fetches full details for a specific estimate, including line items."""
-    cache_key = _generate_cache_key('get_estimate_details', estimate_id=estimate_id)
-    if cache_key in details_cache:
+def _details_from_mirror(db: Optional[Session], EntityClass, entity_id: str, max_staleness: Optional[float]) -> Optional[Dict[str, Any]]:
+    """Returns entity details from the mirror (same shape as the SDK's to_dict()), or None to go live."""
+    entity_name = EntityClass.__name__
+    if not qbo_mirror.is_fresh(db, [entity_name], max_staleness):
+        return None
+    raw = qbo_mirror.get_raw_entity(db, entity_name, entity_id)
+    if raw is None:
+        # Could have been created since the last sync; ask QBO
+        logger.debug(f"{entity_name} ID {entity_id} not in the QBO mirror, falling back to QBO")
+        return None
+    logger.info(f"Served details for {entity_name} ID: {entity_id} from the QBO mirror")
+    return EntityClass.from_json(raw).to_dict()
+
+@single_flight()
+async def get_estimate_details(qbo_client: QuickBooks, estimate_id: str, db: Optional[Session] = None, max_staleness: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Fetches full details for a specific estimate, including line items.
+    Served from the local mirror when fresh enough (see get_customer_transactions).
+    """
+    cache_key = _cache_key(qbo_client, 'get_estimate_details', estimate_id=estimate_id)
+    cached = details_cache.get(cache_key)
+    if cached is not None:
         logger.debug(f"Cache hit for estimate details ID: {estimate_id}")
-        return details_cache[cache_key]
+        return cached
+
+    details = _details_from_mirror(db, Estimate, estimate_id, max_staleness)
+    if details is not None:
+        details_cache.set(cache_key, details, tags=[entity_tag('Estimate', estimate_id)])
+        return details
 
     logger.info(f"Fetching details for estimate ID: {estimate_id} from QBO")
     try:
-        estimate = await _sync_qbo_call(Estimate.get, estimate_id, qb=qbo_client)
+        estimate = await _read_entity(qbo_client, Estimate, estimate_id, 'get_estimate_details')
         # Convert the full SDK object to a dictionary
         details = estimate.to_dict()
         logger.info(f"Successfully fetched details for estimate ID: {estimate_id}")
-        details_cache[cache_key] = details # Cache the result
+        details_cache.set(cache_key, details, tags=[entity_tag('Estimate', estimate_id)]) # Cache the result
+        qbo_mirror.write_back(db, 'Estimate', [json.loads(estimate.to_json())])
         return details
     except Exception as e:
         _handle_qbo_sdk_error(e, context=f"get estimate details for ID {estimate_id}")
 
-async def get_invoice_details(qbo_client: QuickBooks, invoice_id: str) -> Dict[str, Any]:
-    """Fetches full details for a specific invoice, including line items."""
-    cache_key = _generate_cache_key('get_invoice_details', invoice_id=invoice_id)
-    if cache_key in details_cache:
+@single_flight()
+async def get_invoice_details(qbo_client: QuickBooks, invoice_id: str, db: Optional[Session] = None, max_staleness: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Fetches full details for a specific invoice, including line items.
+    Served from the local mirror when fresh enough (see get_customer_transactions).
+    """
+    cache_key = _cache_key(qbo_client, 'get_invoice_details', invoice_id=invoice_id)
+    cached = details_cache.get(cache_key)
+    if cached is not None:
         logger.debug(f"Cache hit for invoice details ID: {invoice_id}")
-        return details_cache[cache_key]
+        return cached
+
+    details = _details_from_mirror(db, Invoice, invoice_id, max_staleness)
+    if details is not None:
+        details_cache.set(cache_key, details, tags=[entity_tag('Invoice', invoice_id)])
+        return details
 
     logger.info(f"Fetching details for invoice ID: {invoice_id} from QBO")
     try:
-        # Use the Invoice object's get method via the sync helper
-        invoice = await _sync_qbo_call(Invoice.get, invoice_id, qb=qbo_client)
+        invoice = await _read_entity(qbo_client, Invoice, invoice_id, 'get_invoice_details')
         # Convert the full SDK object to a dictionary for easier handling
         details = invoice.to_dict()
         logger.info(f"Successfully fetched details for invoice ID: {invoice_id}")
-        details_cache[cache_key] = details # Cache the result
+        details_cache.set(cache_key, details, tags=[entity_tag('Invoice', invoice_id)]) # Cache the result
+        qbo_mirror.write_back(db, 'Invoice', [json.loads(invoice.to_json())])
         return details
     except QuickbooksException as qbe:
         # Check error code for NotFound equivalent
@@ -386,17 +851,27 @@ async def get_invoice_details(qbo_client: QuickBooks, invoice_id: str) -> Dict[s
         _handle_qbo_sdk_error(e, context=f"get invoice details for ID {invoice_id}")
         # _handle_qbo_sdk_error raises the appropriate QBOError subtype, so no return needed here
 
-async def find_estimates(qbo_client: QuickBooks, customer_id: Optional[str] = None, status: Optional[str] = None) -> List[Dict[str, Any]]:
-    """Finds estimates, filterable by customer and status."""
-    cache_key = _generate_cache_key('find_estimates', customer_id=customer_id, status=status)
-    if cache_key in search_cache:
+@single_flight()
+async def find_estimates(qbo_client: QuickBooks, customer_id: Optional[str] = None, status: Optional[str] = None,
+                         db: Optional[Session] = None, max_staleness: Optional[float] = None,
+                         fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Finds estimates, filterable by customer and status.
+    With fields, only those fields are queried and each estimate is a light record of them;
+    otherwise full estimate dictionaries are returned.
+    Served from the local mirror when fresh enough (see get_customer_transactions).
+    """
+    fields = normalize_fields(fields)
+    cache_key = _cache_key(qbo_client, 'find_estimates', customer_id=customer_id, status=status, fields=tuple(fields) if fields else None)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
         logger.debug(f"Cache hit for find_estimates: Cust={customer_id}, Stat={status}")
-        return search_cache[cache_key]
+        return cached
 
-    logger.info(f"Finding estimates from QBO (Customer: {customer_id}, Status: {status})")
     filters = []
     if customer_id:
         filters.append(f"CustomerRef = '{customer_id}'")
+    status_filter = None
     if status:
         # Ensure status matches QBO valid statuses
         # QBO statuses: Accepted, Pending, Closed, Rejected
@@ -404,36 +879,64 @@ async def find_estimates(qbo_client: QuickBooks, customer_id: Optional[str] = No
         if status not in valid_statuses:
             logger.warning(f"Invalid status '{status}' requested for find_estimates. Ignoring status filter.")
         else:
+            status_filter = status
             filters.append(f"TxnStatus = '{status}'")
 
-    query = " AND ".join(filters) if filters else "" # Empty query string for .all
-    max_results = 1000 # Default limit for queries
+    # A customer-scoped search only changes when that customer's estimates do
+    cache_tags = [customer_tag(customer_id)] if customer_id else [entity_type_tag('Estimate')]
 
-    try:
-        if query:
-            # Use .where for filtering
-            estimates_sdk = await _sync_qbo_call(Estimate.where, query, max_results=max_results, qb=qbo_client)
+    if qbo_mirror.is_fresh(db, ['Estimate'], max_staleness):
+        mirrored = qbo_mirror.find_estimates(db, customer_id=customer_id, status=status_filter)
+        if fields:
+            estimates_list = [project(raw, fields) for raw in mirrored]
         else:
-            # Use .all if no specific filters are provided
-            estimates_sdk = await _sync_qbo_call(Estimate.all, max_results=max_results, qb=qbo_client)
+            estimates_list = [Estimate.from_json(raw).to_dict() for raw in mirrored]
+        logger.info(f"Served {len(estimates_list)} estimates matching criteria from the QBO mirror.")
+        search_cache.set(cache_key, estimates_list, tags=cache_tags)
+        return estimates_list
+
+    logger.info(f"Finding estimates from QBO (Customer: {customer_id}, Status: {status})")
+
+    try:
+        # Every page is read (no silent cut-off at QBO's 1000-row page limit)
+        raw_estimates = await paginate_entities(qbo_client, QBOQuery('Estimate', fields=fields, conditions=list(filters))).to_list()
+        if fields:
+            # Projected query: light records straight from the response, no SDK objects
+            estimates_list = [project(raw, fields) for raw in raw_estimates]
+            logger.info(f"Found {len(estimates_list)} estimates matching criteria.")
+            search_cache.set(cache_key, estimates_list, tags=cache_tags)
+            return estimates_list
 
         # Convert results to dictionaries for consistent output
-        estimates_list = [est.to_dict() for est in estimates_sdk]
+        estimates_list = [Estimate.from_json(raw).to_dict() for raw in raw_estimates]
         logger.info(f"Found {len(estimates_list)} estimates matching criteria.")
-        search_cache[cache_key] = estimates_list # Cache the results
+        search_cache.set(cache_key, estimates_list, tags=cache_tags) # Cache the results
+        qbo_mirror.write_back(db, 'Estimate', raw_estimates)
         return estimates_list
     except Exception as e:
+        if isinstance(e, QBOError):
+            raise
         _handle_qbo_sdk_error(e, context=f"finding estimates (Cust={customer_id}, Status={status})")
         # Error handler raises
 
-async def find_customers_by_details(query: str, qbo_client: QuickBooks) -> List[Dict[str, Any]]:
+async def find_customers_by_details(query: str, qbo_client: QuickBooks, db: Optional[Session] = None,
+                                    max_staleness: Optional[float] = None) -> List[Dict[str, Any]]:
     """
     Finds customers by matching the query string against DisplayName, CompanyName,
     Email, or Phone.
     Returns a list of customer dictionaries with essential details if found,
     otherwise an empty list.
+    With a fresh customer mirror the search runs against the in-memory fuzzy index
+    (typos, partial names and phone fragments match); otherwise QBO is queried with LIKE.
     """
     logger.info(f"Searching for customers matching details: '{query}'")
+    if qbo_mirror.is_fresh(db, ['Customer'], max_staleness):
+        try:
+            customers_found = qbo_customer_index.index_for(db).search(query, limit=10)
+            logger.info(f"Found {len(customers_found)} customer(s) matching '{query}' in the local customer index.")
+            return customers_found
+        except Exception as e: # Index refresh failed; the live query still works
+            logger.warning(f"Customer index unavailable, querying QBO instead: {e}")
     # Escape single quotes in the query for the QBO query string
     escaped_query = query.replace("'", "\\\\'")
 
@@ -446,41 +949,43 @@ async def find_customers_by_details(query: str, qbo_client: QuickBooks) -> List[
     
     # Attempting a query that searches multiple fields (syntax might vary or not be fully supported for complex ORs)
     # QBO's query language is not full SQL. It's often better to query one specific field or use more generic text search if the API supports it.
-    # For this iteration, we will prioritize DisplayName and then try Email if no results.
+    # For this iteration, we query DisplayName and, for email-like input, Email as well.
     # A simpler, more reliable initial query:
     
-    # Query 1: Try DisplayName
-    full_query_display_name = f"SELECT * FROM Customer WHERE DisplayName LIKE '%{escaped_query}%' MAXRESULTS 10"
-    logger.info(f"Constructed QBO query (DisplayName): {full_query_display_name}")
-    
+    # Query 1: DisplayName. Query 2: PrimaryEmailAddr, only if the query looks like an email.
+    # The queries are independent, so they run together; matches are merged DisplayName first.
+    customer_queries = {
+        "DisplayName": QBOQuery('Customer', fields=CUSTOMER_DETAIL_FIELDS, max_results=10).where(f"DisplayName LIKE '%{escaped_query}%'").to_sql()
+    }
+    if '@' in query: # Rudimentary check for email-like query
+        customer_queries["Email"] = QBOQuery('Customer', fields=CUSTOMER_DETAIL_FIELDS, max_results=10).where(
+            f"PrimaryEmailAddr.Address LIKE '%{escaped_query}%'").to_sql()
+    for field_name, field_query in customer_queries.items():
+        logger.info(f"Constructed QBO query ({field_name}): {field_query}")
+
     customers_found = []
     try:
-        customers_sdk_display_name = await _sync_qbo_call(Customer.query, full_query_display_name, qb=qbo_client)
-        if customers_sdk_display_name:
-            for cust_sdk in customers_sdk_display_name:
-                customers_found.append(sdk_customer_to_dict(cust_sdk))
-        logger.info(f"Found {len(customers_found)} customer(s) matching DisplayName query: '{query}'")
-
+        query_results = await query_entities(qbo_client, customer_queries)
     except Exception as e:
-        # Log the error but don't let it stop other query attempts if DisplayName query itself fails syntactically
-        logger.error(f"Error during QBO Customer query by DisplayName for '{query}': {e}", exc_info=True)
-        # Do not re-raise here, allow fallback to other field queries. _handle_qbo_sdk_error might be called by _sync_qbo_call
-
-    # Query 2: Try PrimaryEmailAddr if no results from DisplayName and query looks like an email
-    if not customers_found and '@' in query: # Rudimentary check for email-like query
-        full_query_email = f"SELECT * FROM Customer WHERE PrimaryEmailAddr.Address LIKE '%{escaped_query}%' MAXRESULTS 10"
-        logger.info(f"Constructed QBO query (Email): {full_query_email}")
-        try:
-            customers_sdk_email = await _sync_qbo_call(Customer.query, full_query_email, qb=qbo_client)
-            if customers_sdk_email:
-                for cust_sdk in customers_sdk_email:
-                    # Avoid duplicates if a customer somehow matched both
-                    if not any(c['Id'] == cust_sdk.Id for c in customers_found):
-                         customers_found.append(sdk_customer_to_dict(cust_sdk))
-            logger.info(f"Found {len(customers_found) - len([c for c in customers_found if c.get('matched_by_displayname')])} additional customer(s) matching Email query: '{query}'") # Adjust log
-        except Exception as e:
-            logger.error(f"Error during QBO Customer query by Email for '{query}': {e}", exc_info=True)
-
+        # Log the error but return what we have (nothing) rather than failing the tool call
+        logger.error(f"Error during QBO Customer queries for '{query}': {e}", exc_info=True)
+        query_results = {}
+
+    for field_name in customer_queries:
+        result = query_results.get(field_name)
+        if result is None:
+            continue
+        if not result.ok:
+            # Log the error but don't let it stop the other field's matches
+            logger.error(f"Error during QBO Customer query by {field_name} for '{query}': {result.error}")
+            continue
+        matched = 0
+        for raw_customer in result.entities("Customer"):
+            # Avoid duplicates if a customer somehow matched both
+            if not any(c['Id'] == raw_customer.get("Id") for c in customers_found):
+                customers_found.append(sdk_customer_to_dict(Customer.from_json(raw_customer)))
+                matched += 1
+        logger.info(f"Found {matched} customer(s) matching {field_name} query: '{query}'")
 
     # TODO: Add searches for CompanyName and Phone if necessary, being mindful of QBO query limitations.
     # It's often better to let the LLM decide to query specific fields if an initial broader search fails.
@@ -517,20 +1022,24 @@ def sdk_customer_to_dict(customer_sdk_object: Customer) -> Dict[str, Any]:
     }
     return data
 
-async def get_recent_transactions_with_customer_data(qbo_client: QuickBooks, days: int = 30) -> List[Dict[str, Any]]:
-    """Fetches recent transactions (all types) and includes associated customer details."""
-    cache_key = _generate_cache_key('get_recent_transactions_with_customer_data', days=days)
-    if cache_key in transaction_cache:
+async def get_recent_transactions_with_customer_data(qbo_client: QuickBooks, days: int = 30,
+                                                     fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Fetches recent transactions (all types) and includes associated customer details.
+    Only the listed fields (by default a summary per type) are queried from QBO.
+    """
+    fields = normalize_fields(fields)
+    cache_key = _cache_key(qbo_client, 'get_recent_transactions_with_customer_data', days=days, fields=tuple(fields) if fields else None)
+    cached = transaction_cache.get(cache_key)
+    if cached is not None:
         logger.debug(f"Cache hit for recent transactions w/ customer data (last {days} days)")
-        return transaction_cache[cache_key]
+        return cached
 
     logger.info(f"Fetching transactions from the last {days} days with customer data from QBO.")
     end_date = datetime.date.today().strftime('%Y-%m-%d')
     start_date = (datetime.date.today() - datetime.timedelta(days=days)).strftime('%Y-%m-%d')
 
     all_enriched_transactions = []
-    # Cache customer details fetched during this specific call to avoid redundant gets
-    customer_details_internal_cache = {}
 
     # Define entity types and key fields (include CustomerRef)
     entity_map = {
@@ -540,90 +1049,103 @@ async def get_recent_transactions_with_customer_data(qbo_client: QuickBooks, day
         salesreceipt.SalesReceipt: ["Id", "TxnDate", "TotalAmt", "DocNumber", "CustomerRef"] # Revised usage
         # Add Purchase, Bill, etc. if needed
     }
+    if fields:
+        # CustomerRef is always needed for the enrichment
+        entity_map = {EntityClass: list(dict.fromkeys(fields + ["CustomerRef"])) for EntityClass in entity_map}
     max_results_per_page = 100 # Keep page size reasonable for enrichment loops
 
     try:
+        query = f"TxnDate >= '{start_date}' AND TxnDate <= '{end_date}'"
+        # One paginator per entity type; their page queries share round trips (one batch request by default).
+        # A failing type stops paginating (keeping the pages read so far) without failing the others.
+        coalescer = QueryCoalescer(lambda queries: query_entities(qbo_client, queries))
+        fields_by_type = {EntityClass.__name__: fields_to_extract for EntityClass, fields_to_extract in entity_map.items()}
+        paginators = {
+            entity_name: paginate_entities(qbo_client, QBOQuery(entity_name, fields=fields_by_type[entity_name], conditions=[query]),
+                                           page_size=max_results_per_page, coalescer=coalescer, skip_failed_queries=True)
+            for entity_name in fields_by_type
+        }
+        logger.debug(f"Querying recent {list(paginators)} (last {days} days)")
+        entity_lists = await asyncio.gather(*(paginator.to_list() for paginator in paginators.values()))
+        entities_by_type = dict(zip(paginators, entity_lists))
+
+        # Fetch every referenced customer up front in bulk, then join in memory
+        customer_ids = [entity["CustomerRef"]["value"] for entities in entities_by_type.values()
+                        for entity in entities if (entity.get("CustomerRef") or {}).get("value")]
+        customers = await get_customers_by_ids(qbo_client, customer_ids)
+        unresolved = set(customer_ids) - set(customers)
+        if unresolved:
+            logger.warning(f"{len(unresolved)} customer(s) could not be fetched for enrichment: {sorted(unresolved)}")
+
+        # Process and enrich the fetched entities, keeping the entity_map order
         for EntityClass, fields_to_extract in entity_map.items():
             entity_name = EntityClass.__name__
-            logger.debug(f"Querying recent {entity_name} (last {days} days)")
-            query = f"TxnDate >= '{start_date}' AND TxnDate <= '{end_date}'"
-
-            # Handle pagination explicitly
-            start_position = 1
-            fetch_more = True
-            while fetch_more:
-                try:
-                    entities = await _sync_qbo_call(EntityClass.where, query, start_position=start_position, max_results=max_results_per_page, qb=qbo_client)
-                    logger.debug(f"Fetched page of {len(entities)} {entity_name}(s)")
-
-                    if not entities:
-                        fetch_more = False
-                        continue # No more entities of this type/page
-
-                    # Process and enrich the fetched entities
-                    for entity in entities:
-                        txn_data = {"type": entity_name}
-                        customer_id = None
-                        customer_ref_value = None
-
-                        # Extract fields and find CustomerRef ID
-                        for field in fields_to_extract:
-                            value = getattr(entity, field, None)
-                            if field == "CustomerRef" and value:
-                                customer_id = value.value
-                                customer_ref_value = {"value": customer_id, "name": value.name} # Store ref dict
-                                txn_data[field] = customer_ref_value
-                            else:
-                                txn_data[field] = value
-
-                        # Fetch and add customer details if ID found
-                        if customer_id:
-                            if customer_id not in customer_details_internal_cache:
-                                try:
-                                    # Use the dedicated function (which has its own cache)
-                                    cust_details = await get_customer_details(qbo_client, customer_id)
-                                    customer_details_internal_cache[customer_id] = cust_details
-                                except QBOError as cust_err:
-                                    # Log but store error state in cache to avoid retries within this call
-                                    logger.warning(f"Failed to fetch customer {customer_id} for enrichment: {cust_err}")
-                                    customer_details_internal_cache[customer_id] = {"error": str(cust_err), "original_exception": cust_err}
-
-                            txn_data["CustomerDetails"] = customer_details_internal_cache.get(customer_id)
-                        else:
-                            txn_data["CustomerDetails"] = None
-
-                        all_enriched_transactions.append(txn_data)
-
-                    # Pagination logic
-                    if len(entities) < max_results_per_page:
-                        fetch_more = False # Last page for this entity type
+            for entity in entities_by_type[entity_name]:
+                txn_data = {"type": entity_name}
+                customer_id = None
+
+                # Extract fields and find CustomerRef ID
+                for field in fields_to_extract:
+                    value = entity.get(field)
+                    if field == "CustomerRef" and value:
+                        customer_id = value.get("value")
+                        txn_data[field] = {"value": customer_id, "name": value.get("name")} # Store ref dict
                     else:
-                        start_position += max_results_per_page
+                        txn_data[field] = value
 
-                except QuickbooksException as page_qbe:
-                    error_code = getattr(page_qbe, 'error_code', None)
-                    if error_code and 600 <= int(error_code) < 700:
-                         logger.debug(f"No more {entity_name} found for the period (Caught via QuickbooksException code {error_code}).")
-                         fetch_more = False # Treat as NotFound for pagination
-                    else:
-                         # Log other query errors but continue overall process
-                         logger.error(f"Error querying page for {entity_name}: {page_qbe}", exc_info=True)
-                         fetch_more = False # Stop pagination on error for this type
-                except Exception as page_e:
-                    # Log error for this page/type but continue overall process
-                    logger.error(f"Error querying page for {entity_name}: {page_e}", exc_info=True)
-                    fetch_more = False # Stop pagination on error for this type
+                # Add customer details if ID found
+                if customer_id:
+                    txn_data["CustomerDetails"] = customers.get(customer_id, {"error": f"Customer ID {customer_id} could not be fetched."})
+                else:
+                    txn_data["CustomerDetails"] = None
+
+                all_enriched_transactions.append(txn_data)
 
         logger.info(f"Successfully fetched and enriched {len(all_enriched_transactions)} transactions from the last {days} days.")
-        transaction_cache[cache_key] = all_enriched_transactions # Update main transaction cache
+        # Any new or changed transaction of these types can appear in the list
+        recent_tags = [entity_type_tag(EntityClass.__name__) for EntityClass in entity_map]
+        transaction_cache.set(cache_key, all_enriched_transactions, tags=recent_tags) # Update main transaction cache
         return all_enriched_transactions
     except Exception as e:
         # Catch broad errors during the process
+        if isinstance(e, QBOError):
+            raise
         _handle_qbo_sdk_error(e, context=f"getting recent transactions (last {days} days)")
         # Error handler raises
 
-async def create_invoice(qbo_client: QuickBooks, customer_id: str, line_items: List[Dict[str, Any]], invoice_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-    """Creates an invoice in QBO using python-quickbooks."""
+async def _resolve_item_refs(qbo_client: QuickBooks, line_items: List[Dict[str, Any]], db: Optional[Session],
+                             doc_type: str) -> List[Optional[Dict[str, Any]]]:
+    """
+    The ItemRef of each sales line: the one it was given, or else the catalog item its Description names.
+    The catalog is loaded once for all lines (no per-line item queries), and only if a line needs it.
+    Lines left without an ItemRef (catalog unavailable) get None.
+    """
+    def given_ref(item_dict: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        ref = item_dict.get('SalesItemLineDetail', {}).get('ItemRef')
+        return ref if isinstance(ref, dict) and ref.get('value') else None
+
+    item_refs = [given_ref(item_dict) for item_dict in line_items]
+    if all(item_refs):
+        return item_refs
+    try:
+        catalog = await get_item_catalog(qbo_client, db)
+    except QBOError as e:
+        logger.warning(f"Item catalog unavailable ({e}); {doc_type} lines without an ItemRef are sent without one.")
+        return item_refs
+    for idx, item_dict in enumerate(line_items):
+        if item_refs[idx] is None:
+            item = catalog.resolve_line(item_dict.get('Description'))
+            if item is not None:
+                item_refs[idx] = {"value": item["Id"], "name": item.get("Name")}
+                logger.info(f"{doc_type.capitalize()} line {idx+1} ('{item_dict.get('Description')}') resolved to item '{item.get('Name')}' (ID: {item['Id']}).")
+    return item_refs
+
+async def create_invoice(qbo_client: QuickBooks, customer_id: str, line_items: List[Dict[str, Any]], invoice_data: Optional[Dict[str, Any]] = None,
+                         db: Optional[Session] = None) -> Dict[str, Any]:
+    """
+    Creates an invoice in QBO using python-quickbooks.
+    Lines without an ItemRef get one from the item catalog, matched on their Description.
+    """
     logger.info(f"Attempting to create invoice in QBO for customer ID: {customer_id}")
     invoice_obj = Invoice()
     invoice_obj.CustomerRef = {"value": customer_id}
@@ -648,6 +1170,7 @@ async def create_invoice(qbo_client: QuickBooks, customer_id: str, line_items: L
     sdk_lines = []
     if not line_items:
          raise InvalidDataError("Invoice must have at least one line item.")
+    item_refs = await _resolve_item_refs(qbo_client, line_items, db, 'invoice')
 
     for idx, item_dict in enumerate(line_items):
         line = SalesItemLine()
@@ -664,8 +1187,8 @@ async def create_invoice(qbo_client: QuickBooks, customer_id: str, line_items: L
         sild = SalesItemLineDetail()
 
         # Check if ItemRef is provided for linking to a Product/Service in QBO
-        item_ref_data = item_dict.get('SalesItemLineDetail', {}).get('ItemRef')
-        if isinstance(item_ref_data, dict) and item_ref_data.get('value'):
+        item_ref_data = item_refs[idx]
+        if item_ref_data:
             sild.ItemRef = item_ref_data
             # Optionally set Qty and UnitPrice if provided and using ItemRef
             if 'Qty' in item_dict: sild.Qty = item_dict['Qty']
@@ -686,16 +1209,25 @@ async def create_invoice(qbo_client: QuickBooks, customer_id: str, line_items: L
 
     try:
         # Save the populated invoice object
-        created_invoice_sdk = await _sync_qbo_call(invoice_obj.save, qb=qbo_client)
+        if qbo_http.is_enabled('create_invoice'):
+            response = await _async_qbo_call(qbo_client, 'create', 'Invoice', json.loads(invoice_obj.to_json()))
+            created_invoice_sdk = Invoice.from_json(response['Invoice'])
+        else:
+            created_invoice_sdk = await _sync_qbo_call(invoice_obj.save, qb=qbo_client)
         logger.info(f"Successfully created invoice ID: {created_invoice_sdk.Id} Doc #: {created_invoice_sdk.DocNumber}")
+        _invalidate_after_write('Invoice', created_invoice_sdk.Id, customer_id)
+        _mirror_saved(db, 'Invoice', created_invoice_sdk)
         # Return the created invoice data as a dictionary
         return created_invoice_sdk.to_dict()
     except Exception as e:
         _handle_qbo_sdk_error(e, context=f"creating invoice for customer {customer_id}")
         # Error handler raises
 
-async def create_estimate(qbo_client: QuickBooks, customer_id: str, line_items: List[Dict[str, Any]], estimate_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-    """Creates an estimate in QBO using python-quickbooks."""
+async def create_estimate(qbo_client: QuickBooks, customer_id: str, line_items: List[Dict[str, Any]], estimate_data: Optional[Dict[str, Any]] = None, db: Optional[Session] = None) -> Dict[str, Any]:
+    """
+    Creates an estimate in QBO using python-quickbooks.
+    Lines without an ItemRef get one from the item catalog, matched on their Description.
+    """
     logger.info(f"Attempting to create estimate in QBO for customer ID: {customer_id}")
     estimate_obj = Estimate()
     estimate_obj.CustomerRef = {"value": customer_id}
@@ -716,6 +1248,7 @@ async def create_estimate(qbo_client: QuickBooks, customer_id: str, line_items:
     sdk_lines = []
     if not line_items:
         raise InvalidDataError("Estimate must have at least one line item.")
+    item_refs = await _resolve_item_refs(qbo_client, line_items, db, 'estimate')
 
     for idx, item_dict in enumerate(line_items):
         line = SalesItemLine()
@@ -728,8 +1261,8 @@ async def create_estimate(qbo_client: QuickBooks, customer_id: str, line_items:
         line.DetailType = 'SalesItemLineDetail'
 
         sild = SalesItemLineDetail()
-        item_ref_data = item_dict.get('SalesItemLineDetail', {}).get('ItemRef')
-        if isinstance(item_ref_data, dict) and item_ref_data.get('value'):
+        item_ref_data = item_refs[idx]
+        if item_ref_data:
             sild.ItemRef = item_ref_data
             if 'Qty' in item_dict: sild.Qty = item_dict['Qty']
             if 'UnitPrice' in item_dict: sild.UnitPrice = item_dict['UnitPrice']
@@ -747,12 +1280,15 @@ async def create_estimate(qbo_client: QuickBooks, customer_id: str, line_items:
         # Save the estimate object
         created_estimate_sdk = await _sync_qbo_call(estimate_obj.save, qb=qbo_client)
         logger.info(f"Successfully created estimate ID: {created_estimate_sdk.Id} Doc #: {created_estimate_sdk.DocNumber}")
+        _invalidate_after_write('Estimate', created_estimate_sdk.Id, customer_id)
+        _mirror_saved(db, 'Estimate', created_estimate_sdk)
         return created_estimate_sdk.to_dict()
     except Exception as e:
         _handle_qbo_sdk_error(e, context=f"creating estimate for customer {customer_id}")
 
-async def record_payment(qbo_client: QuickBooks, customer_id: str, invoice_id: str, amount: float, payment_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-    """Records a payment against an invoice in QBO."""
+async def record_payment(qbo_client: QuickBooks, customer_id: str, invoice_id: str, amount: float, payment_data: Optional[Dict[str, Any]] = None,
+                         db: Optional[Session] = None) -> Dict[str, Any]:
+    """Records a payment against an invoice in QBO. With db, the payment and the paid invoice are updated in the mirror."""
     logger.info(f"Attempting to record payment of {amount} for invoice ID: {invoice_id} from customer {customer_id}")
     payment_obj = Payment()
     payment_obj.CustomerRef = {"value": customer_id}
@@ -786,26 +1322,34 @@ async def record_payment(qbo_client: QuickBooks, customer_id: str, invoice_id: s
         # Save the payment object
         created_payment_sdk = await _sync_qbo_call(payment_obj.save, qb=qbo_client)
         logger.info(f"Successfully recorded payment ID: {created_payment_sdk.Id}")
+        _invalidate_after_write('Payment', created_payment_sdk.Id, customer_id)
+        _invalidate_after_write('Invoice', invoice_id, customer_id) # The paid invoice's balance changed
+        _mirror_saved(db, 'Payment', created_payment_sdk)
+        await _remirror_entity(qbo_client, db, Invoice, invoice_id, 'record_payment')
         return created_payment_sdk.to_dict()
     except Exception as e:
         _handle_qbo_sdk_error(e, context=f"recording payment for invoice {invoice_id}")
 
-async def send_invoice(qbo_client: QuickBooks, invoice_id: str) -> bool:
-    """Triggers QBO to send the specified invoice via email."""
+async def send_invoice(qbo_client: QuickBooks, invoice_id: str, db: Optional[Session] = None) -> bool:
+    """Triggers QBO to send the specified invoice via email. With db, the sent invoice is updated in the mirror."""
     logger.info(f"Attempting to trigger QBO send for invoice ID: {invoice_id}")
     try:
         # Fetch the invoice first to ensure it exists
-        invoice = await _sync_qbo_call(Invoice.get, invoice_id, qb=qbo_client)
+        invoice = await _read_entity(qbo_client, Invoice, invoice_id, 'send_invoice')
 
-        # Use the SDK's send() method on the invoice object
-        # This typically sends to the customer's BillEmail or PrimaryEmailAddr
-        await _sync_qbo_call(invoice.send, qb=qbo_client)
+        # Send to the customer's BillEmail or PrimaryEmailAddr
+        if qbo_http.is_enabled('send_invoice'):
+            response = await _async_qbo_call(qbo_client, 'send', 'Invoice', invoice_id)
+        else:
+            response = await _sync_qbo_call(invoice.send, qb=qbo_client)
 
         logger.info(f"Successfully called send method for invoice ID: {invoice_id}. QBO handles actual email delivery.")
-        # Clear cache for this specific invoice details if needed
-        details_cache.pop(_generate_cache_key('get_invoice_details', invoice_id=invoice_id), None)
-        # Potentially clear broader transaction caches if status change is critical
-        transaction_cache.clear()
+        # Evict this invoice's details and the lists showing it (EmailStatus changed)
+        _invalidate_after_write('Invoice', invoice_id, _ref_id(invoice.CustomerRef))
+        # QBO answers with the invoice as sent (EmailStatus, DeliveryInfo)
+        sent_invoice = response.get('Invoice') if isinstance(response, dict) else None
+        if sent_invoice:
+            qbo_mirror.write_back(db, 'Invoice', [sent_invoice])
         return True
     except ValidationException as ve:
         # Handle specific errors like missing email address
@@ -820,12 +1364,12 @@ async def send_invoice(qbo_client: QuickBooks, invoice_id: str) -> bool:
         _handle_qbo_sdk_error(e, context=f"sending invoice ID {invoice_id}")
         return False # Indicate failure on error (though error handler should raise)
 
-async def void_invoice(qbo_client: QuickBooks, invoice_id: str) -> bool:
-    """Voids a specific invoice in QBO."""
+async def void_invoice(qbo_client: QuickBooks, invoice_id: str, db: Optional[Session] = None) -> bool:
+    """Voids a specific invoice in QBO. With db, the voided invoice is updated in the mirror."""
     logger.warning(f"Attempting to VOID invoice ID: {invoice_id} in QBO")
     try:
         # 1. Fetch the invoice to get the current state and SyncToken
-        invoice = await _sync_qbo_call(Invoice.get, invoice_id, qb=qbo_client)
+        invoice = await _read_entity(qbo_client, Invoice, invoice_id, 'void_invoice')
 
         # Ensure we have SyncToken needed for updates/voids
         if not invoice.SyncToken:
@@ -834,19 +1378,23 @@ async def void_invoice(qbo_client: QuickBooks, invoice_id: str) -> bool:
         # 2. Use the .save() method with the 'operation=void' parameter
         # The SDK should handle constructing the correct sparse update request.
         # The object passed to save (invoice) contains the ID and SyncToken.
-        voided_invoice_response = await _sync_qbo_call(
-            invoice.save, # Call save on the fetched object itself
-            qb=qbo_client,
-            params={'operation': 'void'} # Crucial parameter for void action
-        )
+        if qbo_http.is_enabled('void_invoice'):
+            response = await _async_qbo_call(qbo_client, 'void', 'Invoice', invoice_id, invoice.SyncToken)
+            voided_invoice_response = Invoice.from_json(response['Invoice'])
+        else:
+            voided_invoice_response = await _sync_qbo_call(
+                invoice.save, # Call save on the fetched object itself
+                qb=qbo_client,
+                params={'operation': 'void'} # Crucial parameter for void action
+            )
 
         # 3. Verify response
         # A successful void usually returns the object with updated state (e.g., status, zeroed amounts)
         if voided_invoice_response and voided_invoice_response.Id == invoice_id:
             logger.info(f"Successfully voided invoice ID: {invoice_id}")
-            # Clear relevant caches as the transaction state has significantly changed
-            details_cache.pop(_generate_cache_key('get_invoice_details', invoice_id=invoice_id), None)
-            transaction_cache.clear() # Clear broader caches that might list this invoice
+            # Evict this invoice's details and the lists showing it, as its state has significantly changed
+            _invalidate_after_write('Invoice', invoice_id, _ref_id(invoice.CustomerRef))
+            _mirror_saved(db, 'Invoice', voided_invoice_response)
             return True
         else:
             # This case might indicate an unexpected response from the SDK/API after a 2xx status
@@ -872,10 +1420,23 @@ async def void_invoice(qbo_client: QuickBooks, invoice_id: str) -> bool:
 async def find_or_create_customer(name: str, db: Session, qbo: QuickBooks, create_if_not_found: bool = True) -> Dict[str, Any] | None:
     """Finds or creates a customer, checking DB cache first. Uses async SDK calls."""
     logger.info(f"Async Finding/Creating customer: '{name}'")
-    # 1. Check DB cache (synchronous - ok within async func)
+    # 1. Check the in-process name directory (loaded once from the DB cache)
+    entry = qbo_directory.customer_names.get(db, name)
+    if entry:
+        logger.info(f"Found customer '{name}' in the name directory (ID: {entry.qbo_id}).")
+        return {
+            "qbo_customer_id": entry.qbo_id,
+            "display_name": entry.display_name,
+            "email_address": entry.email_address,
+            "source": "directory",
+            "qbo_customer_ref_id": entry.qbo_id
+        }
+
+    # 2. Check DB cache (synchronous - ok within async func); rows written by other processes since the directory loaded
     cached_customer = crud.get_customer_by_name(db, name)
     if cached_customer:
         logger.info(f"Found customer '{name}' in DB cache (ID: {cached_customer.qbo_customer_id}).")
+        qbo_directory.customer_names.put(cached_customer.qbo_customer_id, cached_customer.display_name, cached_customer.email_address)
         # Return structure includes ID for referencing
         return {
             "qbo_customer_id": cached_customer.qbo_customer_id,
@@ -885,8 +1446,12 @@ async def find_or_create_customer(name: str, db: Session, qbo: QuickBooks, creat
             "qbo_customer_ref_id": cached_customer.qbo_customer_id # Added for consistency
         }
 
+    if not create_if_not_found and _known_missing(qbo, 'Customer', name):
+        logger.info(f"Customer '{name}' was not found in QBO moments ago; not querying again.")
+        return None
+
     logger.info(f"Customer '{name}' not found in DB cache. Querying QBO.")
-    # 2. Query QBO (asynchronously)
+    # 3. Query QBO (asynchronously)
     try:
         sanitized_name = name.replace("'", "\\\'")
         query = f"SELECT * FROM Customer WHERE DisplayName = '{sanitized_name}' MAXRESULTS 1"
@@ -921,12 +1486,16 @@ async def find_or_create_customer(name: str, db: Session, qbo: QuickBooks, creat
 
         else: # Not found and not creating
             logger.info(f"Customer '{name}' not found in QBO and creation disabled.")
+            _remember_missing(qbo, 'Customer', name)
             return None
 
         # Update DB cache if customer was found or created
         if customer_data_for_cache:
              crud.update_or_create_customer_cache(db, customer_data_for_cache)
              # db.commit() should be handled by the caller/session manager
+             qbo_directory.customer_names.put(customer_data_for_cache["qbo_customer_id"], customer_data_for_cache["display_name"],
+                                              customer_data_for_cache["email_address"])
+             _forget_missing('Customer', name)
 
         return return_data
 
@@ -934,9 +1503,73 @@ async def find_or_create_customer(name: str, db: Session, qbo: QuickBooks, creat
         _handle_qbo_sdk_error(e, context=f"find/create customer '{name}'")
         # Error handler raises
 
-async def find_item(qbo: QuickBooks, name: str) -> Optional[Dict[str, Any]]:
-     """Finds an item by name. Returns dict with key details or None."""
+def _item_summary(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Key details of an item (as returned by to_dict()), in the shape find_item returns."""
+    income_ref = item.get("IncomeAccountRef") or {}
+    expense_ref = item.get("ExpenseAccountRef") or {}
+    return {
+        "Id": item.get("Id"),
+        "Name": item.get("Name"),
+        "Description": item.get("Description"),
+        "Type": item.get("Type"),
+        "UnitPrice": item.get("UnitPrice"),
+        "IncomeAccountRef": income_ref.get("value"),
+        "ExpenseAccountRef": expense_ref.get("value"),
+        "Active": item.get("Active"),
+    }
+
+async def get_reference_data(qbo: QuickBooks, entity_name: str, force_refresh: bool = False) -> List[Dict[str, Any]]:
+    """
+    Returns every active entity of a slow-changing reference type ('Item', 'Term', 'PaymentMethod')
+    as dictionaries. Stale-while-revalidate, like get_qbo_accounts.
+    """
+    EntityClass = REFERENCE_ENTITIES.get(entity_name)
+    if EntityClass is None:
+        raise ValueError(f"Unknown reference data type '{entity_name}'. Expected one of {list(REFERENCE_ENTITIES)}.")
+
+    async def load() -> List[Dict[str, Any]]:
+        logger.info(f"Fetching all {entity_name} reference data from QBO.")
+        entities = await _sync_qbo_call(EntityClass.all, max_results=1000, qb=qbo)
+        return [entity.to_dict() for entity in entities]
+
+    try:
+        return await reference_cache.get(_cache_key(qbo, 'get_reference_data', entity_name=entity_name), load, force_refresh=force_refresh)
+    except Exception as e:
+        _handle_qbo_sdk_error(e, context=f"fetching QBO {entity_name} reference data")
+
+_item_catalogs: Dict[CacheKey, tuple] = {} # (item list, ItemCatalog) built from the cached item list, per key
+
+async def get_item_catalog(qbo: QuickBooks, db: Optional[Session] = None, max_staleness: Optional[float] = None) -> qbo_items.ItemCatalog:
+    """
+    The indexed item catalog: over the item mirror when it is fresh (every item, synced in
+    bulk), otherwise over the cached item list. Rebuilt only when its source changes.
+    """
+    if qbo_mirror.is_fresh(db, ['Item'], max_staleness):
+        return qbo_items.catalog_for(db)
+    items = await get_reference_data(qbo, 'Item')
+    cache_key = _cache_key(qbo, 'get_item_catalog')
+    cached = _item_catalogs.get(cache_key)
+    if cached is None or cached[0] is not items:
+        cached = (items, qbo_items.ItemCatalog(items))
+        _item_catalogs[cache_key] = cached
+    return cached[1]
+
+async def find_item(qbo: QuickBooks, name: str, db: Optional[Session] = None) -> Optional[Dict[str, Any]]:
+     """Finds an item by name or SKU. Returns dict with key details or None."""
      logger.info(f"Async Searching for item: {name}")
+     # The item catalog answers most lookups without a QBO call
+     try:
+         match = (await get_item_catalog(qbo, db)).find(name)
+         if match:
+             logger.info(f"Found item: {name} (ID: {match.get('Id')}) in the item catalog")
+             return _item_summary(match)
+     except QBOError as e:
+         logger.warning(f"Item catalog unavailable ({e}); querying QBO for item '{name}'.")
+
+     # Not in the list: the item may have been created since it was loaded
+     if _known_missing(qbo, 'Item', name):
+         logger.info(f"Item '{name}' was not found in QBO moments ago; not querying again.")
+         return None
      try:
          sanitized_name = name.replace("'", "\\\'")
          query = f"SELECT * FROM Item WHERE Name = '{sanitized_name}' MAXRESULTS 1"
@@ -946,87 +1579,102 @@ async def find_item(qbo: QuickBooks, name: str) -> Optional[Dict[str, Any]]:
              item = items_sdk[0]
              logger.info(f"Found item: {name} (ID: {item.Id}, Type: {item.Type})")
              # Return key details as a dictionary
-             return {
-                 "Id": item.Id,
-                 "Name": item.Name,
-                 "Description": item.Description,
-                 "Type": item.Type,
-                 "UnitPrice": item.UnitPrice,
-                 "IncomeAccountRef": item.IncomeAccountRef.value if item.IncomeAccountRef else None,
-                 "ExpenseAccountRef": item.ExpenseAccountRef.value if item.ExpenseAccountRef else None,
-                 "Active": item.Active
-             }
+             return _item_summary(item.to_dict())
          else:
              logger.warning(f"Item '{name}' not found in QBO.")
+             _remember_missing(qbo, 'Item', name)
              return None
      except Exception as e:
          _handle_qbo_sdk_error(e, context=f"find item '{name}'")
          # Return None on error after handling/logging
          return None
 
+async def _load_qbo_accounts(qbo: QuickBooks) -> List[Dict[str, Any]]:
+    logger.info("Fetching accounts from QBO.")
+    accounts_sdk = await _sync_qbo_call(Account.all, max_results=1000, qb=qbo)
+    accounts_data = []
+    for acc in accounts_sdk:
+        accounts_data.append({
+            'qbo_account_id': acc.Id,
+            'name': acc.Name,
+            'account_type': acc.AccountType,
+            'account_sub_type': acc.AccountSubType,
+            'classification': acc.Classification,
+            'fully_qualified_name': acc.FullyQualifiedName,
+            'parent_account_id': acc.ParentRef.value if acc.ParentRef else None,
+            'active': acc.Active,
+            'current_balance': acc.CurrentBalance,
+        })
+    logger.info(f"Fetched {len(accounts_data)} accounts from QBO.")
+    return accounts_data
+
+_accounts_db_generation: Dict[CacheKey, int] = {} # Last account_cache load written to the DB cache, per key
+
 async def get_qbo_accounts(qbo: QuickBooks, db: Session, force_refresh: bool = False) -> List[Dict[str, Any]]:
-    """Fetches all accounts from QBO, uses/updates DB cache and in-memory cache."""
-    cache_key = 'all_accounts' # Use a fixed key for the full list
-    now = time.time()
-
-    # Check in-memory cache first
-    cached_data = account_cache.get(cache_key)
-    if not force_refresh and cached_data is not None:
-         # Use get_timestamp if available, otherwise assume standard TTLCache behavior if needed
-         # Simple check if data exists is often enough if TTL is handled internally
-         logger.info("Using in-memory cache for QBO accounts.")
-         return cached_data
-
-    logger.info(f"Fetching accounts from QBO (force_refresh={force_refresh}). Updating caches.")
+    """
+    Fetches all accounts from QBO, uses/updates DB cache and in-memory cache.
+    After the one-hour TTL the cached list is returned at once and refreshed in the background
+    (stale-while-revalidate), up to QBO_REFERENCE_MAX_STALENESS_SECONDS.
+    """
+    cache_key = _cache_key(qbo, 'get_qbo_accounts')
     try:
-        accounts_sdk = await _sync_qbo_call(Account.all, qb=qbo)
-        accounts_data = []
-        for acc in accounts_sdk:
-            accounts_data.append({
-                'qbo_account_id': acc.Id,
-                'name': acc.Name,
-                'account_type': acc.AccountType,
-                'account_sub_type': acc.AccountSubType,
-                'classification': acc.Classification,
-                'active': acc.Active,
-                'current_balance': acc.CurrentBalance,
-            })
-
-        # Update DB cache (synchronous)
+        accounts_data, generation = await account_cache.get_with_generation(cache_key, lambda: _load_qbo_accounts(qbo), force_refresh=force_refresh)
+    except Exception as e:
+        # Attempt to return the cached list on error, within the staleness bound
+        stale_data = account_cache.peek(cache_key)
+        stale_age = account_cache.age(cache_key)
+        if stale_data is not None and stale_age < account_cache.max_staleness:
+            logger.warning(f"Returning cached accounts ({stale_age:.0f}s old) due to fetch error: {e}")
+            return stale_data
+        logger.error("Failed to fetch accounts and no usable cache available.")
+        _handle_qbo_sdk_error(e, context="fetching QBO accounts")
+
+    # Write newly loaded lists (including ones refreshed in the background) to the DB cache; a stale
+    # list returned to a slower caller must not overwrite a newer one already written
+    if generation > _accounts_db_generation.get(cache_key, 0):
         try:
             crud.bulk_update_or_create_account_cache(db, accounts_data)
+            _accounts_db_generation[cache_key] = generation
             logger.info(f"Updated DB cache with {len(accounts_data)} accounts.")
             # db.commit() # Assume commit happens higher up
         except Exception as db_err:
              logger.error(f"Failed to update account DB cache: {db_err}", exc_info=True)
-             # Continue with in-memory cache update even if DB fails
-
-        # Update in-memory cache
-        account_cache[cache_key] = accounts_data
-        logger.info(f"Fetched and cached {len(accounts_data)} accounts from QBO.")
-        return accounts_data
-
-    except Exception as e:
-        _handle_qbo_sdk_error(e, context="fetching QBO accounts")
-        # Attempt to return stale in-memory cache if available on error
-        stale_data = account_cache.get(cache_key)
-        if stale_data is not None:
-             logger.warning("Returning stale account cache due to fetch error.")
-             return stale_data
-        else:
-             # If fetch fails and no cache exists, reraise the original error
-             logger.error("Failed to fetch accounts and no cache available.")
-             raise
-
-# find_account_in_cache remains synchronous
+             # Continue with in-memory cache even if DB fails
+    return accounts_data
+
+_account_resolvers: Dict[CacheKey, tuple] = {} # (account_cache generation, account list, AccountResolver), per key
+
+async def get_account_resolver(qbo: QuickBooks, db: Session) -> qbo_accounts.AccountResolver:
+    """The AccountResolver over the cached chart of accounts, rebuilt only when a new version of it is loaded."""
+    accounts_data = await get_qbo_accounts(qbo, db)
+    cache_key = _cache_key(qbo, 'get_qbo_accounts')
+    generation = account_cache.generation(cache_key)
+    cached = _account_resolvers.get(cache_key)
+    if cached is None or cached[0] != generation or cached[1] is not accounts_data:
+        cached = (generation, accounts_data, qbo_accounts.AccountResolver(accounts_data))
+        _account_resolvers[cache_key] = cached
+        logger.debug(f"Built account resolver over {len(cached[2])} accounts (generation {generation}).")
+    return cached[2]
 
 async def find_or_create_vendor(name: str, db: Session, qbo: QuickBooks, create_if_not_found: bool = True) -> Dict[str, Any] | None:
     """Finds or creates a vendor, checking DB cache first. Uses async SDK calls."""
     logger.info(f"Async Finding/Creating vendor: '{name}'")
-    # 1. Check DB cache
+    # 1. Check the in-process name directory (loaded once from the DB cache)
+    entry = qbo_directory.vendor_names.get(db, name)
+    if entry:
+        logger.info(f"Found vendor '{name}' in the name directory (ID: {entry.qbo_id}).")
+        return {
+            "qbo_vendor_id": entry.qbo_id,
+            "display_name": entry.display_name,
+            "source": "directory",
+            "qbo_vendor_ref_id": entry.qbo_id
+        }
+
+    # 2. Check DB cache; rows written by other processes since the directory loaded
     cached_vendor = crud.get_vendor_by_name(db, name)
     if cached_vendor:
         logger.info(f"Found vendor '{name}' in DB cache (ID: {cached_vendor.qbo_vendor_id}).")
+        qbo_directory.vendor_names.put(cached_vendor.qbo_vendor_id, cached_vendor.display_name, cached_vendor.email_address)
         return {
             "qbo_vendor_id": cached_vendor.qbo_vendor_id,
             "display_name": cached_vendor.display_name,
@@ -1034,8 +1682,12 @@ async def find_or_create_vendor(name: str, db: Session, qbo: QuickBooks, create_
             "qbo_vendor_ref_id": cached_vendor.qbo_vendor_id # Added for consistency
         }
 
+    if not create_if_not_found and _known_missing(qbo, 'Vendor', name):
+        logger.info(f"Vendor '{name}' was not found in QBO moments ago; not querying again.")
+        return None
+
     logger.info(f"Vendor '{name}' not found in DB cache. Querying QBO.")
-    # 2. Query QBO
+    # 3. Query QBO
     try:
         sanitized_name = name.replace("'", "\\\'")
         query = f"SELECT * FROM Vendor WHERE DisplayName = '{sanitized_name}' MAXRESULTS 1"
@@ -1067,11 +1719,14 @@ async def find_or_create_vendor(name: str, db: Session, qbo: QuickBooks, create_
             return_data = {**vendor_data_for_cache, "source": "qbo_created", "qbo_vendor_ref_id": created_vendor.Id}
         else:
             logger.info(f"Vendor '{name}' not found in QBO and creation disabled.")
+            _remember_missing(qbo, 'Vendor', name)
             return None
 
         if vendor_data_for_cache:
             crud.update_or_create_vendor_cache(db, vendor_data_for_cache)
             # db.commit()
+            qbo_directory.vendor_names.put(vendor_data_for_cache["qbo_vendor_id"], vendor_data_for_cache["display_name"])
+            _forget_missing('Vendor', name)
 
         return return_data
 
@@ -1090,21 +1745,21 @@ async def create_purchase(qbo: QuickBooks, db: Session, vendor_name: str, amount
              raise QBOError(f"Failed to find or create vendor '{vendor_name}' before purchase creation.")
         vendor_ref_id = vendor_info['qbo_vendor_id']
 
-        # 2. Fetch/Cache Accounts (async)
-        all_accounts = await get_qbo_accounts(qbo, db)
-        if not all_accounts:
+        # 2. Chart of accounts, indexed once per version (async)
+        accounts = await get_account_resolver(qbo, db)
+        if not len(accounts):
              # get_qbo_accounts should raise if it fails and has no cache
              raise QBOError("Failed to get QBO Chart of Accounts before purchase creation.")
 
-        # 3. Find Expense Account (sync using cached list)
+        # 3. Find Expense Account: exact path/name, then fuzzy, then the catch-all accounts
         expense_category_name = category_name or "Miscellaneous Expense"
-        expense_account = find_account_in_cache(expense_category_name, account_type='Expense', accounts_list=all_accounts)
+        expense_account = accounts.resolve(expense_category_name, qbo_accounts.EXPENSE_ACCOUNT_TYPES)
         if not expense_account:
              # Try fallbacks
              logger.warning(f"Expense category '{expense_category_name}' not found. Trying fallbacks...")
              fallbacks = ["Miscellaneous Expense", "Other Miscellaneous Expense", "Uncategorized Expense"]
              for fb_name in fallbacks:
-                 expense_account = find_account_in_cache(fb_name, account_type='Expense', accounts_list=all_accounts)
+                 expense_account = accounts.find_exact(fb_name, qbo_accounts.EXPENSE_ACCOUNT_TYPES)
                  if expense_account: break
              if not expense_account:
                  err_msg = f"Could not find suitable expense account category ('{category_name}' or fallbacks)."
@@ -1113,13 +1768,11 @@ async def create_purchase(qbo: QuickBooks, db: Session, vendor_name: str, amount
         expense_account_ref = {"value": expense_account['qbo_account_id']}
         logger.info(f"Using expense account: {expense_account['name']} (ID: {expense_account['qbo_account_id']})")
 
-        # 4. Find Payment Account (sync using cached list)
-        payment_account = find_account_in_cache(payment_account_name, account_type='Bank', accounts_list=all_accounts)
+        # 4. Find Payment Account (Bank preferred over Credit Card)
+        payment_account = accounts.resolve(payment_account_name, qbo_accounts.PAYMENT_ACCOUNT_TYPES)
         if not payment_account:
-             payment_account = find_account_in_cache(payment_account_name, account_type='Credit Card', accounts_list=all_accounts)
-             if not payment_account:
-                 err_msg = f"Payment account '{payment_account_name}' not found as Bank or Credit Card type."
-                 raise InvalidDataError(err_msg)
+             err_msg = f"Payment account '{payment_account_name}' not found as Bank or Credit Card type."
+             raise InvalidDataError(err_msg)
 
         payment_account_ref = {"value": payment_account['qbo_account_id']}
         logger.info(f"Using payment account: {payment_account['name']} (ID: {payment_account['qbo_account_id']})")
@@ -1144,6 +1797,8 @@ async def create_purchase(qbo: QuickBooks, db: Session, vendor_name: str, amount
         # 6. Save Purchase (async)
         created_purchase = await _sync_qbo_call(purchase_obj.save, qb=qbo)
         logger.info(f"Successfully created Purchase ID: {created_purchase.Id}")
+        _invalidate_after_write('Purchase', created_purchase.Id) # Open-period reports include it
+        _mirror_saved(db, 'Purchase', created_purchase)
 
         # 7. Return success details as dictionary
         return created_purchase.to_dict()
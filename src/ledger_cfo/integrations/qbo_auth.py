@@ -0,0 +1,197 @@
+"""
+OAuth token management for the QBO client.
+
+QBO access tokens live for an hour. QBOTokenManager refreshes them in a background thread
+ahead of expiry, so tool calls never wait on the token endpoint. Concurrent refresh requests
+(background loop, a 401 nudge, an explicit refresh) collapse into a single call (single-flight).
+QBO rotates refresh tokens, so every new refresh token is persisted through a pluggable
+RefreshTokenStore; the default store writes a new Secret Manager version.
+
+A background thread is used rather than an asyncio task because Flask runs each async view
+in its own short-lived event loop.
+"""
+import abc
+import logging
+import os
+import threading
+import time
+from typing import Callable, List, Optional
+
+from quickbooks.client import QuickBooks
+
+from ..core import metrics
+from ..core.config import get_secret, add_secret_version
+
+logger = logging.getLogger(__name__)
+
+QBO_TOKEN_REFRESH_MARGIN_SECONDS = float(os.getenv("QBO_TOKEN_REFRESH_MARGIN_SECONDS", "600")) # Refresh this long before expiry
+QBO_TOKEN_RETRY_INTERVAL_SECONDS = float(os.getenv("QBO_TOKEN_RETRY_INTERVAL_SECONDS", "30")) # Wait after a failed refresh
+QBO_TOKEN_MIN_FORCED_INTERVAL_SECONDS = 30 # Forced refreshes closer together than this are collapsed
+DEFAULT_ACCESS_TOKEN_LIFETIME_SECONDS = 3600 # Used when the token response has no expires_in
+
+# --- Refresh token stores ---
+
+class RefreshTokenStore(abc.ABC):
+    """Where the current QBO refresh token is kept between process restarts."""
+
+    @abc.abstractmethod
+    def load(self) -> Optional[str]:
+        """Returns the stored refresh token, or None if there is none."""
+
+    @abc.abstractmethod
+    def save(self, refresh_token: str):
+        """Persists a rotated refresh token."""
+
+class SecretManagerRefreshTokenStore(RefreshTokenStore):
+    """Keeps the refresh token as the latest version of a Secret Manager secret."""
+
+    def __init__(self, secret_id: str = "ledger-cfo-qbo-refresh-token"):
+        self.secret_id = secret_id
+
+    def load(self) -> Optional[str]:
+        token = get_secret(self.secret_id)
+        return token.strip() if token else None
+
+    def save(self, refresh_token: str):
+        if not add_secret_version(self.secret_id, refresh_token):
+            raise RuntimeError(f"Could not store the rotated QBO refresh token in secret '{self.secret_id}'.")
+
+class InMemoryRefreshTokenStore(RefreshTokenStore):
+    """Process-local store, for tests and local runs."""
+
+    def __init__(self, refresh_token: Optional[str] = None):
+        self.refresh_token = refresh_token
+
+    def load(self) -> Optional[str]:
+        return self.refresh_token
+
+    def save(self, refresh_token: str):
+        self.refresh_token = refresh_token
+
+# --- Token manager ---
+
+class QBOTokenManager:
+    """Keeps the access token of one intuitlib AuthClient (and the QBO clients using it) fresh."""
+
+    def __init__(self, auth_client, store: RefreshTokenStore,
+                 refresh_margin: float = QBO_TOKEN_REFRESH_MARGIN_SECONDS,
+                 retry_interval: float = QBO_TOKEN_RETRY_INTERVAL_SECONDS,
+                 persisted_refresh_token: Optional[str] = None,
+                 clock: Callable[[], float] = time.time):
+        self.auth_client = auth_client
+        self.store = store
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        self._clock = clock
+        self._clients: List[QuickBooks] = []
+        self._expires_at: Optional[float] = None
+        self._refreshed_at: Optional[float] = None
+        self._persisted_refresh_token = persisted_refresh_token # The token the store holds, to detect rotation
+        self._generation = 0 # Bumped on every successful refresh
+        self._refresh_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # --- State ---
+
+    def attach(self, client: QuickBooks):
+        """Registers a client whose session should receive new access tokens, and records the current token."""
+        self._clients.append(client)
+        if self.auth_client.access_token:
+            self._record_token()
+
+    def seconds_left(self) -> Optional[float]:
+        """Seconds until the current access token expires (negative if expired), or None if unknown."""
+        if self._expires_at is None:
+            return None
+        return self._expires_at - self._clock()
+
+    def needs_refresh(self) -> bool:
+        left = self.seconds_left()
+        return left is None or left <= self.refresh_margin
+
+    def _record_token(self):
+        expires_in = getattr(self.auth_client, "expires_in", None) or DEFAULT_ACCESS_TOKEN_LIFETIME_SECONDS
+        self._refreshed_at = self._clock()
+        self._expires_at = self._refreshed_at + float(expires_in)
+        for client in self._clients:
+            if client.session is not None:
+                client.session.access_token = self.auth_client.access_token
+            client.refresh_token = self.auth_client.refresh_token
+
+        new_refresh_token = self.auth_client.refresh_token
+        if new_refresh_token and new_refresh_token != self._persisted_refresh_token:
+            try:
+                self.store.save(new_refresh_token)
+                self._persisted_refresh_token = new_refresh_token
+                logger.info("Persisted rotated QBO refresh token.")
+            except Exception as e:
+                # The token still works in memory; keep trying on the next refresh
+                logger.error(f"Failed to persist rotated QBO refresh token: {e}", exc_info=True)
+
+    # --- Refresh ---
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Refreshes the access token unless it is still fresh (or, when forced, unless another caller
+        refreshed it while this one waited). Blocking; hot-path code uses request_refresh() instead.
+        Returns True if a valid token is in place afterwards.
+        """
+        generation_seen = self._generation
+        with self._refresh_lock:
+            if self._generation != generation_seen:
+                logger.debug("QBO token was refreshed by a concurrent caller.")
+                return True
+            if not force and not self.needs_refresh():
+                return True
+            if force and self._refreshed_at is not None and self._clock() - self._refreshed_at < QBO_TOKEN_MIN_FORCED_INTERVAL_SECONDS:
+                logger.debug("Skipping forced QBO token refresh; the token was refreshed moments ago.")
+                return True
+            started = time.monotonic()
+            try:
+                self.auth_client.refresh(refresh_token=self.auth_client.refresh_token)
+            except Exception as e:
+                metrics.counter("qbo_token_refresh_total", outcome="error").inc()
+                logger.error(f"QBO token refresh failed: {e}", exc_info=True)
+                return False
+            self._generation += 1
+            self._record_token()
+            metrics.counter("qbo_token_refresh_total", outcome="ok").inc()
+            metrics.histogram("qbo_token_refresh_seconds").observe(time.monotonic() - started)
+            logger.info(f"QBO access token refreshed; expires in {self.seconds_left():.0f}s.")
+            return True
+
+    def request_refresh(self):
+        """Asks the background thread to refresh now (e.g. after a 401). Never blocks."""
+        self._wake.set()
+        self.start()
+
+    # --- Background loop ---
+
+    def start(self):
+        """Starts the background refresh thread if it is not running."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="qbo-token-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            left = self.seconds_left()
+            delay = 0 if left is None else max(0.0, left - self.refresh_margin)
+            woken = self._wake.wait(timeout=delay) if delay > 0 else self._wake.is_set()
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            if not woken and not self.needs_refresh():
+                continue
+            if not self.refresh(force=woken):
+                self._stop.wait(self.retry_interval)
@@ -0,0 +1,114 @@
+"""
+Batch request layer over QBO's /batch endpoint.
+
+A single batch request carries up to MAX_BATCH_OPERATIONS operations (queries or
+create/update/delete), so a multi-entity lookup costs one HTTP round trip instead of
+one per entity. This module only builds payloads and parses responses; sending the
+request is done by qbo_api.run_batch so it goes through the same client helpers as
+every other QBO call.
+"""
+import logging
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List
+
+from quickbooks.client import QuickBooks
+from quickbooks.exceptions import QuickbooksException
+
+from .qbo_errors import QBOError, map_qbo_exception
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_OPERATIONS = 30 # Hard limit imposed by QBO per batch request
+BATCH_WRITE_OPERATIONS = ("create", "update", "delete")
+
+@dataclass
+class BatchOperation:
+    """A single operation inside a batch request, identified by its bId."""
+    bid: str
+    query: Optional[str] = None # QBO SQL for query operations
+    entity_name: Optional[str] = None # e.g. 'Invoice' for write operations
+    operation: Optional[str] = None # 'create', 'update' or 'delete'
+    payload: Optional[Dict[str, Any]] = None # Entity body for write operations
+
+    def to_request_item(self) -> Dict[str, Any]:
+        """Returns the BatchItemRequest entry for this operation."""
+        if self.query is not None:
+            return {"bId": self.bid, "Query": self.query}
+        if self.operation not in BATCH_WRITE_OPERATIONS or not self.entity_name:
+            raise ValueError(f"Batch operation '{self.bid}' needs a query or a valid entity write operation.")
+        return {"bId": self.bid, "operation": self.operation, self.entity_name: self.payload or {}}
+
+@dataclass
+class BatchResult:
+    """The outcome of one batch operation. Exactly one of data/error is meaningful."""
+    bid: str
+    data: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[QBOError] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def entities(self, entity_name: str) -> List[Dict[str, Any]]:
+        """Returns the raw entity dicts of a query result. Raises the mapped error if the operation failed."""
+        if self.error is not None:
+            raise self.error
+        query_response = self.data.get("QueryResponse")
+        if query_response is not None:
+            return query_response.get(entity_name, [])
+        # Write operations return the single entity under its own name
+        entity = self.data.get(entity_name)
+        return [entity] if entity else []
+
+def query_operation(bid: str, query: str) -> BatchOperation:
+    """Convenience constructor for a query operation."""
+    return BatchOperation(bid=bid, query=query)
+
+def chunk_operations(operations: List[BatchOperation], size: int = MAX_BATCH_OPERATIONS) -> List[List[BatchOperation]]:
+    """Splits operations into chunks that fit in a single batch request."""
+    if size < 1 or size > MAX_BATCH_OPERATIONS:
+        raise ValueError(f"Batch chunk size must be between 1 and {MAX_BATCH_OPERATIONS}.")
+    return [operations[i:i + size] for i in range(0, len(operations), size)]
+
+def build_batch_payload(operations: List[BatchOperation]) -> Dict[str, Any]:
+    """Builds the request body for one batch request."""
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise ValueError(f"A QBO batch request holds at most {MAX_BATCH_OPERATIONS} operations, got {len(operations)}.")
+    bids = [op.bid for op in operations]
+    if len(set(bids)) != len(bids):
+        raise ValueError(f"Batch operation bIds must be unique: {bids}")
+    return {"BatchItemRequest": [op.to_request_item() for op in operations]}
+
+def _fault_to_error(fault: Dict[str, Any], context: str) -> QBOError:
+    """Maps a per-operation Fault to the QBOError hierarchy, reusing the SDK's own code ranges."""
+    try:
+        # handle_exceptions always raises for a Fault with at least one Error entry
+        QuickBooks.handle_exceptions(fault)
+    except QuickbooksException as sdk_error:
+        return map_qbo_exception(sdk_error, context=context)
+    except Exception as parse_error: # Malformed fault (missing Error/Message keys)
+        return QBOError(f"Malformed QBO fault during {context}: {fault}", original_exception=parse_error)
+    return QBOError(f"QBO returned an empty fault during {context}: {fault}")
+
+def parse_batch_response(response: Dict[str, Any], operations: List[BatchOperation]) -> Dict[str, BatchResult]:
+    """
+    Parses a BatchItemResponse into one BatchResult per requested operation.
+    Operations missing from the response are reported as errors rather than dropped.
+    """
+    results: Dict[str, BatchResult] = {}
+    for item in (response or {}).get("BatchItemResponse", []):
+        bid = item.get("bId")
+        if bid is None:
+            logger.warning(f"Ignoring batch response item without bId: {item}")
+            continue
+        if "Fault" in item:
+            error = _fault_to_error(item["Fault"], context=f"batch operation {bid}")
+            logger.debug(f"Batch operation {bid} failed: {error}")
+            results[bid] = BatchResult(bid=bid, error=error)
+        else:
+            results[bid] = BatchResult(bid=bid, data=item)
+
+    for op in operations:
+        if op.bid not in results:
+            results[op.bid] = BatchResult(bid=op.bid, error=QBOError(f"QBO batch response contained no result for operation {op.bid}."))
+    return results
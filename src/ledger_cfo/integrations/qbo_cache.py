@@ -0,0 +1,559 @@
+"""
+Tag-based invalidation for the QBO read caches.
+
+Each cached entry records the tags it depends on: the customer it belongs to
+(customer_tag), the entities it shows (entity_tag) and, for lists that any new
+entity of a type could join, the type itself (entity_type_tag). Write paths evict
+exactly the entries carrying the tags they touch, instead of clearing whole caches.
+
+TieredCache puts an optional shared tier (L2, see qbo_cache_backends) behind the in-process
+tagged TTL cache (L1), so gunicorn workers and Cloud Run instances warm one cache between
+them. Keys are structured CacheKeys; values are stored in L2 as compact (and, when large,
+compressed) JSON. Caches given a byte budget (max_bytes) keep their L1 values in that same
+serialized form, as CompactValues decoded on each read, and evict by total bytes rather than
+entry count.
+
+single_flight coalesces concurrent cache misses: callers asking for the same key while a
+call for it is in flight await that call's result instead of issuing their own.
+
+StaleWhileRevalidateCache serves slow-changing reference data (chart of accounts, items,
+terms, payment methods) past its TTL while a background refresh runs, up to a hard
+maximum staleness.
+"""
+import asyncio
+import concurrent.futures
+import functools
+import inspect
+import itertools
+import json
+import logging
+import math
+import os
+import threading
+import time
+import weakref
+import zlib
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Set, Tuple
+from urllib.parse import urlencode
+
+from cachetools import TTLCache
+
+try:
+    import orjson # Several times faster than json, and encodes straight to bytes
+except ImportError:
+    orjson = None
+from quickbooks.client import QuickBooks
+
+from ..core import metrics
+from .qbo_cache_backends import CacheBackend, QBO_CACHE_L2_URL, backend_from_url
+
+logger = logging.getLogger(__name__)
+
+# With a shared tier, L1 copies live at most this long so writes made by other processes
+# (which evict L2 but not this process's L1) become visible quickly
+QBO_CACHE_L1_TTL_SECONDS = float(os.getenv("QBO_CACHE_L1_TTL_SECONDS", "30"))
+COMPRESS_MIN_BYTES = 1024 # Serialized values at least this large are zlib-compressed
+COMPACT_ENTRY_OVERHEAD_BYTES = 256 # Key, tags and cache bookkeeping charged to each CompactValue, roughly
+
+# --- Keys ---
+
+@dataclass(frozen=True)
+class CacheKey:
+    """Identifies one cached read: the operation, the realm it ran against and its parameters."""
+    operation: str
+    realm: str
+    params: Tuple[Tuple[str, Any], ...] = ()
+
+    def __str__(self) -> str:
+        # Stable, readable form used as the L2 key, e.g. "9130/get_invoice_details?invoice_id=101"
+        return f"{self.realm}/{self.operation}" + (f"?{urlencode(self.params)}" if self.params else "")
+
+def cache_key(operation: str, realm: Any, **params) -> CacheKey:
+    """Builds a CacheKey; parameters left as None are omitted so defaults and explicit None match."""
+    return CacheKey(operation, str(realm), tuple(sorted((name, value) for name, value in params.items() if value is not None)))
+
+# --- Serialization ---
+
+def _dumps(value: Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+        except TypeError:
+            pass # e.g. integers beyond 64 bits; json handles them
+    # (datetimes and dataclasses are passed through to default=str, so both encoders produce the same JSON)
+    return json.dumps(value, separators=(",", ":"), default=str).encode("utf-8")
+
+def _loads(data: bytes) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+def serialize(value: Any) -> bytes:
+    """Encodes a JSON-compatible value as compact JSON, compressed when large. First byte marks the format."""
+    data = _dumps(value)
+    if len(data) >= COMPRESS_MIN_BYTES:
+        return b"z" + zlib.compress(data)
+    return b"j" + data
+
+def deserialize(data: bytes) -> Any:
+    data = bytes(data)
+    if data[:1] == b"z":
+        return _loads(zlib.decompress(data[1:]))
+    if data[:1] == b"j":
+        return _loads(data[1:])
+    raise ValueError(f"Unknown cache value format {data[:1]!r}")
+
+class CompactValue:
+    """
+    A cached value held as serialize() bytes instead of a tree of dicts and lists.
+    decode() builds a fresh copy on every read, so callers never share (or mutate) the cached one.
+    """
+    __slots__ = ("data",)
+
+    def __init__(self, value: Any):
+        self.data = serialize(value)
+
+    def decode(self) -> Any:
+        return deserialize(self.data)
+
+def compact_size(value: CompactValue) -> int:
+    """Bytes a CompactValue is charged against its cache's byte budget."""
+    return len(value.data) + COMPACT_ENTRY_OVERHEAD_BYTES
+
+def customer_tag(customer_id: Any) -> str:
+    """Tag for entries listing or summarizing one customer's transactions."""
+    return f"customer:{customer_id}"
+
+def entity_tag(entity_name: str, entity_id: Any) -> str:
+    """Tag for entries that show one specific entity (e.g. an invoice's details)."""
+    return f"{entity_name}:{entity_id}"
+
+def entity_type_tag(entity_name: str) -> str:
+    """Tag for lists that a new or changed entity of this type may appear in, whatever its customer."""
+    return f"{entity_name}:*"
+
+def lookup_tag(entity_name: str, term: str) -> str:
+    """Tag for cached results of looking an entity up by a (normalized) name, e.g. a not-found answer."""
+    return f"{entity_name}:name:{term}"
+
+class TaggedTTLCache(TTLCache):
+    """
+    A TTLCache whose entries can carry tags and be evicted by tag.
+    Behaves like a plain TTLCache for untagged reads and writes.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, **kwargs):
+        super().__init__(maxsize, ttl, **kwargs)
+        self._key_tags: Dict[Hashable, frozenset] = {}
+        self._tag_keys: Dict[str, Set[Hashable]] = {}
+        self._tag_lock = threading.RLock()
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[str] = ()):
+        """Stores value under key, tagged with tags (replacing any previous tags of key)."""
+        with self._tag_lock:
+            self[key] = value
+            self._untag(key)
+            tags = frozenset(tags)
+            if tags:
+                self._key_tags[key] = tags
+                for tag in tags:
+                    self._tag_keys.setdefault(tag, set()).add(key)
+            self._prune_index()
+
+    def tags_of(self, key: Hashable) -> frozenset:
+        return self._key_tags.get(key, frozenset())
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """Evicts every entry carrying at least one of tags. Returns how many entries were evicted."""
+        evicted = 0
+        with self._tag_lock:
+            keys = set()
+            for tag in tags:
+                keys |= self._tag_keys.get(tag, set())
+            for key in keys:
+                if self.pop(key, None) is not None:
+                    evicted += 1
+                self._untag(key)
+        return evicted
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        with self._tag_lock:
+            self._untag(key)
+
+    def clear(self):
+        with self._tag_lock:
+            super().clear()
+            self._key_tags.clear()
+            self._tag_keys.clear()
+
+    def _untag(self, key: Hashable):
+        for tag in self._key_tags.pop(key, ()):
+            keys = self._tag_keys.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_keys[tag]
+
+    def _prune_index(self):
+        # TTL expiry removes entries without going through __delitem__, so drop their tags lazily
+        # (maxsize may count bytes rather than entries, so the bound follows the live entry count)
+        if len(self._key_tags) > 2 * len(self) + 64:
+            for key in [k for k in self._key_tags if k not in self]:
+                self._untag(key)
+
+# --- Shared tier ---
+
+_l2_backend: Optional[CacheBackend] = None
+_l2_configured = False
+_l2_lock = threading.Lock()
+_tiered_caches: "weakref.WeakSet[TieredCache]" = weakref.WeakSet()
+
+def get_l2_backend() -> Optional[CacheBackend]:
+    """The shared cache tier, built from QBO_CACHE_L2_URL on first use (None if not configured)."""
+    global _l2_backend, _l2_configured
+    if not _l2_configured:
+        with _l2_lock:
+            if not _l2_configured:
+                try:
+                    _l2_backend = backend_from_url(QBO_CACHE_L2_URL)
+                except Exception as e:
+                    logger.error(f"Could not set up the shared QBO cache tier; caching per process only: {e}", exc_info=True)
+                    _l2_backend = None
+                _l2_configured = True
+                _resize_l1_tiers()
+    return _l2_backend
+
+def set_l2_backend(backend: Optional[CacheBackend]):
+    """Swaps the shared cache tier (None for per-process caching only)."""
+    global _l2_backend, _l2_configured
+    with _l2_lock:
+        _l2_backend = backend
+        _l2_configured = True
+        _resize_l1_tiers()
+
+def _resize_l1_tiers():
+    for cache in list(_tiered_caches):
+        cache._reset_l1()
+
+class TieredCache:
+    """
+    L1 (in-process TaggedTTLCache) in front of the optional shared L2 backend.
+    Reads check L1, then L2 (filling L1); writes and tag invalidations go to both tiers.
+    L2 failures are logged and treated as misses, so a broken shared store never breaks reads.
+
+    With max_bytes set, L1 holds CompactValues and is bounded by their total size (maxsize is
+    then ignored); reads decode the stored bytes, so each caller gets its own copy.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float, max_bytes: Optional[int] = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.l1 = self._new_l1(ttl)
+        _tiered_caches.add(self)
+
+    def _new_l1(self, ttl: float) -> TaggedTTLCache:
+        if self.max_bytes:
+            return TaggedTTLCache(self.max_bytes, ttl, getsizeof=compact_size)
+        return TaggedTTLCache(self.maxsize, ttl)
+
+    def _reset_l1(self):
+        l1_ttl = min(self.ttl, QBO_CACHE_L1_TTL_SECONDS) if _l2_backend is not None else self.ttl
+        if l1_ttl != self.l1.ttl:
+            self.l1 = self._new_l1(l1_ttl)
+
+    def _set_l1(self, key: Hashable, value: Any, tags: Iterable[str]):
+        if not self.max_bytes:
+            self.l1.set(key, value, tags=tags)
+            return
+        compact = CompactValue(value)
+        if compact_size(compact) > self.max_bytes:
+            logger.debug(f"Not caching {self.name} key {key} in L1: {len(compact.data)} bytes exceeds the cache's budget")
+            self.l1.pop(key, None)
+            return
+        self.l1.set(key, compact, tags=tags)
+
+    @property
+    def currsize(self) -> int:
+        """L1 size in its own unit: bytes with max_bytes set, entries otherwise."""
+        return self.l1.currsize
+
+    def _l2_key(self, key: Hashable) -> str:
+        return f"qbo:{self.name}:{key}"
+
+    def _tag_key(self, tag: str) -> str:
+        return f"qbo:{self.name}:tag:{tag}"
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            value = self.l1[key]
+            metrics.counter("qbo_cache_hits_total", cache=self.name, tier="l1").inc()
+            return value.decode() if isinstance(value, CompactValue) else value
+        except KeyError:
+            pass
+        backend = get_l2_backend()
+        if backend is not None:
+            try:
+                data = backend.get(self._l2_key(key))
+                if data is not None:
+                    entry = deserialize(data)
+                    self._set_l1(key, entry["v"], entry["t"])
+                    metrics.counter("qbo_cache_hits_total", cache=self.name, tier="l2").inc()
+                    return entry["v"]
+            except Exception as e:
+                logger.warning(f"Shared cache read failed for {self.name} key {key}: {e}")
+        metrics.counter("qbo_cache_misses_total", cache=self.name).inc()
+        return default
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[str] = ()):
+        tags = sorted(set(tags))
+        self._set_l1(key, value, tags)
+        backend = get_l2_backend()
+        if backend is None:
+            return
+        ttl = math.ceil(self.ttl)
+        try:
+            l2_key = self._l2_key(key)
+            backend.set(l2_key, serialize({"v": value, "t": tags}), ex=ttl)
+            for tag in tags:
+                backend.sadd(self._tag_key(tag), l2_key)
+                backend.expire(self._tag_key(tag), ttl)
+        except Exception as e:
+            logger.warning(f"Shared cache write failed for {self.name} key {key}: {e}")
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """Evicts entries carrying any of tags from both tiers. Returns how many L1 entries were evicted."""
+        tags = list(tags)
+        evicted = self.l1.invalidate_tags(tags)
+        backend = get_l2_backend()
+        if backend is not None:
+            try:
+                for tag in tags:
+                    members = [m.decode() if isinstance(m, bytes) else m for m in backend.smembers(self._tag_key(tag))]
+                    backend.delete(*members, self._tag_key(tag))
+            except Exception as e:
+                logger.warning(f"Shared cache invalidation failed for {self.name} tags {tags}: {e}")
+        return evicted
+
+    def clear(self):
+        """Empties L1 and this cache's keys in L2."""
+        self.l1.clear()
+        backend = get_l2_backend()
+        if backend is not None:
+            try:
+                keys = list(backend.scan_iter(match=f"qbo:{self.name}:*"))
+                if keys:
+                    backend.delete(*keys)
+            except Exception as e:
+                logger.warning(f"Shared cache clear failed for {self.name}: {e}")
+
+    # L1 views, for introspection
+    def tags_of(self, key: Hashable) -> frozenset:
+        return self.l1.tags_of(key)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.l1
+
+    def __len__(self) -> int:
+        return len(self.l1)
+
+    def __iter__(self):
+        return iter(self.l1)
+
+def invalidate(caches: Iterable["TieredCache | TaggedTTLCache"], tags: Iterable[str], reason: Optional[str] = None) -> int:
+    """Evicts the tagged entries from each cache. Returns the total number of entries evicted."""
+    tags = list(tags)
+    evicted = sum(cache.invalidate_tags(tags) for cache in caches)
+    logger.debug(f"Invalidated {evicted} cache entries for tags {tags}" + (f" ({reason})" if reason else ""))
+    return evicted
+
+# --- Single-flight ---
+
+class SingleFlight:
+    """
+    Tracks in-flight calls by key. The first caller for a key (the leader) runs the call;
+    callers arriving before it finishes await the leader's result or exception.
+    Results are shared through concurrent.futures.Future so callers in other event loops
+    (Flask runs each async view in its own loop) are coalesced too.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: Dict[Hashable, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        while True:
+            with self._lock:
+                future = self._in_flight.get(key)
+                leader = future is None
+                if leader:
+                    future = concurrent.futures.Future()
+                    future.set_running_or_notify_cancel() # Running futures cannot be cancelled by followers
+                    self._in_flight[key] = future
+
+            if leader:
+                return await self._lead(key, future, call)
+
+            metrics.counter("qbo_single_flight_saved_total", operation=self.name).inc()
+            logger.debug(f"Coalesced {self.name} call for key {key} with the in-flight call")
+            try:
+                # Shielded so a follower being cancelled does not touch the shared future
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except asyncio.CancelledError:
+                if not (future.done() and isinstance(future.exception(), asyncio.CancelledError)):
+                    raise # This caller itself was cancelled
+                logger.debug(f"Leading {self.name} call for key {key} was cancelled; retrying")
+
+    async def _lead(self, key: Hashable, future: concurrent.futures.Future, call: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            result = await call()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                if self._in_flight.get(key) is future:
+                    del self._in_flight[key]
+
+def _key_value(value: Any) -> Hashable:
+    """Turns an argument into a hashable key part; QuickBooks clients are keyed by their realm."""
+    if isinstance(value, QuickBooks):
+        return ("realm", value.company_id)
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return repr(value)
+
+def single_flight(ignore: Tuple[str, ...] = ("db",)):
+    """
+    Decorator coalescing concurrent calls of an async function that share the same arguments
+    (parameters named in ignore, like the DB session, are left out of the key).
+    The number of calls saved is counted in qbo_single_flight_saved_total{operation}.
+    """
+    def decorator(func):
+        flight = SingleFlight(func.__name__)
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = tuple((name, _key_value(value)) for name, value in bound.arguments.items() if name not in ignore)
+            return await flight.do(key, lambda: func(*args, **kwargs))
+
+        wrapper.single_flight = flight
+        return wrapper
+    return decorator
+
+# --- Stale-while-revalidate ---
+
+class StaleWhileRevalidateCache:
+    """
+    Per-key cache of loaded values that are fresh for ttl seconds. Between ttl and max_staleness
+    the stale value is returned at once and a background refresh is started (one per key);
+    older values are never served and callers wait for a load. Loads are single-flight.
+
+    Refreshes run in a daemon thread with its own event loop: Flask runs each async view in a
+    short-lived loop, which would cancel a background task when the request ends.
+    """
+
+    def __init__(self, name: str, ttl: float, max_staleness: float, clock: Callable[[], float] = time.monotonic):
+        if max_staleness < ttl:
+            raise ValueError("max_staleness must be at least ttl")
+        self.name = name
+        self.ttl = ttl
+        self.max_staleness = max_staleness
+        self._clock = clock
+        self._entries: Dict[Hashable, Tuple[Any, float, int]] = {} # key -> (value, loaded_at, generation)
+        self._generations = itertools.count(1) # Increases with every load, also across invalidate()/clear()
+        self._flight = SingleFlight(name)
+        self._refreshes: Dict[Hashable, threading.Thread] = {}
+        self._lock = threading.Lock()
+
+    def age(self, key: Hashable) -> Optional[float]:
+        """Seconds since the value for key was loaded, or None if there is none."""
+        entry = self._entries.get(key)
+        return None if entry is None else self._clock() - entry[1]
+
+    def generation(self, key: Hashable) -> int:
+        """Generation of the stored value for key (0 if none); a newer load always has a higher one."""
+        entry = self._entries.get(key)
+        return 0 if entry is None else entry[2]
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the stored value for key whatever its age, without loading."""
+        entry = self._entries.get(key)
+        return default if entry is None else entry[0]
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]], force_refresh: bool = False) -> Any:
+        """Returns the value for key, loading it with loader() when missing, forced or too stale."""
+        value, _ = await self.get_with_generation(key, loader, force_refresh=force_refresh)
+        return value
+
+    async def get_with_generation(self, key: Hashable, loader: Callable[[], Awaitable[Any]], force_refresh: bool = False) -> Tuple[Any, int]:
+        """
+        Like get, but returns (value, generation) taken from the same stored entry, so a background
+        refresh completing in between cannot pair an old value with the new generation.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and not force_refresh:
+            value, loaded_at, generation = entry
+            age = self._clock() - loaded_at
+            if age < self.ttl:
+                return value, generation
+            if age < self.max_staleness:
+                metrics.counter("qbo_cache_stale_served_total", cache=self.name).inc()
+                metrics.histogram("qbo_cache_stale_age_seconds", cache=self.name).observe(age)
+                logger.debug(f"Serving stale {self.name} ({age:.0f}s old) while revalidating")
+                self._revalidate_in_background(key, loader)
+                return value, generation
+            metrics.counter("qbo_cache_stale_rejected_total", cache=self.name).inc()
+            logger.info(f"Cached {self.name} is {age:.0f}s old, past the {self.max_staleness:.0f}s limit; reloading")
+        return await self._flight.do(key, lambda: self._load(key, loader))
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Tuple[Any, int]:
+        value = await loader()
+        with self._lock:
+            generation = next(self._generations)
+            self._entries[key] = (value, self._clock(), generation)
+        return value, generation
+
+    def _revalidate_in_background(self, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        with self._lock:
+            running = self._refreshes.get(key)
+            if running is not None and running.is_alive():
+                return
+            thread = threading.Thread(target=self._revalidate, args=(key, loader), name=f"revalidate-{self.name}", daemon=True)
+            self._refreshes[key] = thread
+        thread.start()
+
+    def _revalidate(self, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        try:
+            asyncio.run(self._flight.do(key, lambda: self._load(key, loader)))
+            metrics.counter("qbo_cache_revalidations_total", cache=self.name, outcome="ok").inc()
+        except Exception as e:
+            # The stale value stays servable until max_staleness; the next stale read retries
+            metrics.counter("qbo_cache_revalidations_total", cache=self.name, outcome="error").inc()
+            logger.warning(f"Background refresh of {self.name} failed: {e}")
+
+    def wait_for_revalidation(self, timeout: Optional[float] = None):
+        """Blocks until running background refreshes finish (for shutdown and tests)."""
+        for thread in list(self._refreshes.values()):
+            thread.join(timeout)
@@ -0,0 +1,139 @@
+"""
+Shared (L2) stores for the QBO read caches.
+
+CacheBackend mirrors the subset of the redis-py client API the caches use (get/set/delete,
+sets for tag indexes, expire, scan_iter), so a redis.Redis client can be plugged in as is.
+SQLCacheBackend implements the same interface on a SQL table, either in a local SQLite
+file (shared by the workers of one host, and what the tests use) or in the app's
+Postgres database (shared by every instance).
+
+Configured with QBO_CACHE_L2_URL:
+  * unset / empty          - no L2 tier, caches are per process
+  * sqlite:////path/to.db  - SQLite file
+  * postgresql://...       - any SQLAlchemy URL
+  * database               - the app's own database (core.database.get_engine)
+  * redis://...            - Redis (requires the optional 'redis' package)
+"""
+import abc
+import logging
+import os
+import threading
+import time
+from typing import Callable, Iterator, Optional, Set, Union
+
+from sqlalchemy import Engine, create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from ..core import crud
+from ..core.database import Base, get_engine
+from ..models import QBOCacheEntry, QBOCacheSetMember
+
+logger = logging.getLogger(__name__)
+
+QBO_CACHE_L2_URL = os.getenv("QBO_CACHE_L2_URL", "")
+SQL_CACHE_PURGE_INTERVAL_SECONDS = 300 # How often SQLCacheBackend drops expired rows
+
+class CacheBackend(abc.ABC):
+    """Redis-compatible key/value store with per-key expiry and string sets."""
+
+    @abc.abstractmethod
+    def get(self, name: str) -> Optional[bytes]:
+        """Returns the value stored at name, or None."""
+
+    @abc.abstractmethod
+    def set(self, name: str, value: bytes, ex: Optional[int] = None) -> bool:
+        """Stores value at name, expiring after ex seconds if given."""
+
+    @abc.abstractmethod
+    def delete(self, *names: str) -> int:
+        """Deletes keys (values or sets). Returns how many existed."""
+
+    @abc.abstractmethod
+    def sadd(self, name: str, *values: str) -> int:
+        """Adds values to the set at name. Returns how many were new."""
+
+    @abc.abstractmethod
+    def smembers(self, name: str) -> Set[Union[str, bytes]]:
+        """Returns the members of the set at name (empty if missing)."""
+
+    @abc.abstractmethod
+    def expire(self, name: str, time: int) -> bool:
+        """Expires the value or set at name after time seconds."""
+
+    @abc.abstractmethod
+    def scan_iter(self, match: Optional[str] = None) -> Iterator[Union[str, bytes]]:
+        """Iterates over keys matching a glob pattern (only trailing '*' is required to work)."""
+
+class SQLCacheBackend(CacheBackend):
+    """CacheBackend on the qbo_cache_entries / qbo_cache_set_members tables."""
+
+    def __init__(self, engine: Engine, create_tables: bool = True, clock: Callable[[], float] = time.time):
+        self.engine = engine
+        self._session_factory = sessionmaker(bind=engine, autoflush=False)
+        self._clock = clock
+        self._last_purge = clock()
+        self._purge_lock = threading.Lock()
+        if create_tables:
+            Base.metadata.create_all(bind=engine, tables=[QBOCacheEntry.__table__, QBOCacheSetMember.__table__])
+
+    def _run(self, operation: Callable[[Session, float], object]):
+        """Runs operation(session, now) in its own transaction."""
+        now = self._clock()
+        with self._session_factory() as session, session.begin():
+            result = operation(session, now)
+        self._maybe_purge(now)
+        return result
+
+    def _maybe_purge(self, now: float):
+        if now - self._last_purge < SQL_CACHE_PURGE_INTERVAL_SECONDS or not self._purge_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_purge = now
+            with self._session_factory() as session, session.begin():
+                crud.purge_expired_cache_rows(session, now)
+        except Exception as e:
+            logger.warning(f"Failed to purge expired shared cache rows: {e}")
+        finally:
+            self._purge_lock.release()
+
+    def get(self, name: str) -> Optional[bytes]:
+        return self._run(lambda db, now: crud.get_cache_entry(db, name, now))
+
+    def set(self, name: str, value: bytes, ex: Optional[int] = None) -> bool:
+        self._run(lambda db, now: crud.set_cache_entry(db, name, value, now + ex if ex else None))
+        return True
+
+    def delete(self, *names: str) -> int:
+        return self._run(lambda db, now: crud.delete_cache_keys(db, list(names), now))
+
+    def sadd(self, name: str, *values: str) -> int:
+        return self._run(lambda db, now: crud.add_cache_set_members(db, name, list(values), now))
+
+    def smembers(self, name: str) -> Set[str]:
+        return self._run(lambda db, now: crud.get_cache_set_members(db, name, now))
+
+    def expire(self, name: str, time: int) -> bool:
+        return self._run(lambda db, now: crud.expire_cache_key(db, name, now + time))
+
+    def scan_iter(self, match: Optional[str] = None) -> Iterator[str]:
+        if match and "*" in match.rstrip("*"):
+            raise ValueError("SQLCacheBackend.scan_iter only supports prefix patterns ('prefix*').")
+        prefix = (match or "").rstrip("*")
+        return iter(self._run(lambda db, now: crud.find_cache_keys(db, prefix, now)))
+
+def backend_from_url(url: str) -> Optional[CacheBackend]:
+    """Builds the L2 backend for a QBO_CACHE_L2_URL value (see module docstring)."""
+    url = (url or "").strip()
+    if not url:
+        return None
+    if url == "database":
+        return SQLCacheBackend(get_engine(), create_tables=False) # create_all at startup covers the tables
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("QBO_CACHE_L2_URL points at Redis but the 'redis' package is not installed.") from e
+        CacheBackend.register(redis.Redis) # Same interface, no adapter needed
+        return redis.Redis.from_url(url)
+    connect_args = {"timeout": 5, "check_same_thread": False} if url.startswith("sqlite") else {}
+    return SQLCacheBackend(create_engine(url, connect_args=connect_args, pool_pre_ping=True))
@@ -0,0 +1,45 @@
+"""
+Concurrency helpers for QBO calls.
+
+QBO allows 10 concurrent requests per realm (company). fan_out runs independent
+calls together with asyncio.gather while holding a per-realm semaphore, and
+returns results in the order the calls were given so merged output is stable.
+"""
+import asyncio
+import logging
+import os
+import weakref
+from typing import Any, Awaitable, Callable, Dict, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+QBO_MAX_CONCURRENT_REQUESTS_PER_REALM = int(os.getenv("QBO_MAX_CONCURRENT_REQUESTS_PER_REALM", "10"))
+
+# asyncio primitives belong to one event loop, so semaphores are tracked per loop
+_realm_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+
+def get_realm_semaphore(realm_id: Any) -> asyncio.Semaphore:
+    """Returns the semaphore that caps concurrent QBO requests for a realm on the running loop."""
+    loop = asyncio.get_running_loop()
+    semaphores = _realm_semaphores.setdefault(loop, {})
+    key = str(realm_id)
+    if key not in semaphores:
+        semaphores[key] = asyncio.Semaphore(QBO_MAX_CONCURRENT_REQUESTS_PER_REALM)
+    return semaphores[key]
+
+async def fan_out(realm_id: Any, call_factories: Sequence[Callable[[], Awaitable[Any]]], return_exceptions: bool = False) -> List[Any]:
+    """
+    Runs independent QBO calls concurrently, at most QBO_MAX_CONCURRENT_REQUESTS_PER_REALM at a time.
+    Each factory is called only once a slot is free, so no request starts outside the limit.
+    Results (or exceptions, if return_exceptions) are returned in the order of call_factories.
+    """
+    if not call_factories:
+        return []
+    semaphore = get_realm_semaphore(realm_id)
+
+    async def _run(factory: Callable[[], Awaitable[Any]]) -> Any:
+        async with semaphore:
+            return await factory()
+
+    logger.debug(f"Fanning out {len(call_factories)} QBO call(s) for realm {realm_id}")
+    return await asyncio.gather(*(_run(factory) for factory in call_factories), return_exceptions=return_exceptions)
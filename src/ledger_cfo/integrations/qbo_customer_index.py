@@ -0,0 +1,287 @@
+"""
+In-memory fuzzy search over customers.
+
+find_customers_by_details used to send LIKE '%...%' queries to QBO: one round trip per
+field, DisplayName and Email only, no typo tolerance and no phone search. This index holds
+every mirrored customer in memory and answers the same question locally:
+
+  * Text fields (display name, company, given + family name, email) are normalized
+    (accents stripped, case folded, punctuation split into tokens) and broken into padded
+    character trigrams. Each trigram has a postings set of customer IDs.
+  * Phone numbers are reduced to digits (a leading US country code dropped) and indexed by
+    digit trigrams, so any 4+ digit fragment of a number finds it.
+  * A search gathers candidates from the postings of the query's trigrams, keeps the ones
+    sharing the most trigrams, and ranks them per field by token similarity: exact token,
+    token prefix, or difflib ratio (which tolerates transpositions trigrams miss).
+
+The index is filled from the customer mirror (CustomerCache) and refreshed incrementally:
+index_for only reads rows synced since the last refresh, plus the ID list when rows were
+deleted.
+"""
+import datetime
+import difflib
+import logging
+import re
+import threading
+import unicodedata
+from collections import Counter
+from itertools import chain
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ..models import CustomerCache
+
+logger = logging.getLogger(__name__)
+
+TEXT_FIELDS = ("name", "company", "person", "email")
+COMBINED_FIELD_WEIGHT = 0.95 # A query spread over several fields ranks just below a single-field match
+MAX_RESCORED_CANDIDATES = 64 # Candidates sharing the most trigrams with the query get the finer scoring
+MIN_PHONE_DIGITS = 4 # Digit-only queries shorter than this are treated as text
+MIN_TOKEN_SIMILARITY = 0.5 # difflib ratios below this are coincidental letters, not typos
+DEFAULT_MIN_SCORE = 0.6
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+_NON_DIGIT = re.compile(r"\D+")
+_LETTER = re.compile(r"[^\W\d_]")
+
+def normalize_text(value: Optional[str]) -> List[str]:
+    """Case-folded, accent-free alphanumeric tokens of a string."""
+    if not value:
+        return []
+    decomposed = unicodedata.normalize("NFKD", value)
+    folded = "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+    return _NON_ALNUM.sub(" ", folded).split()
+
+def normalize_phone(value: Optional[str]) -> str:
+    """The digits of a phone number, without a leading US country code."""
+    digits = _NON_DIGIT.sub("", value or "")
+    if len(digits) == 11 and digits.startswith("1"):
+        digits = digits[1:]
+    return digits
+
+def trigrams(tokens: List[str]) -> Set[str]:
+    """Padded character trigrams of each token (" jo", "joh", "ohn", "hn ")."""
+    grams = set()
+    for token in tokens:
+        padded = f" {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def phone_trigrams(digits: str) -> Set[str]:
+    """Digit trigrams, prefixed so they never collide with text trigrams."""
+    return {"#" + digits[i:i + 3] for i in range(len(digits) - 2)}
+
+def customer_record(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """The customer dictionary find_customers_by_details returns (the shape of sdk_customer_to_dict), from raw QBO JSON."""
+    bill_addr = raw.get("BillAddr")
+    return {
+        "Id": raw.get("Id"),
+        "DisplayName": raw.get("DisplayName"),
+        "CompanyName": raw.get("CompanyName"),
+        "GivenName": raw.get("GivenName"),
+        "FamilyName": raw.get("FamilyName"),
+        "PrimaryEmailAddr": (raw.get("PrimaryEmailAddr") or {}).get("Address"),
+        "PrimaryPhone": (raw.get("PrimaryPhone") or {}).get("FreeFormNumber"),
+        "BillAddr": {
+            "Line1": bill_addr.get("Line1"),
+            "City": bill_addr.get("City"),
+            "CountrySubDivisionCode": bill_addr.get("CountrySubDivisionCode"), # State
+            "PostalCode": bill_addr.get("PostalCode"),
+        } if bill_addr else None,
+        "Balance": raw.get("Balance", 0),
+        "SyncToken": raw.get("SyncToken"),
+    }
+
+def _record_from_row(row: CustomerCache) -> Dict[str, Any]:
+    """Customer dictionary from a mirror row; rows cached without raw JSON fall back to their columns."""
+    if row.raw_data:
+        return customer_record(row.raw_data)
+    return customer_record({
+        "Id": row.qbo_customer_id, "DisplayName": row.display_name, "CompanyName": row.company_name,
+        "GivenName": row.given_name, "FamilyName": row.family_name, "Balance": row.balance, "SyncToken": row.sync_token,
+        "PrimaryEmailAddr": {"Address": row.email_address} if row.email_address else None,
+        "PrimaryPhone": {"FreeFormNumber": row.phone_number} if row.phone_number else None,
+    })
+
+def _token_similarity(query_token: str, token: str, matcher: difflib.SequenceMatcher) -> float:
+    """
+    1 for an exact token, 0.9 for a prefix (partial typing), otherwise the difflib ratio
+    (0 if unrelated). matcher has query_token as its second sequence.
+    """
+    if token == query_token:
+        return 1.0
+    if len(query_token) >= 2 and token.startswith(query_token):
+        return 0.9
+    if abs(len(token) - len(query_token)) > max(2, len(query_token) // 2):
+        return 0.0
+    matcher.set_seq1(token)
+    # quick_ratio is an upper bound of ratio and much cheaper
+    if matcher.quick_ratio() < MIN_TOKEN_SIMILARITY:
+        return 0.0
+    ratio = matcher.ratio()
+    return ratio if ratio >= MIN_TOKEN_SIMILARITY else 0.0
+
+def _field_score(query_tokens: List[str], field_tokens: List[str], similarity: Dict[Tuple[str, str], float]) -> float:
+    """Length-weighted best token similarity, with a small penalty for field tokens the query did not ask for."""
+    if not field_tokens:
+        return 0.0
+    score = sum(len(q) * max(similarity[q, t] for t in field_tokens) for q in query_tokens) / sum(len(q) for q in query_tokens)
+    return score - 0.02 * max(0, len(field_tokens) - len(query_tokens))
+
+@dataclass
+class _Entry:
+    record: Dict[str, Any]
+    fields: Dict[str, List[str]] # Normalized tokens per text field, plus "all"
+    grams: Set[str] # Every trigram posted for this customer (text and phone)
+    phone: str
+    email: str
+
+class CustomerSearchIndex:
+    """Trigram postings over customer text fields and phone digits. Thread-safe."""
+
+    def __init__(self):
+        self._entries: Dict[str, _Entry] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._lock = threading.RLock()
+        self.synced_through: Optional[datetime.datetime] = None # Highest last_synced_at seen by refresh_from_db
+        self.source: Optional[str] = None # Database URL the index was filled from
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, customer_id: str) -> bool:
+        return str(customer_id) in self._entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._postings.clear()
+            self.synced_through = None
+            self.source = None
+
+    def upsert(self, record: Dict[str, Any]):
+        """Adds or replaces one customer (a customer_record dictionary)."""
+        customer_id = str(record["Id"])
+        fields = {
+            "name": normalize_text(record.get("DisplayName")),
+            "company": normalize_text(record.get("CompanyName")),
+            "person": normalize_text(" ".join(filter(None, (record.get("GivenName"), record.get("FamilyName"))))),
+            "email": normalize_text(record.get("PrimaryEmailAddr")),
+        }
+        fields["all"] = [token for name in TEXT_FIELDS for token in fields[name]]
+        phone = normalize_phone(record.get("PrimaryPhone"))
+        grams = trigrams(fields["all"]) | phone_trigrams(phone)
+        with self._lock:
+            self.remove(customer_id)
+            self._entries[customer_id] = _Entry(record, fields, grams, phone, (record.get("PrimaryEmailAddr") or "").casefold())
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(customer_id)
+
+    def remove(self, customer_id: str):
+        with self._lock:
+            entry = self._entries.pop(str(customer_id), None)
+            if entry is None:
+                return
+            for gram in entry.grams:
+                ids = self._postings.get(gram)
+                if ids is not None:
+                    ids.discard(str(customer_id))
+                    if not ids:
+                        del self._postings[gram]
+
+    def search(self, query: str, limit: int = 10, min_score: float = DEFAULT_MIN_SCORE) -> List[Dict[str, Any]]:
+        """Customers matching query, best first. Digit-only queries search phone numbers."""
+        query = (query or "").strip()
+        with self._lock:
+            if not _LETTER.search(query) and len(normalize_phone(query)) >= MIN_PHONE_DIGITS:
+                scored = self._search_phone(normalize_phone(query))
+            else:
+                scored = self._search_text(query)
+            scored = [(score, customer_id) for score, customer_id in scored if score >= min_score]
+            scored.sort(key=lambda pair: (-pair[0], (self._entries[pair[1]].record.get("DisplayName") or "").casefold()))
+            return [dict(self._entries[customer_id].record) for _, customer_id in scored[:limit]]
+
+    def _search_phone(self, digits: str) -> List[Tuple[float, str]]:
+        candidates: Optional[Set[str]] = None
+        for gram in phone_trigrams(digits):
+            ids = self._postings.get(gram, set())
+            candidates = set(ids) if candidates is None else candidates & ids
+            if not candidates:
+                return []
+        scored = []
+        for customer_id in candidates:
+            phone = self._entries[customer_id].phone
+            if digits in phone:
+                # A full number is a certain match; fragments rank by how much of the number they cover
+                scored.append((1.0 if digits == phone else 0.6 + 0.4 * len(digits) / len(phone), customer_id))
+        return scored
+
+    def _search_text(self, query: str) -> List[Tuple[float, str]]:
+        tokens = normalize_text(query)
+        if not tokens:
+            return []
+        hits = Counter(chain.from_iterable(self._postings.get(gram, ()) for gram in trigrams(tokens)))
+        if not hits:
+            return []
+        # Candidates sharing under half the best candidate's trigrams cannot outrank it; skip them
+        cutoff = max(1, hits.most_common(1)[0][1] // 2)
+        matchers = {}
+        for token in tokens:
+            matchers[token] = difflib.SequenceMatcher(None, autojunk=False)
+            matchers[token].set_seq2(token)
+        similarity: Dict[Tuple[str, str], float] = {} # (query token, field token) -> similarity, shared by every candidate
+        email = query.casefold()
+        scored = []
+        for customer_id, count in hits.most_common(MAX_RESCORED_CANDIDATES):
+            if count < cutoff:
+                break
+            entry = self._entries[customer_id]
+            if "@" in email and entry.email == email:
+                scored.append((1.0, customer_id))
+                continue
+            for token in entry.fields["all"]:
+                for query_token in tokens:
+                    if (query_token, token) not in similarity:
+                        similarity[query_token, token] = _token_similarity(query_token, token, matchers[query_token])
+            score = max(_field_score(tokens, entry.fields[name], similarity) for name in TEXT_FIELDS)
+            score = max(score, COMBINED_FIELD_WEIGHT * _field_score(tokens, entry.fields["all"], similarity))
+            scored.append((score, customer_id))
+        return scored
+
+    def refresh_from_db(self, db: Session) -> int:
+        """
+        Brings the index up to date with the customer mirror: upserts rows synced since the
+        last refresh and drops customers no longer in the table. Returns the rows read.
+        """
+        source = str(db.get_bind().url)
+        with self._lock:
+            if self.source != source:
+                self.clear()
+                self.source = source
+            statement = select(CustomerCache)
+            if self.synced_through is not None:
+                # >= rather than >: rows written in the same clock tick as the last refresh are re-read, not missed
+                statement = statement.where(CustomerCache.last_synced_at >= self.synced_through)
+            rows = list(db.execute(statement).scalars())
+            for row in rows:
+                self.upsert(_record_from_row(row))
+                if row.last_synced_at and (self.synced_through is None or row.last_synced_at > self.synced_through):
+                    self.synced_through = row.last_synced_at
+
+            if db.execute(select(func.count()).select_from(CustomerCache)).scalar_one() != len(self._entries):
+                mirrored = set(db.execute(select(CustomerCache.qbo_customer_id)).scalars())
+                for customer_id in [c for c in self._entries if c not in mirrored]:
+                    self.remove(customer_id)
+            if rows:
+                logger.debug(f"Customer search index refreshed with {len(rows)} row(s); {len(self._entries)} customers indexed.")
+            return len(rows)
+
+customer_index = CustomerSearchIndex()
+
+def index_for(db: Session) -> CustomerSearchIndex:
+    """The process-wide customer index, incrementally refreshed from db."""
+    customer_index.refresh_from_db(db)
+    return customer_index
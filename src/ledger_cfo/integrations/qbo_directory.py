@@ -0,0 +1,93 @@
+"""
+In-process name -> ID directory of customers and vendors.
+
+find_or_create_customer and find_or_create_vendor resolve a display name on almost every
+tool call. Each NameIndex holds every mirrored customer (or vendor) keyed by its
+case-folded, whitespace-collapsed display name, loaded with one query from the mirror
+table, so a repeat lookup is a dict hit: no ilike query, no QBO round trip.
+
+The tables are filled in bulk by the mirror sync (qbo_sync.warm_directory pages every
+customer and vendor at startup); the indexes are reloaded after each sync and updated in
+place when find_or_create_* finds or creates an entity.
+"""
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..models import CustomerCache, VendorCache
+
+logger = logging.getLogger(__name__)
+
+def normalize_name(name: Optional[str]) -> str:
+    """Display names compare case-insensitively and ignore runs of whitespace, like QBO's own uniqueness check."""
+    return " ".join((name or "").split()).casefold()
+
+@dataclass(frozen=True)
+class DirectoryEntry:
+    qbo_id: str
+    display_name: str
+    email_address: Optional[str] = None
+
+class NameIndex:
+    """Case-folded display name -> DirectoryEntry for one mirrored entity. Thread-safe."""
+
+    def __init__(self, entity_name: str, model, key_column: str):
+        self.entity_name = entity_name
+        self.model = model
+        self.key_column = key_column
+        self._by_name: Dict[str, DirectoryEntry] = {}
+        self._lock = threading.Lock()
+        self._source: Optional[str] = None # Database URL the index was loaded from; None until loaded
+
+    def __len__(self) -> int:
+        return len(self._by_name)
+
+    @property
+    def loaded(self) -> bool:
+        return self._source is not None
+
+    def load_from_db(self, db: Session) -> int:
+        """Replaces the index with every row of the mirror table. Returns the number of names indexed."""
+        statement = select(getattr(self.model, self.key_column), self.model.display_name, self.model.email_address)
+        by_name = {normalize_name(display_name): DirectoryEntry(qbo_id, display_name, email_address)
+                   for qbo_id, display_name, email_address in db.execute(statement)}
+        with self._lock:
+            self._by_name = by_name
+            self._source = str(db.get_bind().url)
+        logger.info(f"Loaded {len(by_name)} {self.entity_name} names into the in-process directory.")
+        return len(by_name)
+
+    def get(self, db: Session, name: str) -> Optional[DirectoryEntry]:
+        """The entry for name, loading the index from db first if it is not loaded (or was loaded from another database)."""
+        if self._source != str(db.get_bind().url):
+            self.load_from_db(db)
+        return self._by_name.get(normalize_name(name))
+
+    def put(self, qbo_id: str, display_name: str, email_address: Optional[str] = None):
+        """Records an entity found or created outside a sync; a renamed entity's old name is dropped."""
+        entry = DirectoryEntry(str(qbo_id), display_name, email_address)
+        with self._lock:
+            for key in [k for k, existing in self._by_name.items() if existing.qbo_id == entry.qbo_id and k != normalize_name(display_name)]:
+                del self._by_name[key]
+            self._by_name[normalize_name(display_name)] = entry
+
+    def invalidate(self):
+        """Forces a reload from the mirror table on the next lookup."""
+        with self._lock:
+            self._source = None
+
+customer_names = NameIndex('Customer', CustomerCache, 'qbo_customer_id')
+vendor_names = NameIndex('Vendor', VendorCache, 'qbo_vendor_id')
+
+DIRECTORY_INDEXES: Dict[str, NameIndex] = {'Customer': customer_names, 'Vendor': vendor_names}
+
+def invalidate(entity_names: Iterable[str]):
+    """Marks the indexes of the given entities for reload (e.g. after their mirror tables were synced)."""
+    for name in entity_names:
+        index = DIRECTORY_INDEXES.get(name)
+        if index is not None:
+            index.invalidate()
@@ -0,0 +1,59 @@
+import logging
+
+from quickbooks.exceptions import QuickbooksException, AuthorizationException, ValidationException
+
+logger = logging.getLogger(__name__)
+
+# --- Custom Exception Hierarchy ---
+# Kept in its own module so the helper modules (batching, caching, etc.) can raise
+# the same errors as qbo_api without importing it. qbo_api re-exports all of these.
+class QBOError(Exception):
+    """Base exception for Ledger CFO QBO integration errors."""
+    def __init__(self, message, original_exception=None):
+        super().__init__(message)
+        self.original_exception = original_exception
+
+class AuthenticationError(QBOError): pass
+class NotFoundError(QBOError): pass
+class InvalidDataError(QBOError): pass
+class RateLimitError(QBOError): pass
+
+
+def map_qbo_exception(e, context="QBO API call") -> QBOError:
+    """
+    Maps specific python-quickbooks exceptions to custom exceptions.
+    Returns the mapped exception instead of raising it so callers that collect
+    per-operation errors (e.g. batch requests) can use the same mapping.
+    """
+    # Check for specific QBO exceptions first
+    if isinstance(e, AuthorizationException):
+        return AuthenticationError(f"QBO authentication/authorization failed: {e}", original_exception=e)
+    elif isinstance(e, ValidationException):
+        return InvalidDataError(f"QBO data validation failed: {e}", original_exception=e)
+    elif isinstance(e, QuickbooksException):
+        # Check for specific error codes within the base QuickbooksException
+        error_code = getattr(e, 'error_code', None)
+        # Safely get detail, handling if it's a string or missing
+        detail_attr = getattr(e, 'detail', None)
+        if isinstance(detail_attr, dict):
+            http_status_code = detail_attr.get('status', None)
+        else:
+            # If detail is not a dict (e.g., string, None), status code is unknown from detail
+            http_status_code = None
+
+        # Log the raw detail if it wasn't a dict, for debugging
+        if not isinstance(detail_attr, dict) and detail_attr is not None:
+            logger.warning(f"QBO Exception detail was not a dictionary: {detail_attr}")
+
+        if error_code and 600 <= int(error_code) < 700:
+            # Treat QBO 6xx error codes as NotFound
+            return NotFoundError(f"QBO object not found or inactive (Error code: {error_code}): {e}", original_exception=e)
+        elif http_status_code == 429 or (error_code and str(error_code) == '8012'): # Check HTTP 429 or QBO specific code
+            # Treat as RateLimitError
+            return RateLimitError(f"QBO rate limit exceeded (HTTP Status: {http_status_code}, Error code: {error_code}): {e}", original_exception=e)
+        else:
+            # Catch-all for other QBO-specific errors
+            return QBOError(f"A QBO specific error occurred (Error code: {error_code}): {e}", original_exception=e)
+    else:
+        # For non-QBO exceptions (network errors, etc.)
+        return QBOError(f"An unexpected error occurred: {e}", original_exception=e)
@@ -0,0 +1,158 @@
+"""
+Asyncio-native QBO transport.
+
+The python-quickbooks SDK is blocking (requests), so every SDK call made through
+qbo_api._sync_qbo_call occupies a worker thread for its whole round trip. QBOAsyncTransport
+talks to the same v3 REST endpoints with an httpx AsyncClient instead:
+
+  * one pooled keep-alive client per realm (and event loop, since httpx connections belong
+    to the loop that opened them), capped at the realm's concurrency limit,
+  * gzip-compressed responses,
+  * configurable connect/read/pool timeouts,
+  * query, read, create, update, send and void, each returning the raw JSON response.
+
+Faults are raised as the same python-quickbooks exceptions the SDK raises (via
+QuickBooks.handle_exceptions), so callers, map_qbo_exception and the rate limiter treat
+both transports alike. qbo_api moves functions onto this transport one at a time: a
+function uses it only when its name is listed in QBO_ASYNC_HTTP (see is_enabled).
+"""
+import asyncio
+import logging
+import os
+import time
+import weakref
+from typing import Any, Dict, Optional
+
+import httpx
+from quickbooks.client import QuickBooks
+from quickbooks.exceptions import AuthorizationException, QuickbooksException
+
+from ..core import metrics
+from .qbo_concurrency import QBO_MAX_CONCURRENT_REQUESTS_PER_REALM
+
+logger = logging.getLogger(__name__)
+
+QBO_HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("QBO_HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+QBO_HTTP_READ_TIMEOUT_SECONDS = float(os.getenv("QBO_HTTP_READ_TIMEOUT_SECONDS", "60")) # Also used for writes
+QBO_HTTP_POOL_TIMEOUT_SECONDS = float(os.getenv("QBO_HTTP_POOL_TIMEOUT_SECONDS", "10")) # Waiting for a free pooled connection
+QBO_HTTP_KEEPALIVE_SECONDS = float(os.getenv("QBO_HTTP_KEEPALIVE_SECONDS", "60")) # Idle connections are closed after this
+
+# Comma-separated qbo_api function names that use this transport, or "all"
+QBO_ASYNC_HTTP_OPERATIONS = {name.strip() for name in os.getenv("QBO_ASYNC_HTTP", "").split(",") if name.strip()}
+
+def is_enabled(operation: str) -> bool:
+    """Whether the qbo_api function named operation should use the async transport."""
+    return "all" in QBO_ASYNC_HTTP_OPERATIONS or operation in QBO_ASYNC_HTTP_OPERATIONS
+
+def default_timeout() -> httpx.Timeout:
+    return httpx.Timeout(QBO_HTTP_READ_TIMEOUT_SECONDS, connect=QBO_HTTP_CONNECT_TIMEOUT_SECONDS, pool=QBO_HTTP_POOL_TIMEOUT_SECONDS)
+
+class QBOAsyncTransport:
+    """Raw-JSON QBO v3 client on pooled httpx AsyncClients, one per realm and event loop."""
+
+    def __init__(self, timeout: Optional[httpx.Timeout] = None,
+                 max_connections: int = QBO_MAX_CONCURRENT_REQUESTS_PER_REALM,
+                 keepalive_expiry: float = QBO_HTTP_KEEPALIVE_SECONDS):
+        self.timeout = timeout or default_timeout()
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                   keepalive_expiry=keepalive_expiry)
+        # httpx connections belong to one event loop, so clients are tracked per loop (like the rate limiter's semaphores)
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = weakref.WeakKeyDictionary()
+
+    def _client(self, realm_id: str) -> httpx.AsyncClient:
+        clients = self._clients.setdefault(asyncio.get_running_loop(), {})
+        client = clients.get(realm_id)
+        if client is None or client.is_closed:
+            logger.debug(f"Opening pooled QBO HTTP client for realm {realm_id}")
+            client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits,
+                                       headers={"Accept": "application/json", "Accept-Encoding": "gzip",
+                                                "User-Agent": "ledger-cfo async QBO transport"})
+            clients[realm_id] = client
+        return client
+
+    async def aclose(self):
+        """Closes the pooled clients opened on the running event loop."""
+        clients = self._clients.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            await client.aclose()
+
+    @staticmethod
+    def _url(qbo_client: QuickBooks, *segments: str) -> str:
+        return "/".join([qbo_client.api_url, "company", str(qbo_client.company_id)] + [str(s) for s in segments])
+
+    async def request(self, qbo_client: QuickBooks, method: str, url: str, operation: str,
+                      json_body: Optional[Dict[str, Any]] = None, content: Optional[str] = None,
+                      content_type: str = "application/json", params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Sends one request with the client's current access token and returns the parsed JSON body."""
+        session = getattr(qbo_client, "session", None)
+        if session is None or not getattr(session, "access_token", None):
+            raise QuickbooksException("No session manager")
+        realm_id = str(qbo_client.company_id)
+        params = {**(params or {}), "minorversion": qbo_client.minorversion}
+        headers = {"Authorization": f"Bearer {session.access_token}", "Content-Type": content_type}
+
+        started = time.monotonic()
+        try:
+            response = await self._client(realm_id).request(method, url, params=params, headers=headers,
+                                                            json=json_body, content=content)
+        finally:
+            metrics.histogram("qbo_http_request_seconds", operation=operation).observe(time.monotonic() - started)
+        metrics.counter("qbo_http_requests_total", operation=operation, status=str(response.status_code)).inc()
+        return self._parse(response)
+
+    @staticmethod
+    def _parse(response: httpx.Response) -> Dict[str, Any]:
+        """Mirrors QuickBooks.make_request's error handling, so faults raise the SDK's exception types."""
+        if response.status_code == 401:
+            raise AuthorizationException("Application authentication failed", error_code=401, detail=response.text)
+        if response.status_code == 429:
+            # Throttled responses may have no Fault; the status lets map_qbo_exception classify it as a RateLimitError
+            raise QuickbooksException(f"QBO throttled the request: {response.text}", error_code=429, detail={"status": 429})
+        try:
+            result = response.json()
+        except ValueError:
+            raise QuickbooksException(f"Error reading json response: {response.text}", 10000)
+        if "Fault" in result:
+            QuickBooks.handle_exceptions(result["Fault"])
+        if response.status_code != 200:
+            raise QuickbooksException(f"Error returned with status code '{response.status_code}': {response.text}", 10000)
+        return result
+
+    # --- Operations ---
+
+    async def query(self, qbo_client: QuickBooks, select: str) -> Dict[str, Any]:
+        """Runs a QBO SQL query; returns {"QueryResponse": {...}, "time": ...}."""
+        return await self.request(qbo_client, "POST", self._url(qbo_client, "query"), "query",
+                                  content=select, content_type="application/text")
+
+    async def read(self, qbo_client: QuickBooks, entity_name: str, entity_id: str) -> Dict[str, Any]:
+        """Reads one entity; returns {entity_name: {...}, "time": ...}."""
+        return await self.request(qbo_client, "GET", self._url(qbo_client, entity_name.lower(), entity_id), f"read {entity_name}")
+
+    async def create(self, qbo_client: QuickBooks, entity_name: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Creates an entity from its JSON body (without Id)."""
+        return await self.request(qbo_client, "POST", self._url(qbo_client, entity_name.lower()), f"create {entity_name}", json_body=body)
+
+    async def update(self, qbo_client: QuickBooks, entity_name: str, body: Dict[str, Any], sparse: bool = False) -> Dict[str, Any]:
+        """Updates an entity; body must carry Id and SyncToken. sparse=True changes only the fields sent."""
+        if sparse:
+            body = {**body, "sparse": True}
+        return await self.request(qbo_client, "POST", self._url(qbo_client, entity_name.lower()), f"update {entity_name}", json_body=body)
+
+    async def send(self, qbo_client: QuickBooks, entity_name: str, entity_id: str, send_to: Optional[str] = None) -> Dict[str, Any]:
+        """Emails a transaction (to send_to, or the address on the transaction)."""
+        params = {"sendTo": send_to} if send_to else None
+        return await self.request(qbo_client, "POST", self._url(qbo_client, entity_name.lower(), entity_id, "send"), f"send {entity_name}",
+                                  content="", content_type="application/octet-stream", params=params)
+
+    async def void(self, qbo_client: QuickBooks, entity_name: str, entity_id: str, sync_token: str) -> Dict[str, Any]:
+        """Voids a transaction at the given SyncToken."""
+        return await self.request(qbo_client, "POST", self._url(qbo_client, entity_name.lower()), f"void {entity_name}",
+                                  json_body={"Id": str(entity_id), "SyncToken": str(sync_token), "sparse": True},
+                                  params={"operation": "void"})
+
+    async def report(self, qbo_client: QuickBooks, report_name: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Runs a report (e.g. 'ProfitAndLoss'); returns {"Header": ..., "Columns": ..., "Rows": ...}."""
+        return await self.request(qbo_client, "GET", self._url(qbo_client, "reports", report_name), f"report {report_name}", params=params)
+
+transport = QBOAsyncTransport()
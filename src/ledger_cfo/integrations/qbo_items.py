@@ -0,0 +1,169 @@
+"""
+Item catalog: products and services indexed for local lookups.
+
+Invoice lines need an ItemRef, but what arrives is a description ("Gutter cleaning, 2 story
+house"). ItemCatalog indexes every active item once:
+
+  * by normalized name and fully qualified name ("Services:Gutter Cleaning"),
+  * by SKU,
+  * by income account,
+  * by trigrams of the name, SKU and path tokens (see qbo_customer_index.trigrams),
+
+so find_item's name/SKU lookups are dict hits, and resolve_line matches a free-text line
+description to the item whose name it mentions, typos included, without a QBO query.
+
+The catalog is built from the item mirror (kept complete by the bulk/CDC sync in qbo_sync)
+when it is fresh, otherwise from the cached item list; qbo_api.get_item_catalog keeps one
+catalog per version of its source.
+"""
+import difflib
+import logging
+import os
+import threading
+from collections import Counter
+from itertools import chain
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..core import crud
+from ..models import ItemMirror
+from .qbo_customer_index import normalize_text, trigrams
+
+logger = logging.getLogger(__name__)
+
+# The item used for invoice lines that match no item (QBO companies start with "Services")
+QBO_DEFAULT_ITEM_NAME = os.getenv("QBO_DEFAULT_ITEM_NAME", "Services")
+MIN_LINE_MATCH_SCORE = 0.75
+MIN_TOKEN_SIMILARITY = 0.8 # A description word counts as an item-name word above this difflib ratio
+MAX_RESCORED_CANDIDATES = 32
+
+def normalize_item_name(name: Optional[str]) -> str:
+    """Item names and SKUs compare on their normalized tokens; ':' path separators are kept."""
+    return ":".join(" ".join(normalize_text(segment)) for segment in (name or "").split(":"))
+
+def item_from_row(row: ItemMirror) -> Dict[str, Any]:
+    """QBO JSON for a mirrored item, from its columns when the row has no raw JSON."""
+    if row.raw_data:
+        return row.raw_data
+    return {
+        "Id": row.qbo_item_id, "Name": row.name, "Sku": row.sku, "Type": row.item_type, "Description": row.description,
+        "UnitPrice": row.unit_price, "Active": row.active,
+        "IncomeAccountRef": {"value": row.income_account_id} if row.income_account_id else None,
+        "ExpenseAccountRef": {"value": row.expense_account_id} if row.expense_account_id else None,
+    }
+
+def _word_similarity(item_word: str, words: List[str]) -> float:
+    """How well item_word appears among the description words: exact 1, otherwise the best close difflib ratio."""
+    if item_word in words:
+        return 1.0
+    best = 0.0
+    for word in words:
+        if abs(len(word) - len(item_word)) <= 2:
+            best = max(best, difflib.SequenceMatcher(None, item_word, word).ratio())
+    return best if best >= MIN_TOKEN_SIMILARITY else 0.0
+
+class ItemCatalog:
+    """Name, SKU and income-account indexes plus trigram postings over one version of the item list."""
+
+    def __init__(self, items: List[Dict[str, Any]]):
+        # Inactive items cannot be put on new invoices
+        self.items = [item for item in items if item.get("Active") is not False]
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._by_name: Dict[str, Dict[str, Any]] = {}
+        self._by_sku: Dict[str, Dict[str, Any]] = {}
+        self._by_income_account: Dict[str, List[Dict[str, Any]]] = {}
+        self._tokens: Dict[str, List[List[str]]] = {} # Item ID -> token lists of its name, path leaf and SKU
+        self._postings: Dict[str, set] = {}
+        for item in self.items:
+            item_id = str(item.get("Id"))
+            self._by_id[item_id] = item
+            for name in (item.get("FullyQualifiedName"), item.get("Name")):
+                if name:
+                    self._by_name.setdefault(normalize_item_name(name), item)
+            if item.get("Sku"):
+                self._by_sku.setdefault(normalize_item_name(item["Sku"]), item)
+            income_account_id = (item.get("IncomeAccountRef") or {}).get("value")
+            if income_account_id:
+                self._by_income_account.setdefault(str(income_account_id), []).append(item)
+            token_lists = [normalize_text(text) for text in
+                           (item.get("Name"), (item.get("FullyQualifiedName") or "").split(":")[-1], item.get("Sku")) if text]
+            self._tokens[item_id] = [tokens for tokens in token_lists if tokens]
+            for gram in trigrams([token for tokens in token_lists for token in tokens]):
+                self._postings.setdefault(gram, set()).add(item_id)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def get(self, item_id: str) -> Optional[Dict[str, Any]]:
+        return self._by_id.get(str(item_id))
+
+    def by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        """The item with this name or fully qualified name (case, spacing and punctuation ignored)."""
+        return self._by_name.get(normalize_item_name(name))
+
+    def by_sku(self, sku: str) -> Optional[Dict[str, Any]]:
+        return self._by_sku.get(normalize_item_name(sku))
+
+    def by_income_account(self, account_id: str) -> List[Dict[str, Any]]:
+        return list(self._by_income_account.get(str(account_id), []))
+
+    def find(self, name_or_sku: str) -> Optional[Dict[str, Any]]:
+        """Exact name, then exact SKU."""
+        return self.by_name(name_or_sku) or self.by_sku(name_or_sku)
+
+    def match_line(self, description: str, limit: int = 5, income_account_id: Optional[str] = None,
+                   min_score: float = MIN_LINE_MATCH_SCORE) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        Items ranked by how completely their name (or SKU) appears in a line description:
+        the share of the item's words found in the description, exactly or as a close typo.
+        Ties go to the item with more words (the more specific one).
+        """
+        words = normalize_text(description)
+        if not words:
+            return []
+        hits = Counter(chain.from_iterable(self._postings.get(gram, ()) for gram in trigrams(words)))
+        scored = []
+        for item_id, _ in hits.most_common(MAX_RESCORED_CANDIDATES):
+            item = self._by_id[item_id]
+            if income_account_id and (item.get("IncomeAccountRef") or {}).get("value") != str(income_account_id):
+                continue
+            best = (0.0, 0)
+            for tokens in self._tokens[item_id]:
+                coverage = sum(len(t) * _word_similarity(t, words) for t in tokens) / sum(len(t) for t in tokens)
+                best = max(best, (coverage, len(tokens)))
+            if best[0] >= min_score:
+                scored.append((best, item_id))
+        scored.sort(key=lambda entry: (-entry[0][0], -entry[0][1], entry[1]))
+        return [(score, self._by_id[item_id]) for (score, _), item_id in scored[:limit]]
+
+    def default_item(self) -> Optional[Dict[str, Any]]:
+        return self.by_name(QBO_DEFAULT_ITEM_NAME)
+
+    def resolve_line(self, description: Optional[str], income_account_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """The item for an invoice line: exact name/SKU, else the best fuzzy match, else the default item."""
+        if description:
+            item = self.find(description)
+            if item is not None:
+                return item
+            ranked = self.match_line(description, limit=1, income_account_id=income_account_id)
+            if ranked:
+                return ranked[0][1]
+        return self.default_item()
+
+_mirror_catalog: Optional[ItemCatalog] = None
+_mirror_catalog_version: Optional[Tuple] = None
+_mirror_catalog_lock = threading.Lock()
+
+def catalog_for(db: Session) -> ItemCatalog:
+    """The catalog over the item mirror, rebuilt only after the mirror has been synced since the last build."""
+    global _mirror_catalog, _mirror_catalog_version
+    state = crud.get_sync_states(db).get('Item')
+    version = (str(db.get_bind().url), state.last_synced_at if state else None)
+    with _mirror_catalog_lock:
+        if _mirror_catalog is None or _mirror_catalog_version != version:
+            _mirror_catalog = ItemCatalog([item_from_row(row) for row in db.execute(select(ItemMirror)).scalars()])
+            _mirror_catalog_version = version
+            logger.info(f"Built item catalog from {len(_mirror_catalog)} mirrored items.")
+        return _mirror_catalog
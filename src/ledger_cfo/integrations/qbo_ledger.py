@@ -0,0 +1,332 @@
+"""
+Profit and Loss computed locally from the QBO mirror.
+
+Asking QBO's reports endpoint every ad-hoc P&L question costs a round trip and rate-limit
+budget. PnLEngine instead loads the P&L postings of the mirrored transactions once, as
+columnar NumPy arrays (date, account code, amount), and aggregates them in one grouped pass:
+
+    daily[account, posting day] = sum of amounts    (one np.bincount over every line)
+    cumulative = daily.cumsum(axis=1)
+
+The total of every account over any date range is then cumulative[:, end] - cumulative[:, start],
+so month/quarter/year buckets and side-by-side period comparisons are all read off the same
+matrix with a handful of vectorized lookups.
+
+Reports use qbo_reports.parse_report's format, and reconcile() checks one against QBO's own
+ProfitAndLoss. Limits: accrual basis only, and only the transaction types in
+LEDGER_SOURCE_ENTITIES are mirrored (not Bills, JournalEntries or CreditMemos), so reconcile
+before relying on it for a company that records those.
+"""
+import datetime
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..core import crud
+from ..models import AccountCache, ItemMirror, InvoiceMirror, SalesReceiptMirror, PurchaseMirror
+from .qbo_mirror import parse_qbo_date
+from .qbo_reports import ROW_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Mirrored transactions whose lines post to P&L accounts
+LEDGER_SOURCE_ENTITIES = {"Invoice": InvoiceMirror, "SalesReceipt": SalesReceiptMirror, "Purchase": PurchaseMirror}
+# Everything a local P&L reads; all must be fresh for it to be served
+LEDGER_MIRROR_ENTITIES = list(LEDGER_SOURCE_ENTITIES) + ["Item", "Account"]
+
+# QBO AccountType -> the P&L section (QBO's report group) its accounts appear in
+PNL_SECTIONS = {
+    "Income": "Income",
+    "Cost of Goods Sold": "COGS",
+    "Expense": "Expenses",
+    "Other Income": "OtherIncome",
+    "Other Expense": "OtherExpenses",
+}
+SECTION_ORDER = ("Income", "COGS", "Expenses", "OtherIncome", "OtherExpenses")
+SECTION_LABELS = {"Income": "Income", "COGS": "Cost of Goods Sold", "Expenses": "Expenses",
+                  "OtherIncome": "Other Income", "OtherExpenses": "Other Expenses"}
+
+BUCKET_MONTHS = {"month": 1, "quarter": 3, "year": 12} # summarize_column_by values supported locally
+
+# --- Lines ---
+
+@dataclass
+class LedgerLines:
+    """Columnar P&L postings: one entry per transaction line, amounts in the account's normal direction."""
+    dates: np.ndarray # datetime64[D]
+    accounts: np.ndarray # int32 codes into account_ids
+    amounts: np.ndarray # float64
+    account_ids: List[str]
+    unmapped_amount: float = 0.0 # Line amounts whose account could not be determined (e.g. item not mirrored)
+
+    @classmethod
+    def from_columns(cls, dates: Sequence, account_ids: Sequence[str], amounts: Sequence[float]) -> "LedgerLines":
+        ids, codes = np.unique(np.asarray(account_ids, dtype=str), return_inverse=True)
+        return cls(np.asarray(dates, dtype="datetime64[D]"), codes.astype(np.int32), np.asarray(amounts, dtype=np.float64), ids.tolist())
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+def _ref(container: Optional[Dict[str, Any]], ref_name: str) -> Optional[str]:
+    return ((container or {}).get(ref_name) or {}).get("value")
+
+def _sales_postings(lines: Iterable[Dict[str, Any]], item_accounts: Dict[str, Tuple[Optional[str], Optional[str]]]):
+    for line in lines or ():
+        detail_type = line.get("DetailType")
+        amount = float(line.get("Amount") or 0)
+        if detail_type == "SalesItemLineDetail":
+            yield item_accounts.get(_ref(line.get("SalesItemLineDetail"), "ItemRef"), (None, None))[0], amount
+        elif detail_type == "DiscountLineDetail":
+            yield _ref(line.get("DiscountLineDetail"), "DiscountAccountRef"), -amount
+        elif detail_type == "GroupLineDetail": # Bundles carry their item lines inside
+            yield from _sales_postings((line.get("GroupLineDetail") or {}).get("Line"), item_accounts)
+        # SubTotalLineDetail and DescriptionOnly lines post nothing
+
+def _purchase_postings(lines: Iterable[Dict[str, Any]], item_accounts: Dict[str, Tuple[Optional[str], Optional[str]]]):
+    for line in lines or ():
+        detail_type = line.get("DetailType")
+        amount = float(line.get("Amount") or 0)
+        if detail_type == "AccountBasedExpenseLineDetail":
+            yield _ref(line.get("AccountBasedExpenseLineDetail"), "AccountRef"), amount
+        elif detail_type == "ItemBasedExpenseLineDetail":
+            yield item_accounts.get(_ref(line.get("ItemBasedExpenseLineDetail"), "ItemRef"), (None, None))[1], amount
+
+def lines_from_transactions(transactions: Dict[str, Iterable[Dict[str, Any]]],
+                            item_accounts: Dict[str, Tuple[Optional[str], Optional[str]]]) -> LedgerLines:
+    """
+    Extracts the P&L postings of raw QBO transactions (per entity name in LEDGER_SOURCE_ENTITIES).
+    item_accounts maps item IDs to their (income account ID, expense account ID).
+    """
+    dates, codes, amounts = [], [], []
+    account_codes: Dict[str, int] = {} # Coded while extracting, which is cheaper than np.unique over strings
+    unmapped = 0.0
+    for entity_name, raws in transactions.items():
+        for raw in raws:
+            txn_date = raw.get("TxnDate")
+            if not txn_date:
+                continue
+            if entity_name == "Purchase":
+                sign = -1.0 if raw.get("Credit") else 1.0 # Credit card credits reverse the expense
+                postings = _purchase_postings(raw.get("Line"), item_accounts)
+            else:
+                sign = 1.0
+                postings = _sales_postings(raw.get("Line"), item_accounts)
+            for account_id, amount in postings:
+                if account_id is None:
+                    unmapped += amount
+                    continue
+                dates.append(txn_date[:10])
+                codes.append(account_codes.setdefault(account_id, len(account_codes)))
+                amounts.append(sign * amount)
+    if unmapped:
+        logger.warning(f"{unmapped:,.2f} of transaction line amounts have no known account and are left out of the local P&L")
+    return LedgerLines(np.array(dates, dtype="datetime64[D]"), np.array(codes, dtype=np.int32),
+                       np.array(amounts, dtype=np.float64), list(account_codes), unmapped)
+
+def load_mirror_lines(db: Session, start_date: Optional[str] = None, end_date: Optional[str] = None) -> LedgerLines:
+    """Reads the P&L postings of the mirrored transactions dated within the optional range."""
+    item_accounts = {item_id: (income_id, expense_id) for item_id, income_id, expense_id in db.execute(
+        select(ItemMirror.qbo_item_id, ItemMirror.income_account_id, ItemMirror.expense_account_id))}
+    start, end = parse_qbo_date(start_date), parse_qbo_date(end_date)
+    transactions = {}
+    for entity_name, model in LEDGER_SOURCE_ENTITIES.items():
+        statement = select(model.raw_data)
+        if start:
+            statement = statement.where(model.txn_date >= start)
+        if end:
+            statement = statement.where(model.txn_date <= end)
+        transactions[entity_name] = db.execute(statement).scalars()
+    return lines_from_transactions(transactions, item_accounts)
+
+def load_accounts(db: Session) -> Dict[str, Dict[str, Any]]:
+    """The mirrored chart of accounts as {account ID: {"name", "account_type"}}."""
+    statement = select(AccountCache.qbo_account_id, AccountCache.name, AccountCache.fully_qualified_name, AccountCache.account_type)
+    return {account_id: {"name": full_name or name, "account_type": account_type}
+            for account_id, name, full_name, account_type in db.execute(statement)}
+
+# --- Periods ---
+
+def period_buckets(start_date: str, end_date: str, summarize_column_by: str) -> List[Tuple[str, str, str]]:
+    """
+    Splits start_date..end_date into calendar months, quarters or years as (label, start, end),
+    labelled like QBO's columns ("Jan 2025", "Q1 2025", "2025"). The first and last buckets are
+    clipped to the range.
+    """
+    step = BUCKET_MONTHS.get(summarize_column_by.lower())
+    if step is None:
+        raise ValueError(f"Cannot summarize locally by '{summarize_column_by}'. Expected one of {[k.title() for k in BUCKET_MONTHS]}.")
+    start, end = np.datetime64(start_date, "D"), np.datetime64(end_date, "D")
+    first_month = start.astype("datetime64[M]").astype(np.int64)
+    first_month -= first_month % step # Calendar-aligned quarters and years (month 0 is January 1970)
+    bucket_months = np.arange(first_month, end.astype("datetime64[M]").astype(np.int64) + 1, step).astype("datetime64[M]")
+    buckets = []
+    for month in bucket_months:
+        bucket_start = max(month.astype("datetime64[D]"), start)
+        bucket_end = min((month + step).astype("datetime64[D]") - 1, end)
+        first = month.astype(datetime.date)
+        if step == 1:
+            label = first.strftime("%b %Y")
+        elif step == 3:
+            label = f"Q{(first.month - 1) // 3 + 1} {first.year}"
+        else:
+            label = str(first.year)
+        buckets.append((label, str(bucket_start), str(bucket_end)))
+    return buckets
+
+# --- Engine ---
+
+class PnLEngine:
+    """Account totals over arbitrary date ranges from one aggregation of LedgerLines (see module docstring)."""
+
+    def __init__(self, lines: LedgerLines, accounts: Dict[str, Dict[str, Any]]):
+        section_of = {account_id: PNL_SECTIONS.get(accounts.get(account_id, {}).get("account_type")) for account_id in lines.account_ids}
+        in_pnl = np.array([section_of[a] is not None for a in lines.account_ids], dtype=bool)
+        keep = in_pnl[lines.accounts] if len(lines) else np.zeros(0, dtype=bool)
+
+        # Order the P&L accounts as the report lists them: by section, then name
+        pnl_ids = [a for a in lines.account_ids if section_of[a] is not None]
+        pnl_ids.sort(key=lambda a: (SECTION_ORDER.index(section_of[a]), accounts[a].get("name") or ""))
+        self.account_ids = pnl_ids
+        self.names = [accounts[a].get("name") or a for a in pnl_ids]
+        self.sections = np.array([SECTION_ORDER.index(section_of[a]) for a in pnl_ids], dtype=np.int64)
+        remap = np.full(len(lines.account_ids), -1, dtype=np.int64)
+        position = {a: i for i, a in enumerate(pnl_ids)}
+        for code, account_id in enumerate(lines.account_ids):
+            remap[code] = position.get(account_id, -1)
+
+        codes = remap[lines.accounts[keep]]
+        # Only days with postings get a column, so memory follows activity rather than the calendar span
+        self.days, day_index = np.unique(lines.dates[keep], return_inverse=True)
+        n_accounts, n_days = len(pnl_ids), len(self.days)
+        daily = np.bincount(codes * n_days + day_index.reshape(-1), weights=lines.amounts[keep],
+                            minlength=n_accounts * n_days).reshape(n_accounts, n_days)
+        self._cumulative = np.zeros((n_accounts, n_days + 1))
+        np.cumsum(daily, axis=1, out=self._cumulative[:, 1:])
+        self.line_count = int(keep.sum())
+        self.unmapped_amount = lines.unmapped_amount
+
+    def totals(self, periods: Sequence[Tuple[str, str]]) -> np.ndarray:
+        """Totals per account (rows, in account_ids order) for each inclusive (start_date, end_date) period (columns)."""
+        starts = np.array([start for start, _ in periods], dtype="datetime64[D]")
+        ends = np.array([end for _, end in periods], dtype="datetime64[D]")
+        lo = np.searchsorted(self.days, starts, side="left")
+        hi = np.searchsorted(self.days, ends, side="right")
+        return self._cumulative[:, hi] - self._cumulative[:, lo]
+
+    def report(self, start_date: str, end_date: str, summarize_column_by: Optional[str] = None) -> Dict[str, Any]:
+        """
+        P&L for start_date..end_date in qbo_reports.parse_report's format. With summarize_column_by
+        ('Month', 'Quarter' or 'Year') there is one column per bucket, then a Total column, as in QBO.
+        """
+        periods = [("Total", start_date, end_date)]
+        if summarize_column_by and summarize_column_by.lower() != "total":
+            periods = period_buckets(start_date, end_date, summarize_column_by) + periods
+        return self._report(periods, start_date, end_date)
+
+    def compare(self, periods: Dict[str, Tuple[str, str]]) -> Dict[str, Any]:
+        """P&L with one column per labelled (start_date, end_date) period, e.g. this quarter vs. the same quarter last year."""
+        rows = [(label, start, end) for label, (start, end) in periods.items()]
+        return self._report(rows, min(start for _, start, _ in rows), max(end for _, _, end in rows))
+
+    def _report(self, periods: List[Tuple[str, str, str]], start_date: str, end_date: str) -> Dict[str, Any]:
+        values = np.round(self.totals([(start, end) for _, start, end in periods]), 2)
+        width = len(periods)
+        section_totals = np.zeros((len(SECTION_ORDER), width))
+        np.add.at(section_totals, self.sections, values)
+        section_totals = np.round(section_totals, 2)
+        active = np.any(values != 0, axis=1) # Accounts without activity in any column are left out, as in QBO
+
+        def amounts(vector) -> List[float]:
+            return [float(v) for v in vector]
+
+        income, cogs, expenses, other_income, other_expenses = section_totals
+        subtotals = {
+            "COGS": ("GrossProfit", "Gross Profit", income - cogs),
+            "Expenses": ("NetOperatingIncome", "Net Operating Income", income - cogs - expenses),
+            "OtherExpenses": ("NetOtherIncome", "Net Other Income", other_income - other_expenses),
+        }
+        rows = []
+        for index, group in enumerate(SECTION_ORDER):
+            members = np.flatnonzero((self.sections == index) & active)
+            if len(members):
+                rows.append(["header", 0, group, SECTION_LABELS[group], None] + [None] * width)
+                for member in members:
+                    rows.append(["data", 1, group, self.names[member], self.account_ids[member]] + amounts(values[member]))
+                rows.append(["summary", 0, group, f"Total {SECTION_LABELS[group]}", None] + amounts(section_totals[index]))
+            if group in subtotals:
+                subtotal_group, label, subtotal = subtotals[group]
+                rows.append(["summary", 0, subtotal_group, label, None] + amounts(np.round(subtotal, 2)))
+        net_income = np.round(income - cogs - expenses + other_income - other_expenses, 2)
+        rows.append(["summary", 0, "NetIncome", "Net Income", None] + amounts(net_income))
+        return {
+            "report": "ProfitAndLoss",
+            "start_date": start_date,
+            "end_date": end_date,
+            "accounting_method": "Accrual",
+            "currency": None,
+            "columns": [label for label, _, _ in periods],
+            "rows": rows,
+            "totals": {row[2]: row[len(ROW_FIELDS):] for row in rows if row[0] == "summary"},
+            "source": "mirror",
+        }
+
+# --- Reconciliation ---
+
+def _account_values(report: Dict[str, Any]) -> Dict[str, Tuple[str, List[float]]]:
+    values: Dict[str, Tuple[str, List[float]]] = {}
+    for row in report["rows"]:
+        if row[0] == "data" and row[4]:
+            label, amounts = values.get(row[4], (row[3], [0.0] * (len(row) - len(ROW_FIELDS))))
+            values[row[4]] = (label, [a + (v if isinstance(v, float) else 0.0) for a, v in zip(amounts, row[len(ROW_FIELDS):])])
+    return values
+
+def reconcile(local: Dict[str, Any], qbo: Dict[str, Any], tolerance: float = 0.01) -> List[Dict[str, Any]]:
+    """
+    Differences larger than tolerance between two P&Ls with the same columns (typically the engine's
+    and QBO's): per account (by ID) and per section total present in both. Empty when they agree.
+    """
+    differences = []
+
+    def compare(kind: str, key: str, label: str, ours: List[Any], theirs: List[Any]):
+        for column, local_value, qbo_value in zip(qbo["columns"], ours, theirs):
+            local_value, qbo_value = local_value or 0.0, qbo_value or 0.0
+            if abs(local_value - qbo_value) > tolerance:
+                differences.append({kind: key, "label": label, "column": column, "local": local_value, "qbo": qbo_value,
+                                    "difference": round(local_value - qbo_value, 2)})
+
+    local_accounts, qbo_accounts = _account_values(local), _account_values(qbo)
+    for account_id in sorted(set(local_accounts) | set(qbo_accounts)):
+        label, ours = local_accounts.get(account_id, (None, []))
+        qbo_label, theirs = qbo_accounts.get(account_id, (None, []))
+        width = len(qbo["columns"])
+        compare("account_id", account_id, label or qbo_label, ours or [0.0] * width, theirs or [0.0] * width)
+    for group in local["totals"].keys() & qbo["totals"].keys():
+        compare("group", group, group, local["totals"][group], qbo["totals"][group])
+    return differences
+
+# --- Mirror-backed engine ---
+
+_engine_lock = threading.Lock()
+_engine: Optional[PnLEngine] = None
+_engine_version: Optional[Tuple] = None
+
+def engine_for(db: Session) -> PnLEngine:
+    """
+    The PnLEngine over the whole mirror, rebuilt only after the mirror has been synced since
+    the last build (entities written back between syncs show up at the next one).
+    """
+    global _engine, _engine_version
+    states = crud.get_sync_states(db)
+    version = (str(db.get_bind().url),) + tuple((name, states[name].last_synced_at if name in states else None) for name in LEDGER_MIRROR_ENTITIES)
+    with _engine_lock:
+        if _engine is None or _engine_version != version:
+            lines = load_mirror_lines(db)
+            _engine = PnLEngine(lines, load_accounts(db))
+            _engine_version = version
+            logger.info(f"Built local P&L engine from {_engine.line_count} mirrored transaction lines")
+        return _engine
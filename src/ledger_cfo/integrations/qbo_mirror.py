@@ -0,0 +1,291 @@
+"""
+Local mirror of QBO entities and the read path that serves from it.
+
+The mirror tables are kept up to date by qbo_sync (CDC). Read tools in qbo_api ask
+is_fresh() whether the mirror for the entities they need was synced within the caller's
+max_staleness; if so they answer from the indexed local tables, otherwise they call QBO
+and write the fetched entities back with write_back().
+
+Entities are stored as raw QBO JSON (raw_data) next to the indexed columns, so the read
+path can rebuild the same output the live SDK path produces.
+"""
+import datetime
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..core import crud
+from ..models import CustomerCache, VendorCache, AccountCache, ItemMirror
+from ..models import InvoiceMirror, PaymentMirror, EstimateMirror, SalesReceiptMirror, PurchaseMirror
+
+logger = logging.getLogger(__name__)
+
+# Default freshness bound for mirror reads; a call can pass its own max_staleness (0 = always live)
+MIRROR_MAX_STALENESS_SECONDS = float(os.getenv('QBO_MIRROR_MAX_STALENESS_SECONDS', '300'))
+
+# --- Row mappers (raw QBO JSON -> mirror columns) ---
+
+def parse_qbo_datetime(value: Optional[str]) -> Optional[datetime.datetime]:
+    """Parses a QBO timestamp (e.g. '2025-01-01T10:00:00-08:00') into a naive UTC datetime."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        logger.warning(f"Could not parse QBO timestamp '{value}'")
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def parse_qbo_date(value: Optional[str]) -> Optional[datetime.date]:
+    """Parses a QBO date ('2025-01-31') into a date."""
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(value[:10])
+    except ValueError:
+        logger.warning(f"Could not parse QBO date '{value}'")
+        return None
+
+def _ref_value(raw: Dict[str, Any], ref_name: str, key: str = 'value') -> Optional[str]:
+    return (raw.get(ref_name) or {}).get(key)
+
+def _amount(raw: Dict[str, Any], field: str) -> Any:
+    """An amount field, or None when unset (SDK objects serialize unset amounts as '')."""
+    value = raw.get(field)
+    return None if value == '' else value
+
+def _common_columns(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Columns every mirror table shares."""
+    return {
+        'sync_token': str(raw['SyncToken']) if raw.get('SyncToken') is not None else None, # SDK objects serialize it as an int
+        'qbo_last_updated_at': parse_qbo_datetime((raw.get('MetaData') or {}).get('LastUpdatedTime')),
+        'raw_data': raw,
+        'last_synced_at': datetime.datetime.utcnow(),
+    }
+
+def customer_row(raw: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'qbo_customer_id': raw['Id'],
+        'display_name': raw.get('DisplayName') or '',
+        'email_address': _ref_value(raw, 'PrimaryEmailAddr', 'Address'),
+        'company_name': raw.get('CompanyName'),
+        'given_name': raw.get('GivenName'),
+        'family_name': raw.get('FamilyName'),
+        'phone_number': _ref_value(raw, 'PrimaryPhone', 'FreeFormNumber'),
+        'balance': _amount(raw, 'Balance'),
+        'active': raw.get('Active'),
+        **_common_columns(raw),
+    }
+
+def vendor_row(raw: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'qbo_vendor_id': raw['Id'],
+        'display_name': raw.get('DisplayName') or '',
+        'company_name': raw.get('CompanyName'),
+        'email_address': _ref_value(raw, 'PrimaryEmailAddr', 'Address'),
+        'phone_number': _ref_value(raw, 'PrimaryPhone', 'FreeFormNumber'),
+        'balance': _amount(raw, 'Balance'),
+        'active': raw.get('Active'),
+        **_common_columns(raw),
+    }
+
+def account_row(raw: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'qbo_account_id': raw['Id'],
+        'name': raw.get('Name') or '',
+        'account_type': raw.get('AccountType'),
+        'account_sub_type': raw.get('AccountSubType'),
+        'classification': raw.get('Classification'),
+        'fully_qualified_name': raw.get('FullyQualifiedName'),
+        'parent_account_id': _ref_value(raw, 'ParentRef'),
+        'active': raw.get('Active'),
+        'current_balance': _amount(raw, 'CurrentBalance'),
+        **_common_columns(raw),
+    }
+
+def item_row(raw: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'qbo_item_id': raw['Id'],
+        'name': raw.get('Name') or '',
+        'sku': raw.get('Sku'),
+        'item_type': raw.get('Type'),
+        'description': raw.get('Description'),
+        'unit_price': _amount(raw, 'UnitPrice'),
+        'income_account_id': _ref_value(raw, 'IncomeAccountRef'),
+        'expense_account_id': _ref_value(raw, 'ExpenseAccountRef'),
+        'active': raw.get('Active'),
+        **_common_columns(raw),
+    }
+
+def _transaction_columns(raw: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'customer_id': _ref_value(raw, 'CustomerRef'),
+        'customer_name': _ref_value(raw, 'CustomerRef', 'name'),
+        'txn_date': parse_qbo_date(raw.get('TxnDate')),
+        'total_amt': _amount(raw, 'TotalAmt'),
+        **_common_columns(raw),
+    }
+
+def invoice_row(raw: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'qbo_invoice_id': raw['Id'],
+        'doc_number': raw.get('DocNumber'),
+        'due_date': parse_qbo_date(raw.get('DueDate')),
+        'balance': _amount(raw, 'Balance'),
+        **_transaction_columns(raw),
+    }
+
+def payment_row(raw: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'qbo_payment_id': raw['Id'],
+        'unapplied_amt': _amount(raw, 'UnappliedAmt'),
+        **_transaction_columns(raw),
+    }
+
+def estimate_row(raw: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'qbo_estimate_id': raw['Id'],
+        'doc_number': raw.get('DocNumber'),
+        'txn_status': raw.get('TxnStatus'),
+        'expiration_date': parse_qbo_date(raw.get('ExpirationDate')),
+        **_transaction_columns(raw),
+    }
+
+def sales_receipt_row(raw: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'qbo_sales_receipt_id': raw['Id'],
+        'doc_number': raw.get('DocNumber'),
+        **_transaction_columns(raw),
+    }
+
+def purchase_row(raw: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'qbo_purchase_id': raw['Id'],
+        'doc_number': raw.get('DocNumber'),
+        'payment_type': raw.get('PaymentType'),
+        'account_id': _ref_value(raw, 'AccountRef'),
+        'entity_id': _ref_value(raw, 'EntityRef'),
+        'credit': raw.get('Credit'),
+        **_transaction_columns(raw),
+    }
+
+@dataclass(frozen=True)
+class MirrorSpec:
+    """How one QBO entity is stored locally."""
+    model: Any
+    key_column: str # Unique column holding the QBO Id
+    to_row: Callable[[Dict[str, Any]], Dict[str, Any]]
+
+MIRRORED_ENTITIES: Dict[str, MirrorSpec] = {
+    'Customer': MirrorSpec(CustomerCache, 'qbo_customer_id', customer_row),
+    'Vendor': MirrorSpec(VendorCache, 'qbo_vendor_id', vendor_row),
+    'Account': MirrorSpec(AccountCache, 'qbo_account_id', account_row),
+    'Item': MirrorSpec(ItemMirror, 'qbo_item_id', item_row),
+    'Invoice': MirrorSpec(InvoiceMirror, 'qbo_invoice_id', invoice_row),
+    'Payment': MirrorSpec(PaymentMirror, 'qbo_payment_id', payment_row),
+    'Estimate': MirrorSpec(EstimateMirror, 'qbo_estimate_id', estimate_row),
+    'SalesReceipt': MirrorSpec(SalesReceiptMirror, 'qbo_sales_receipt_id', sales_receipt_row),
+    'Purchase': MirrorSpec(PurchaseMirror, 'qbo_purchase_id', purchase_row),
+}
+
+
+def apply_mirror_changes(db: Session, entity_name: str, upserts: List[Dict[str, Any]], deleted_ids: Iterable[str] = ()) -> Dict[str, int]:
+    """Bulk-upserts raw QBO entities into the entity's mirror table and removes deleted IDs."""
+    spec = MIRRORED_ENTITIES[entity_name]
+    rows = [spec.to_row(raw) for raw in upserts]
+    upserted = crud.bulk_upsert_mirror_rows(db, spec.model, spec.key_column, rows)
+    deleted = crud.delete_mirror_rows(db, spec.model, spec.key_column, list(deleted_ids))
+    return {'upserted': upserted, 'deleted': deleted}
+
+# --- Freshness ---
+
+def mirror_age(db: Session, entity_name: str) -> Optional[datetime.timedelta]:
+    """Returns how long ago the mirror for an entity was last brought up to date, or None if never synced."""
+    state = crud.get_sync_states(db).get(entity_name)
+    if state is None:
+        return None
+    return datetime.datetime.utcnow() - state.last_synced_at
+
+def is_fresh(db: Optional[Session], entity_names: List[str], max_staleness: Optional[float] = None) -> bool:
+    """
+    True if every entity in entity_names was synced within max_staleness seconds
+    (default MIRROR_MAX_STALENESS_SECONDS). Without a session, or with max_staleness <= 0, the
+    mirror is never used.
+    """
+    if db is None:
+        return False
+    max_staleness = MIRROR_MAX_STALENESS_SECONDS if max_staleness is None else max_staleness
+    if max_staleness <= 0:
+        return False
+    try:
+        states = crud.get_sync_states(db)
+    except Exception as e: # Mirror tables unavailable; the live path still works
+        logger.warning(f"Could not read QBO mirror sync state, reading from QBO instead: {e}")
+        return False
+    now = datetime.datetime.utcnow()
+    limit = datetime.timedelta(seconds=max_staleness)
+    for name in entity_names:
+        state = states.get(name)
+        if state is None or now - state.last_synced_at > limit:
+            logger.debug(f"Mirror for {name} is not fresh enough (max_staleness={max_staleness}s).")
+            return False
+    return True
+
+# --- Reads ---
+
+def get_raw_entity(db: Session, entity_name: str, qbo_id: str) -> Optional[Dict[str, Any]]:
+    """Returns the mirrored raw QBO JSON for one entity, or None if it is not in the mirror."""
+    spec = MIRRORED_ENTITIES[entity_name]
+    statement = select(spec.model.raw_data).where(getattr(spec.model, spec.key_column) == str(qbo_id))
+    return db.execute(statement).scalar_one_or_none()
+
+def get_customer_transactions(db: Session, entity_names: List[str], customer_id: str,
+                              start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """Returns the mirrored raw transactions of a customer per entity name, using the (customer_id, txn_date) index."""
+    start = parse_qbo_date(start_date)
+    end = parse_qbo_date(end_date)
+    transactions = {}
+    for name in entity_names:
+        model = MIRRORED_ENTITIES[name].model
+        statement = select(model.raw_data).where(model.customer_id == str(customer_id))
+        if start:
+            statement = statement.where(model.txn_date >= start)
+        if end:
+            statement = statement.where(model.txn_date <= end)
+        statement = statement.order_by(model.txn_date, model.id)
+        transactions[name] = list(db.execute(statement).scalars())
+    return transactions
+
+def find_estimates(db: Session, customer_id: Optional[str] = None, status: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Returns mirrored raw estimates (all of them unless limit is given), optionally filtered by customer and TxnStatus."""
+    statement = select(EstimateMirror.raw_data)
+    if customer_id:
+        statement = statement.where(EstimateMirror.customer_id == str(customer_id))
+    if status:
+        statement = statement.where(EstimateMirror.txn_status == status)
+    statement = statement.order_by(EstimateMirror.txn_date, EstimateMirror.id)
+    if limit is not None:
+        statement = statement.limit(limit)
+    return list(db.execute(statement).scalars())
+
+# --- Write-back ---
+
+def write_back(db: Optional[Session], entity_name: str, raws: List[Dict[str, Any]]):
+    """
+    Stores entities fetched live from QBO in the mirror. Runs in a savepoint and never raises,
+    so a mirror problem cannot fail the read that triggered it. The sync state is not touched:
+    a partial write-back says nothing about the rest of the table.
+    """
+    if db is None or not raws:
+        return
+    try:
+        with db.begin_nested():
+            apply_mirror_changes(db, entity_name, raws)
+    except Exception as e:
+        logger.warning(f"Could not write {len(raws)} {entity_name}(s) back to the QBO mirror: {e}")
@@ -0,0 +1,189 @@
+"""
+Streaming pagination over QBO queries.
+
+QBO returns at most 1000 rows per query; longer result sets must be read page by page with
+STARTPOSITION. QBOPaginator does that behind an `async for`:
+
+    async with paginator:
+        async for raw_invoice in paginator:
+            ...
+
+A background task fetches the next page while the consumer works through the current one.
+It runs at most prefetch_pages pages ahead, so no more than (prefetch_pages + 1) * page_size
+records are held at once however long the result set is (the backpressure window).
+
+QueryCoalescer lets several paginators (e.g. one per entity type) share round trips: page
+queries issued in the same event loop iteration are sent together in one batch request.
+
+For full exports, where every row is wanted and the consumer does not need to start early,
+window_starts() plans the STARTPOSITION windows from a COUNT(*) so they can all be fetched
+at once (qbo_api.bulk_read_entities).
+"""
+import asyncio
+import dataclasses
+import itertools
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .qbo_query import QBOQuery
+
+logger = logging.getLogger(__name__)
+
+QBO_MAX_PAGE_SIZE = 1000 # QBO's MAXRESULTS ceiling
+QBO_PAGINATOR_PREFETCH_PAGES = int(os.getenv("QBO_PAGINATOR_PREFETCH_PAGES", "1")) # Pages fetched ahead of the consumer
+
+_END = object() # Queue marker: no more pages
+
+class QBOPaginator:
+    """
+    Async iterator over every record of a query, fetched page_size rows at a time.
+    fetch_page(sql) returns the raw records of one page (an empty list once past the end).
+    The query's start_position is where reading starts; its max_results is replaced by page_size.
+    """
+
+    def __init__(self, query: QBOQuery, fetch_page: Callable[[str], Awaitable[List[Dict[str, Any]]]],
+                 page_size: int = QBO_MAX_PAGE_SIZE, prefetch_pages: int = QBO_PAGINATOR_PREFETCH_PAGES):
+        if not 1 <= page_size <= QBO_MAX_PAGE_SIZE:
+            raise ValueError(f"page_size must be between 1 and {QBO_MAX_PAGE_SIZE}, got {page_size}")
+        self.query = query
+        self.page_size = page_size
+        self.prefetch_pages = max(0, prefetch_pages)
+        self.pages_fetched = 0
+        self._fetch_page = fetch_page
+        self._pages: Optional[asyncio.Queue] = None
+        self._window: Optional[asyncio.Semaphore] = None # One permit per page held (being consumed, buffered or in flight)
+        self._producer: Optional[asyncio.Task] = None
+        self._current: List[Dict[str, Any]] = []
+        self._position = 0
+        self._holding_page = False
+        self._done = False
+
+    def page_sql(self, start_position: Optional[int]) -> str:
+        # The first page keeps the query's own start (often none, i.e. QBO's default of 1)
+        return dataclasses.replace(self.query, start_position=start_position, max_results=self.page_size).to_sql()
+
+    def start(self) -> "QBOPaginator":
+        """Starts fetching the first pages now instead of on the first iteration."""
+        if self._producer is None:
+            self._pages = asyncio.Queue()
+            self._window = asyncio.Semaphore(self.prefetch_pages + 1)
+            self._producer = asyncio.get_running_loop().create_task(self._produce())
+        return self
+
+    async def _produce(self):
+        start_position = self.query.start_position
+        next_start = start_position or 1
+        try:
+            while True:
+                await self._window.acquire() # Blocks while the window is full: backpressure
+                page = await self._fetch_page(self.page_sql(start_position))
+                self.pages_fetched += 1
+                logger.debug(f"Fetched page {self.pages_fetched} of {self.query.entity_name} ({len(page)} rows from {next_start})")
+                if page:
+                    self._pages.put_nowait(page)
+                if len(page) < self.page_size:
+                    break
+                next_start += self.page_size
+                start_position = next_start
+            self._pages.put_nowait(_END)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._pages.put_nowait(e) # Raised to the consumer after the pages before it
+
+    def __aiter__(self) -> "QBOPaginator":
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        while self._position >= len(self._current):
+            if self._done:
+                raise StopAsyncIteration
+            self.start()
+            if self._holding_page:
+                self._window.release() # Finished with the current page; let the producer fetch another
+                self._holding_page = False
+            item = await self._pages.get()
+            if item is _END or isinstance(item, Exception):
+                self._done = True
+                self._current, self._position = [], 0
+                if item is _END:
+                    raise StopAsyncIteration
+                raise item
+            self._current, self._position, self._holding_page = item, 0, True
+        record = self._current[self._position]
+        self._position += 1
+        return record
+
+    async def to_list(self) -> List[Dict[str, Any]]:
+        """Reads every remaining record into a list (for callers that need them all anyway)."""
+        async with self:
+            return [record async for record in self]
+
+    async def aclose(self):
+        """Stops prefetching; call when abandoning the iteration early (or use `async with`)."""
+        self._done = True
+        self._current = []
+        if self._producer is not None and not self._producer.done():
+            self._producer.cancel()
+            try:
+                await self._producer
+            except asyncio.CancelledError:
+                pass
+
+    async def __aenter__(self) -> "QBOPaginator":
+        return self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+def window_starts(total_count: int, page_size: int = QBO_MAX_PAGE_SIZE) -> List[int]:
+    """STARTPOSITIONs of the pages covering total_count rows (at least one page)."""
+    return list(range(1, max(total_count, 1) + 1, page_size))
+
+def window_sql(query: QBOQuery, start_position: int, page_size: int = QBO_MAX_PAGE_SIZE) -> str:
+    """One window of query. Windows fetched independently need a stable order, so Id is the default."""
+    return dataclasses.replace(query, order_by=query.order_by or "Id", start_position=start_position, max_results=page_size).to_sql()
+
+class QueryCoalescer:
+    """
+    Sends the queries requested during one event loop iteration as a single
+    run_queries({key: sql}) call (e.g. qbo_api.query_entities, i.e. one batch request).
+    """
+
+    def __init__(self, run_queries: Callable[[Dict[str, str]], Awaitable[Dict[str, Any]]]):
+        self._run_queries = run_queries
+        self._pending: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self._flush_scheduled = False
+        self._keys = itertools.count(1)
+        self._tasks = set() # Keeps flush tasks referenced until they finish
+
+    async def run(self, name: str, sql: str) -> Any:
+        """Queues sql and returns its result (e.g. a BatchResult) once the shared request completes."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending[f"{name}-{next(self._keys)}"] = (sql, future)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            loop.call_soon(self._start_flush, loop)
+        return await future
+
+    def _start_flush(self, loop: asyncio.AbstractEventLoop):
+        task = loop.create_task(self._flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self):
+        pending, self._pending, self._flush_scheduled = self._pending, {}, False
+        try:
+            results = await self._run_queries({key: sql for key, (sql, _) in pending.items()})
+        except BaseException as e:
+            for _, future in pending.values():
+                if not future.done():
+                    future.cancel() if isinstance(e, asyncio.CancelledError) else future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        for key, (_, future) in pending.items():
+            if not future.done():
+                future.set_result(results[key])
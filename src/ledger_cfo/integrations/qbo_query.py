@@ -0,0 +1,93 @@
+"""
+QBO SQL query builder with projection pushdown.
+
+QBO's query language accepts an explicit column list ("SELECT Id, TxnDate FROM Invoice"),
+in which case the response only carries those properties. QBOQuery emits such queries and
+project() trims the raw response entities into light records (plain dicts holding just the
+requested fields), so list endpoints never build python-quickbooks objects for rows they
+only read a handful of fields from.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from .qbo_errors import InvalidDataError
+
+FIELD_NAME_REGEX = re.compile(r"^[A-Za-z][A-Za-z0-9]*$") # QBO property names; top-level only
+ALWAYS_SELECTED = ("Id",) # Every light record keeps its ID
+
+def quote(value: Any) -> str:
+    """Quotes a value as a QBO SQL string literal."""
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+def normalize_fields(fields: Optional[Iterable[str]]) -> Optional[List[str]]:
+    """
+    Validates a projection (e.g. from a tool call's fields= argument) and returns it with Id
+    first and duplicates removed. None means all fields. Raises InvalidDataError on names that
+    are not plain QBO property names, so a projection can never alter the query.
+    """
+    if fields is None:
+        return None
+    if isinstance(fields, str):
+        fields = [name.strip() for name in fields.split(",")]
+    names = [name for name in fields if name]
+    invalid = [name for name in names if not isinstance(name, str) or not FIELD_NAME_REGEX.match(name)]
+    if invalid:
+        raise InvalidDataError(f"Invalid field name(s) for a QBO query: {invalid}. Use top-level property names like 'TxnDate'.")
+    return list(dict.fromkeys(list(ALWAYS_SELECTED) + names))
+
+@dataclass
+class QBOQuery:
+    """A QBO SQL SELECT. fields=None selects every property."""
+    entity_name: str
+    fields: Optional[Sequence[str]] = None
+    conditions: List[str] = field(default_factory=list)
+    order_by: Optional[str] = None
+    start_position: Optional[int] = None
+    max_results: Optional[int] = None
+
+    def __post_init__(self):
+        self.fields = normalize_fields(self.fields)
+
+    def where(self, condition: str) -> "QBOQuery":
+        """Adds a raw condition (ANDed with the others). Values must already be quoted."""
+        self.conditions.append(condition)
+        return self
+
+    def where_equals(self, field_name: str, value: Any) -> "QBOQuery":
+        return self.where(f"{field_name} = {quote(value)}")
+
+    def where_in(self, field_name: str, values: Iterable[Any]) -> "QBOQuery":
+        return self.where(f"{field_name} IN ({', '.join(quote(value) for value in values)})")
+
+    def to_sql(self) -> str:
+        columns = ", ".join(self.fields) if self.fields else "*"
+        sql = f"SELECT {columns} FROM {self.entity_name}"
+        if self.conditions:
+            sql += " WHERE " + " AND ".join(self.conditions)
+        if self.order_by:
+            sql += f" ORDERBY {self.order_by}"
+        if self.start_position is not None:
+            sql += f" STARTPOSITION {self.start_position}"
+        if self.max_results is not None:
+            sql += f" MAXRESULTS {self.max_results}"
+        return sql
+
+    def count_sql(self) -> str:
+        """The matching SELECT COUNT(*), answered with QueryResponse.totalCount."""
+        sql = f"SELECT COUNT(*) FROM {self.entity_name}"
+        if self.conditions:
+            sql += " WHERE " + " AND ".join(self.conditions)
+        return sql
+
+    def __str__(self) -> str:
+        return self.to_sql()
+
+def project(raw_entity: Dict[str, Any], fields: Optional[Sequence[str]]) -> Dict[str, Any]:
+    """Returns the light record for a raw entity: only the requested fields (missing ones as None)."""
+    if fields is None:
+        return raw_entity
+    return {name: raw_entity.get(name) for name in fields}
+
+def project_all(raw_entities: Iterable[Dict[str, Any]], fields: Optional[Sequence[str]]) -> List[Dict[str, Any]]:
+    return [project(raw_entity, fields) for raw_entity in raw_entities]
@@ -0,0 +1,198 @@
+"""
+Realm-scoped rate limiting for QBO calls.
+
+QBO throttles each realm at 500 requests per minute and 10 concurrent requests. Every SDK
+call made through qbo_api._sync_qbo_call passes through QBORateLimiter.call (and every
+async transport request through QBORateLimiter.run), which:
+
+  * holds one of max_concurrent slots for the realm while the request is in flight,
+  * takes a token from a token bucket refilled at the realm's current rate,
+  * adapts that rate AIMD-style: halved on every rate-limit error (with a pause and a retry),
+    increased additively on every success until it is back at the configured ceiling.
+
+Token accounting lives in a RateLimitBackend. The default in-memory backend is shared by
+all coroutines and threads of one process; a multi-process deployment plugs in a backend
+that keeps the buckets in a shared store (set_backend). The concurrency cap is per process.
+"""
+import abc
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from ..core import metrics
+from ..core.executors import InstrumentedExecutor, operation_name
+from .qbo_concurrency import QBO_MAX_CONCURRENT_REQUESTS_PER_REALM
+from .qbo_errors import RateLimitError, map_qbo_exception
+
+logger = logging.getLogger(__name__)
+
+QBO_RATE_LIMIT_PER_MINUTE = float(os.getenv("QBO_RATE_LIMIT_PER_MINUTE", "500"))
+QBO_RATE_LIMIT_BURST = float(os.getenv("QBO_RATE_LIMIT_BURST", "50")) # Bucket capacity
+QBO_RATE_LIMIT_MIN_PER_MINUTE = float(os.getenv("QBO_RATE_LIMIT_MIN_PER_MINUTE", "30")) # Floor for multiplicative decrease
+QBO_RATE_LIMIT_ADDITIVE_INCREASE = float(os.getenv("QBO_RATE_LIMIT_ADDITIVE_INCREASE", "5")) # Requests/minute regained per success
+QBO_RATE_LIMIT_MAX_RETRIES = int(os.getenv("QBO_RATE_LIMIT_MAX_RETRIES", "3"))
+QBO_RATE_LIMIT_BASE_BACKOFF_SECONDS = float(os.getenv("QBO_RATE_LIMIT_BASE_BACKOFF_SECONDS", "1.0"))
+# Threads for blocking SDK calls; separate from asyncio's default executor so Claude consultations
+# and other to_thread work cannot starve QBO calls (or the other way round)
+QBO_SDK_EXECUTOR_WORKERS = int(os.getenv("QBO_SDK_EXECUTOR_WORKERS", str(2 * QBO_MAX_CONCURRENT_REQUESTS_PER_REALM)))
+
+# --- Backends ---
+
+class RateLimitBackend(abc.ABC):
+    """Token bucket storage. Implementations must make reserve() atomic per key."""
+
+    @abc.abstractmethod
+    async def reserve(self, key: str, rate_per_second: float, capacity: float) -> float:
+        """
+        Takes one token from the bucket for key and returns how many seconds the caller must
+        wait before using it (0 if a token was available). Tokens may go negative so waiting
+        callers are served in reservation order.
+        """
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Process-local buckets, safe across coroutines, event loops and threads."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._buckets: Dict[str, Tuple[float, float]] = {} # key -> (tokens, last refill time)
+        self._lock = threading.Lock()
+
+    async def reserve(self, key: str, rate_per_second: float, capacity: float) -> float:
+        with self._lock:
+            now = self._clock()
+            tokens, last_refill = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - last_refill) * rate_per_second) - 1
+            self._buckets[key] = (tokens, now)
+        return 0.0 if tokens >= 0 else -tokens / rate_per_second
+
+# --- Limiter ---
+
+sdk_executor = InstrumentedExecutor("qbo_sdk", QBO_SDK_EXECUTOR_WORKERS)
+
+@dataclass
+class _RealmState:
+    """AIMD state of one realm."""
+    rate_per_minute: float
+    paused_until: float = 0.0 # monotonic time before which no request may start
+
+def _is_rate_limit_error(error: Exception) -> bool:
+    if isinstance(error, RateLimitError):
+        return True
+    return isinstance(map_qbo_exception(error), RateLimitError)
+
+class QBORateLimiter:
+    """Token bucket + concurrency cap + AIMD backoff, per realm."""
+
+    def __init__(self, backend: Optional[RateLimitBackend] = None,
+                 requests_per_minute: float = QBO_RATE_LIMIT_PER_MINUTE,
+                 burst: float = QBO_RATE_LIMIT_BURST,
+                 max_concurrent: int = QBO_MAX_CONCURRENT_REQUESTS_PER_REALM,
+                 min_requests_per_minute: float = QBO_RATE_LIMIT_MIN_PER_MINUTE,
+                 additive_increase: float = QBO_RATE_LIMIT_ADDITIVE_INCREASE,
+                 max_retries: int = QBO_RATE_LIMIT_MAX_RETRIES,
+                 base_backoff: float = QBO_RATE_LIMIT_BASE_BACKOFF_SECONDS,
+                 executor: Optional[InstrumentedExecutor] = None):
+        self.backend = backend or InMemoryRateLimitBackend()
+        self.executor = executor or sdk_executor
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.min_requests_per_minute = min_requests_per_minute
+        self.additive_increase = additive_increase
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self._realms: Dict[str, _RealmState] = {}
+        self._state_lock = threading.Lock()
+        # asyncio primitives belong to one event loop, so semaphores are tracked per loop
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+
+    def _state(self, realm_id: str) -> _RealmState:
+        with self._state_lock:
+            if realm_id not in self._realms:
+                self._realms[realm_id] = _RealmState(rate_per_minute=self.requests_per_minute)
+            return self._realms[realm_id]
+
+    def _semaphore(self, realm_id: str) -> asyncio.Semaphore:
+        semaphores = self._semaphores.setdefault(asyncio.get_running_loop(), {})
+        if realm_id not in semaphores:
+            semaphores[realm_id] = asyncio.Semaphore(self.max_concurrent)
+        return semaphores[realm_id]
+
+    def current_rate(self, realm_id: Any) -> float:
+        """The realm's current allowed rate in requests per minute."""
+        return self._state(str(realm_id)).rate_per_minute
+
+    async def _wait_for_token(self, realm_id: str):
+        state = self._state(realm_id)
+        pause = state.paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+        wait = await self.backend.reserve(f"qbo:{realm_id}", state.rate_per_minute / 60.0, self.burst)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def _on_success(self, realm_id: str):
+        state = self._state(realm_id)
+        if state.rate_per_minute < self.requests_per_minute:
+            with self._state_lock:
+                state.rate_per_minute = min(self.requests_per_minute, state.rate_per_minute + self.additive_increase)
+
+    def _on_rate_limited(self, realm_id: str, attempt: int) -> float:
+        """Halves the realm's rate, pauses the realm and returns the backoff before the retry."""
+        state = self._state(realm_id)
+        backoff = self.base_backoff * (2 ** attempt) * random.uniform(0.8, 1.2)
+        with self._state_lock:
+            state.rate_per_minute = max(self.min_requests_per_minute, state.rate_per_minute / 2)
+            state.paused_until = max(state.paused_until, time.monotonic() + backoff)
+        metrics.counter("qbo_rate_limited_total", realm=realm_id).inc()
+        logger.warning(f"QBO rate limit hit for realm {realm_id}; rate lowered to {state.rate_per_minute:.0f}/min, retrying in {backoff:.2f}s")
+        return backoff
+
+    async def call(self, realm_id: Any, func: Callable, *args, operation: Optional[str] = None, **kwargs) -> Any:
+        """
+        Runs a blocking QBO SDK call on the limiter's executor under the realm's limits.
+        Rate-limit errors are retried up to max_retries times; other errors propagate unchanged.
+        """
+        operation = operation or operation_name(func)
+        return await self.run(realm_id, lambda: self.executor.run(func, *args, operation=operation, **kwargs), operation=operation)
+
+    async def run(self, realm_id: Any, call: Callable[[], Awaitable[Any]], operation: str = "QBO call") -> Any:
+        """
+        Awaits call() under the realm's limits, e.g. a request on the async HTTP transport.
+        call is invoked once per attempt, so it must return a fresh awaitable each time.
+        """
+        realm_id = str(realm_id)
+        queue_wait = metrics.histogram("qbo_rate_limiter_queue_wait_seconds", realm=realm_id)
+        attempt = 0
+        while True:
+            queued_at = time.monotonic()
+            async with self._semaphore(realm_id):
+                await self._wait_for_token(realm_id)
+                queue_wait.observe(time.monotonic() - queued_at)
+                try:
+                    result = await call()
+                except Exception as e:
+                    if not _is_rate_limit_error(e):
+                        raise
+                    backoff = self._on_rate_limited(realm_id, attempt) # Slow the realm down even if we give up
+                    if attempt >= self.max_retries:
+                        raise
+                else:
+                    self._on_success(realm_id)
+                    return result
+            # Back off outside the slot so other requests (after the pause) are not blocked on it
+            logger.debug(f"Retrying QBO {operation} for realm {realm_id} (attempt {attempt + 2})")
+            await asyncio.sleep(backoff)
+            attempt += 1
+
+rate_limiter = QBORateLimiter()
+
+def set_backend(backend: RateLimitBackend):
+    """Swaps the token bucket store, e.g. for one shared between worker processes."""
+    rate_limiter.backend = backend
@@ -0,0 +1,210 @@
+"""
+QBO financial reports: request parameters, date ranges, closed periods and parsing.
+
+qbo_api.get_report fetches GET /reports/<name> for the reports in REPORTS and caches the
+parsed result by (report, date range, accounting method, summarize_column_by). How long
+depends on the period:
+
+  * Closed periods (ending on or before the books' closing date: QBO_BOOKS_CLOSED_THROUGH,
+    or the BookCloseDate in the company's QBO Preferences) cannot change any more, so they
+    are cached for QBO_CLOSED_REPORT_TTL_SECONDS and never fetched twice.
+  * Open periods are cached briefly and evicted by writes to the entities they total
+    (REPORT_SOURCE_ENTITIES).
+
+QBO returns reports as nested Rows/ColData sections; parse_report flattens them into one
+row per line (see ROW_FIELDS), which is much smaller and easy to sum or compare.
+"""
+import calendar
+import datetime
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+QBO_CLOSED_REPORT_TTL_SECONDS = float(os.getenv("QBO_CLOSED_REPORT_TTL_SECONDS", str(30 * 24 * 3600))) # 30 days
+QBO_OPEN_REPORT_TTL_SECONDS = float(os.getenv("QBO_OPEN_REPORT_TTL_SECONDS", "300")) # 5 minutes
+# The books' closing date as YYYY-MM-DD; overrides the one set in QBO (Account and Settings > Advanced > Close the books)
+QBO_BOOKS_CLOSED_THROUGH = os.getenv("QBO_BOOKS_CLOSED_THROUGH") or None
+
+ACCOUNTING_METHODS = ("Accrual", "Cash")
+
+@dataclass(frozen=True)
+class ReportSpec:
+    """The request parameters one QBO report accepts."""
+    point_in_time: bool = False # Takes a report_date (the range's end) instead of start_date/end_date
+    accounting_method: bool = True
+    summarize_column_by: bool = True
+
+REPORTS = {
+    "ProfitAndLoss": ReportSpec(),
+    "BalanceSheet": ReportSpec(),
+    "AgedReceivables": ReportSpec(point_in_time=True, accounting_method=False, summarize_column_by=False),
+    "CustomerBalance": ReportSpec(point_in_time=True),
+}
+
+# Transaction types whose writes change open-period report figures
+REPORT_SOURCE_ENTITIES = ("Invoice", "Payment", "SalesReceipt", "Purchase", "CreditMemo", "RefundReceipt", "Bill", "JournalEntry")
+
+# Leading fields of every parsed row; the report's value columns follow
+ROW_FIELDS = ("kind", "depth", "group", "label", "id")
+
+# --- Request parameters ---
+
+def report_params(report_name: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                  accounting_method: Optional[str] = None, summarize_column_by: Optional[str] = None) -> Dict[str, str]:
+    """
+    The query string for a report request, holding only the parameters the report accepts
+    (so requests that QBO would answer identically get the same cache key).
+    """
+    spec = REPORTS.get(report_name)
+    if spec is None:
+        raise ValueError(f"Unknown report '{report_name}'. Expected one of {list(REPORTS)}.")
+    params = {}
+    if spec.point_in_time:
+        if end_date:
+            params["report_date"] = end_date
+    else:
+        if start_date:
+            params["start_date"] = start_date
+        if end_date:
+            params["end_date"] = end_date
+    if accounting_method and spec.accounting_method:
+        if accounting_method not in ACCOUNTING_METHODS:
+            raise ValueError(f"Unknown accounting method '{accounting_method}'. Expected one of {list(ACCOUNTING_METHODS)}.")
+        params["accounting_method"] = accounting_method
+    if summarize_column_by and spec.summarize_column_by:
+        params["summarize_column_by"] = summarize_column_by
+    return params
+
+# --- Date ranges ---
+
+_EXPLICIT_RANGE = re.compile(r"(\d{4}-\d{2}-\d{2})\s*(?:to|through|until|-)\s*(\d{4}-\d{2}-\d{2})", re.IGNORECASE)
+
+def _month_range(year: int, month: int) -> Tuple[datetime.date, datetime.date]:
+    return datetime.date(year, month, 1), datetime.date(year, month, calendar.monthrange(year, month)[1])
+
+def _quarter_range(year: int, quarter: int) -> Tuple[datetime.date, datetime.date]:
+    first_month = 3 * (quarter - 1) + 1
+    return _month_range(year, first_month)[0], _month_range(year, first_month + 2)[1]
+
+def parse_date_range(text: Optional[str], today: Optional[datetime.date] = None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Turns a phrase like "last month", "this quarter", "last year" or "2023-01-01 to 2023-03-31"
+    into (start_date, end_date) as YYYY-MM-DD strings covering whole calendar periods.
+    Returns (None, None) when the phrase is not understood.
+    """
+    if not text:
+        return None, None
+    today = today or datetime.date.today()
+    phrase = text.strip().lower()
+
+    explicit = _EXPLICIT_RANGE.search(phrase)
+    if explicit:
+        try:
+            start, end = (datetime.date.fromisoformat(value) for value in explicit.groups())
+        except ValueError:
+            logger.warning(f"Invalid date in range '{text}'")
+            return None, None
+        if start > end:
+            logger.warning(f"Date range '{text}' ends before it starts")
+            return None, None
+        return start.isoformat(), end.isoformat()
+
+    quarter = (today.month - 1) // 3 + 1
+    if "this month" in phrase or "month to date" in phrase:
+        start, end = _month_range(today.year, today.month)
+    elif "last month" in phrase:
+        previous = today.replace(day=1) - datetime.timedelta(days=1)
+        start, end = _month_range(previous.year, previous.month)
+    elif "this quarter" in phrase:
+        start, end = _quarter_range(today.year, quarter)
+    elif "last quarter" in phrase:
+        start, end = _quarter_range(today.year, quarter - 1) if quarter > 1 else _quarter_range(today.year - 1, 4)
+    elif "this year" in phrase or "year to date" in phrase:
+        start, end = datetime.date(today.year, 1, 1), datetime.date(today.year, 12, 31)
+    elif "last year" in phrase:
+        start, end = datetime.date(today.year - 1, 1, 1), datetime.date(today.year - 1, 12, 31)
+    else:
+        return None, None
+    return start.isoformat(), end.isoformat()
+
+def period_is_closed(end_date: Optional[str], books_closed_through: Optional[str] = None) -> bool:
+    """
+    Whether a report period ending on end_date can no longer change: it ends on or before the
+    books' closing date. However old, a period of books that were never closed stays open
+    (backdated invoices and late bills still land in it). Open-ended periods are never closed.
+    """
+    books_closed_through = books_closed_through or QBO_BOOKS_CLOSED_THROUGH
+    if not end_date or not books_closed_through:
+        return False
+    return datetime.date.fromisoformat(end_date) <= datetime.date.fromisoformat(books_closed_through[:10])
+
+# --- Parsing ---
+
+def _cell_value(cell: Dict[str, Any]) -> Any:
+    """Amount cells become floats, blanks None; anything else (names, dates) stays text."""
+    value = cell.get("value", "")
+    if value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+def _column_title(column: Dict[str, Any]) -> str:
+    if column.get("ColTitle"):
+        return column["ColTitle"]
+    col_key = next((m.get("Value") for m in column.get("MetaData", []) if m.get("Name") == "ColKey"), None)
+    return col_key or column.get("ColType", "")
+
+def _flatten(rows: List[Dict[str, Any]], depth: int, group: Optional[str], out: List[list]):
+    for row in rows:
+        row_group = row.get("group") or group
+        if "ColData" in row: # A data line
+            cells = row["ColData"]
+            out.append(["data", depth, row_group, cells[0].get("value"), cells[0].get("id")] + [_cell_value(c) for c in cells[1:]])
+            continue
+        header = row.get("Header", {}).get("ColData")
+        if header:
+            out.append(["header", depth, row_group, header[0].get("value"), header[0].get("id")] + [_cell_value(c) for c in header[1:]])
+        _flatten(row.get("Rows", {}).get("Row", []), depth + 1, row_group, out)
+        summary = row.get("Summary", {}).get("ColData")
+        if summary:
+            out.append(["summary", depth, row_group, summary[0].get("value"), None] + [_cell_value(c) for c in summary[1:]])
+
+def parse_report(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Flattens a QBO report response into
+    {"report", "start_date", "end_date", "accounting_method", "currency", "columns", "rows", "totals"}.
+    Each row is a list of ROW_FIELDS followed by one value per column: kind is "header", "data"
+    or "summary", depth the section nesting level, group the QBO section (e.g. "Income").
+    totals maps each section group to its summary values (e.g. totals["NetIncome"]).
+    """
+    header = raw.get("Header", {})
+    columns = raw.get("Columns", {}).get("Column", [])
+    rows: List[list] = []
+    _flatten(raw.get("Rows", {}).get("Row", []), 0, None, rows)
+    return {
+        "report": header.get("ReportName"),
+        "start_date": header.get("StartPeriod"),
+        "end_date": header.get("EndPeriod"),
+        "accounting_method": header.get("ReportBasis"),
+        "currency": header.get("Currency"),
+        "columns": [_column_title(column) for column in columns[1:]], # The first column holds the row labels
+        "rows": rows,
+        "totals": {row[2]: row[len(ROW_FIELDS):] for row in rows if row[0] == "summary" and row[2]},
+    }
+
+def format_summary(report: Dict[str, Any]) -> str:
+    """Plain-text summary of a parsed report: its top-level totals, last (total) column, e.g. for email replies."""
+    lines = [f"{report.get('report')} ({report.get('accounting_method') or 'default'} basis)"]
+    for row in report["rows"]:
+        kind, depth, _, label, _ = row[:len(ROW_FIELDS)]
+        values = row[len(ROW_FIELDS):]
+        if kind == "summary" and depth == 0 and values:
+            amount = values[-1]
+            lines.append(f"{label}: {amount:,.2f}" if isinstance(amount, float) else f"{label}: {amount or ''}")
+    return "\n".join(lines)
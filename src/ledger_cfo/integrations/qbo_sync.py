@@ -0,0 +1,142 @@
+"""
+Change Data Capture (CDC) sync of QBO entities into local mirror tables.
+
+Each mirrored entity keeps a high-water mark in qbo_sync_state. An incremental sync makes
+one GET /cdc call for every entity whose mark is recent enough and bulk-upserts the changed
+rows (deleted entities are removed from the mirror). Entities that have never been synced,
+whose mark is older than QBO's CDC look-back window, or whose CDC response hit QBO's
+per-entity cap are fully reloaded with a bulk read (qbo_api.bulk_read_entities) instead.
+warm_directory runs the customer and vendor part of this at startup.
+
+The sync only flushes; callers own the transaction and commit it.
+"""
+import datetime
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from quickbooks.client import QuickBooks
+
+from ..core import crud
+from . import qbo_directory
+from .qbo_errors import map_qbo_exception
+from .qbo_api import bulk_read_entities, _sync_qbo_call
+from .qbo_query import QBOQuery
+from .qbo_mirror import MIRRORED_ENTITIES, apply_mirror_changes, parse_qbo_datetime
+
+logger = logging.getLogger(__name__)
+
+CDC_LOOKBACK_LIMIT = datetime.timedelta(days=30) # QBO only answers CDC for the last 30 days
+CDC_MAX_ENTITIES_PER_RESPONSE = 1000 # QBO truncates each entity's CDC result at this size
+CDC_CLOCK_SKEW_MARGIN = datetime.timedelta(minutes=1) # Overlap used when the response has no server time
+FULL_SYNC_PAGE_SIZE = 1000 # QBO's MAXRESULTS ceiling
+
+# --- CDC parsing ---
+
+def parse_cdc_response(payload: Dict[str, Any]) -> Dict[str, Tuple[List[Dict[str, Any]], List[str]]]:
+    """
+    Splits a CDC response into, per entity name, the changed raw entities and the IDs of deleted ones.
+    QBO marks deleted entities with status 'Deleted' and only includes their Id and MetaData.
+    """
+    changes: Dict[str, Tuple[List[Dict[str, Any]], List[str]]] = {}
+    for cdc_response in (payload or {}).get('CDCResponse', []):
+        for query_response in cdc_response.get('QueryResponse', []):
+            for entity_name, entities in query_response.items():
+                if not isinstance(entities, list):
+                    continue # startPosition, maxResults, totalCount
+                upserts, deleted_ids = changes.setdefault(entity_name, ([], []))
+                for raw in entities:
+                    if raw.get('status') == 'Deleted':
+                        deleted_ids.append(raw['Id'])
+                    else:
+                        upserts.append(raw)
+    return changes
+
+def format_changed_since(high_water_mark: datetime.datetime) -> str:
+    """Formats a naive UTC high-water mark for the changedSince parameter."""
+    return high_water_mark.replace(microsecond=0).isoformat() + 'Z'
+
+# --- Sync ---
+
+async def _full_reload(qbo_client: QuickBooks, db: Session, entity_names: List[str]) -> Dict[str, Dict[str, int]]:
+    """
+    Reloads entities from scratch with a bulk read (COUNT(*) and first pages of all entities in one
+    round trip, then the remaining pages concurrently), then removes mirror rows that QBO no longer returns.
+    """
+    fetched = await bulk_read_entities(qbo_client, {name: QBOQuery(name) for name in entity_names}, page_size=FULL_SYNC_PAGE_SIZE)
+
+    stats = {}
+    for name, raws in fetched.items():
+        spec = MIRRORED_ENTITIES[name]
+        seen_ids = {raw['Id'] for raw in raws}
+        stale_ids = [qbo_id for qbo_id in db.execute(select(getattr(spec.model, spec.key_column))).scalars() if qbo_id not in seen_ids]
+        stats[name] = apply_mirror_changes(db, name, raws, stale_ids)
+        logger.info(f"Full reload of {name}: {len(raws)} rows, {len(stale_ids)} stale rows removed.")
+    return stats
+
+async def sync_qbo_mirror(qbo_client: QuickBooks, db: Session, entities: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Brings the local mirror up to date for the given entities (default: all of MIRRORED_ENTITIES).
+    Returns per-entity stats: {'mode': 'cdc'|'full', 'upserted': n, 'deleted': n}.
+    The caller must commit the session.
+    """
+    entity_names = entities or list(MIRRORED_ENTITIES)
+    unknown = [name for name in entity_names if name not in MIRRORED_ENTITIES]
+    if unknown:
+        raise ValueError(f"Entities are not mirrored: {unknown}")
+
+    started_at = datetime.datetime.utcnow()
+    states = crud.get_sync_states(db)
+    cdc_entities = [
+        name for name in entity_names
+        if name in states and started_at - states[name].high_water_mark < CDC_LOOKBACK_LIMIT
+    ]
+    full_entities = [name for name in entity_names if name not in cdc_entities]
+    stats: Dict[str, Dict[str, Any]] = {}
+    new_high_water_mark = started_at - CDC_CLOCK_SKEW_MARGIN
+
+    if cdc_entities:
+        changed_since = min(states[name].high_water_mark for name in cdc_entities)
+        logger.info(f"Running CDC sync for {cdc_entities} since {changed_since}.")
+        try:
+            payload = await _sync_qbo_call(qbo_client.change_data_capture, ",".join(cdc_entities), format_changed_since(changed_since))
+        except Exception as e:
+            raise map_qbo_exception(e, context="CDC sync") from e
+
+        # The server time of the response is the safest next changedSince (no client clock skew)
+        server_time = parse_qbo_datetime((payload or {}).get('time'))
+        if server_time:
+            new_high_water_mark = server_time
+        changes = parse_cdc_response(payload)
+        for name in cdc_entities:
+            upserts, deleted_ids = changes.get(name, ([], []))
+            if len(upserts) + len(deleted_ids) >= CDC_MAX_ENTITIES_PER_RESPONSE:
+                # The response was truncated; a reload is the only way to be sure nothing was missed
+                logger.warning(f"CDC response for {name} hit the {CDC_MAX_ENTITIES_PER_RESPONSE} entity cap; falling back to a full reload.")
+                full_entities.append(name)
+                continue
+            stats[name] = {'mode': 'cdc', **apply_mirror_changes(db, name, upserts, deleted_ids)}
+
+    if full_entities:
+        logger.info(f"Running full reload for {full_entities}.")
+        for name, entity_stats in (await _full_reload(qbo_client, db, full_entities)).items():
+            stats[name] = {'mode': 'full', **entity_stats}
+
+    for name in entity_names:
+        crud.update_sync_state(db, name, new_high_water_mark)
+    qbo_directory.invalidate(entity_names)
+    logger.info(f"QBO mirror sync finished: {stats}")
+    return stats
+
+async def warm_directory(qbo_client: QuickBooks, db: Session) -> Dict[str, Dict[str, Any]]:
+    """
+    Startup warm-up: syncs every customer and vendor into the mirror (a paged bulk read the
+    first time, CDC afterwards) and loads the in-process name directory from it, so
+    find_or_create_customer/vendor answer known names without touching the network.
+    The caller must commit the session.
+    """
+    stats = await sync_qbo_mirror(qbo_client, db, list(qbo_directory.DIRECTORY_INDEXES))
+    for index in qbo_directory.DIRECTORY_INDEXES.values():
+        index.load_from_db(db)
+    return stats
@@ -3,4 +3,8 @@
 from .customer import CustomerCache
 from .pending_action import PendingAction
 from .vendor_cache import VendorCache
-from .account_cache import AccountCache 
\ No newline at end of file
+from .account_cache import AccountCache 
+from .item_mirror import ItemMirror
+from .transaction_mirror import InvoiceMirror, PaymentMirror, EstimateMirror, SalesReceiptMirror, PurchaseMirror
+from .sync_state import QBOSyncState
+from .qbo_cache_entry import QBOCacheEntry, QBOCacheSetMember
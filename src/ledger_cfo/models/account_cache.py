@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, func
+from sqlalchemy import Column, String, DateTime, Boolean, Numeric, JSON, func
 from sqlalchemy.orm import Mapped, mapped_column
 from datetime import datetime
 
@@ -13,6 +13,14 @@ class AccountCache(Base):
     account_type: Mapped[str] = mapped_column(String, nullable=True) # e.g., Expense, Bank, Accounts Payable
     account_sub_type: Mapped[str] = mapped_column(String, nullable=True) # e.g., Checking, Credit Card, Travel
     classification: Mapped[str] = mapped_column(String, nullable=True) # e.g., Liability, Equity, Revenue, Expense
+    # Mirror columns, filled by the QBO CDC sync (integrations/qbo_sync.py)
+    fully_qualified_name: Mapped[str] = mapped_column(String, nullable=True) # e.g., "Utilities:Gas and Electric"
+    parent_account_id: Mapped[str] = mapped_column(String, nullable=True) # QBO ID of the parent for sub-accounts
+    active: Mapped[bool] = mapped_column(Boolean, nullable=True)
+    current_balance: Mapped[float] = mapped_column(Numeric(18, 2, asdecimal=False), nullable=True)
+    sync_token: Mapped[str] = mapped_column(String, nullable=True)
+    qbo_last_updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=True) # MetaData.LastUpdatedTime (UTC)
+    raw_data: Mapped[dict] = mapped_column(JSON, nullable=True) # Full QBO entity as returned by the API
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
     last_synced_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, func
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Numeric, JSON, func
 from sqlalchemy.orm import relationship
 import datetime
 
@@ -11,6 +11,16 @@ class CustomerCache(Base):
     qbo_customer_id = Column(String, unique=True, index=True, nullable=False)
     display_name = Column(String, index=True, nullable=False)
     email_address = Column(String, nullable=True)
+    # Mirror columns, filled by the QBO CDC sync (integrations/qbo_sync.py)
+    company_name = Column(String, nullable=True)
+    given_name = Column(String, nullable=True)
+    family_name = Column(String, nullable=True)
+    phone_number = Column(String, nullable=True)
+    balance = Column(Numeric(18, 2, asdecimal=False), nullable=True)
+    active = Column(Boolean, nullable=True)
+    sync_token = Column(String, nullable=True)
+    qbo_last_updated_at = Column(DateTime, nullable=True) # MetaData.LastUpdatedTime (UTC)
+    raw_data = Column(JSON, nullable=True) # Full QBO entity as returned by the API
     last_synced_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
     def __repr__(self):
@@ -0,0 +1,28 @@
+from sqlalchemy import String, DateTime, Boolean, Numeric, JSON
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime
+
+from ..core.database import Base
+
+class ItemMirror(Base):
+    __tablename__ = "item_mirror"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    qbo_item_id: Mapped[str] = mapped_column(String, unique=True, nullable=False, index=True)
+    name: Mapped[str] = mapped_column(String, nullable=False, index=True)
+    sku: Mapped[str] = mapped_column(String, nullable=True)
+    item_type: Mapped[str] = mapped_column(String, nullable=True) # e.g., Service, Inventory, NonInventory
+    description: Mapped[str] = mapped_column(String, nullable=True)
+    unit_price: Mapped[float] = mapped_column(Numeric(18, 2, asdecimal=False), nullable=True)
+    income_account_id: Mapped[str] = mapped_column(String, nullable=True)
+    expense_account_id: Mapped[str] = mapped_column(String, nullable=True)
+    active: Mapped[bool] = mapped_column(Boolean, nullable=True)
+    sync_token: Mapped[str] = mapped_column(String, nullable=True)
+    qbo_last_updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=True) # MetaData.LastUpdatedTime (UTC)
+    raw_data: Mapped[dict] = mapped_column(JSON, nullable=True) # Full QBO entity as returned by the API
+    last_synced_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+    )
+
+    def __repr__(self) -> str:
+        return f"<ItemMirror(id={self.id}, qbo_id={self.qbo_item_id}, name='{self.name}')>"
@@ -0,0 +1,26 @@
+from sqlalchemy import String, Float, LargeBinary
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..core.database import Base
+
+class QBOCacheEntry(Base):
+    """A value of the shared (L2) QBO read cache, stored as serialized bytes."""
+    __tablename__ = "qbo_cache_entries"
+
+    cache_key: Mapped[str] = mapped_column(String(512), primary_key=True)
+    value: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    expires_at: Mapped[float] = mapped_column(Float, nullable=True, index=True) # Unix time; NULL never expires
+
+    def __repr__(self) -> str:
+        return f"<QBOCacheEntry(key='{self.cache_key}', expires_at={self.expires_at})>"
+
+class QBOCacheSetMember(Base):
+    """A member of a set in the shared QBO cache (used for tag -> cache key sets)."""
+    __tablename__ = "qbo_cache_set_members"
+
+    set_key: Mapped[str] = mapped_column(String(512), primary_key=True)
+    member: Mapped[str] = mapped_column(String(512), primary_key=True)
+    expires_at: Mapped[float] = mapped_column(Float, nullable=True, index=True) # Set-wide expiry, copied to each member
+
+    def __repr__(self) -> str:
+        return f"<QBOCacheSetMember(set='{self.set_key}', member='{self.member}')>"
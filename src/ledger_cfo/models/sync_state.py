@@ -0,0 +1,18 @@
+from sqlalchemy import String, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime
+
+from ..core.database import Base
+
+class QBOSyncState(Base):
+    """Per-entity high-water mark for the QBO CDC mirror sync."""
+    __tablename__ = "qbo_sync_state"
+
+    entity_name: Mapped[str] = mapped_column(String(50), primary_key=True) # e.g., Customer, Invoice
+    high_water_mark: Mapped[datetime] = mapped_column(DateTime, nullable=False) # QBO time to use as next changedSince (UTC)
+    last_synced_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+    ) # When the mirror for this entity was last brought up to date
+
+    def __repr__(self) -> str:
+        return f"<QBOSyncState(entity='{self.entity_name}', high_water_mark='{self.high_water_mark}')>"
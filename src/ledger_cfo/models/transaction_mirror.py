@@ -0,0 +1,92 @@
+from sqlalchemy import String, Date, DateTime, Boolean, Numeric, JSON, Index
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import date, datetime
+
+from ..core.database import Base
+
+class TransactionMirrorMixin:
+    """Columns shared by all mirrored transactions (Invoice, Payment, Estimate, SalesReceipt, Purchase)."""
+    id: Mapped[int] = mapped_column(primary_key=True)
+    customer_id: Mapped[str] = mapped_column(String, nullable=True, index=True) # CustomerRef.value
+    customer_name: Mapped[str] = mapped_column(String, nullable=True) # CustomerRef.name
+    txn_date: Mapped[date] = mapped_column(Date, nullable=True)
+    total_amt: Mapped[float] = mapped_column(Numeric(18, 2, asdecimal=False), nullable=True)
+    sync_token: Mapped[str] = mapped_column(String, nullable=True)
+    qbo_last_updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=True) # MetaData.LastUpdatedTime (UTC)
+    raw_data: Mapped[dict] = mapped_column(JSON, nullable=True) # Full QBO entity as returned by the API
+    last_synced_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+    )
+
+class InvoiceMirror(TransactionMirrorMixin, Base):
+    __tablename__ = "invoice_mirror"
+
+    qbo_invoice_id: Mapped[str] = mapped_column(String, unique=True, nullable=False, index=True)
+    doc_number: Mapped[str] = mapped_column(String, nullable=True)
+    due_date: Mapped[date] = mapped_column(Date, nullable=True)
+    balance: Mapped[float] = mapped_column(Numeric(18, 2, asdecimal=False), nullable=True)
+
+    __table_args__ = (
+        Index('ix_invoice_mirror_customer_txn_date', 'customer_id', 'txn_date'),
+    )
+
+    def __repr__(self) -> str:
+        return f"<InvoiceMirror(id={self.id}, qbo_id={self.qbo_invoice_id}, customer={self.customer_id}, total={self.total_amt})>"
+
+class PaymentMirror(TransactionMirrorMixin, Base):
+    __tablename__ = "payment_mirror"
+
+    qbo_payment_id: Mapped[str] = mapped_column(String, unique=True, nullable=False, index=True)
+    unapplied_amt: Mapped[float] = mapped_column(Numeric(18, 2, asdecimal=False), nullable=True)
+
+    __table_args__ = (
+        Index('ix_payment_mirror_customer_txn_date', 'customer_id', 'txn_date'),
+    )
+
+    def __repr__(self) -> str:
+        return f"<PaymentMirror(id={self.id}, qbo_id={self.qbo_payment_id}, customer={self.customer_id}, total={self.total_amt})>"
+
+class EstimateMirror(TransactionMirrorMixin, Base):
+    __tablename__ = "estimate_mirror"
+
+    qbo_estimate_id: Mapped[str] = mapped_column(String, unique=True, nullable=False, index=True)
+    doc_number: Mapped[str] = mapped_column(String, nullable=True)
+    txn_status: Mapped[str] = mapped_column(String, nullable=True) # Accepted, Pending, Closed, Rejected
+    expiration_date: Mapped[date] = mapped_column(Date, nullable=True)
+
+    __table_args__ = (
+        Index('ix_estimate_mirror_customer_txn_date', 'customer_id', 'txn_date'),
+    )
+
+    def __repr__(self) -> str:
+        return f"<EstimateMirror(id={self.id}, qbo_id={self.qbo_estimate_id}, customer={self.customer_id}, status='{self.txn_status}')>"
+
+class SalesReceiptMirror(TransactionMirrorMixin, Base):
+    __tablename__ = "sales_receipt_mirror"
+
+    qbo_sales_receipt_id: Mapped[str] = mapped_column(String, unique=True, nullable=False, index=True)
+    doc_number: Mapped[str] = mapped_column(String, nullable=True)
+
+    __table_args__ = (
+        Index('ix_sales_receipt_mirror_customer_txn_date', 'customer_id', 'txn_date'),
+    )
+
+    def __repr__(self) -> str:
+        return f"<SalesReceiptMirror(id={self.id}, qbo_id={self.qbo_sales_receipt_id}, customer={self.customer_id}, total={self.total_amt})>"
+
+class PurchaseMirror(TransactionMirrorMixin, Base):
+    __tablename__ = "purchase_mirror"
+
+    qbo_purchase_id: Mapped[str] = mapped_column(String, unique=True, nullable=False, index=True)
+    doc_number: Mapped[str] = mapped_column(String, nullable=True)
+    payment_type: Mapped[str] = mapped_column(String, nullable=True) # Cash, Check, CreditCard
+    account_id: Mapped[str] = mapped_column(String, nullable=True) # AccountRef.value: the account paid from
+    entity_id: Mapped[str] = mapped_column(String, nullable=True, index=True) # EntityRef.value, usually the vendor
+    credit: Mapped[bool] = mapped_column(Boolean, nullable=True) # Credit card refunds are Purchases with Credit=true
+
+    __table_args__ = (
+        Index('ix_purchase_mirror_txn_date', 'txn_date'),
+    )
+
+    def __repr__(self) -> str:
+        return f"<PurchaseMirror(id={self.id}, qbo_id={self.qbo_purchase_id}, entity={self.entity_id}, total={self.total_amt})>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, func
+from sqlalchemy import Column, String, DateTime, Boolean, Numeric, JSON, func
 from sqlalchemy.orm import Mapped, mapped_column
 from datetime import datetime
 
@@ -10,7 +10,15 @@ class VendorCache(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     qbo_vendor_id: Mapped[str] = mapped_column(String, unique=True, nullable=False, index=True)
     display_name: Mapped[str] = mapped_column(String, nullable=False, index=True)
-    # Add other relevant fields if needed, e.g., email, phone
+    # Mirror columns, filled by the QBO CDC sync (integrations/qbo_sync.py)
+    company_name: Mapped[str] = mapped_column(String, nullable=True)
+    email_address: Mapped[str] = mapped_column(String, nullable=True)
+    phone_number: Mapped[str] = mapped_column(String, nullable=True)
+    balance: Mapped[float] = mapped_column(Numeric(18, 2, asdecimal=False), nullable=True)
+    active: Mapped[bool] = mapped_column(Boolean, nullable=True)
+    sync_token: Mapped[str] = mapped_column(String, nullable=True)
+    qbo_last_updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=True) # MetaData.LastUpdatedTime (UTC)
+    raw_data: Mapped[dict] = mapped_column(JSON, nullable=True) # Full QBO entity as returned by the API
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
     last_synced_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
@@ -196,17 +196,20 @@ REACT_SYSTEM_PROMPT = """
 You MUST use the exact tool names and parameters specified. All QBO tools are `async` and return data as Python dictionaries or lists of dictionaries (unless otherwise specified).
 
 *   `QBO_GET_CUSTOMER_DETAILS(customer_id: str) -> dict`: Fetches full customer details (name, email, phone, address, balance, etc.). Raises NotFoundError if ID is invalid.
-*   `QBO_GET_CUSTOMER_TRANSACTIONS(customer_id: str, start_date: str = None, end_date: str = None) -> list[dict]`: Fetches a list of transactions (Invoice, Payment, Estimate, SalesReceipt) for a customer within an optional date range (YYYY-MM-DD). Includes key details like ID, date, amount, status/balance.
+*   `QBO_GET_CUSTOMER_TRANSACTIONS(customer_id: str, start_date: str = None, end_date: str = None, fields: list[str] = None) -> list[dict]`: Fetches a list of transactions (Invoice, Payment, Estimate, SalesReceipt) for a customer within an optional date range (YYYY-MM-DD). Includes key details like ID, date, amount, status/balance. Pass `fields` (QBO property names like `['TxnDate', 'TotalAmt']`) to return only those.
 *   `QBO_GET_ESTIMATE_DETAILS(estimate_id: str) -> dict`: Fetches full details of a specific estimate, including line items. Raises NotFoundError if ID is invalid.
-*   `QBO_FIND_ESTIMATES(customer_id: str = None, status: str = None) -> list[dict]`: Finds estimates, filterable by customer ID and status ('Accepted', 'Pending', 'Closed', 'Rejected'). Returns a list of estimate dictionaries.
+*   `QBO_FIND_ESTIMATES(customer_id: str = None, status: str = None, fields: list[str] = None) -> list[dict]`: Finds estimates, filterable by customer ID and status ('Accepted', 'Pending', 'Closed', 'Rejected'). Returns a list of estimate dictionaries; with `fields`, each holds only `Id` and those fields (much smaller).
 *   `QBO_FIND_CUSTOMERS_BY_DETAILS(query: str) -> list[dict]`: Searches for customers based on fragments of name, company, email, or phone. Returns a list of potential matches with IDs and key details. Use this to find a customer ID if you only have a name or other detail.
-*   `QBO_GET_RECENT_TRANSACTIONS_WITH_CUSTOMER_DATA(days: int = 30) -> list[dict]`: Fetches recent transactions (default 30 days, all types) and includes associated customer details dictionary for each. Useful for broad overviews.
+*   `QBO_GET_RECENT_TRANSACTIONS_WITH_CUSTOMER_DATA(days: int = 30, fields: list[str] = None) -> list[dict]`: Fetches recent transactions (default 30 days, all types) and includes associated customer details dictionary for each. Useful for broad overviews. `fields` limits the transaction fields returned.
 *   `QBO_CREATE_INVOICE(customer_id: str, line_items: list[dict], invoice_data: dict = None) -> dict`: Creates an invoice. `line_items` is a list like `[{'Amount': 100.00, 'Description': 'Service X', 'SalesItemLineDetail': {'ItemRef': {'value': 'ITEM_ID'}}}]` (ItemRef is optional). `invoice_data` can contain header fields like `DueDate`. Returns created invoice dictionary including 'Id'.
     **Hint:** For a final invoice representing a remaining balance, a single line item can be used, e.g., `[{'Amount': <calculated_amount>, 'Description': 'Remaining balance for completed project per Estimate #XYZ.'}]`. This avoids needing specific ItemRefs.
 *   `QBO_CREATE_ESTIMATE(customer_id: str, line_items: list[dict], estimate_data: dict = None) -> dict`: Creates an estimate. Similar structure to `QBO_CREATE_INVOICE`. Returns created estimate dictionary including 'Id'.
 *   `QBO_RECORD_PAYMENT(customer_id: str, invoice_id: str, amount: float, payment_data: dict = None) -> dict`: Records a payment against a specific invoice. `payment_data` can contain fields like `TxnDate`, `PaymentMethodRef`. Returns created payment dictionary including 'Id'.
 *   `QBO_SEND_INVOICE(invoice_id: str) -> bool`: Triggers QBO to email the specified invoice to the customer's primary email address. Returns True if the send command was accepted, False otherwise (e.g., invoice not found, customer email missing).
 *   `QBO_VOID_INVOICE(invoice_id: str) -> bool`: **USE WITH EXTREME CAUTION.** Voids a specific invoice. Returns True if successful, False otherwise. Raises InvalidDataError if the invoice cannot be voided (e.g., already paid).
+*   `QBO_GENERATE_PNL(start_date: str, end_date: str, accounting_method: str = None, summarize_column_by: str = None) -> dict`: Profit and Loss report for a date range (YYYY-MM-DD). `accounting_method` is 'Accrual' or 'Cash'; `summarize_column_by` (e.g. 'Month', 'Quarter') splits the figures into columns. Returns `columns`, flattened `rows` and `totals` per section (e.g. `totals['NetIncome']`).
+*   `QBO_GET_REPORT(report_name: str, start_date: str = None, end_date: str = None, accounting_method: str = None, summarize_column_by: str = None) -> dict`: Runs 'ProfitAndLoss', 'BalanceSheet', 'AgedReceivables' or 'CustomerBalance' in the same format. Aging and balance reports are as of `end_date`.
+*   `QBO_GET_AR_AGING(as_of_date: str = None, limit: int = None) -> dict`: Who owes money, for all customers at once: each customer's open balance split into `current`, `1-30`, `31-60`, `61-90` and `91+` days past due, plus `total` and `open_invoices`, largest total first, and company-wide `totals`. Use this (one step) instead of looking up customers' transactions one by one for balance, overdue or collections questions.
 *   `CALCULATE(expression: str) -> float`: Evaluates a simple mathematical expression (e.g., "25296.00 - 7588.80"). Returns the numerical result. Use this for calculating final amounts, remaining balances, etc.
 *   `SEND_DIRECTOR_EMAIL(subject: str, body: str) -> bool`: Sends an email notification to the Director (your boss). Use this to report task completion, errors you cannot resolve, or when clarification is needed.
 
@@ -353,6 +356,21 @@ QBO_TOOLS = [
             }
         }
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "QBO_GET_AR_AGING",
+            "description": "Accounts receivable aging for all customers in one call: open balances per customer in current, 1-30, 31-60, 61-90 and 91+ days past due buckets, largest first, with company totals.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "as_of_date": {"type": "string", "description": "Optional date to age from (YYYY-MM-DD); defaults to today."},
+                    "limit": {"type": "integer", "description": "Optional number of customers to return, largest balances first."}
+                },
+                "required": []
+            }
+        }
+    },
     # Add QBO_FIND_ITEM, QBO_CREATE_PURCHASE etc. if needed by the LLM
 ]
 
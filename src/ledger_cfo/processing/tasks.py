@@ -1,12 +1,13 @@
+import asyncio
+import concurrent.futures
 import logging
 import uuid
 from decimal import Decimal
 from sqlalchemy.orm import Session
-from quickbooks.objects.invoice import Invoice
 from quickbooks.objects.purchase import Purchase
 
 from ..core.constants import Intent
-from ..integrations import qbo_api, gmail_api
+from ..integrations import qbo_api, gmail_api, qbo_reports
 from ..core.config import get_secret
 from ..core import crud # Import crud module
 
@@ -14,6 +15,21 @@ logger = logging.getLogger(__name__)
 
 # --- Helper Functions ---
 
+def _run_async(coro):
+    """Runs a qbo_api coroutine to completion from this synchronous module, also when called inside a running event loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    # asyncio.run cannot nest; give the coroutine its own loop on a helper thread
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
+
+def _qbo_txn_link(qbo_client, txn_type: str, txn_id: str) -> str:
+    """Builds the QBO web UI link for a transaction (e.g. 'invoice', 'estimate')."""
+    host = "app.sandbox.qbo.intuit.com" if getattr(qbo_client, 'sandbox', False) else "app.qbo.intuit.com"
+    return f"https://{host}/app/{txn_type}?txnId={txn_id}"
+
 def _format_confirmation_email_body(action_details: dict, pending_id: str) -> str:
     """Formats the body of the confirmation email."""
     intent_value = action_details.get('intent') # Intent might be stored as string now
@@ -42,33 +58,19 @@ def execute_create_invoice(entities: dict, qbo_client, db_session: Session) -> d
 
     try:
         # 1. Find or create customer (uses cache)
-        customer = qbo_api.find_or_create_customer(customer_name, db_session, qbo_client)
+        customer = _run_async(qbo_api.find_or_create_customer(customer_name, db_session, qbo_client))
         if not customer:
             return {'status': 'FAILED', 'error': f'Could not find or create customer: {customer_name}'}
 
-        # 2. Create Invoice object (using placeholder values for item/account refs)
-        # TODO: Need proper Item and Account references from QBO or config
-        line_detail = {
-            "Amount": float(amount),
-            "DetailType": "SalesItemLineDetail",
-            "SalesItemLineDetail": {
-                "ItemRef": {"value": "1"} # Placeholder - Fetch/config real item ID
-            },
-            "Description": item_desc
-        }
-        invoice = Invoice()
-        invoice.CustomerRef = customer['qbo_customer_ref'] # Assuming find_or_create_customer returns this
-        invoice.Line = [line_detail]
-        # Add due date if present
-        # if entities.get('due_date'): ... parse and add ...
-
-        created_invoice = qbo_api.create_invoice(invoice, qbo_client)
-        logger.info(f"Successfully created invoice ID: {created_invoice.Id}")
+        # 2. Create the invoice; the line's ItemRef is resolved from the item catalog by its description
+        line_items = [{"Amount": float(amount), "Description": item_desc}]
+        created_invoice = _run_async(qbo_api.create_invoice(qbo_client, customer['qbo_customer_id'], line_items, db=db_session))
+        logger.info(f"Successfully created invoice ID: {created_invoice['Id']}")
         # Include customer email if found for potential follow-up
         customer_email = customer.get('email_address')
         result_detail = {
-            'invoice_id': created_invoice.Id,
-            'qbo_link': created_invoice.get_link(),
+            'invoice_id': created_invoice['Id'],
+            'qbo_link': _qbo_txn_link(qbo_client, 'invoice', created_invoice['Id']),
             'customer_name': customer.get('display_name'),
             'customer_email': customer_email,
             'amount': float(amount)
@@ -79,6 +81,38 @@ def execute_create_invoice(entities: dict, qbo_client, db_session: Session) -> d
         logger.error(f"Failed to execute CREATE_INVOICE: {e}", exc_info=True)
         return {'status': 'FAILED', 'error': str(e)}
 
+def execute_create_estimate(entities: dict, qbo_client, db_session: Session) -> dict:
+    """Creates an estimate in QBO for a customer; the line's ItemRef is resolved from the item catalog."""
+    logger.info(f"Attempting to execute CREATE_ESTIMATE with entities: {entities}")
+    customer_name = entities.get('customer_name')
+    amount = entities.get('amount')
+    item_desc = entities.get('item_description', 'Service') # Default item description
+
+    if not customer_name or not amount:
+        logger.error("Missing customer name or amount for creating estimate.")
+        return {'status': 'FAILED', 'error': 'Missing required details: customer_name, amount'}
+
+    try:
+        customer = _run_async(qbo_api.find_or_create_customer(customer_name, db_session, qbo_client))
+        if not customer:
+            return {'status': 'FAILED', 'error': f'Could not find or create customer: {customer_name}'}
+
+        line_items = [{"Amount": float(amount), "Description": item_desc}]
+        created_estimate = _run_async(qbo_api.create_estimate(qbo_client, customer['qbo_customer_id'], line_items, db=db_session))
+        logger.info(f"Successfully created estimate ID: {created_estimate['Id']}")
+        result_detail = {
+            'estimate_id': created_estimate['Id'],
+            'qbo_link': _qbo_txn_link(qbo_client, 'estimate', created_estimate['Id']),
+            'customer_name': customer.get('display_name'),
+            'customer_email': customer.get('email_address'),
+            'amount': float(amount)
+        }
+        return {'status': 'EXECUTED', 'result': result_detail}
+
+    except Exception as e:
+        logger.error(f"Failed to execute CREATE_ESTIMATE: {e}", exc_info=True)
+        return {'status': 'FAILED', 'error': str(e)}
+
 def execute_send_invoice(entities: dict, qbo_client, gmail_service, db_session: Session) -> dict:
     """Placeholder or actual call to send an invoice."""
     logger.info(f"Attempting to execute SEND_INVOICE with entities: {entities}")
@@ -197,7 +231,8 @@ def execute_get_report_pnl(entities: dict, qbo_client) -> dict:
         return {'status': 'FAILED', 'error': f'Could not understand date range: \'{raw_date_range}\'. Try "last month", "this year", or "YYYY-MM-DD to YYYY-MM-DD".'}
 
     try:
-        report_summary = qbo_api.generate_pnl_report(qbo_client, start_date, end_date)
+        report = _run_async(qbo_api.generate_pnl_report(qbo_client, start_date, end_date))
+        report_summary = qbo_reports.format_summary(report)
         logger.info(f"Successfully fetched P&L report for range: {start_date} to {end_date}")
         return {
             'status': 'EXECUTED',
@@ -0,0 +1,229 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from quickbooks.client import QuickBooks
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from ledger_cfo.core.database import Base
+from ledger_cfo.integrations.qbo_mirror import MIRRORED_ENTITIES
+from ledger_cfo.models import QBOSyncState
+
+FAKE_REALM_ID = "9130000000000001"
+
+QUERY_ENTITY_REGEX = re.compile(r"FROM\s+(\w+)", re.IGNORECASE)
+ID_IN_REGEX = re.compile(r"WHERE\s+Id\s+IN\s*\(([^)]*)\)", re.IGNORECASE)
+START_POSITION_REGEX = re.compile(r"STARTPOSITION\s+(\d+)", re.IGNORECASE)
+MAX_RESULTS_REGEX = re.compile(r"MAXRESULTS\s+(\d+)", re.IGNORECASE)
+
+
+class FakeQBOServer:
+    """
+    Minimal local stand-in for the QBO v3 API.
+    Serves canned entities per entity name for /query and /batch requests (paged by STARTPOSITION
+    and MAXRESULTS, or counted for COUNT(*)), a canned /cdc payload, canned company Preferences,
+    single-entity reads (GET /<entity>/<id>), canned reports (GET /reports/<name>), saves (POST /<entity>, echoed back with an Id) and
+    sends (POST /<entity>/<id>/send, marking the entity EmailSent). Returns configured faults per entity name, and records
+    every request it receives.
+    """
+
+    def __init__(self):
+        self.entities = {}  # entity name -> list of raw entity dicts
+        self.faults = {}  # entity name -> Fault dict returned instead of results
+        self.transient_faults = {}  # query substring -> how many more times matching queries get a throttling Fault
+        self.request_fault = None  # Fault returned for the whole request (e.g. auth failure)
+        self.reports = {}  # report name -> raw report body
+        self.preferences = {}  # GET /preferences body (the Preferences object)
+        self.cdc_payload = {"CDCResponse": [{"QueryResponse": []}], "time": "2025-01-01T00:00:00.000-08:00"}  # GET /cdc body
+        self.requests = []  # (method, path, body) for every request received
+        self.saved = []  # (entity name, body) for every create/update/void received
+        self.response_delay = 0.0  # Seconds to wait before answering, to make concurrent requests overlap
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v3"
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def requests_to(self, endpoint: str) -> list:
+        return [r for r in self.requests if r[1].split("?")[0].endswith(f"/{endpoint}")]
+
+    def query_response(self, query: str) -> dict:
+        """Builds the QueryResponse (or Fault) item for a single QBO SQL query."""
+        entity_name = QUERY_ENTITY_REGEX.search(query).group(1)
+        if entity_name in self.faults:
+            return {"Fault": self.faults[entity_name]}
+        for fragment, remaining in self.transient_faults.items():
+            if fragment in query and remaining > 0:
+                self.transient_faults[fragment] = remaining - 1
+                return {"Fault": {"Error": [{"Message": "Throttled", "code": "8012"}], "type": "ThrottleFault"}}
+        rows = self.entities.get(entity_name, [])
+        if "COUNT(*)" in query.upper():
+            return {"QueryResponse": {"totalCount": len(rows)}}
+        id_filter = ID_IN_REGEX.search(query)
+        if id_filter:
+            ids = {value.strip().strip("'") for value in id_filter.group(1).split(",")}
+            rows = [row for row in rows if str(row.get("Id")) in ids]
+        start = int(START_POSITION_REGEX.search(query).group(1)) if START_POSITION_REGEX.search(query) else 1
+        max_results = int(MAX_RESULTS_REGEX.search(query).group(1)) if MAX_RESULTS_REGEX.search(query) else 100
+        rows = rows[start - 1:start - 1 + max_results]
+        if not rows:
+            return {"QueryResponse": {}}  # QBO omits the entity key past the last row
+        return {"QueryResponse": {entity_name: rows, "startPosition": start, "maxResults": len(rows)}}
+
+    def entity_name_for(self, path_segment: str) -> str:
+        """Maps a lowercase URL segment (e.g. 'salesreceipt') to its entity name."""
+        for name in list(self.entities) + ["Invoice", "Estimate", "Payment", "SalesReceipt", "Customer", "Vendor", "Item", "Purchase"]:
+            if name.lower() == path_segment:
+                return name
+        return path_segment.capitalize()
+
+    def find_entity(self, entity_name: str, entity_id: str):
+        return next((e for e in self.entities.get(entity_name, []) if str(e.get("Id")) == str(entity_id)), None)
+
+    def save_entity(self, entity_name: str, body: dict, operation: str = None) -> dict:
+        """
+        Creates (new Id) or replaces (existing Id) an entity and returns the stored body.
+        operation='void' zeroes the stored amounts; a Payment lowers the Balance of the invoices it links.
+        """
+        self.saved.append((entity_name, body))
+        rows = self.entities.setdefault(entity_name, [])
+        if body.get("Id"):
+            stored = self.find_entity(entity_name, body["Id"]) or {}
+            rows[:] = [e for e in rows if str(e.get("Id")) != str(body["Id"])]
+            changes = {k: v for k, v in body.items() if k != "sparse"}  # Sparse updates change only the fields sent
+            body = {**stored, **changes, "SyncToken": str(int(body.get("SyncToken", 0)) + 1)}
+        else:
+            body = {**body, "Id": str(9000 + len(self.saved)), "SyncToken": "0"}
+        if operation == "void":
+            body = {**body, "TotalAmt": 0, "Balance": 0, "PrivateNote": "Voided"}
+        if entity_name == "Payment":
+            for line in body.get("Line", []):
+                for linked in line.get("LinkedTxn", []):
+                    invoice = self.find_entity("Invoice", linked["TxnId"])
+                    if linked.get("TxnType") == "Invoice" and invoice is not None:
+                        invoice["Balance"] = invoice.get("Balance", 0) - line["Amount"]
+        rows.append(body)
+        return body
+
+    @staticmethod
+    def company_path(path: str) -> list:
+        """Returns the URL segments after /company/<realm>/, e.g. ['invoice', '101', 'send']."""
+        segments = path.split("?")[0].strip("/").split("/")
+        return segments[segments.index("company") + 2:] if "company" in segments else []
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):  # Keep test output quiet
+                pass
+
+            def _send_json(self, payload, status=200):
+                if server.response_delay:
+                    time.sleep(server.response_delay)
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                server.requests.append(("GET", self.path, ""))
+                if server.request_fault:
+                    self._send_json({"Fault": server.request_fault}, status=400)
+                elif self.path.split("?")[0].endswith("/cdc"):
+                    self._send_json(server.cdc_payload)
+                elif server.company_path(self.path) == ["preferences"]:
+                    self._send_json({"Preferences": server.preferences})
+                elif server.company_path(self.path)[:1] == ["reports"]:
+                    report_name = server.company_path(self.path)[1]
+                    self._send_json(server.reports.get(report_name, {"Header": {"ReportName": report_name}}))
+                elif len(server.company_path(self.path)) == 2:
+                    segment, entity_id = server.company_path(self.path)
+                    entity_name = server.entity_name_for(segment)
+                    entity = server.find_entity(entity_name, entity_id)
+                    if entity is None:
+                        self._send_json({"Fault": {"Error": [{"Message": "Object Not Found", "Detail": "Object Not Found", "code": "610"}],
+                                                   "type": "ValidationFault"}}, status=400)
+                    else:
+                        self._send_json({entity_name: entity})
+                else:
+                    self._send_json({"Fault": {"Error": [{"Message": "Unsupported", "code": "500"}]}}, status=400)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                raw_body = self.rfile.read(length).decode("utf-8")
+                server.requests.append(("POST", self.path, raw_body))
+                path = self.path.split("?")[0]
+
+                if server.request_fault:
+                    self._send_json({"Fault": server.request_fault}, status=400)
+                elif path.endswith("/batch"):
+                    items = []
+                    for op in json.loads(raw_body)["BatchItemRequest"]:
+                        item = server.query_response(op["Query"]) if "Query" in op else {op["operation"]: True}
+                        items.append({"bId": op["bId"], **item})
+                    self._send_json({"BatchItemResponse": items, "time": "2025-01-01T00:00:00.000-08:00"})
+                elif path.endswith("/query"):
+                    self._send_json(server.query_response(raw_body))
+                elif len(server.company_path(path)) == 1:
+                    entity_name = server.entity_name_for(server.company_path(path)[0])
+                    operation = "void" if "operation=void" in self.path else None
+                    self._send_json({entity_name: server.save_entity(entity_name, json.loads(raw_body), operation)})
+                elif len(server.company_path(path)) == 3 and path.endswith("/send"):
+                    segment, entity_id, _ = server.company_path(path)
+                    entity_name = server.entity_name_for(segment)
+                    entity = server.find_entity(entity_name, entity_id)
+                    if entity is not None:
+                        entity["EmailStatus"] = "EmailSent"
+                    self._send_json({entity_name: entity or {"Id": entity_id}})
+                else:
+                    self._send_json({"Fault": {"Error": [{"Message": "Unsupported", "code": "500"}]}}, status=400)
+
+        return Handler
+
+
+@pytest.fixture
+def fake_qbo():
+    server = FakeQBOServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def fake_qbo_client(fake_qbo):
+    """A real python-quickbooks client whose API base URL points at the fake server."""
+    client = QuickBooks(company_id=FAKE_REALM_ID, minorversion=75)
+    client.api_url_v3 = fake_qbo.base_url
+    session = requests.Session()
+    session.access_token = "test-access-token"
+    client.session = session
+    return client
+
+
+@pytest.fixture
+def db():
+    """A session on an in-memory SQLite database holding the QBO mirror tables."""
+    engine = create_engine("sqlite://")
+    tables = [spec.model.__table__ for spec in MIRRORED_ENTITIES.values()] + [QBOSyncState.__table__]
+    Base.metadata.create_all(engine, tables=tables)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from ledger_cfo.integrations import qbo_api, qbo_directory
+from ledger_cfo.integrations.qbo_accounts import EXPENSE_ACCOUNT_TYPES, PAYMENT_ACCOUNT_TYPES, AccountResolver
+from ledger_cfo.integrations.qbo_cache import StaleWhileRevalidateCache
+
+
+def _account(account_id, name, account_type, sub_type=None, path=None, parent=None, active=True):
+    return {"qbo_account_id": account_id, "name": name, "account_type": account_type, "account_sub_type": sub_type,
+            "fully_qualified_name": path or name, "parent_account_id": parent, "active": active}
+
+
+ACCOUNTS = [
+    _account("1", "Checking", "Bank", "Checking"),
+    _account("2", "Amex", "Credit Card", "CreditCard"),
+    _account("3", "Checking", "Credit Card", "CreditCard"),
+    _account("10", "Utilities", "Expense", "Utilities"),
+    _account("11", "Gas and Electric", "Expense", "Utilities", path="Utilities:Gas and Electric", parent="10"),
+    _account("12", "Meals & Entertainment", "Expense", "EntertainmentMeals"),
+    _account("13", "Office Supplies", "Expense", "SuppliesMaterials"),
+    _account("14", "Airfare", "Expense", "Travel"),
+    _account("15", "Old Fuel", "Expense", "Auto", active=False),
+    _account("16", "Gas and Electric", "Other Expense", "OtherMiscellaneousExpense"),
+    _account("20", "Miscellaneous Expense", "Expense", "OtherMiscellaneousServiceCost"),
+]
+
+
+def test_exact_lookups_by_name_path_and_type():
+    accounts = AccountResolver(ACCOUNTS)
+
+    assert accounts.find_exact("meals and entertainment", EXPENSE_ACCOUNT_TYPES)["qbo_account_id"] == "12"
+    assert accounts.find_exact("utilities : gas & electric")["qbo_account_id"] == "11"
+    assert accounts.find_exact("Gas and Electric", EXPENSE_ACCOUNT_TYPES)["qbo_account_id"] == "11"  # Types are tried in order
+    assert accounts.find_exact("checking", PAYMENT_ACCOUNT_TYPES)["qbo_account_id"] == "1"  # Bank before Credit Card
+    assert accounts.find_exact("checking", ["Credit Card"])["qbo_account_id"] == "3"
+    assert [a["qbo_account_id"] for a in accounts.by_type("Credit Card")] == ["2", "3"]
+    assert [a["qbo_account_id"] for a in accounts.by_type("Expense", sub_type="Utilities")] == ["10", "11"]
+    assert accounts.find_exact("Old Fuel") is None  # Inactive accounts are not indexed
+
+
+def test_fuzzy_fallback_is_ranked_and_restricted_to_the_requested_types():
+    accounts = AccountResolver(ACCOUNTS)
+
+    assert accounts.resolve("Ofice suplies", EXPENSE_ACCOUNT_TYPES)["qbo_account_id"] == "13"
+    assert accounts.resolve("travel", EXPENSE_ACCOUNT_TYPES)["qbo_account_id"] == "14"  # Sub-type match
+    assert accounts.resolve("meals", EXPENSE_ACCOUNT_TYPES)["qbo_account_id"] == "12"  # Every query word present
+    assert accounts.resolve("amex", EXPENSE_ACCOUNT_TYPES) is None
+    assert accounts.resolve("Parking", EXPENSE_ACCOUNT_TYPES) is None
+
+
+@pytest.mark.asyncio
+async def test_create_purchase_resolves_accounts_from_one_cached_chart(fake_qbo, fake_qbo_client, db, monkeypatch):
+    monkeypatch.setattr(qbo_api, "account_cache", StaleWhileRevalidateCache("accounts", ttl=3600, max_staleness=7200))
+    monkeypatch.setattr(qbo_api, "_account_resolvers", {})
+    qbo_directory.vendor_names.invalidate()
+    fake_qbo.entities["Vendor"] = [{"Id": "50", "DisplayName": "Shell"}]
+    fake_qbo.entities["Account"] = [
+        {"Id": "1", "Name": "Checking", "AccountType": "Bank", "Active": True, "FullyQualifiedName": "Checking"},
+        {"Id": "2", "Name": "Amex", "AccountType": "Credit Card", "Active": True, "FullyQualifiedName": "Amex"},
+        {"Id": "30", "Name": "Fuel", "AccountType": "Expense", "Active": True, "FullyQualifiedName": "Automobile:Fuel",
+         "ParentRef": {"value": "29"}},
+    ]
+
+    await qbo_api.create_purchase(fake_qbo_client, db, "Shell", 40.0, category_name="fuel", payment_account_name="amex")
+    await qbo_api.create_purchase(fake_qbo_client, db, "Shell", 25.0, category_name="Automobile:Fuel")
+
+    purchases = [json.loads(body) for method, path, body in fake_qbo.requests if method == "POST" and "/purchase" in path]
+    assert [(p["AccountRef"]["value"], p["Line"][0]["AccountBasedExpenseLineDetail"]["AccountRef"]["value"]) for p in purchases] == [
+        ("2", "30"), ("1", "30")]
+    assert sum("FROM Account" in body or "from%20Account" in path.lower() for _, path, body in fake_qbo.requests) == 1
@@ -0,0 +1,80 @@
+import datetime
+import json
+
+import numpy as np
+import pytest
+
+from ledger_cfo.core import crud
+from ledger_cfo.integrations import qbo_aging, qbo_api, qbo_mirror
+from ledger_cfo.integrations.qbo_aging import OpenInvoices, age_receivables
+from ledger_cfo.models import InvoiceMirror
+
+AS_OF = datetime.date(2025, 6, 30)
+
+
+def _invoice(invoice_id, customer_id, due_date, balance, name=None):
+    return {"Id": invoice_id, "TxnDate": "2025-01-01", "DueDate": due_date, "Balance": balance, "TotalAmt": balance,
+            "CustomerRef": {"value": customer_id, "name": name or f"Customer {customer_id}"}}
+
+
+INVOICES = [
+    _invoice("1", "42", "2025-07-15", 100.0),  # Not yet due
+    _invoice("2", "42", "2025-06-30", 50.0),  # Due today: current
+    _invoice("3", "42", "2025-06-29", 25.0),  # 1 day
+    _invoice("4", "7", "2025-05-31", 300.0),  # 30 days
+    _invoice("5", "7", "2025-05-30", 10.0),  # 31 days
+    _invoice("6", "7", "2025-04-01", 20.0),  # 90 days
+    _invoice("7", "9", "2025-03-01", 1000.0),  # 121 days
+    _invoice("8", "9", "2025-03-01", 0.0),  # Paid
+]
+
+
+def test_every_open_invoice_lands_in_its_bucket():
+    aging = age_receivables(qbo_aging.open_invoices_from_raw(INVOICES), AS_OF)
+
+    assert aging["buckets"] == ["current", "1-30", "31-60", "61-90", "91+"]
+    assert [c["customer_id"] for c in aging["customers"]] == ["9", "7", "42"]
+    assert aging["customers"][1] == {"customer_id": "7", "customer_name": "Customer 7", "current": 0.0, "1-30": 300.0,
+                                     "31-60": 10.0, "61-90": 20.0, "91+": 0.0, "total": 330.0, "open_invoices": 3}
+    assert aging["customers"][2]["current"] == 150.0 and aging["customers"][2]["1-30"] == 25.0
+    assert aging["totals"] == {"current": 150.0, "1-30": 325.0, "31-60": 10.0, "61-90": 20.0, "91+": 1000.0, "total": 1505.0}
+
+
+def test_bucketing_matches_a_plain_loop_on_many_invoices():
+    rng = np.random.default_rng(3)
+    n = 100_000
+    rows = [(str(c), None, str(np.datetime64("2025-01-01") + int(d)), None, float(b))
+            for c, d, b in zip(rng.integers(0, 500, n), rng.integers(0, 300, n), np.round(rng.uniform(1, 900, n), 2))]
+
+    aging = age_receivables(OpenInvoices.from_rows(rows), AS_OF)
+
+    expected = {}
+    for customer_id, _, due_date, _, balance in rows:
+        days = (AS_OF - datetime.date.fromisoformat(due_date)).days
+        bucket = "current" if days <= 0 else "1-30" if days <= 30 else "31-60" if days <= 60 else "61-90" if days <= 90 else "91+"
+        expected[(customer_id, bucket)] = expected.get((customer_id, bucket), 0.0) + balance
+    for customer in aging["customers"]:
+        for bucket in aging["buckets"]:
+            assert customer[bucket] == pytest.approx(expected.get((customer["customer_id"], bucket), 0.0), abs=0.01)
+
+
+@pytest.mark.asyncio
+async def test_aging_reads_open_invoices_from_a_fresh_mirror(fake_qbo, fake_qbo_client, db):
+    crud.bulk_upsert_mirror_rows(db, InvoiceMirror, "qbo_invoice_id", [qbo_mirror.invoice_row(raw) for raw in INVOICES])
+    crud.update_sync_state(db, "Invoice", datetime.datetime.utcnow())
+
+    aging = await qbo_api.get_ar_aging(fake_qbo_client, db=db, as_of_date="2025-06-30", limit=1)
+
+    assert [c["customer_id"] for c in aging["customers"]] == ["9"] and aging["totals"]["total"] == 1505.0
+    assert fake_qbo.requests == []
+
+
+@pytest.mark.asyncio
+async def test_aging_without_a_mirror_runs_one_projected_query(fake_qbo, fake_qbo_client):
+    fake_qbo.entities["Invoice"] = INVOICES
+
+    aging = await qbo_api.get_ar_aging(fake_qbo_client, as_of_date="2025-06-30")
+
+    assert aging["totals"]["91+"] == 1000.0
+    queries = [op["Query"] for _, _, body in fake_qbo.requests_to("batch") for op in json.loads(body)["BatchItemRequest"]]
+    assert queries == ["SELECT Id, DueDate, TxnDate, Balance, CustomerRef FROM Invoice WHERE Balance > '0' MAXRESULTS 1000"]
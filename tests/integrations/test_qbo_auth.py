@@ -0,0 +1,94 @@
+import threading
+import time
+
+import requests
+
+from ledger_cfo.integrations.qbo_auth import InMemoryRefreshTokenStore, QBOTokenManager
+
+
+class FakeAuthClient:
+    """Stands in for intuitlib's AuthClient: each refresh issues a new access token and rotates the refresh token."""
+
+    def __init__(self, expires_in=3600, delay=0.0):
+        self.access_token = None
+        self.refresh_token = "refresh-0"
+        self.expires_in = expires_in
+        self.delay = delay
+        self.refresh_calls = 0
+        self._lock = threading.Lock()
+
+    def refresh(self, refresh_token=None):
+        time.sleep(self.delay)
+        with self._lock:
+            self.refresh_calls += 1
+            self.access_token = f"access-{self.refresh_calls}"
+            self.refresh_token = f"refresh-{self.refresh_calls}"
+
+
+class FakeClient:
+    def __init__(self):
+        self.session = requests.Session()
+        self.session.access_token = None
+        self.refresh_token = None
+
+
+def test_concurrent_refreshes_collapse_into_one_call():
+    auth = FakeAuthClient(delay=0.05)
+    manager = QBOTokenManager(auth, InMemoryRefreshTokenStore())
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(manager.refresh(force=True))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == [True] * 5
+    assert auth.refresh_calls == 1
+
+
+def test_refresh_updates_clients_and_persists_rotated_refresh_token():
+    auth = FakeAuthClient(expires_in=3600)
+    store = InMemoryRefreshTokenStore("refresh-0")
+    manager = QBOTokenManager(auth, store, refresh_margin=600, persisted_refresh_token="refresh-0")
+    client = FakeClient()
+    manager.attach(client)
+
+    assert manager.seconds_left() is None and manager.needs_refresh()
+    assert manager.refresh()
+
+    assert client.session.access_token == "access-1"
+    assert store.refresh_token == "refresh-1"
+    assert 3590 < manager.seconds_left() <= 3600
+    assert not manager.needs_refresh()
+    assert manager.refresh() and auth.refresh_calls == 1  # Still fresh: no call
+
+
+def test_background_thread_refreshes_ahead_of_expiry():
+    auth = FakeAuthClient(expires_in=1.2)
+    manager = QBOTokenManager(auth, InMemoryRefreshTokenStore(), refresh_margin=1.0)
+    client = FakeClient()
+    manager.attach(client)
+    manager.start()
+    try:
+        deadline = time.time() + 3
+        while auth.refresh_calls < 2 and time.time() < deadline:
+            time.sleep(0.02)
+    finally:
+        manager.stop(timeout=1)
+
+    # First refresh immediately (no token yet), second ~0.2s later when within the margin again
+    assert auth.refresh_calls >= 2
+    assert client.session.access_token == f"access-{auth.refresh_calls}"
+
+
+def test_request_refresh_does_not_block():
+    auth = FakeAuthClient(delay=0.5)
+    manager = QBOTokenManager(auth, InMemoryRefreshTokenStore())
+    try:
+        started = time.monotonic()
+        manager.request_refresh()
+        assert time.monotonic() - started < 0.1
+        manager._thread.join(timeout=0.01)
+    finally:
+        manager.stop(timeout=2)
+    assert auth.refresh_calls == 1
@@ -0,0 +1,102 @@
+import pytest
+
+from ledger_cfo.integrations import qbo_api, qbo_batch
+from ledger_cfo.integrations.qbo_errors import NotFoundError, InvalidDataError, AuthenticationError, QBOError
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    qbo_api.transaction_cache.clear()
+    yield
+    qbo_api.transaction_cache.clear()
+
+
+def _fault(code, message="Fault"):
+    return {"Error": [{"Message": message, "Detail": message, "code": str(code)}], "type": "ValidationFault"}
+
+
+# --- Payload / response handling ---
+
+def test_build_batch_payload_mixes_queries_and_writes():
+    ops = [
+        qbo_batch.query_operation("q1", "SELECT * FROM Invoice"),
+        qbo_batch.BatchOperation(bid="w1", entity_name="Customer", operation="create", payload={"DisplayName": "Acme"}),
+    ]
+    payload = qbo_batch.build_batch_payload(ops)
+    assert payload == {"BatchItemRequest": [
+        {"bId": "q1", "Query": "SELECT * FROM Invoice"},
+        {"bId": "w1", "operation": "create", "Customer": {"DisplayName": "Acme"}},
+    ]}
+
+
+def test_build_batch_payload_rejects_oversized_and_duplicate_batches():
+    too_many = [qbo_batch.query_operation(str(i), "SELECT * FROM Item") for i in range(qbo_batch.MAX_BATCH_OPERATIONS + 1)]
+    with pytest.raises(ValueError):
+        qbo_batch.build_batch_payload(too_many)
+    with pytest.raises(ValueError):
+        qbo_batch.build_batch_payload([qbo_batch.query_operation("a", "x"), qbo_batch.query_operation("a", "y")])
+
+
+@pytest.mark.parametrize("code, expected_error", [
+    (610, NotFoundError),
+    (2020, InvalidDataError),
+    (100, AuthenticationError),
+    (10000, QBOError),
+])
+def test_parse_batch_response_maps_faults_to_qbo_errors(code, expected_error):
+    ops = [qbo_batch.query_operation("ok", "SELECT * FROM Invoice"), qbo_batch.query_operation("bad", "SELECT * FROM Payment")]
+    response = {"BatchItemResponse": [
+        {"bId": "ok", "QueryResponse": {"Invoice": [{"Id": "1"}]}},
+        {"bId": "bad", "Fault": _fault(code)},
+    ]}
+    results = qbo_batch.parse_batch_response(response, ops)
+    assert results["ok"].entities("Invoice") == [{"Id": "1"}]
+    assert type(results["bad"].error) is expected_error
+    with pytest.raises(expected_error):
+        results["bad"].entities("Payment")
+
+
+def test_parse_batch_response_reports_missing_operations():
+    ops = [qbo_batch.query_operation("missing", "SELECT * FROM Invoice")]
+    results = qbo_batch.parse_batch_response({"BatchItemResponse": []}, ops)
+    assert isinstance(results["missing"].error, QBOError)
+
+
+# --- Against the local fake QBO server ---
+
+@pytest.mark.asyncio
+async def test_run_batch_chunks_into_requests_of_thirty(fake_qbo, fake_qbo_client):
+    fake_qbo.entities["Item"] = [{"Id": "7", "Name": "Widget"}]
+    ops = [qbo_batch.query_operation(f"op{i}", "SELECT * FROM Item") for i in range(45)]
+
+    results = await qbo_api.run_batch(fake_qbo_client, ops)
+
+    assert len(fake_qbo.requests_to("batch")) == 2
+    assert set(results) == {op.bid for op in ops}
+    assert all(r.entities("Item") == [{"Id": "7", "Name": "Widget"}] for r in results.values())
+
+
+@pytest.mark.asyncio
+async def test_get_customer_transactions_uses_one_round_trip(fake_qbo, fake_qbo_client):
+    fake_qbo.entities["Invoice"] = [{"Id": "101", "TxnDate": "2025-01-02", "TotalAmt": 250.0, "Balance": 50.0,
+                                     "DueDate": "2025-02-01", "DocNumber": "1001", "CustomerRef": {"value": "42", "name": "Acme"}}]
+    fake_qbo.entities["Payment"] = [{"Id": "201", "TxnDate": "2025-01-10", "TotalAmt": 200.0, "UnappliedAmt": 0,
+                                     "CustomerRef": {"value": "42"}}]
+    fake_qbo.faults["Estimate"] = _fault(610, "Object Not Found")
+    fake_qbo.faults["SalesReceipt"] = _fault(2020, "Invalid query")
+
+    transactions = await qbo_api.get_customer_transactions(fake_qbo_client, "42", start_date="2025-01-01")
+
+    assert len(fake_qbo.requests) == 1
+    assert [t["type"] for t in transactions] == ["Invoice", "Payment"]
+    assert transactions[0] == {"type": "Invoice", "Id": "101", "TxnDate": "2025-01-02", "TotalAmt": 250.0, "Balance": 50.0,
+                               "DueDate": "2025-02-01", "DocNumber": "1001", "CustomerRefValue": "42"}
+    assert "TxnDate >= '2025-01-01'" in fake_qbo.requests[0][2]
+
+
+@pytest.mark.asyncio
+async def test_whole_batch_failure_raises_mapped_error(fake_qbo, fake_qbo_client):
+    fake_qbo.request_fault = _fault(100, "Token expired")
+
+    with pytest.raises(AuthenticationError):
+        await qbo_api.get_customer_transactions(fake_qbo_client, "42")
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from ledger_cfo.integrations import qbo_api
+from ledger_cfo.integrations.qbo_errors import RateLimitError
+from ledger_cfo.integrations.qbo_pagination import window_sql, window_starts
+from ledger_cfo.integrations.qbo_query import QBOQuery
+
+INVOICES = [{"Id": str(i), "TotalAmt": float(i)} for i in range(1, 2501)]
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(qbo_api, "QBO_BULK_READ_RETRY_BACKOFF_SECONDS", 0)
+
+
+def _batches(fake_qbo):
+    return [[op["Query"] for op in json.loads(body)["BatchItemRequest"]] for _, _, body in fake_qbo.requests_to("batch")]
+
+
+def test_windows_are_planned_from_the_count():
+    assert window_starts(2500) == [1, 1001, 2001]
+    assert window_starts(1000) == [1] and window_starts(0) == [1]
+    assert window_sql(QBOQuery("Invoice").where("TxnDate >= '2024-01-01'"), 1001) == \
+        "SELECT * FROM Invoice WHERE TxnDate >= '2024-01-01' ORDERBY Id STARTPOSITION 1001 MAXRESULTS 1000"
+    assert QBOQuery("Invoice").where("Balance > '0'").count_sql() == "SELECT COUNT(*) FROM Invoice WHERE Balance > '0'"
+
+
+@pytest.mark.asyncio
+async def test_count_then_remaining_windows_in_parallel_reassembled_in_order(fake_qbo, fake_qbo_client):
+    fake_qbo.entities["Invoice"] = INVOICES
+    fake_qbo.entities["Vendor"] = [{"Id": "7", "DisplayName": "Fuel Co"}]
+
+    rows = await qbo_api.bulk_read_entities(fake_qbo_client, {"Invoice": QBOQuery("Invoice"), "Vendor": QBOQuery("Vendor")})
+
+    assert rows["Invoice"] == INVOICES and rows["Vendor"] == fake_qbo.entities["Vendor"]
+    first_round, second_round = _batches(fake_qbo)
+    assert first_round == ["SELECT COUNT(*) FROM Invoice", "SELECT * FROM Invoice ORDERBY Id STARTPOSITION 1 MAXRESULTS 1000",
+                           "SELECT COUNT(*) FROM Vendor", "SELECT * FROM Vendor ORDERBY Id STARTPOSITION 1 MAXRESULTS 1000"]
+    assert second_round == ["SELECT * FROM Invoice ORDERBY Id STARTPOSITION 1001 MAXRESULTS 1000",
+                            "SELECT * FROM Invoice ORDERBY Id STARTPOSITION 2001 MAXRESULTS 1000"]
+
+
+@pytest.mark.asyncio
+async def test_only_failed_windows_are_retried(fake_qbo, fake_qbo_client):
+    fake_qbo.entities["Invoice"] = INVOICES
+    fake_qbo.transient_faults = {"STARTPOSITION 1001": 2}
+
+    rows = await qbo_api.bulk_read_entities(fake_qbo_client, {"Invoice": QBOQuery("Invoice")})
+
+    assert rows["Invoice"] == INVOICES
+    assert [len(batch) for batch in _batches(fake_qbo)] == [2, 2, 1, 1]  # Count + page 1, both windows, then the failed one twice
+
+
+@pytest.mark.asyncio
+async def test_window_that_keeps_failing_raises(fake_qbo, fake_qbo_client, monkeypatch):
+    monkeypatch.setattr(qbo_api, "QBO_BULK_READ_MAX_ATTEMPTS", 2)
+    fake_qbo.entities["Invoice"] = INVOICES
+    fake_qbo.transient_faults = {"STARTPOSITION 2001": 5}
+
+    with pytest.raises(RateLimitError):
+        await qbo_api.bulk_read_entities(fake_qbo_client, {"Invoice": QBOQuery("Invoice")})
+
+
+@pytest.mark.asyncio
+async def test_bulk_export_covers_the_transaction_and_name_entities(fake_qbo, fake_qbo_client):
+    fake_qbo.entities["Purchase"] = [{"Id": "1", "TotalAmt": 12.0}]
+
+    exported = await qbo_api.bulk_export(fake_qbo_client)
+
+    assert list(exported) == ["Invoice", "Payment", "Estimate", "SalesReceipt", "Purchase", "Customer", "Vendor"]
+    assert exported["Purchase"] == [{"Id": "1", "TotalAmt": 12.0}] and exported["Invoice"] == []
+    assert [len(batch) for batch in _batches(fake_qbo)] == [14]  # Nothing beyond the first page: one round trip
@@ -0,0 +1,99 @@
+import pytest
+
+from ledger_cfo.integrations import qbo_api
+from ledger_cfo.integrations.qbo_cache import TaggedTTLCache, customer_tag, entity_tag, entity_type_tag, invalidate
+
+INVOICE = {"Id": "101", "SyncToken": "0", "DocNumber": "1001", "TxnDate": "2025-01-02", "TotalAmt": 250.0, "Balance": 250.0,
+           "CustomerRef": {"value": "42", "name": "Acme"}, "BillEmail": {"Address": "ap@acme.test"},
+           "Line": [{"Id": "1", "Amount": 250.0, "DetailType": "SalesItemLineDetail",
+                     "SalesItemLineDetail": {"ItemRef": {"value": "1", "name": "Services"}}}]}
+OTHER_INVOICE = {**INVOICE, "Id": "201", "DocNumber": "2001", "CustomerRef": {"value": "77", "name": "Globex"}}
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    for cache in qbo_api.TRANSACTIONAL_CACHES:
+        cache.clear()
+    yield
+    for cache in qbo_api.TRANSACTIONAL_CACHES:
+        cache.clear()
+
+
+def test_invalidate_tags_evicts_only_dependent_entries():
+    cache = TaggedTTLCache(maxsize=10, ttl=60)
+    cache.set("acme-txns", [1], tags=[customer_tag("42")])
+    cache.set("globex-txns", [2], tags=[customer_tag("77")])
+    cache.set("invoice-101", {"Id": "101"}, tags=[entity_tag("Invoice", "101")])
+    cache["untagged"] = "kept"
+
+    assert invalidate([cache], [customer_tag("42"), entity_tag("Invoice", "101")]) == 2
+
+    assert set(cache) == {"globex-txns", "untagged"}
+    assert cache.tags_of("acme-txns") == frozenset()
+    assert cache.invalidate_tags([customer_tag("42")]) == 0  # Index no longer points at evicted keys
+
+
+def test_retagging_and_deleting_keep_index_consistent():
+    cache = TaggedTTLCache(maxsize=10, ttl=60)
+    cache.set("estimates", [], tags=[entity_type_tag("Estimate")])
+    cache.set("estimates", [], tags=[customer_tag("42")])  # Replaces the previous tags
+    assert cache.invalidate_tags([entity_type_tag("Estimate")]) == 0
+
+    del cache["estimates"]
+    assert cache.tags_of("estimates") == frozenset()
+
+    cache.set("a", 1, tags=["t"])
+    cache.clear()
+    assert len(cache) == 0 and cache.invalidate_tags(["t"]) == 0
+
+
+@pytest.mark.asyncio
+async def test_send_invoice_keeps_other_customers_cached_reads(fake_qbo, fake_qbo_client):
+    fake_qbo.entities["Invoice"] = [INVOICE, OTHER_INVOICE]
+    await qbo_api.get_customer_transactions(fake_qbo_client, "42")
+    await qbo_api.get_customer_transactions(fake_qbo_client, "77")
+    await qbo_api.get_invoice_details(fake_qbo_client, "101")
+    await qbo_api.get_invoice_details(fake_qbo_client, "201")
+    assert len(qbo_api.transaction_cache) == 2 and len(qbo_api.details_cache) == 2
+
+    assert await qbo_api.send_invoice(fake_qbo_client, "101") is True
+
+    # Customer 42's list and invoice 101's details are gone; customer 77's entries survive
+    assert [qbo_api.transaction_cache.tags_of(k) for k in qbo_api.transaction_cache] == [frozenset({customer_tag("77")})]
+    assert [qbo_api.details_cache.tags_of(k) for k in qbo_api.details_cache] == [frozenset({entity_tag("Invoice", "201")})]
+
+    requests_before = len(fake_qbo.requests)
+    await qbo_api.get_customer_transactions(fake_qbo_client, "77")
+    assert len(fake_qbo.requests) == requests_before  # Still a cache hit
+
+
+@pytest.mark.asyncio
+async def test_record_payment_evicts_paid_invoice_and_customer_lists(fake_qbo, fake_qbo_client):
+    fake_qbo.entities["Invoice"] = [INVOICE, OTHER_INVOICE]
+    await qbo_api.get_customer_transactions(fake_qbo_client, "42")
+    await qbo_api.get_customer_transactions(fake_qbo_client, "77")
+    await qbo_api.get_invoice_details(fake_qbo_client, "101")
+
+    payment = await qbo_api.record_payment(fake_qbo_client, "42", "101", 100.0)
+
+    assert payment["Id"]
+    assert [name for name, _ in fake_qbo.saved] == ["Payment"]
+    assert len(qbo_api.details_cache) == 0
+    assert [qbo_api.transaction_cache.tags_of(k) for k in qbo_api.transaction_cache] == [frozenset({customer_tag("77")})]
+
+
+@pytest.mark.asyncio
+async def test_writes_evict_the_customers_cached_balance(fake_qbo, fake_qbo_client):
+    fake_qbo.entities["Invoice"] = [INVOICE]
+    fake_qbo.entities["Customer"] = [{"Id": "42", "DisplayName": "Acme", "Balance": 250.0},
+                                     {"Id": "77", "DisplayName": "Globex", "Balance": 250.0}]
+    await qbo_api.get_customer_details(fake_qbo_client, "42")
+    await qbo_api.get_customer_details(fake_qbo_client, "77")
+
+    await qbo_api.record_payment(fake_qbo_client, "42", "101", 100.0)
+    fake_qbo.entities["Customer"][0]["Balance"] = 150.0
+
+    requests_before = len(fake_qbo.requests)
+    assert (await qbo_api.get_customer_details(fake_qbo_client, "42"))["Balance"] == 150.0
+    assert (await qbo_api.get_customer_details(fake_qbo_client, "77"))["Balance"] == 250.0
+    assert len(fake_qbo.requests) == requests_before + 1  # Only customer 42 was read again
@@ -0,0 +1,57 @@
+import datetime
+
+from ledger_cfo.integrations import qbo_api
+from ledger_cfo.integrations.qbo_cache import CompactValue, TieredCache, compact_size, entity_tag, serialize
+
+
+def _invoice(invoice_id, lines=20):
+    return {
+        "Id": str(invoice_id), "DocNumber": f"INV-{invoice_id}", "TotalAmt": 100.0 * lines,
+        "CustomerRef": {"value": "42", "name": "John Smith"},
+        "Line": [{"Id": str(n), "Amount": 100.0, "Description": f"Window washing, pane {n}",
+                  "SalesItemLineDetail": {"ItemRef": {"value": "7", "name": "Window Washing"}, "Qty": 1}}
+                 for n in range(lines)],
+    }
+
+
+def test_values_are_stored_serialized_and_decoded_per_read():
+    cache = TieredCache("details", maxsize=10, ttl=600, max_bytes=1024 * 1024)
+    invoice = _invoice(101)
+    cache.set("k", invoice, tags=[entity_tag("Invoice", "101")])
+
+    assert isinstance(cache.l1["k"], CompactValue) and cache.l1["k"].data == serialize(invoice)
+    first = cache.get("k")
+    assert first == invoice
+    first["Line"].clear()  # Callers get their own copy
+    assert cache.get("k") == invoice
+
+
+def test_byte_budget_bounds_memory_instead_of_entry_count():
+    entry_bytes = compact_size(CompactValue(_invoice(1)))
+    cache = TieredCache("details", maxsize=2, ttl=600, max_bytes=entry_bytes * 5 + entry_bytes // 2)
+    for invoice_id in range(8):
+        cache.set(invoice_id, _invoice(invoice_id), tags=[entity_tag("Invoice", invoice_id)])
+
+    assert len(cache) == 5 and cache.currsize <= cache.max_bytes  # maxsize=2 is ignored
+    assert 0 not in cache and cache.get(7) == _invoice(7)
+    assert cache.invalidate_tags([entity_tag("Invoice", 7)]) == 1 and 7 not in cache
+
+
+def test_values_larger_than_the_budget_are_not_cached():
+    cache = TieredCache("search", maxsize=10, ttl=120, max_bytes=512)
+    cache.set("small", {"Id": "1"})
+    cache.set("huge", [_invoice(i) for i in range(50)])
+
+    assert cache.get("small") == {"Id": "1"} and "huge" not in cache
+
+
+def test_non_json_values_encode_like_the_json_module():
+    cache = TieredCache("details", maxsize=10, ttl=600, max_bytes=4096)
+    cache.set("k", {"TxnDate": datetime.date(2024, 5, 1), 3: "three"})
+
+    assert cache.get("k") == {"TxnDate": "2024-05-01", "3": "three"}
+
+
+def test_details_and_search_caches_are_sized_in_bytes():
+    assert qbo_api.details_cache.max_bytes == qbo_api.QBO_DETAILS_CACHE_BYTES
+    assert qbo_api.search_cache.max_bytes == qbo_api.QBO_SEARCH_CACHE_BYTES
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from ledger_cfo.integrations import qbo_api, qbo_concurrency
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    qbo_api.transaction_cache.clear()
+    yield
+    qbo_api.transaction_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_fan_out_caps_concurrency_and_keeps_order(monkeypatch):
+    monkeypatch.setattr(qbo_concurrency, "QBO_MAX_CONCURRENT_REQUESTS_PER_REALM", 3)
+    running = 0
+    peak = 0
+
+    async def call(i):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01 * (10 - i))  # Later calls finish first
+        running -= 1
+        return i
+
+    results = await qbo_concurrency.fan_out("realm-cap-test", [lambda i=i: call(i) for i in range(10)])
+
+    assert results == list(range(10))
+    assert peak == 3
+
+
+@pytest.mark.asyncio
+async def test_fan_out_returns_exceptions_in_place():
+    async def fail():
+        raise ValueError("boom")
+
+    async def succeed():
+        return "ok"
+
+    results = await qbo_concurrency.fan_out("realm-1", [succeed, fail, succeed], return_exceptions=True)
+
+    assert results[0] == "ok" and results[2] == "ok"
+    assert isinstance(results[1], ValueError)
+
+
+@pytest.mark.asyncio
+async def test_customer_transactions_same_output_with_and_without_batch(fake_qbo, fake_qbo_client, monkeypatch):
+    fake_qbo.entities["Invoice"] = [{"Id": "1", "TxnDate": "2025-01-02", "TotalAmt": 10.0, "CustomerRef": {"value": "42"}}]
+    fake_qbo.entities["SalesReceipt"] = [{"Id": "2", "TxnDate": "2025-01-03", "TotalAmt": 5.0, "CustomerRef": {"value": "42"}}]
+
+    batched = await qbo_api.get_customer_transactions(fake_qbo_client, "42")
+    qbo_api.transaction_cache.clear()
+    monkeypatch.setattr(qbo_api, "QBO_USE_BATCH_API", False)
+    fanned_out = await qbo_api.get_customer_transactions(fake_qbo_client, "42")
+
+    assert batched == fanned_out
+    assert [t["type"] for t in fanned_out] == ["Invoice", "SalesReceipt"]
+    assert len(fake_qbo.requests_to("batch")) == 1
+    assert len(fake_qbo.requests_to("query")) == 4
+
+
+@pytest.mark.asyncio
+async def test_find_customers_merges_display_name_and_email_matches(fake_qbo, fake_qbo_client):
+    fake_qbo.entities["Customer"] = [{"Id": "5", "DisplayName": "Jane Doe", "PrimaryEmailAddr": {"Address": "jane@example.com"}}]
+
+    customers = await qbo_api.find_customers_by_details("jane@example.com", fake_qbo_client)
+
+    # Both queries ran in the same batch; the duplicate match is only returned once
+    assert len(fake_qbo.requests) == 1
+    assert fake_qbo.requests[0][2].count("FROM Customer") == 2
+    assert [c["Id"] for c in customers] == ["5"]
+    assert customers[0]["PrimaryEmailAddr"] == "jane@example.com"
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from ledger_cfo.integrations import qbo_api
+from ledger_cfo.integrations.qbo_errors import NotFoundError
+
+CUSTOMERS = [{"Id": str(100 + i), "DisplayName": f"Customer {i}", "PrimaryEmailAddr": {"Address": f"c{i}@example.test"},
+              "Balance": float(i), "SyncToken": "0"} for i in range(60)]
+INVOICES = [{"Id": str(5000 + i), "TxnDate": "2025-01-02", "TotalAmt": 10.0, "DocNumber": str(i),
+             "CustomerRef": {"value": str(100 + i % 61), "name": f"Customer {i % 61}"}} for i in range(80)]
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    qbo_api.customer_cache.clear()
+    qbo_api.transaction_cache.clear()
+    yield
+    qbo_api.customer_cache.clear()
+    qbo_api.transaction_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_enrichment_fetches_customers_in_bulk_chunks(fake_qbo, fake_qbo_client, monkeypatch):
+    monkeypatch.setattr(qbo_api, "CUSTOMER_IN_QUERY_CHUNK_SIZE", 25)
+    fake_qbo.entities["Customer"] = CUSTOMERS  # Customer 160 (Id "160") does not exist
+    fake_qbo.entities["Invoice"] = INVOICES
+
+    transactions = await qbo_api.get_recent_transactions_with_customer_data(fake_qbo_client, days=30)
+
+    batches = [json.loads(body)["BatchItemRequest"] for _, _, body in fake_qbo.requests_to("batch")]
+    assert len(batches) == 2  # One round of transaction queries, one of customer queries
+    customer_queries = [op["Query"] for op in batches[1]]
+    assert len(customer_queries) == 3 and all("WHERE Id IN (" in q for q in customer_queries)  # 61 distinct IDs / 25
+
+    by_id = {t["Id"]: t for t in transactions}
+    assert by_id["5003"]["CustomerDetails"]["PrimaryEmailAddr"] == "c3@example.test"
+    assert by_id["5060"]["CustomerDetails"] == {"error": "Customer ID 160 could not be fetched."}
+    assert len(qbo_api.customer_cache) == 60
+
+
+@pytest.mark.asyncio
+async def test_customer_details_come_from_cache_after_bulk_fetch(fake_qbo, fake_qbo_client):
+    fake_qbo.entities["Customer"] = CUSTOMERS
+
+    customers = await qbo_api.get_customers_by_ids(fake_qbo_client, ["101", "102", "101"])
+    assert list(customers) == ["101", "102"]
+    requests_before = len(fake_qbo.requests)
+
+    assert (await qbo_api.get_customer_details(fake_qbo_client, "102"))["DisplayName"] == "Customer 2"
+    assert await qbo_api.get_customers_by_ids(fake_qbo_client, ["101"]) == {"101": customers["101"]}
+    assert len(fake_qbo.requests) == requests_before
+
+
+@pytest.mark.asyncio
+async def test_get_customer_details_reads_single_customer(fake_qbo, fake_qbo_client):
+    fake_qbo.entities["Customer"] = CUSTOMERS
+
+    details = await qbo_api.get_customer_details(fake_qbo_client, "105")
+
+    assert details["Id"] == "105" and details["Balance"] == 5.0
+    assert fake_qbo.requests[0][0] == "GET" and "/customer/105" in fake_qbo.requests[0][1]
+    with pytest.raises(NotFoundError):
+        await qbo_api.get_customer_details(fake_qbo_client, "999")
@@ -0,0 +1,81 @@
+import datetime
+
+import pytest
+
+from ledger_cfo.core import crud
+from ledger_cfo.integrations import qbo_api, qbo_customer_index, qbo_mirror
+from ledger_cfo.integrations.qbo_customer_index import CustomerSearchIndex, customer_record
+from ledger_cfo.models import CustomerCache
+
+CUSTOMERS = [
+    {"Id": "1", "DisplayName": "John Smith", "GivenName": "John", "FamilyName": "Smith",
+     "PrimaryEmailAddr": {"Address": "jsmith@example.com"}, "PrimaryPhone": {"FreeFormNumber": "(555) 010-4477"}},
+    {"Id": "2", "DisplayName": "Renée Dupont", "CompanyName": "Acme Roofing LLC", "PrimaryPhone": {"FreeFormNumber": "+1 555-777-1234"}},
+    {"Id": "3", "DisplayName": "Smithson Builders", "CompanyName": "Smithson Builders Inc"},
+    {"Id": "4", "DisplayName": "Jane Doe", "PrimaryEmailAddr": {"Address": "jane@example.com"}},
+]
+
+
+@pytest.fixture
+def index():
+    index = CustomerSearchIndex()
+    for raw in CUSTOMERS:
+        index.upsert(customer_record(raw))
+    return index
+
+
+def _ids(results):
+    return [c["Id"] for c in results]
+
+
+def test_exact_typo_and_partial_names_rank_the_right_customer_first(index):
+    assert _ids(index.search("John Smith")) == ["1"]
+    assert _ids(index.search("jonh smtih")) == ["1"]
+    assert _ids(index.search("smith"))[0] == "1"
+    assert _ids(index.search("smi")) == ["1", "3"]
+    assert index.search("xylophone") == []
+
+
+def test_company_email_and_accents_are_searchable(index):
+    assert _ids(index.search("acme roofing")) == ["2"]
+    assert _ids(index.search("renee")) == ["2"]
+    assert _ids(index.search("jane@example.com"))[0] == "4"  # Same-domain customers follow
+    assert index.search("Jane Doe")[0] == customer_record(CUSTOMERS[3])
+
+
+def test_phone_fragments_match_digits_regardless_of_formatting(index):
+    assert _ids(index.search("555-777-1234")) == ["2"]
+    assert _ids(index.search("1 (555) 777 1234")) == ["2"]
+    assert _ids(index.search("4477")) == ["1"]
+    assert _ids(index.search("555")) == []  # Too short to be a phone search, and no name matches
+
+
+def test_upsert_replaces_and_remove_drops_postings(index):
+    index.upsert(customer_record({"Id": "1", "DisplayName": "Johnny Appleseed"}))
+    assert _ids(index.search("smith")) == ["3"]
+    assert _ids(index.search("appleseed")) == ["1"]
+
+    index.remove("1")
+    assert index.search("appleseed") == [] and len(index) == 3
+
+
+def test_refresh_reads_only_new_rows_and_drops_deleted_ones(db):
+    index = CustomerSearchIndex()
+    qbo_mirror.apply_mirror_changes(db, "Customer", CUSTOMERS)
+    assert index.refresh_from_db(db) == 4
+
+    qbo_mirror.apply_mirror_changes(db, "Customer", [{"Id": "5", "DisplayName": "Walter Brick"}], deleted_ids=["4"])
+    assert index.refresh_from_db(db) == 1
+    assert _ids(index.search("walter")) == ["5"] and "4" not in index
+
+
+@pytest.mark.asyncio
+async def test_find_customers_uses_the_index_when_the_mirror_is_fresh(fake_qbo, fake_qbo_client, db):
+    qbo_customer_index.customer_index.clear()
+    crud.bulk_upsert_mirror_rows(db, CustomerCache, "qbo_customer_id", [qbo_mirror.customer_row(raw) for raw in CUSTOMERS])
+    crud.update_sync_state(db, "Customer", datetime.datetime.utcnow())
+
+    customers = await qbo_api.find_customers_by_details("acme rofing", fake_qbo_client, db=db)
+
+    assert _ids(customers) == ["2"] and customers[0]["CompanyName"] == "Acme Roofing LLC"
+    assert fake_qbo.requests == []
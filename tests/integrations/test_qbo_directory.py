@@ -0,0 +1,50 @@
+import pytest
+
+from ledger_cfo.integrations import qbo_api, qbo_directory, qbo_sync
+
+
+@pytest.fixture(autouse=True)
+def fresh_directory():
+    for index in qbo_directory.DIRECTORY_INDEXES.values():
+        index.invalidate()
+    yield
+
+
+@pytest.mark.asyncio
+async def test_after_warm_up_repeat_lookups_never_touch_qbo(fake_qbo, fake_qbo_client, db):
+    fake_qbo.entities["Customer"] = [{"Id": "1", "DisplayName": "Acme Corp", "PrimaryEmailAddr": {"Address": "ap@acme.test"}},
+                                     {"Id": "2", "DisplayName": "Beta LLC"}]
+    fake_qbo.entities["Vendor"] = [{"Id": "7", "DisplayName": "Home Depot"}]
+
+    stats = await qbo_sync.warm_directory(fake_qbo_client, db)
+    assert stats["Customer"]["upserted"] == 2 and stats["Vendor"]["upserted"] == 1
+    warm_up_requests = len(fake_qbo.requests)
+
+    customer = await qbo_api.find_or_create_customer("  acme   CORP ", db, fake_qbo_client)
+    vendor = await qbo_api.find_or_create_vendor("home depot", db, fake_qbo_client)
+
+    assert customer["qbo_customer_id"] == "1" and customer["email_address"] == "ap@acme.test"
+    assert customer["source"] == "directory" and vendor["qbo_vendor_id"] == "7"
+    assert len(fake_qbo.requests) == warm_up_requests
+
+
+@pytest.mark.asyncio
+async def test_names_found_in_qbo_are_indexed_for_the_next_lookup(fake_qbo, fake_qbo_client, db):
+    fake_qbo.entities["Vendor"] = [{"Id": "9", "DisplayName": "Shell"}]
+
+    first = await qbo_api.find_or_create_vendor("Shell", db, fake_qbo_client, create_if_not_found=False)
+    requests_after_first = len(fake_qbo.requests)
+    second = await qbo_api.find_or_create_vendor("SHELL", db, fake_qbo_client, create_if_not_found=False)
+
+    assert first["source"] == "qbo" and second["source"] == "directory"
+    assert requests_after_first == 1 and len(fake_qbo.requests) == 1
+
+
+def test_put_drops_the_old_name_of_a_renamed_entity(db):
+    index = qbo_directory.customer_names
+    index.load_from_db(db)
+    index.put("5", "Old Name")
+    index.put("5", "New Name")
+
+    assert index.get(db, "old name") is None
+    assert index.get(db, "new name").qbo_id == "5"
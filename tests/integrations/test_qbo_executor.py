@@ -0,0 +1,87 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from quickbooks.objects.invoice import Invoice
+
+from ledger_cfo.core import metrics
+from ledger_cfo.core.executors import InstrumentedExecutor
+from ledger_cfo.integrations import qbo_api
+from ledger_cfo.integrations.qbo_rate_limit import rate_limiter
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+@pytest.fixture
+def executor():
+    executor = InstrumentedExecutor("test", max_workers=1)
+    yield executor
+    executor.shutdown()
+
+
+async def _wait_until(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_queue_depth_wait_and_run_time_are_reported_per_operation(executor):
+    release = threading.Event()
+    blocked = asyncio.ensure_future(executor.run(release.wait, operation="slow"))
+    queued = asyncio.ensure_future(executor.run(lambda: "done", operation="fast"))
+
+    await _wait_until(lambda: executor.queue_depth("fast") == 1)
+    assert executor.queue_depth("slow") == 0  # Already running
+    release.set()
+
+    assert await queued == "done" and await blocked is True
+    assert executor.queue_depth("fast") == 0
+    wait = metrics.histogram("executor_wait_seconds", executor="test", operation="fast")
+    run = metrics.histogram("executor_run_seconds", executor="test", operation="slow")
+    assert wait.count == 1 and wait.max > 0
+    assert run.count == 1 and run.sum >= wait.max * 0.5
+    gauges = {g["labels"]["operation"]: g["value"] for g in metrics.snapshot()["gauges"] if g["name"] == "executor_queue_depth"}
+    assert gauges == {"slow": 0, "fast": 0}
+
+
+@pytest.mark.asyncio
+async def test_cancelled_queued_call_leaves_the_queue_without_running(executor):
+    release = threading.Event()
+    ran = []
+    blocked = asyncio.ensure_future(executor.run(release.wait, operation="slow"))
+    queued = asyncio.ensure_future(executor.run(ran.append, 1, operation="queued"))
+    await _wait_until(lambda: executor.queue_depth("queued") == 1)
+
+    queued.cancel()
+    await asyncio.sleep(0)
+    release.set()
+    await blocked
+
+    assert ran == [] and executor.queue_depth("queued") == 0
+
+
+@pytest.mark.asyncio
+async def test_sdk_calls_do_not_share_the_default_executor(fake_qbo, fake_qbo_client):
+    fake_qbo.entities["Invoice"] = [{"Id": "101", "TotalAmt": 5.0}]
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=1))
+    release = threading.Event()
+    hog = asyncio.ensure_future(asyncio.to_thread(release.wait))  # e.g. a long Claude consultation
+
+    try:
+        invoice = await asyncio.wait_for(qbo_api._sync_qbo_call(Invoice.get, "101", qb=fake_qbo_client), timeout=5)
+    finally:
+        release.set()
+        await hog
+
+    assert invoice.TotalAmt == 5.0
+    assert rate_limiter.executor.name == "qbo_sdk"
+    assert metrics.histogram("executor_run_seconds", executor="qbo_sdk", operation="Invoice.get").count == 1
@@ -0,0 +1,108 @@
+import pytest
+from quickbooks.exceptions import AuthorizationException, ObjectNotFoundException
+
+from ledger_cfo.integrations import qbo_api, qbo_http
+from ledger_cfo.integrations.qbo_errors import NotFoundError
+from ledger_cfo.integrations.qbo_http import QBOAsyncTransport
+
+INVOICE = {"Id": "101", "SyncToken": "3", "DocNumber": "1001", "TxnDate": "2025-01-02", "TotalAmt": 250.0, "Balance": 250.0,
+           "CustomerRef": {"value": "42"}, "Line": [{"Id": "1", "Amount": 250.0, "DetailType": "SalesItemLineDetail",
+                                                      "SalesItemLineDetail": {"ItemRef": {"value": "1"}}}]}
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    for cache in qbo_api.TRANSACTIONAL_CACHES:
+        cache.clear()
+    yield
+    for cache in qbo_api.TRANSACTIONAL_CACHES:
+        cache.clear()
+
+
+@pytest.fixture
+def enable(monkeypatch):
+    """Moves the given qbo_api functions onto the async transport for one test."""
+    def _enable(*operations):
+        monkeypatch.setattr(qbo_http, "QBO_ASYNC_HTTP_OPERATIONS", set(operations))
+    return _enable
+
+
+@pytest.mark.asyncio
+async def test_transport_operations_return_raw_json_over_one_pooled_client(fake_qbo, fake_qbo_client):
+    fake_qbo.entities["Invoice"] = [dict(INVOICE)]
+    transport = QBOAsyncTransport()
+
+    queried = await transport.query(fake_qbo_client, "SELECT * FROM Invoice")
+    read = await transport.read(fake_qbo_client, "Invoice", "101")
+    created = await transport.create(fake_qbo_client, "Invoice", {"CustomerRef": {"value": "42"}, "Line": []})
+    updated = await transport.update(fake_qbo_client, "Invoice", {"Id": "101", "SyncToken": "3", "PrivateNote": "x"}, sparse=True)
+    sent = await transport.send(fake_qbo_client, "Invoice", "101", send_to="ap@acme.test")
+    voided = await transport.void(fake_qbo_client, "Invoice", "101", "4")
+
+    assert queried["QueryResponse"]["Invoice"][0]["Id"] == "101"
+    assert read["Invoice"]["TotalAmt"] == 250.0
+    assert created["Invoice"]["Id"].startswith("90")
+    assert updated["Invoice"]["SyncToken"] == "4" and fake_qbo.saved[1][1]["sparse"] is True
+    assert sent["Invoice"]["Id"] == "101"
+    assert voided["Invoice"]["SyncToken"] == "5"
+
+    paths = [(method, path) for method, path, _ in fake_qbo.requests]
+    assert paths[1][0] == "GET" and paths[1][1].startswith("/v3/company/9130000000000001/invoice/101?minorversion=75")
+    assert "/invoice/101/send?sendTo=ap%40acme.test" in paths[4][1]
+    assert "operation=void" in paths[5][1]
+
+    client = transport._client("9130000000000001")
+    assert list(transport._clients.values()) == [{"9130000000000001": client}]  # One keep-alive pool for all six calls
+    assert client.headers["Accept-Encoding"] == "gzip"
+    assert client.timeout.connect == qbo_http.QBO_HTTP_CONNECT_TIMEOUT_SECONDS
+    await transport.aclose()
+    assert client.is_closed
+
+
+@pytest.mark.asyncio
+async def test_transport_raises_the_sdk_exceptions(fake_qbo, fake_qbo_client):
+    transport = QBOAsyncTransport()
+
+    with pytest.raises(ObjectNotFoundException):
+        await transport.read(fake_qbo_client, "Invoice", "999")
+
+    fake_qbo.request_fault = {"Error": [{"Message": "AuthenticationFailed", "code": "100"}], "type": "AUTHENTICATION"}
+    with pytest.raises(AuthorizationException):
+        await transport.query(fake_qbo_client, "SELECT * FROM Invoice")
+    await transport.aclose()
+
+
+@pytest.mark.asyncio
+async def test_functions_move_to_the_transport_one_at_a_time(fake_qbo, fake_qbo_client, enable):
+    fake_qbo.entities["Invoice"] = [dict(INVOICE)]
+    sdk_details = await qbo_api.get_invoice_details(fake_qbo_client, "101")
+    qbo_api.details_cache.clear()
+
+    enable("get_invoice_details")
+    assert await qbo_api.get_invoice_details(fake_qbo_client, "101") == sdk_details
+    assert qbo_http.is_enabled("get_invoice_details") and not qbo_http.is_enabled("send_invoice")
+    with pytest.raises(NotFoundError):
+        await qbo_api.get_invoice_details(fake_qbo_client, "999")
+
+    enable("all")
+    assert await qbo_api.send_invoice(fake_qbo_client, "101") is True
+    assert await qbo_api.void_invoice(fake_qbo_client, "101") is True
+    assert fake_qbo.saved[-1] == ("Invoice", {"Id": "101", "SyncToken": "3", "sparse": True})
+    assert fake_qbo.requests[-1][1].endswith("operation=void&minorversion=75")
+
+    created = await qbo_api.create_invoice(fake_qbo_client, "42", [{"Amount": 10.0, "Description": "Labor"}])
+    assert created["CustomerRef"]["value"] == "42" and created["Line"][0]["Amount"] == 10.0
+
+
+@pytest.mark.asyncio
+async def test_individual_queries_use_the_transport(fake_qbo, fake_qbo_client, enable, monkeypatch):
+    monkeypatch.setattr(qbo_api, "QBO_USE_BATCH_API", False)
+    enable("query_entities")
+    fake_qbo.entities["Invoice"] = [dict(INVOICE)]
+    fake_qbo.faults["Estimate"] = {"Error": [{"Message": "Not found", "code": "610"}]}
+
+    results = await qbo_api.query_entities(fake_qbo_client, {"inv": "SELECT * FROM Invoice", "est": "SELECT * FROM Estimate"})
+
+    assert results["inv"].data["QueryResponse"]["Invoice"][0]["Id"] == "101"
+    assert isinstance(results["est"].error, NotFoundError)
+    assert sorted(body for _, _, body in fake_qbo.requests_to("query")) == ["SELECT * FROM Estimate", "SELECT * FROM Invoice"]
@@ -0,0 +1,86 @@
+import datetime
+import json
+
+import pytest
+
+from ledger_cfo.core import crud
+from ledger_cfo.integrations import qbo_api, qbo_mirror
+from ledger_cfo.integrations.qbo_items import ItemCatalog
+from ledger_cfo.models import ItemMirror
+
+ITEMS = [
+    {"Id": "1", "Name": "Services", "Type": "Service", "IncomeAccountRef": {"value": "79"}, "Active": True},
+    {"Id": "5", "Name": "Gutter Cleaning", "Sku": "GC-100", "FullyQualifiedName": "Exterior:Gutter Cleaning",
+     "Type": "Service", "IncomeAccountRef": {"value": "80"}, "Active": True},
+    {"Id": "6", "Name": "Window Washing", "Type": "Service", "IncomeAccountRef": {"value": "80"}, "Active": True},
+    {"Id": "7", "Name": "Pressure Washing", "Type": "Service", "IncomeAccountRef": {"value": "81"}, "Active": True},
+    {"Id": "8", "Name": "Snow Removal", "Type": "Service", "Active": False},
+]
+
+
+@pytest.fixture(autouse=True)
+def fresh_item_list():
+    qbo_api.reference_cache.clear()
+    yield
+    qbo_api.reference_cache.clear()
+
+
+def test_exact_lookups_by_name_path_sku_and_income_account():
+    catalog = ItemCatalog(ITEMS)
+
+    assert catalog.find("gutter  cleaning")["Id"] == "5"
+    assert catalog.find("exterior:gutter cleaning")["Id"] == "5"
+    assert catalog.find("gc-100")["Id"] == "5"
+    assert [item["Id"] for item in catalog.by_income_account("80")] == ["5", "6"]
+    assert catalog.find("Snow Removal") is None  # Inactive
+
+
+def test_line_descriptions_resolve_to_the_item_they_mention():
+    catalog = ItemCatalog(ITEMS)
+
+    assert catalog.resolve_line("Gutter cleaning - 2 story house")["Id"] == "5"
+    assert catalog.resolve_line("Guter claening, back of house")["Id"] == "5"
+    assert catalog.resolve_line("Washing of all windows")["Id"] == "6"
+    assert catalog.resolve_line("Washing the car")["Id"] == "1"  # Only half of any washing item: default item
+    assert catalog.resolve_line("Pressure washing the driveway")["Id"] == "7"
+    assert catalog.resolve_line("Driveway washing", income_account_id="80") == catalog.default_item()
+    assert catalog.resolve_line(None)["Id"] == "1"
+
+
+@pytest.mark.asyncio
+async def test_invoice_lines_get_item_refs_from_one_catalog_load(fake_qbo, fake_qbo_client):
+    fake_qbo.entities["Item"] = ITEMS
+    lines = [{"Amount": 200.0, "Description": "Gutter cleaning"}, {"Amount": 90.0, "Description": "Window washing, 12 panes"},
+             {"Amount": 50.0, "Description": "Trip charge"},
+             {"Amount": 10.0, "Description": "Custom", "SalesItemLineDetail": {"ItemRef": {"value": "6"}}}]
+
+    await qbo_api.create_invoice(fake_qbo_client, "42", lines)
+
+    posted = [json.loads(body) for method, path, body in fake_qbo.requests if method == "POST" and "/invoice" in path]
+    assert [line["SalesItemLineDetail"]["ItemRef"]["value"] for line in posted[0]["Line"]] == ["5", "6", "1", "6"]
+
+
+@pytest.mark.asyncio
+async def test_estimate_lines_without_item_ref_are_resolved_from_the_catalog(fake_qbo, fake_qbo_client):
+    fake_qbo.entities["Item"] = ITEMS
+    lines = [{"Amount": 300.0, "Description": "Pressure washing the driveway"}, {"Amount": 25.0, "Description": "Trip charge"}]
+
+    created = await qbo_api.create_estimate(fake_qbo_client, "42", lines)
+
+    posted = [json.loads(body) for method, path, body in fake_qbo.requests if method == "POST" and "/estimate" in path]
+    assert len(posted) == 1 and created["Id"]
+    assert posted[0]["CustomerRef"]["value"] == "42"
+    assert [line["SalesItemLineDetail"]["ItemRef"]["value"] for line in posted[0]["Line"]] == ["7", "1"]
+    assert [line["Amount"] for line in posted[0]["Line"]] == [300.0, 25.0]
+    assert len(fake_qbo.requests) == 2  # The item list and the invoice
+
+
+@pytest.mark.asyncio
+async def test_find_item_reads_a_fresh_mirror_without_calling_qbo(fake_qbo, fake_qbo_client, db):
+    crud.bulk_upsert_mirror_rows(db, ItemMirror, "qbo_item_id", [qbo_mirror.item_row(raw) for raw in ITEMS])
+    crud.update_sync_state(db, "Item", datetime.datetime.utcnow())
+
+    item = await qbo_api.find_item(fake_qbo_client, "GC-100", db=db)
+
+    assert item["Id"] == "5" and item["IncomeAccountRef"] == "80"
+    assert fake_qbo.requests == []
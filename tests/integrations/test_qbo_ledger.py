@@ -0,0 +1,126 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from ledger_cfo.core import crud
+from ledger_cfo.integrations import qbo_api, qbo_ledger, qbo_mirror
+from ledger_cfo.integrations.qbo_ledger import LedgerLines, PnLEngine, period_buckets
+from ledger_cfo.models import AccountCache, ItemMirror, InvoiceMirror, PurchaseMirror
+
+ACCOUNTS = {
+    "1": {"name": "Services", "account_type": "Income"},
+    "2": {"name": "Discounts", "account_type": "Income"},
+    "5": {"name": "Materials", "account_type": "Cost of Goods Sold"},
+    "7": {"name": "Fuel", "account_type": "Expense"},
+    "35": {"name": "Checking", "account_type": "Bank"},
+}
+
+
+def _sales_line(amount, item_id="10"):
+    return {"DetailType": "SalesItemLineDetail", "Amount": amount, "SalesItemLineDetail": {"ItemRef": {"value": item_id}}}
+
+
+def _expense_line(amount, account_id="7"):
+    return {"DetailType": "AccountBasedExpenseLineDetail", "Amount": amount,
+            "AccountBasedExpenseLineDetail": {"AccountRef": {"value": account_id}}}
+
+
+INVOICES = [
+    {"Id": "101", "TxnDate": "2025-01-15", "Line": [
+        _sales_line(1000.0), {"DetailType": "SubTotalLineDetail", "Amount": 1000.0},
+        {"DetailType": "DiscountLineDetail", "Amount": 50.0, "DiscountLineDetail": {"DiscountAccountRef": {"value": "2"}}}]},
+    {"Id": "102", "TxnDate": "2025-04-02", "Line": [_sales_line(400.0), _sales_line(99.0, item_id="unknown")]},
+]
+PURCHASES = [
+    {"Id": "201", "TxnDate": "2025-02-10", "AccountRef": {"value": "35"}, "Line": [_expense_line(120.0)]},
+    {"Id": "202", "TxnDate": "2025-02-20", "Credit": True, "Line": [_expense_line(20.0)]},
+    {"Id": "203", "TxnDate": "2025-05-01", "Line": [{"DetailType": "ItemBasedExpenseLineDetail", "Amount": 300.0,
+                                                   "ItemBasedExpenseLineDetail": {"ItemRef": {"value": "10"}}}]},
+]
+ITEM_ACCOUNTS = {"10": ("1", "5")}
+
+
+def test_postings_follow_items_discounts_and_credits():
+    lines = qbo_ledger.lines_from_transactions({"Invoice": INVOICES, "Purchase": PURCHASES}, ITEM_ACCOUNTS)
+
+    postings = sorted(zip(lines.dates.astype(str), [lines.account_ids[c] for c in lines.accounts], lines.amounts))
+    assert postings == [("2025-01-15", "1", 1000.0), ("2025-01-15", "2", -50.0), ("2025-02-10", "7", 120.0),
+                        ("2025-02-20", "7", -20.0), ("2025-04-02", "1", 400.0), ("2025-05-01", "5", 300.0)]
+    assert lines.unmapped_amount == 99.0
+
+
+def test_buckets_are_calendar_aligned_and_clipped():
+    assert period_buckets("2025-02-10", "2025-04-05", "Month") == [
+        ("Feb 2025", "2025-02-10", "2025-02-28"), ("Mar 2025", "2025-03-01", "2025-03-31"), ("Apr 2025", "2025-04-01", "2025-04-05")]
+    assert [b[0] for b in period_buckets("2024-11-01", "2025-06-30", "Quarter")] == ["Q4 2024", "Q1 2025", "Q2 2025"]
+    assert period_buckets("2024-06-01", "2025-03-31", "year") == [("2024", "2024-06-01", "2024-12-31"), ("2025", "2025-01-01", "2025-03-31")]
+    with pytest.raises(ValueError):
+        period_buckets("2025-01-01", "2025-12-31", "Week")
+
+
+def test_quarterly_report_sections_subtotals_and_comparison():
+    engine = PnLEngine(qbo_ledger.lines_from_transactions({"Invoice": INVOICES, "Purchase": PURCHASES}, ITEM_ACCOUNTS), ACCOUNTS)
+
+    report = engine.report("2025-01-01", "2025-06-30", summarize_column_by="Quarter")
+
+    assert report["columns"] == ["Q1 2025", "Q2 2025", "Total"]
+    assert report["totals"]["Income"] == [950.0, 400.0, 1350.0]
+    assert report["totals"]["GrossProfit"] == [950.0, 100.0, 1050.0]
+    assert report["totals"]["NetIncome"] == [850.0, 100.0, 950.0]
+    assert ["data", 1, "Expenses", "Fuel", "7", 100.0, 0.0, 100.0] in report["rows"]
+    assert not any(row[4] == "35" for row in report["rows"])  # Balance sheet accounts are not P&L lines
+
+    compared = engine.compare({"Jan": ("2025-01-01", "2025-01-31"), "H1": ("2025-01-01", "2025-06-30")})
+    assert compared["columns"] == ["Jan", "H1"] and compared["totals"]["NetIncome"] == [950.0, 950.0]
+
+
+def test_vectorized_totals_match_a_plain_loop_on_random_lines():
+    rng = np.random.default_rng(7)
+    n = 200_000
+    days = np.datetime64("2020-01-01") + rng.integers(0, 5 * 365, n)
+    account_ids = rng.choice(["1", "5", "7"], n)
+    amounts = np.round(rng.uniform(-100, 500, n), 2)
+    engine = PnLEngine(LedgerLines.from_columns(days, account_ids, amounts), ACCOUNTS)
+
+    start, end = np.datetime64("2021-03-15"), np.datetime64("2023-07-04")
+    totals = engine.totals([(str(start), str(end))])[:, 0]
+
+    in_range = (days >= start) & (days <= end)
+    expected = [amounts[in_range & (account_ids == a)].sum() for a in engine.account_ids]
+    assert np.allclose(totals, expected)
+
+
+def test_local_report_reconciles_with_qbo():
+    engine = PnLEngine(qbo_ledger.lines_from_transactions({"Invoice": INVOICES, "Purchase": PURCHASES}, ITEM_ACCOUNTS), ACCOUNTS)
+    local = engine.report("2025-01-01", "2025-03-31")
+    qbo = {"columns": ["Total"], "totals": {"Income": [950.0], "NetIncome": [850.004]},
+           "rows": [["data", 1, "Income", "Services", "1", 1000.0], ["data", 1, "Income", "Discounts", "2", -50.0],
+                    ["data", 1, "Expenses", "Fuel", "7", 105.0]]}
+
+    differences = qbo_ledger.reconcile(local, qbo)
+
+    assert differences == [{"account_id": "7", "label": "Fuel", "column": "Total", "local": 100.0, "qbo": 105.0, "difference": -5.0}]
+
+
+@pytest.mark.asyncio
+async def test_pnl_is_served_from_a_fresh_mirror_without_calling_qbo(fake_qbo, fake_qbo_client, db):
+    crud.bulk_upsert_mirror_rows(db, AccountCache, "qbo_account_id",
+                                 [qbo_mirror.account_row({"Id": k, "Name": v["name"], "AccountType": v["account_type"]}) for k, v in ACCOUNTS.items()])
+    crud.bulk_upsert_mirror_rows(db, ItemMirror, "qbo_item_id", [qbo_mirror.item_row(
+        {"Id": "10", "Name": "Labor", "IncomeAccountRef": {"value": "1"}, "ExpenseAccountRef": {"value": "5"}})])
+    crud.bulk_upsert_mirror_rows(db, InvoiceMirror, "qbo_invoice_id", [qbo_mirror.invoice_row(raw) for raw in INVOICES])
+    crud.bulk_upsert_mirror_rows(db, PurchaseMirror, "qbo_purchase_id", [qbo_mirror.purchase_row(raw) for raw in PURCHASES])
+    for entity_name in qbo_ledger.LEDGER_MIRROR_ENTITIES:
+        crud.update_sync_state(db, entity_name, datetime.datetime.utcnow())
+
+    report = await qbo_api.generate_pnl_report(fake_qbo_client, "2025-01-01", "2025-06-30", "Accrual", db=db, source="mirror")
+
+    assert report["source"] == "mirror" and report["totals"]["NetIncome"] == [950.0]
+    assert fake_qbo.requests == []
+
+    # Opt-in only, and accrual only: by default, or without an explicit basis, QBO answers
+    fake_qbo.reports["ProfitAndLoss"] = {"Header": {"ReportName": "ProfitAndLoss"}}
+    await qbo_api.generate_pnl_report(fake_qbo_client, "2025-01-01", "2025-06-30", "Accrual", db=db)
+    await qbo_api.generate_pnl_report(fake_qbo_client, "2025-01-01", "2025-06-30", db=db, source="mirror")
+    assert len([r for r in fake_qbo.requests if "/reports/" in r[1]]) == 2
@@ -0,0 +1,135 @@
+import datetime
+
+import pytest
+from sqlalchemy import select
+
+from ledger_cfo.core import crud
+from ledger_cfo.integrations import qbo_api, qbo_mirror
+from ledger_cfo.models import InvoiceMirror
+
+INVOICE = {"Id": "101", "SyncToken": "0", "DocNumber": "1001", "TxnDate": "2025-01-02", "DueDate": "2025-02-01",
+           "TotalAmt": 250.0, "Balance": 50.0, "CustomerRef": {"value": "42", "name": "Acme"},
+           "Line": [{"Id": "1", "Amount": 250.0, "DetailType": "SalesItemLineDetail",
+                     "SalesItemLineDetail": {"ItemRef": {"value": "1", "name": "Services"}}}]}
+ESTIMATES = [
+    {"Id": "301", "TxnDate": "2025-01-05", "TotalAmt": 90.0, "TxnStatus": "Pending", "CustomerRef": {"value": "42"}},
+    {"Id": "302", "TxnDate": "2025-01-06", "TotalAmt": 75.0, "TxnStatus": "Accepted", "CustomerRef": {"value": "42"}},
+]
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    for cache in (qbo_api.transaction_cache, qbo_api.details_cache, qbo_api.search_cache):
+        cache.clear()
+    yield
+    for cache in (qbo_api.transaction_cache, qbo_api.details_cache, qbo_api.search_cache):
+        cache.clear()
+
+
+def _seed_mirror(db, synced_ago=datetime.timedelta(seconds=10)):
+    qbo_mirror.apply_mirror_changes(db, "Invoice", [INVOICE])
+    qbo_mirror.apply_mirror_changes(db, "Estimate", ESTIMATES)
+    for entity_name in ("Invoice", "Payment", "Estimate", "SalesReceipt"):
+        crud.update_sync_state(db, entity_name, datetime.datetime.utcnow()).last_synced_at = datetime.datetime.utcnow() - synced_ago
+    db.flush()
+
+
+@pytest.mark.asyncio
+async def test_fresh_mirror_serves_same_output_as_qbo(fake_qbo, fake_qbo_client, db):
+    _seed_mirror(db)
+    fake_qbo.entities["Invoice"] = [INVOICE]
+    fake_qbo.entities["Estimate"] = ESTIMATES
+
+    from_mirror = await qbo_api.get_customer_transactions(fake_qbo_client, "42", db=db, max_staleness=60)
+    assert fake_qbo.requests == []
+    qbo_api.transaction_cache.clear()
+    live = await qbo_api.get_customer_transactions(fake_qbo_client, "42", db=db, max_staleness=0)
+
+    assert len(fake_qbo.requests) == 1
+    assert from_mirror == live
+    assert [t["Id"] for t in from_mirror] == ["101", "301", "302"]
+
+
+@pytest.mark.asyncio
+async def test_stale_mirror_falls_through_and_full_reads_write_back(fake_qbo, fake_qbo_client, db):
+    _seed_mirror(db, synced_ago=datetime.timedelta(hours=1))
+    fake_qbo.entities["Invoice"] = [INVOICE, {**INVOICE, "Id": "102", "DocNumber": "1002"}]
+
+    transactions = await qbo_api.get_customer_transactions(fake_qbo_client, "42", db=db, max_staleness=60)
+
+    assert len(fake_qbo.requests) == 1
+    assert [t["Id"] for t in transactions] == ["101", "102"]
+    # Projected summary rows are partial and must not replace mirrored entities
+    assert sorted(db.execute(select(InvoiceMirror.qbo_invoice_id)).scalars()) == ["101"]
+
+    await qbo_api.get_invoice_details(fake_qbo_client, "102", db=db, max_staleness=60)
+    assert sorted(db.execute(select(InvoiceMirror.qbo_invoice_id)).scalars()) == ["101", "102"]
+    # A write-back is not a sync: the mirror must still count as stale
+    assert not qbo_mirror.is_fresh(db, ["Invoice"], 60)
+
+
+@pytest.mark.asyncio
+async def test_invoice_details_from_mirror_match_sdk_shape(fake_qbo, fake_qbo_client, db):
+    _seed_mirror(db)
+
+    details = await qbo_api.get_invoice_details(fake_qbo_client, "101", db=db)
+
+    assert fake_qbo.requests == []
+    assert details == qbo_api.Invoice.from_json(INVOICE).to_dict()
+    assert details["Line"][0]["SalesItemLineDetail"]["ItemRef"]["value"] == "1"
+
+
+@pytest.mark.asyncio
+async def test_find_estimates_filters_on_mirror(fake_qbo, fake_qbo_client, db):
+    _seed_mirror(db)
+
+    accepted = await qbo_api.find_estimates(fake_qbo_client, customer_id="42", status="Accepted", db=db)
+    all_for_customer = await qbo_api.find_estimates(fake_qbo_client, customer_id="42", status="Bogus", db=db)
+
+    assert fake_qbo.requests == []
+    assert [e["Id"] for e in accepted] == ["302"]
+    assert [e["Id"] for e in all_for_customer] == ["301", "302"]
+
+
+@pytest.mark.asyncio
+async def test_reads_from_a_fresh_mirror_see_writes_made_through_qbo_api(fake_qbo, fake_qbo_client, db):
+    _seed_mirror(db)
+    fake_qbo.entities["Invoice"] = [dict(INVOICE)]
+    fake_qbo.entities["Estimate"] = [dict(estimate) for estimate in ESTIMATES]
+    line = {"Amount": 80.0, "Description": "Gutters", "SalesItemLineDetail": {"ItemRef": {"value": "1"}}}
+
+    async def read_without_qbo(read):
+        sent = len(fake_qbo.requests)
+        result = await read()
+        assert len(fake_qbo.requests) == sent
+        return result
+
+    invoice = await qbo_api.create_invoice(fake_qbo_client, "42", [line], db=db)
+    transactions = await read_without_qbo(lambda: qbo_api.get_customer_transactions(fake_qbo_client, "42", db=db))
+    assert sorted(t["Id"] for t in transactions) == sorted(["101", invoice["Id"], "301", "302"])
+
+    estimate = await qbo_api.create_estimate(fake_qbo_client, "42", [line], db=db)
+    estimates = await read_without_qbo(lambda: qbo_api.find_estimates(fake_qbo_client, customer_id="42", db=db))
+    assert estimate["Id"] in [e["Id"] for e in estimates]
+
+    payment = await qbo_api.record_payment(fake_qbo_client, "42", "101", 50.0, db=db)
+    paid = await read_without_qbo(lambda: qbo_api.get_invoice_details(fake_qbo_client, "101", db=db))
+    assert paid["Balance"] == 0
+    transactions = await read_without_qbo(lambda: qbo_api.get_customer_transactions(fake_qbo_client, "42", db=db))
+    assert payment["Id"] in [t["Id"] for t in transactions]
+
+    await qbo_api.send_invoice(fake_qbo_client, "101", db=db)
+    sent = await read_without_qbo(lambda: qbo_api.get_invoice_details(fake_qbo_client, "101", db=db))
+    assert sent["EmailStatus"] == "EmailSent"
+
+    await qbo_api.void_invoice(fake_qbo_client, invoice["Id"], db=db)
+    voided = await read_without_qbo(lambda: qbo_api.get_invoice_details(fake_qbo_client, invoice["Id"], db=db))
+    assert voided["TotalAmt"] == 0
+
+
+def test_mirror_is_never_fresh_without_session_or_with_zero_staleness(db):
+    _seed_mirror(db)
+    assert qbo_mirror.is_fresh(db, ["Invoice"], None)
+    assert not qbo_mirror.is_fresh(db, ["Invoice"], 0)
+    assert not qbo_mirror.is_fresh(None, ["Invoice"], 60)
+    assert not qbo_mirror.is_fresh(db, ["Customer"], 60)  # Never synced
@@ -0,0 +1,47 @@
+import pytest
+
+from ledger_cfo.integrations import qbo_api, qbo_directory
+
+
+@pytest.fixture(autouse=True)
+def clean_caches():
+    qbo_api.not_found_cache.clear()
+    qbo_api.reference_cache.clear()
+    for index in qbo_directory.DIRECTORY_INDEXES.values():
+        index.invalidate()
+    yield
+    qbo_api.not_found_cache.clear()
+    qbo_api.reference_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_missing_customer_is_only_queried_once(fake_qbo, fake_qbo_client, db):
+    assert await qbo_api.find_or_create_customer("Zed Corp", db, fake_qbo_client, create_if_not_found=False) is None
+    queries = len(fake_qbo.requests)
+
+    assert await qbo_api.find_or_create_customer("  zed CORP", db, fake_qbo_client, create_if_not_found=False) is None
+    assert len(fake_qbo.requests) == queries
+
+
+@pytest.mark.asyncio
+async def test_creating_the_name_evicts_its_not_found_entry(fake_qbo, fake_qbo_client, db):
+    await qbo_api.find_or_create_vendor("Acme Fuel", db, fake_qbo_client, create_if_not_found=False)
+    await qbo_api.find_or_create_vendor("Other Vendor", db, fake_qbo_client, create_if_not_found=False)
+    assert qbo_api._known_missing(fake_qbo_client, "Vendor", "acme fuel")
+
+    created = await qbo_api.find_or_create_vendor("Acme Fuel", db, fake_qbo_client)
+
+    assert created["source"] == "qbo_created"
+    assert not qbo_api._known_missing(fake_qbo_client, "Vendor", "Acme Fuel")
+    assert qbo_api._known_missing(fake_qbo_client, "Vendor", "Other Vendor")
+
+
+@pytest.mark.asyncio
+async def test_missing_item_skips_the_query_on_retry(fake_qbo, fake_qbo_client):
+    fake_qbo.entities["Item"] = []
+
+    assert await qbo_api.find_item(fake_qbo_client, "Gutter Cleaning") is None
+    requests = len(fake_qbo.requests)
+    assert await qbo_api.find_item(fake_qbo_client, "gutter cleaning") is None
+
+    assert len(fake_qbo.requests) == requests
@@ -0,0 +1,117 @@
+import asyncio
+import json
+
+import pytest
+
+from ledger_cfo.integrations import qbo_api
+from ledger_cfo.integrations.qbo_errors import RateLimitError
+from ledger_cfo.integrations.qbo_pagination import QBOPaginator, QueryCoalescer
+from ledger_cfo.integrations.qbo_query import QBOQuery
+
+INVOICES = [{"Id": str(i), "TxnDate": "2019-01-01", "TotalAmt": 1.0, "CustomerRef": {"value": "42"}} for i in range(1, 2501)]
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    for cache in qbo_api.TRANSACTIONAL_CACHES:
+        cache.clear()
+    yield
+    for cache in qbo_api.TRANSACTIONAL_CACHES:
+        cache.clear()
+
+
+class FakePages:
+    """fetch_page stand-in serving numbered records; records every page query it receives."""
+
+    def __init__(self, total, page_size, fail_at=None):
+        self.total, self.page_size, self.fail_at = total, page_size, fail_at
+        self.queries = []
+
+    async def __call__(self, sql):
+        self.queries.append(sql)
+        await asyncio.sleep(0)
+        start = int(sql.split("STARTPOSITION ")[1].split()[0]) if "STARTPOSITION" in sql else 1
+        if start == self.fail_at:
+            raise RateLimitError("throttled")
+        return [{"Id": str(i)} for i in range(start, min(start + self.page_size, self.total + 1))]
+
+
+@pytest.mark.asyncio
+async def test_paginator_streams_every_page_in_order():
+    pages = FakePages(total=25, page_size=10)
+    paginator = QBOPaginator(QBOQuery("Invoice", fields=["TotalAmt"]), pages, page_size=10)
+
+    ids = [record["Id"] async for record in paginator]
+
+    assert ids == [str(i) for i in range(1, 26)]
+    assert pages.queries == ["SELECT Id, TotalAmt FROM Invoice MAXRESULTS 10",
+                             "SELECT Id, TotalAmt FROM Invoice STARTPOSITION 11 MAXRESULTS 10",
+                             "SELECT Id, TotalAmt FROM Invoice STARTPOSITION 21 MAXRESULTS 10"]
+
+
+@pytest.mark.asyncio
+async def test_prefetch_stays_within_the_window_and_stops_on_close():
+    pages = FakePages(total=1000, page_size=10)
+    paginator = QBOPaginator(QBOQuery("Invoice"), pages, page_size=10, prefetch_pages=2)
+
+    assert (await paginator.__anext__())["Id"] == "1"
+    for _ in range(20):
+        await asyncio.sleep(0)
+    assert len(pages.queries) == 3  # The page being read plus two ahead, no more
+
+    for _ in range(10):  # Finish page 1 and start page 2: one more page may be fetched
+        await paginator.__anext__()
+    for _ in range(20):
+        await asyncio.sleep(0)
+    assert len(pages.queries) == 4
+
+    await paginator.aclose()
+    assert paginator._producer.done()
+    with pytest.raises(StopAsyncIteration):
+        await paginator.__anext__()
+
+
+@pytest.mark.asyncio
+async def test_page_failure_is_raised_after_the_pages_before_it():
+    paginator = QBOPaginator(QBOQuery("Invoice"), FakePages(total=50, page_size=10, fail_at=21), page_size=10)
+    seen = []
+
+    with pytest.raises(RateLimitError):
+        async for record in paginator:
+            seen.append(record["Id"])
+    assert len(seen) == 20
+
+
+@pytest.mark.asyncio
+async def test_coalescer_sends_queries_issued_together_in_one_call():
+    calls = []
+
+    async def run_queries(queries):
+        calls.append(list(queries.values()))
+        return {key: sql.lower() for key, sql in queries.items()}
+
+    coalescer = QueryCoalescer(run_queries)
+    results = await asyncio.gather(coalescer.run("Invoice", "A"), coalescer.run("Payment", "B"))
+
+    assert results == ["a", "b"] and calls == [["A", "B"]]
+    assert await coalescer.run("Invoice", "C") == "c" and len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_customer_history_and_estimates_are_no_longer_truncated(fake_qbo, fake_qbo_client):
+    fake_qbo.entities["Invoice"] = INVOICES
+    fake_qbo.entities["Estimate"] = [{"Id": str(i), "TxnStatus": "Pending", "CustomerRef": {"value": "42"}} for i in range(1200)]
+
+    transactions = await qbo_api.get_customer_transactions(fake_qbo_client, "42")
+    assert [t["type"] for t in transactions].count("Invoice") == 2500
+    assert [t["type"] for t in transactions].count("Estimate") == 1200
+    rounds = [[op["Query"] for op in json.loads(body)["BatchItemRequest"]] for _, _, body in fake_qbo.requests_to("batch")]
+    assert len(rounds[0]) == 4  # First pages of all four types in one request
+    assert "SELECT Id, TxnDate, TotalAmt, Balance, DueDate, DocNumber, CustomerRef FROM Invoice WHERE CustomerRef = '42' " \
+           "STARTPOSITION 2001 MAXRESULTS 1000" in [q for r in rounds for q in r]
+
+    streamed = [t async for t in qbo_api.stream_customer_transactions(fake_qbo_client, "42", fields=["TotalAmt"])]
+    assert len(streamed) == 3700 and streamed[0] == {"type": "Invoice", "Id": "1", "TotalAmt": 1.0, "CustomerRefValue": "42"}
+
+    estimates = await qbo_api.find_estimates(fake_qbo_client, customer_id="42", fields=["TxnStatus"])
+    assert len(estimates) == 1200
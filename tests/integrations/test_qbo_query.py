@@ -0,0 +1,82 @@
+import datetime
+import json
+
+import pytest
+
+from ledger_cfo.core import crud
+from ledger_cfo.integrations import qbo_api, qbo_mirror
+from ledger_cfo.integrations.qbo_errors import InvalidDataError
+from ledger_cfo.integrations.qbo_query import QBOQuery, normalize_fields, project
+
+ESTIMATE = {"Id": "301", "SyncToken": "0", "TxnDate": "2025-01-05", "TotalAmt": 90.0, "TxnStatus": "Pending",
+            "CustomerRef": {"value": "42"}, "Line": [{"Id": "1", "Amount": 90.0, "DetailType": "SubTotalLineDetail"}],
+            "BillEmail": {"Address": "ap@acme.test"}}
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    for cache in qbo_api.TRANSACTIONAL_CACHES:
+        cache.clear()
+    yield
+    for cache in qbo_api.TRANSACTIONAL_CACHES:
+        cache.clear()
+
+
+def _queries_sent(fake_qbo):
+    return [op["Query"] for _, _, body in fake_qbo.requests_to("batch") for op in json.loads(body)["BatchItemRequest"]]
+
+
+def test_query_builder_emits_column_list_and_quotes_values():
+    query = QBOQuery("Invoice", fields=["TxnDate", "TotalAmt", "TxnDate"], max_results=50, start_position=101)
+    query.where_equals("CustomerRef", "O'Brien").where_in("Id", ["1", "2"])
+
+    assert query.to_sql() == ("SELECT Id, TxnDate, TotalAmt FROM Invoice WHERE CustomerRef = 'O\\'Brien' AND Id IN ('1', '2') "
+                              "STARTPOSITION 101 MAXRESULTS 50")
+    assert QBOQuery("Item").to_sql() == "SELECT * FROM Item"
+
+
+def test_fields_are_validated_and_records_projected():
+    assert normalize_fields("TxnDate, TotalAmt") == ["Id", "TxnDate", "TotalAmt"]
+    assert normalize_fields(None) is None
+    with pytest.raises(InvalidDataError):
+        normalize_fields(["TotalAmt FROM Invoice --"])
+    with pytest.raises(InvalidDataError):
+        normalize_fields(["CustomerRef.value"])
+
+    assert project(ESTIMATE, ["Id", "TotalAmt", "DueDate"]) == {"Id": "301", "TotalAmt": 90.0, "DueDate": None}
+
+
+@pytest.mark.asyncio
+async def test_customer_transactions_select_only_summary_fields(fake_qbo, fake_qbo_client):
+    fake_qbo.entities["Estimate"] = [ESTIMATE]
+
+    transactions = await qbo_api.get_customer_transactions(fake_qbo_client, "42", start_date="2025-01-01")
+
+    queries = _queries_sent(fake_qbo)
+    assert "SELECT Id, TxnDate, TotalAmt, Balance, DueDate, DocNumber, CustomerRef FROM Invoice WHERE CustomerRef = '42' " \
+           "AND TxnDate >= '2025-01-01' MAXRESULTS 1000" in queries
+    assert not any(q.startswith("SELECT *") for q in queries)
+    assert transactions == [{"type": "Estimate", "Id": "301", "TxnDate": "2025-01-05", "TotalAmt": 90.0, "TxnStatus": "Pending",
+                             "ExpirationDate": None, "DocNumber": None, "CustomerRefValue": "42"}]
+
+    custom = await qbo_api.get_customer_transactions(fake_qbo_client, "42", start_date="2025-01-01", fields=["TotalAmt"])
+    assert custom == [{"type": "Estimate", "Id": "301", "TotalAmt": 90.0, "CustomerRefValue": "42"}]
+
+
+@pytest.mark.asyncio
+async def test_find_estimates_fields_returns_light_records_live_and_from_mirror(fake_qbo, fake_qbo_client, db):
+    fake_qbo.entities["Estimate"] = [ESTIMATE]
+
+    live = await qbo_api.find_estimates(fake_qbo_client, customer_id="42", fields=["TxnStatus", "TotalAmt"])
+
+    assert _queries_sent(fake_qbo) == ["SELECT Id, TxnStatus, TotalAmt FROM Estimate WHERE CustomerRef = '42' MAXRESULTS 1000"]
+    assert live == [{"Id": "301", "TxnStatus": "Pending", "TotalAmt": 90.0}]
+
+    qbo_mirror.apply_mirror_changes(db, "Estimate", [ESTIMATE])
+    crud.update_sync_state(db, "Estimate", datetime.datetime.utcnow())
+    qbo_api.search_cache.clear()
+    from_mirror = await qbo_api.find_estimates(fake_qbo_client, customer_id="42", fields=["TxnStatus", "TotalAmt"], db=db)
+    assert from_mirror == live
+
+    full = await qbo_api.find_estimates(fake_qbo_client, customer_id="42", db=db)
+    assert full[0]["Line"][0]["Amount"] == 90.0  # Without fields, full estimates as before
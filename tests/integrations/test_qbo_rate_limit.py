@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from quickbooks.exceptions import QuickbooksException
+
+from ledger_cfo.core import metrics
+from ledger_cfo.integrations import qbo_api
+from ledger_cfo.integrations.qbo_rate_limit import InMemoryRateLimitBackend, QBORateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_allows_burst_then_spaces_reservations():
+    clock = FakeClock()
+    backend = InMemoryRateLimitBackend(clock=clock)
+
+    waits = [await backend.reserve("realm", rate_per_second=2.0, capacity=3) for _ in range(5)]
+    assert waits == [0.0, 0.0, 0.0, 0.5, 1.0]
+
+    clock.now = 10.0  # Refills, but never beyond capacity
+    assert [await backend.reserve("realm", 2.0, 3) for _ in range(4)] == [0.0, 0.0, 0.0, 0.5]
+    assert await backend.reserve("other-realm", 2.0, 3) == 0.0
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped_per_realm():
+    limiter = QBORateLimiter(requests_per_minute=60000, burst=100, max_concurrent=3)
+    in_flight, peak, lock = 0, 0, threading.Lock()
+
+    def blocking_call():
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.02)
+        with lock:
+            in_flight -= 1
+        return "ok"
+
+    results = await asyncio.gather(*(limiter.call("realm-a", blocking_call) for _ in range(9)))
+
+    assert results == ["ok"] * 9
+    assert peak == 3
+    wait_metric = next(h for h in metrics.snapshot()["histograms"] if h["name"] == "qbo_rate_limiter_queue_wait_seconds")
+    assert wait_metric["labels"] == {"realm": "realm-a"} and wait_metric["count"] == 9
+    assert wait_metric["max"] > 0  # Later calls queued behind the first three
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_error_halves_rate_and_retries():
+    limiter = QBORateLimiter(requests_per_minute=500, burst=10, min_requests_per_minute=100, additive_increase=5, base_backoff=0.01)
+    calls = []
+
+    def throttled_once():
+        calls.append(1)
+        if len(calls) == 1:
+            raise QuickbooksException("Throttle exceeded", error_code=8012)
+        return "done"
+
+    assert await limiter.call("realm-b", throttled_once) == "done"
+    assert len(calls) == 2
+    # Halved to 250 by the error, then +5 for the successful retry
+    assert limiter.current_rate("realm-b") == 255
+    assert metrics.counter("qbo_rate_limited_total", realm="realm-b").value == 1
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_retries_are_bounded_and_other_errors_pass_through():
+    limiter = QBORateLimiter(max_retries=2, base_backoff=0.001, min_requests_per_minute=100)
+
+    def always_throttled():
+        raise QuickbooksException("Throttle exceeded", error_code=8012)
+
+    def broken():
+        raise ValueError("boom")
+
+    with pytest.raises(QuickbooksException):
+        await limiter.call("realm-c", always_throttled)
+    assert limiter.current_rate("realm-c") == 100  # 500 -> 250 -> 125 -> floor
+    with pytest.raises(ValueError):
+        await limiter.call("realm-c", broken)
+
+
+@pytest.mark.asyncio
+async def test_sync_qbo_call_goes_through_limiter_for_client_realm(fake_qbo, fake_qbo_client):
+    fake_qbo.entities["Item"] = [{"Id": "1", "Name": "Widget"}]
+
+    await qbo_api._sync_qbo_call(fake_qbo_client.query, "SELECT * FROM Item")
+
+    labels = [h["labels"] for h in metrics.snapshot()["histograms"] if h["name"] == "qbo_rate_limiter_queue_wait_seconds"]
+    assert labels == [{"realm": fake_qbo_client.company_id}]
@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from ledger_cfo.core import metrics
+from ledger_cfo.integrations import qbo_api
+from ledger_cfo.integrations.qbo_cache import StaleWhileRevalidateCache
+from ledger_cfo.models import AccountCache
+
+ACCOUNTS = [{"Id": "1", "Name": "Checking", "AccountType": "Bank", "Classification": "Asset", "Active": True},
+            {"Id": "7", "Name": "Supplies", "AccountType": "Expense", "Classification": "Expense", "Active": True}]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(qbo_api, "account_cache", StaleWhileRevalidateCache("accounts", ttl=60, max_staleness=600, clock=clock))
+    monkeypatch.setattr(qbo_api, "reference_cache", StaleWhileRevalidateCache("reference_data", ttl=60, max_staleness=600, clock=clock))
+    monkeypatch.setattr(qbo_api, "_accounts_db_generation", {})
+    metrics.reset()
+    yield clock
+    metrics.reset()
+
+
+@pytest.mark.asyncio
+async def test_stale_value_is_served_at_once_and_refreshed_in_background():
+    clock = FakeClock()
+    cache = StaleWhileRevalidateCache("test", ttl=10, max_staleness=100, clock=clock)
+    loads = []
+
+    async def loader():
+        loads.append(clock.now)
+        return f"v{len(loads)}"
+
+    assert await cache.get("k", loader) == "v1"
+    clock.now = 5
+    assert await cache.get("k", loader) == "v1" and len(loads) == 1  # Fresh
+
+    clock.now = 50
+    assert await cache.get("k", loader) == "v1"  # Stale, returned without waiting
+    cache.wait_for_revalidation(timeout=5)
+    assert loads == [0, 50] and await cache.get("k", loader) == "v2"
+    assert metrics.counter("qbo_cache_stale_served_total", cache="test").value == 1
+    assert metrics.counter("qbo_cache_revalidations_total", cache="test", outcome="ok").value == 1
+
+    clock.now = 500  # Past the hard limit: callers wait for a fresh load
+    assert await cache.get("k", loader) == "v3"
+    assert metrics.counter("qbo_cache_stale_rejected_total", cache="test").value == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_background_refresh_keeps_serving_until_max_staleness():
+    clock = FakeClock()
+    cache = StaleWhileRevalidateCache("test", ttl=10, max_staleness=100, clock=clock)
+
+    async def failing_loader():
+        raise RuntimeError("QBO down")
+
+    await cache.get("k", lambda: asyncio.sleep(0, result="v1"))
+    clock.now = 20
+    assert await cache.get("k", failing_loader) == "v1"
+    cache.wait_for_revalidation(timeout=5)
+    assert metrics.counter("qbo_cache_revalidations_total", cache="test", outcome="error").value == 1
+
+    clock.now = 150
+    with pytest.raises(RuntimeError):
+        await cache.get("k", failing_loader)
+
+
+@pytest.mark.asyncio
+async def test_accounts_refreshed_in_background_reach_db_cache(fake_qbo, fake_qbo_client, db, clock):
+    fake_qbo.entities["Account"] = ACCOUNTS
+
+    accounts = await qbo_api.get_qbo_accounts(fake_qbo_client, db)
+    assert [a["name"] for a in accounts] == ["Checking", "Supplies"]
+
+    fake_qbo.entities["Account"] = ACCOUNTS + [{"Id": "9", "Name": "Fuel", "AccountType": "Expense", "Active": True}]
+    clock.now = 120
+    requests_before = len(fake_qbo.requests)
+    assert len(await qbo_api.get_qbo_accounts(fake_qbo_client, db)) == 2  # Stale copy, no waiting
+    qbo_api.account_cache.wait_for_revalidation(timeout=5)
+    assert len(fake_qbo.requests) == requests_before + 1
+
+    assert len(await qbo_api.get_qbo_accounts(fake_qbo_client, db)) == 3
+    assert sorted(db.execute(select(AccountCache.name)).scalars()) == ["Checking", "Fuel", "Supplies"]
+
+
+@pytest.mark.asyncio
+async def test_find_item_uses_cached_item_list(fake_qbo, fake_qbo_client, clock):
+    fake_qbo.entities["Item"] = [{"Id": "5", "Name": "Consulting", "Type": "Service", "UnitPrice": 150,
+                                  "IncomeAccountRef": {"value": "79"}, "Active": True}]
+
+    first = await qbo_api.find_item(fake_qbo_client, "consulting")
+    second = await qbo_api.find_item(fake_qbo_client, "Consulting")
+
+    assert first == second == {"Id": "5", "Name": "Consulting", "Description": "", "Type": "Service", "UnitPrice": 150,
+                               "IncomeAccountRef": "79", "ExpenseAccountRef": None, "Active": True}
+    assert len(fake_qbo.requests) == 1  # Only the list load
+    with pytest.raises(ValueError):
+        await qbo_api.get_reference_data(fake_qbo_client, "Invoice")
+
+
+@pytest.mark.asyncio
+async def test_generation_is_returned_with_the_value_it_belongs_to():
+    clock = FakeClock()
+    cache = StaleWhileRevalidateCache("test", ttl=10, max_staleness=100, clock=clock)
+    versions = iter(["v1", "v2"])
+
+    async def loader():
+        return next(versions)
+
+    assert await cache.get_with_generation("k", loader) == ("v1", 1)
+    clock.now = 50
+    stale = await cache.get_with_generation("k", loader)
+    cache.wait_for_revalidation(timeout=5)
+
+    assert stale == ("v1", 1)  # Not the refreshed entry's generation, though the refresh has finished
+    assert await cache.get_with_generation("k", loader) == ("v2", 2)
+    cache.invalidate("k")
+    versions = iter(["v3"])
+    assert (await cache.get_with_generation("k", loader))[1] == 3  # Never reused after invalidation
@@ -0,0 +1,121 @@
+import asyncio
+import datetime
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from ledger_cfo.integrations import qbo_api, qbo_reports
+from ledger_cfo.integrations.qbo_reports import parse_date_range, parse_report, period_is_closed
+
+TODAY = datetime.date(2025, 5, 20)
+
+PNL = {
+    "Header": {"ReportName": "ProfitAndLoss", "StartPeriod": "2024-01-01", "EndPeriod": "2024-03-31",
+               "ReportBasis": "Accrual", "Currency": "USD"},
+    "Columns": {"Column": [{"ColTitle": "", "ColType": "Account"}, {"ColTitle": "Total", "ColType": "Money"}]},
+    "Rows": {"Row": [
+        {"type": "Section", "group": "Income",
+         "Header": {"ColData": [{"value": "Income"}, {"value": ""}]},
+         "Rows": {"Row": [{"type": "Data", "ColData": [{"value": "Services", "id": "1"}, {"value": "1500.00"}]},
+                          {"type": "Data", "ColData": [{"value": "Materials", "id": "2"}, {"value": "250.50"}]}]},
+         "Summary": {"ColData": [{"value": "Total Income"}, {"value": "1750.50"}]}},
+        {"type": "Section", "group": "Expenses",
+         "Header": {"ColData": [{"value": "Expenses"}, {"value": ""}]},
+         "Rows": {"Row": [{"type": "Data", "ColData": [{"value": "Fuel", "id": "7"}, {"value": "300.00"}]}]},
+         "Summary": {"ColData": [{"value": "Total Expenses"}, {"value": "300.00"}]}},
+        {"type": "Section", "group": "NetIncome", "Summary": {"ColData": [{"value": "Net Income"}, {"value": "1450.50"}]}},
+    ]},
+}
+
+
+@pytest.fixture(autouse=True)
+def clear_report_caches():
+    for cache in (qbo_api.report_cache, qbo_api.closed_report_cache, qbo_api.reference_cache):
+        cache.clear()
+    yield
+    for cache in (qbo_api.report_cache, qbo_api.closed_report_cache, qbo_api.reference_cache):
+        cache.clear()
+
+
+def _report_requests(fake_qbo):
+    return [parse_qs(urlsplit(path).query) for _, path, _ in fake_qbo.requests if "/reports/" in path]
+
+
+def test_date_phrases_cover_whole_calendar_periods():
+    assert parse_date_range("last month", today=TODAY) == ("2025-04-01", "2025-04-30")
+    assert parse_date_range("this month", today=TODAY) == ("2025-05-01", "2025-05-31")
+    assert parse_date_range("last quarter", today=datetime.date(2025, 2, 1)) == ("2024-10-01", "2024-12-31")
+    assert parse_date_range("this year", today=TODAY) == ("2025-01-01", "2025-12-31")
+    assert parse_date_range("2023-01-01 to 2023-03-31") == ("2023-01-01", "2023-03-31")
+    assert parse_date_range("2023-03-31 to 2023-01-01") == (None, None)
+    assert parse_date_range("sometime soon") == (None, None)
+
+
+def test_periods_close_only_with_the_books_closing_date():
+    assert not period_is_closed("2020-03-31")  # Old, but the books were never closed
+    assert period_is_closed("2025-04-30", books_closed_through="2025-04-30")
+    assert not period_is_closed("2025-05-31", books_closed_through="2025-04-30")
+    assert not period_is_closed(None, books_closed_through="2025-04-30")
+
+
+def test_nested_sections_are_flattened_into_rows_and_totals():
+    report = parse_report(PNL)
+
+    assert report["columns"] == ["Total"] and report["accounting_method"] == "Accrual"
+    assert report["rows"][:4] == [["header", 0, "Income", "Income", None, None],
+                                  ["data", 1, "Income", "Services", "1", 1500.0],
+                                  ["data", 1, "Income", "Materials", "2", 250.5],
+                                  ["summary", 0, "Income", "Total Income", None, 1750.5]]
+    assert report["totals"] == {"Income": [1750.5], "Expenses": [300.0], "NetIncome": [1450.5]}
+    assert qbo_reports.format_summary(report).splitlines()[-1] == "Net Income: 1,450.50"
+
+
+def test_only_parameters_the_report_accepts_are_sent():
+    assert qbo_reports.report_params("AgedReceivables", "2025-01-01", "2025-03-31", "Cash", "Month") == {"report_date": "2025-03-31"}
+    assert qbo_reports.report_params("ProfitAndLoss", "2025-01-01", "2025-03-31", "Cash", "Month") == \
+        {"start_date": "2025-01-01", "end_date": "2025-03-31", "accounting_method": "Cash", "summarize_column_by": "Month"}
+    with pytest.raises(ValueError):
+        qbo_reports.report_params("GeneralLedger")
+
+
+@pytest.mark.asyncio
+async def test_closed_period_report_is_fetched_once(fake_qbo, fake_qbo_client):
+    fake_qbo.reports["ProfitAndLoss"] = PNL
+    fake_qbo.preferences = {"AccountingInfoPrefs": {"BookCloseDate": "2024-12-31"}}
+
+    reports = await asyncio.gather(*(qbo_api.generate_pnl_report(fake_qbo_client, "2024-01-01", "2024-03-31") for _ in range(3)))
+    qbo_api._invalidate_after_write("Invoice", "101") # Writes cannot change a closed period
+    again = await qbo_api.generate_pnl_report(fake_qbo_client, "2024-01-01", "2024-03-31")
+
+    assert all(r["totals"]["NetIncome"] == [1450.5] for r in reports + [again])
+    assert len(fake_qbo.requests_to("preferences")) == 1
+    assert _report_requests(fake_qbo) == [{"start_date": ["2024-01-01"], "end_date": ["2024-03-31"], "minorversion": ["75"]}]
+
+    await qbo_api.generate_pnl_report(fake_qbo_client, "2024-01-01", "2024-03-31", accounting_method="Cash")
+    assert len(_report_requests(fake_qbo)) == 2 # A different basis is a different report
+
+
+@pytest.mark.asyncio
+async def test_open_period_report_is_refetched_after_a_write(fake_qbo, fake_qbo_client):
+    today = datetime.date.today()
+    start, end = parse_date_range("this month", today=today)
+
+    await qbo_api.get_report(fake_qbo_client, "BalanceSheet", start, end)
+    await qbo_api.get_report(fake_qbo_client, "BalanceSheet", start, end)
+    assert len(_report_requests(fake_qbo)) == 1
+
+    qbo_api._invalidate_after_write("Invoice", "101")
+    await qbo_api.get_report(fake_qbo_client, "BalanceSheet", start, end)
+    assert len(_report_requests(fake_qbo)) == 2
+
+
+@pytest.mark.asyncio
+async def test_old_period_of_books_never_closed_is_refetched_after_a_write(fake_qbo, fake_qbo_client):
+    fake_qbo.reports["ProfitAndLoss"] = PNL
+
+    await qbo_api.generate_pnl_report(fake_qbo_client, "2024-01-01", "2024-03-31")
+    qbo_api._invalidate_after_write("Invoice", "101")  # e.g. a backdated invoice
+    await qbo_api.generate_pnl_report(fake_qbo_client, "2024-01-01", "2024-03-31")
+
+    assert len(_report_requests(fake_qbo)) == 2
+    assert len(qbo_api.closed_report_cache) == 0
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from ledger_cfo.core import metrics
+from ledger_cfo.integrations import qbo_api
+from ledger_cfo.integrations.qbo_cache import SingleFlight
+from ledger_cfo.integrations.qbo_errors import NotFoundError
+
+ESTIMATE = {"Id": "301", "SyncToken": "0", "TxnDate": "2025-01-05", "TotalAmt": 90.0, "TxnStatus": "Pending",
+            "CustomerRef": {"value": "42"}}
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    metrics.reset()
+    for cache in qbo_api.TRANSACTIONAL_CACHES:
+        cache.clear()
+    yield
+    metrics.reset()
+    for cache in qbo_api.TRANSACTIONAL_CACHES:
+        cache.clear()
+
+
+def _saved(operation):
+    return metrics.counter("qbo_single_flight_saved_total", operation=operation).value
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_misses_issue_one_qbo_call(fake_qbo, fake_qbo_client):
+    fake_qbo.entities["Estimate"] = [ESTIMATE, {**ESTIMATE, "Id": "302"}]
+    fake_qbo.response_delay = 0.1
+
+    results = await asyncio.gather(*(qbo_api.get_estimate_details(fake_qbo_client, "301") for _ in range(5)),
+                                   qbo_api.get_estimate_details(fake_qbo_client, "302"))
+
+    assert [r["Id"] for r in results] == ["301"] * 5 + ["302"]
+    assert len(fake_qbo.requests) == 2  # One per distinct estimate
+    assert _saved("get_estimate_details") == 4
+    assert qbo_api.get_estimate_details.single_flight.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_followers_receive_the_leaders_error(fake_qbo, fake_qbo_client):
+    fake_qbo.response_delay = 0.1
+
+    results = await asyncio.gather(*(qbo_api.get_invoice_details(fake_qbo_client, "999") for _ in range(3)),
+                                   return_exceptions=True)
+
+    assert all(isinstance(r, NotFoundError) for r in results)
+    assert len(fake_qbo.requests) == 1
+    assert _saved("get_invoice_details") == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_hands_over_to_a_follower():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def slow_call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    leader = asyncio.create_task(flight.do("k", slow_call))
+    await asyncio.sleep(0.01)
+    follower = asyncio.create_task(flight.do("k", slow_call))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    assert await follower == 2  # The follower retried as the new leader
+    with pytest.raises(asyncio.CancelledError):
+        await leader
@@ -0,0 +1,84 @@
+import datetime
+import json
+import pathlib
+
+import pytest
+from sqlalchemy import select
+
+from ledger_cfo.core import crud
+from ledger_cfo.integrations import qbo_mirror, qbo_sync
+from ledger_cfo.models import CustomerCache, InvoiceMirror, PaymentMirror
+
+RECORDED_CDC_RESPONSE = json.loads((pathlib.Path(__file__).parent / "data" / "qbo_cdc_response.json").read_text())
+
+
+def test_parse_cdc_response_splits_changes_and_deletes():
+    changes = qbo_sync.parse_cdc_response(RECORDED_CDC_RESPONSE)
+
+    customers, deleted_customers = changes["Customer"]
+    assert [c["Id"] for c in customers] == ["42"]
+    assert deleted_customers == ["43"]
+    assert changes["Payment"] == ([], ["201"])
+    assert [i["Id"] for i in changes["Invoice"][0]] == ["101"]
+
+
+@pytest.mark.asyncio
+async def test_first_sync_does_full_reload(fake_qbo, fake_qbo_client, db):
+    fake_qbo.entities["Customer"] = [{"Id": "1", "DisplayName": "Beta LLC", "Active": True}]
+    fake_qbo.entities["Invoice"] = [{"Id": "9", "TxnDate": "2025-03-01", "TotalAmt": 10.0, "CustomerRef": {"value": "1"}}]
+
+    stats = await qbo_sync.sync_qbo_mirror(fake_qbo_client, db, entities=["Customer", "Invoice"])
+
+    assert stats["Customer"] == {"mode": "full", "upserted": 1, "deleted": 0}
+    assert len(fake_qbo.requests_to("batch")) == 1  # Both entities' first page in one round trip
+    assert fake_qbo.requests_to("cdc") == []
+    invoice = db.execute(select(InvoiceMirror)).scalar_one()
+    assert (invoice.qbo_invoice_id, invoice.customer_id, invoice.txn_date) == ("9", "1", datetime.date(2025, 3, 1))
+    assert set(crud.get_sync_states(db)) == {"Customer", "Invoice"}
+
+
+@pytest.mark.asyncio
+async def test_incremental_sync_applies_recorded_cdc_payload(fake_qbo, fake_qbo_client, db):
+    recent_mark = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+    for entity_name in ("Customer", "Invoice", "Payment"):
+        crud.update_sync_state(db, entity_name, recent_mark)
+    crud.bulk_upsert_mirror_rows(db, CustomerCache, "qbo_customer_id", [
+        qbo_mirror.customer_row({"Id": "42", "DisplayName": "Acme (old name)"}),
+        qbo_mirror.customer_row({"Id": "43", "DisplayName": "Gone Inc"}),
+    ])
+    crud.bulk_upsert_mirror_rows(db, PaymentMirror, "qbo_payment_id", [qbo_mirror.payment_row({"Id": "201", "TotalAmt": 5.0})])
+    fake_qbo.cdc_payload = RECORDED_CDC_RESPONSE
+
+    stats = await qbo_sync.sync_qbo_mirror(fake_qbo_client, db, entities=["Customer", "Invoice", "Payment"])
+
+    assert stats == {
+        "Customer": {"mode": "cdc", "upserted": 1, "deleted": 1},
+        "Invoice": {"mode": "cdc", "upserted": 1, "deleted": 0},
+        "Payment": {"mode": "cdc", "upserted": 0, "deleted": 1},
+    }
+    cdc_requests = fake_qbo.requests_to("cdc")
+    assert len(cdc_requests) == 1 and fake_qbo.requests_to("batch") == []
+    assert "entities=Customer%2CInvoice%2CPayment" in cdc_requests[0][1]
+    assert f"changedSince={recent_mark.replace(microsecond=0).isoformat()}".replace(":", "%3A") in cdc_requests[0][1]
+
+    customer = db.execute(select(CustomerCache)).scalar_one()
+    assert (customer.qbo_customer_id, customer.display_name, customer.email_address) == ("42", "Acme Corp", "billing@acme.example")
+    assert customer.qbo_last_updated_at == datetime.datetime(2025, 1, 9, 22, 30)
+    assert db.execute(select(PaymentMirror)).first() is None
+    assert db.execute(select(InvoiceMirror.balance)).scalar_one() == 50.0
+    # The server time of the response becomes the next changedSince
+    assert crud.get_sync_states(db)["Invoice"].high_water_mark == datetime.datetime(2025, 1, 10, 0, 5, 12, 345000)
+
+
+@pytest.mark.asyncio
+async def test_truncated_cdc_response_falls_back_to_full_reload(fake_qbo, fake_qbo_client, db, monkeypatch):
+    monkeypatch.setattr(qbo_sync, "CDC_MAX_ENTITIES_PER_RESPONSE", 2)
+    crud.update_sync_state(db, "Customer", datetime.datetime.utcnow() - datetime.timedelta(hours=1))
+    crud.bulk_upsert_mirror_rows(db, CustomerCache, "qbo_customer_id", [qbo_mirror.customer_row({"Id": "7", "DisplayName": "Stale"})])
+    fake_qbo.cdc_payload = RECORDED_CDC_RESPONSE
+    fake_qbo.entities["Customer"] = [{"Id": "42", "DisplayName": "Acme Corp"}]
+
+    stats = await qbo_sync.sync_qbo_mirror(fake_qbo_client, db, entities=["Customer"])
+
+    assert stats["Customer"] == {"mode": "full", "upserted": 1, "deleted": 1}
+    assert db.execute(select(CustomerCache.qbo_customer_id)).scalars().all() == ["42"]
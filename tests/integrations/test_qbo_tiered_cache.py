@@ -0,0 +1,111 @@
+import pytest
+from sqlalchemy import create_engine
+
+from ledger_cfo.core import metrics
+from ledger_cfo.integrations import qbo_cache
+from ledger_cfo.integrations.qbo_cache import TieredCache, cache_key, customer_tag, deserialize, serialize
+from ledger_cfo.integrations.qbo_cache_backends import SQLCacheBackend, backend_from_url
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def l2(tmp_path, clock):
+    backend = SQLCacheBackend(create_engine(f"sqlite:///{tmp_path / 'qbo-cache.db'}"), clock=clock)
+    qbo_cache.set_l2_backend(backend)
+    metrics.reset()
+    yield backend
+    qbo_cache.set_l2_backend(None)
+    metrics.reset()
+
+
+def test_cache_keys_are_structured_and_stable():
+    key = cache_key("find_estimates", "9130", status="Pending", customer_id="42")
+
+    assert key == cache_key("find_estimates", 9130, customer_id="42", status="Pending", start_date=None)
+    assert str(key) == "9130/find_estimates?customer_id=42&status=Pending"
+    assert key != cache_key("find_estimates", "9131", customer_id="42", status="Pending")
+
+
+def test_serialization_is_compact_and_compresses_large_values():
+    small = {"Id": "1", "TotalAmt": 12.5}
+    large = [{"Id": str(i), "DocNumber": f"INV-{i}", "TotalAmt": 100.0} for i in range(200)]
+
+    assert serialize(small) == b'j{"Id":"1","TotalAmt":12.5}'
+    assert serialize(large)[:1] == b"z" and len(serialize(large)) < len(str(large)) / 4
+    assert deserialize(serialize(large)) == large
+
+
+def test_sql_backend_follows_redis_semantics(l2, clock):
+    assert l2.set("a", b"1", ex=10) and l2.get("a") == b"1"
+    assert l2.sadd("s", "x", "y") == 2 and l2.sadd("s", "y", "z") == 1
+    assert l2.expire("s", 5)
+    assert l2.smembers("s") == {"x", "y", "z"}
+    assert sorted(l2.scan_iter(match="*")) == ["a", "s"]
+
+    clock.now += 6
+    assert l2.smembers("s") == set() and l2.get("a") == b"1"
+    clock.now += 5
+    assert l2.get("a") is None
+    assert l2.delete("a", "s") == 0
+
+    l2.set("b", b"2")
+    assert l2.delete("b", "missing") == 1
+
+
+def test_workers_share_entries_through_l2_and_invalidate_both_tiers(l2):
+    worker_a = TieredCache("transactions", maxsize=10, ttl=300)
+    worker_b = TieredCache("transactions", maxsize=10, ttl=300)  # Same cache in another process
+    key = cache_key("get_customer_transactions", "9130", customer_id="42")
+    other_key = cache_key("get_customer_transactions", "9130", customer_id="77")
+
+    worker_a.set(key, [{"Id": "101"}], tags=[customer_tag("42")])
+    worker_a.set(other_key, [{"Id": "201"}], tags=[customer_tag("77")])
+
+    assert worker_b.get(key) == [{"Id": "101"}]  # Served from L2 ...
+    assert worker_b.tags_of(key) == frozenset({customer_tag("42")})  # ... and kept in L1 with its tags
+    assert worker_b.get(key) == [{"Id": "101"}]
+    assert metrics.counter("qbo_cache_hits_total", cache="transactions", tier="l2").value == 1
+    assert metrics.counter("qbo_cache_hits_total", cache="transactions", tier="l1").value == 1
+
+    worker_b.invalidate_tags([customer_tag("42")])  # A write handled by worker B
+    worker_a.l1.clear()  # Worker A's L1 copy ages out (QBO_CACHE_L1_TTL_SECONDS)
+
+    assert worker_a.get(key) is None
+    assert worker_a.get(other_key) == [{"Id": "201"}]
+
+
+def test_l1_ttl_is_bounded_only_with_a_shared_tier(tmp_path):
+    cache = TieredCache("details", maxsize=10, ttl=600)
+    qbo_cache.set_l2_backend(None)
+    assert cache.l1.ttl == 600
+
+    qbo_cache.set_l2_backend(backend_from_url(f"sqlite:///{tmp_path / 'shared.db'}"))
+    try:
+        assert cache.l1.ttl == qbo_cache.QBO_CACHE_L1_TTL_SECONDS
+    finally:
+        qbo_cache.set_l2_backend(None)
+    assert cache.l1.ttl == 600
+
+
+def test_broken_l2_degrades_to_l1_only(l2):
+    cache = TieredCache("search", maxsize=10, ttl=120)
+    l2.engine.dispose()
+    l2._session_factory.configure(bind=create_engine("sqlite:////nonexistent-dir/cache.db"))
+
+    cache.set("k", [1], tags=["t"])  # Logged, not raised
+    assert cache.get("k") == [1]
+    cache.l1.clear()
+    assert cache.get("k") is None
+    assert cache.invalidate_tags(["t"]) == 0